@@ -3,7 +3,7 @@ Fix Prompt Generator Agent
 Generates comprehensive, ready-to-use AI agent prompts from code review findings.
 """
 
-from core.llm import LLMService
+from core.async_llm import AsyncLLMService
 import json
 
 FIX_PROMPT_SYSTEM = """You are **FixBot**, an expert prompt engineer that converts code review findings into a single, comprehensive, ready-to-use prompt. The prompt you generate will be copy-pasted directly into an AI coding assistant (like Claude, Copilot, or ChatGPT) to fix ALL identified issues in one shot.
@@ -60,10 +60,10 @@ In @file.py:
 class FixPromptAgent:
     """Generates comprehensive fix prompts from review findings."""
     
-    def __init__(self):
-        self.llm = LLMService()
+    def __init__(self, llm_service=None):
+        self.llm = llm_service or AsyncLLMService()
 
-    def generate_fix_prompt(self, findings_by_file: dict, pr_title: str = "") -> str:
+    async def generate_fix_prompt(self, findings_by_file: dict, pr_title: str = "") -> str:
         """
         Generate a comprehensive fix prompt from grouped findings.
         
@@ -106,7 +106,7 @@ class FixPromptAgent:
             input_text += "\n"
 
         try:
-            result = self.llm.chat(
+            result = await self.llm.chat(
                 messages=[
                     {"role": "system", "content": FIX_PROMPT_SYSTEM},
                     {"role": "user", "content": input_text}
@@ -2,22 +2,27 @@
 import json
 import traceback
 from typing import List, Dict, Any
-from core.llm import LLMService
+from config import config
+from core.async_llm import AsyncLLMService
+from core.token_budget import truncate_to_tokens
+from core.json_repair import parse_llm_json
+from core.risk_scorer import heuristic_plan
 
 class ReviewPlanner:
     """
     Pass 1 Agent: The "Tech Lead"
     Scans the PR files and decides WHAT to review and WHERE to focus.
     """
-    def __init__(self):
-        self.llm = LLMService()
+    def __init__(self, llm_service=None):
+        self.llm = llm_service or AsyncLLMService()
 
-    def analyze_pr_complexity(self, pr_files: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def analyze_pr_complexity(self, pr_files: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Analyzes the list of changed files to determine review strategy.
         
         Args:
             pr_files: List of dicts with keys like 'filename', 'patch', 'additions', 'deletions'
+                (optionally 'content' and 'changed_lines' for the risk scorer)
             
         Returns:
             JSON plan with keys:
@@ -25,15 +30,26 @@ class ReviewPlanner:
             - high_risk_files (List[str])
             - ignore_files (List[str])
             - focus_instructions (str)
+
+        Small, clear-cut PRs are planned locally by core.risk_scorer (no LLM
+        call); large or ambiguous ones fall through to the LLM below.
         """
-        # Prepare a lightweight summary for the LLM
+        if config.PLANNER_FAST_PATH:
+            plan = heuristic_plan(pr_files)
+            if plan is not None:
+                print(f"  [Planner] Heuristic plan: {len(plan['high_risk_files'])} high-risk, {len(plan['ignore_files'])} ignored (LLM call skipped)")
+                return plan
+
+        # Prepare a lightweight summary for the LLM; the snippet budget is shared across files
+        snippet_tokens = max(config.PLANNER_MIN_SNIPPET_TOKENS, config.PLANNER_PATCH_TOKENS // max(1, len(pr_files)))
         files_summary = []
         for f in pr_files:
             summary = f"- {f.get('filename')}: +{f.get('additions', 0)}/-{f.get('deletions', 0)} lines"
-            # Add a snippet of the patch if small, or just first few lines
+            # Add a snippet of the patch: whole if small, else its first lines
             patch = f.get('patch', '')
             if patch:
-                summary += f"\n  Snippet: {patch[:200].replace(chr(10), ' ')}..."
+                snippet = truncate_to_tokens(patch, snippet_tokens, marker="...")
+                summary += f"\n  Snippet: {snippet.replace(chr(10), ' ')}"
             files_summary.append(summary)
             
         files_text = "\n".join(files_summary)
@@ -76,7 +92,7 @@ class ReviewPlanner:
                         messages.append({"role": "assistant", "content": "0e400"})
                         messages.append({"role": "user", "content": "That is NOT valid JSON. You returned a number. Return a JSON object with keys: review_strategy, high_risk_files, ignore_files, focus_instructions. Start with { immediately."})
                     
-                    content = self.llm.chat(
+                    content = await self.llm.chat(
                         messages=messages,
                         response_format={"type": "json_object"},
                         temperature=0.1
@@ -91,18 +107,8 @@ class ReviewPlanner:
                         print(f"  [Planner] No JSON object in response (attempt {attempt})")
                         continue
                     
-                    # Strip markdown code fences if present
-                    clean = content.strip()
-                    if clean.startswith("```"):
-                        # Remove opening fence (```json or ```)
-                        first_newline = clean.find('\n')
-                        if first_newline > 0:
-                            clean = clean[first_newline + 1:]
-                        # Remove closing fence
-                        if clean.rstrip().endswith("```"):
-                            clean = clean.rstrip()[:-3].rstrip()
-                    
-                    plan = json.loads(clean)
+                    # Fences, trailing commas, truncation etc. are repaired locally before re-prompting
+                    plan = parse_llm_json(content, source="planner")
                     
                     if not isinstance(plan, dict):
                         print(f"  [Planner] Got {type(plan).__name__} instead of dict (attempt {attempt})")
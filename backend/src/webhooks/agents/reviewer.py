@@ -1,12 +1,26 @@
-from core.llm import LLMService
+from core.async_llm import AsyncLLMService
 from core.diff_parser import DiffParser
+from core.parsed_diff import ParsedDiff
 from typing import Dict, Any, List, Optional
+from dataclasses import asdict, dataclass, field, fields
 import os
+import time
+import asyncio
+import hashlib
+import threading
+from config import config
 from core.context_builder import ContextBuilder
 from agents.planner import ReviewPlanner
 from core.github_client import GitHubClient
 from core.security import SecretScanner
 from core.feedback import FeedbackManager
+from core.review_cache import ReviewCache
+from core.file_packing import pack_files, split_pack_response
+from core.token_budget import TokenBudget, ModelLimits, chain_limits, count_tokens, output_budget
+from core.json_stream import IncrementalJSONParser
+from core.json_repair import parse_llm_json
+from core.llm_usage import record_cache_hit
+from core.triage import TriageFile, TriageSettings, triage_files
 
 # ═══════════════════════════════════════════════════════════════
 # APEX CODE REVIEWER — SYSTEM PROMPT
@@ -74,19 +88,199 @@ DEPENDENCY        Supply chain risk, version pinning, unused imports
 - Not a yes-machine. Positive observations are genuine and specific.
 """
 
+# Finding classification and fields, shared by the single-file and packed prompts
+FINDING_FIELDS = """CLASSIFY each finding into one of these types:
+- "actionable": Bugs, security issues, correctness problems, performance issues, reliability concerns — things that MUST or SHOULD be fixed
+- "nitpick": Style improvements, refactoring suggestions, naming conventions, code organization, minor optimizations — things that are nice-to-have but not required
+
+For each finding, provide:
+- "line": The exact line number from the diff
+- "end_line": The ending line number if the issue spans multiple lines (same as line if single line)
+- "severity": One of "CRITICAL", "HIGH", "MEDIUM", "LOW", "INFO" (as defined in your system prompt)
+- "category": One of "SECURITY", "CORRECTNESS", "PERFORMANCE", "RELIABILITY", "ARCHITECTURE", "OBSERVABILITY", "TESTABILITY", "MAINTAINABILITY", "COMPATIBILITY", "DEPENDENCY" (as defined in your system prompt)
+- "title": A short, bold headline summarizing the issue (e.g., "Fix the incorrect input operator.", "Remove hardcoded API key.")
+- "message": A clear, professional explanation of the issue in natural language. Reference specific code identifiers in backticks. Explain the problem AND its impact. Write as a senior engineer would in a PR comment.
+- "suggestion": The corrected code that can replace the problematic code. This should be a concrete, copy-pasteable fix. If no code fix is applicable, leave empty string.
+- "type": Either "actionable" or "nitpick"
+- "original_code": The original problematic code being replaced (for diff rendering). ALWAYS provide this when a suggestion is given, regardless of finding type."""
+
+
+# ═══════════════════════════════════════════════════════════════
+# REVIEW REQUEST INSTRUCTIONS (static, cache-friendly prefix)
+# ═══════════════════════════════════════════════════════════════
+# Providers cache prompt prefixes automatically (Groq / OpenAI-compatible,
+# Gemini implicit caching), so everything identical across requests goes in
+# the system message: the Apex prompt, then the task and the JSON schema.
+# The user message holds only per-PR and per-file material, most stable
+# first (feedback constraints, PR title, then the file itself).
+FILE_REVIEW_SYSTEM_PROMPT = APEX_SYSTEM_PROMPT + """
+## Review Request: One File
+
+The user message holds one file change: its PR context, codebase conventions, the full file and the annotated diff.
+
+Perform a thorough code review of the file in the user message. Analyze the code's correctness, security, performance, maintainability, and any other relevant concerns.
+
+For each issue, provide a CLEAR, NATURAL LANGUAGE explanation in professional prose. Reference specific code elements using backtick formatting (e.g. `functionName`, `variableName`). Explain WHY it matters and provide a concrete fix.
+
+""" + FINDING_FIELDS + """
+
+Also provide:
+- "change_summary": One paragraph describing what this change does and its purpose
+- "file_comments": Array of overall observations about the file (good practices noticed, architectural notes, etc.)
+- "lgtm_note": If the file is clean or largely well-written, provide a short LGTM note explaining what's good about the code (e.g. "Good use of context managers for file handling" or "Clean separation of concerns"). If there are significant issues, set to empty string.
+
+Return STRICT JSON only:
+{
+  "change_summary": "This change introduces...",
+  "findings": [
+    {
+      "line": 15,
+      "end_line": 15,
+      "severity": "CRITICAL",
+      "category": "SECURITY",
+      "title": "Remove hardcoded API key.",
+      "message": "The `API_KEY` is hardcoded as a string literal instead of being read from environment variables. This is a security risk as credentials committed to version control can be extracted from git history even after removal.",
+      "suggestion": "key = os.environ.get('API_KEY')\\nif not key:\\n    raise ValueError('API_KEY environment variable is not set')",
+      "type": "actionable",
+      "original_code": "API_KEY = 'sk-1234567890'"
+    },
+    {
+      "line": 3,
+      "end_line": 5,
+      "severity": "LOW",
+      "category": "MAINTAINABILITY",
+      "title": "Consolidate duplicate imports.",
+      "message": "Lines 3 and 5 both import from `'../controllers/authController'`. These can be consolidated into a single import statement for better maintainability.",
+      "suggestion": "const {\\n  register,\\n  login,\\n  getMe,\\n  logout,\\n  refreshToken,\\n  updateUser,\\n  forgotPassword,\\n  resetPassword\\n} = require('../controllers/authController');",
+      "type": "nitpick",
+      "original_code": "const { register, login, getMe } = require('../controllers/authController');\\nconst { protect } = require('../middleware/auth');\\nconst { logout, refreshToken, updateUser, forgotPassword, resetPassword } = require('../controllers/authController');"
+    }
+  ],
+  "file_comments": ["Good use of context managers for file handling"],
+  "lgtm_note": ""
+}
+
+Be EXHAUSTIVE. Check EVERY line of the diff. Miss nothing. If the file is genuinely clean, return empty findings and a meaningful lgtm_note.
+Return ONLY valid JSON. No markdown. No commentary outside the JSON."""
+
+PACK_REVIEW_SYSTEM_PROMPT = APEX_SYSTEM_PROMPT + """
+## Review Request: Several Small Files
+
+The user message holds several small file changes from the same PR, each in a <file path="..."> block. Review each file independently, as if it were the only file.
+
+For EVERY file in the user message, analyze the code's correctness, security, performance, maintainability, and any other relevant concerns. Explain each issue in clear, professional prose, referencing code elements in backticks, and provide a concrete fix.
+
+""" + FINDING_FIELDS + """
+
+Also provide, per file:
+- "file": The file path exactly as given in the <file path="..."> tag
+- "change_summary": One paragraph describing what this change does and its purpose
+- "file_comments": Array of overall observations about the file
+- "lgtm_note": A short LGTM note if the file is clean or largely well-written, otherwise empty string
+
+Return STRICT JSON only, with one entry per file:
+{
+  "files": [
+    {
+      "file": "src/config.py",
+      "change_summary": "This change introduces...",
+      "findings": [
+        {
+          "line": 15,
+          "end_line": 15,
+          "severity": "CRITICAL",
+          "category": "SECURITY",
+          "title": "Remove hardcoded API key.",
+          "message": "The `API_KEY` is hardcoded as a string literal instead of being read from environment variables.",
+          "suggestion": "API_KEY = os.environ['API_KEY']",
+          "type": "actionable",
+          "original_code": "API_KEY = 'sk-1234567890'"
+        }
+      ],
+      "file_comments": [],
+      "lgtm_note": ""
+    }
+  ]
+}
+
+Line numbers refer to each file's own diff. If a file is genuinely clean, return empty findings and a meaningful lgtm_note for it.
+Return ONLY valid JSON. No markdown. No commentary outside the JSON."""
+
+# Part of the review cache key. Bump the prefix when the user message layout
+# (`_file_prompt`) changes; system prompt edits are picked up by the hash.
+REVIEW_PROMPT_VERSION = "apex-3:" + hashlib.sha256(
+    (FILE_REVIEW_SYSTEM_PROMPT + PACK_REVIEW_SYSTEM_PROMPT).encode("utf-8")
+).hexdigest()[:12]
+
+# Closes the user message of small, low-risk files (and packs) so their replies stay short
+COMPACT_REVIEW_NOTE = (
+    "This is a small, low-risk change: keep the reply compact. Report only findings worth fixing, "
+    "in one or two sentences each; one-sentence change_summary; no file_comments."
+)
+
+@dataclass
+class FileReviewResult:
+    """Everything one file's review produced, merged by ReviewerAgent._aggregate."""
+
+    filepath: str
+    reviewed: bool = False  # False when the review raised
+    clean: bool = False
+    change_summary: str = ""
+    lgtm_note: str = ""
+    inline_comments: List[Dict[str, Any]] = field(default_factory=list)
+    nitpicks: List[Dict[str, Any]] = field(default_factory=list)
+    raw_findings: List[Dict[str, Any]] = field(default_factory=list)
+    critical: int = 0
+    cached: bool = False  # served from the review cache
+    carried_over: bool = False  # reused from the last reviewed commit (incremental review)
+    triaged: bool = False  # called clean by triage, deep review skipped
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FileReviewResult":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+@dataclass
+class FilePrompt:
+    """One file's redacted prompt sections, reviewed alone or packed with other small files."""
+
+    filepath: str
+    language: str
+    focus_note: str
+    safe_context: str
+    safe_full_file: str
+    safe_diff: str
+    user_prompt: str  # the single-file request
+    max_tokens: int = 0  # reply budget (core.token_budget.output_budget)
+    compact: bool = False  # small and low-risk: compact findings requested
+    tokens: int = 0  # estimated size of the file's sections in a pack
+    cache_key: Optional[str] = None
+    cached_result: Optional[Dict[str, Any]] = None
+
+
 class ReviewerAgent:
-    def __init__(self, llm_service=None):
-        self.llm = llm_service or LLMService()
+    def __init__(self, llm_service=None, review_cache: ReviewCache = None):
+        self.llm = llm_service or AsyncLLMService()
+        self.review_cache = review_cache
         self.diff_parser = DiffParser()
         self.context_builder = ContextBuilder()
-        self.planner = ReviewPlanner()
+        self.planner = ReviewPlanner(llm_service=self.llm)
         self.github = GitHubClient()
         self.scanner = SecretScanner()
         self.feedback = FeedbackManager()
+        self._context_lock = threading.Lock()
+        self.pack_token_budget = config.REVIEW_PACK_TOKEN_BUDGET
+        self.pack_max_file_tokens = config.REVIEW_PACK_MAX_FILE_TOKENS
+        self.pack_max_files = config.REVIEW_PACK_MAX_FILES
+        self.stream_reviews = config.REVIEW_STREAMING
 
-    def review(self, diff: str, title: str, description: str = "", context: str = "", repo: str = None, pr_number: int = None) -> Dict[str, Any]:
+    def review(self, diff: str, title: str, description: str = "", context: str = "", repo: str = None, pr_number: int = None, parsed_diff: ParsedDiff = None) -> Dict[str, Any]:
         """
-        Main entry point for review, wrapping run_inline_review for compatibility with ReviewWorker.
+        Blocking entry point for review, wrapping run_inline_review (ReviewWorker uses `areview`).
         """
         return self.run_inline_review(
             raw_diff=diff,
@@ -94,124 +288,32 @@ class ReviewerAgent:
             custom_instructions=description,
             repo_path=None, # In worker we don't have local path unless cloned
             pr_number=pr_number,
-            repo_name=repo
+            repo_name=repo,
+            parsed_diff=parsed_diff,
+        )
+
+    async def areview(self, diff: str, title: str, description: str = "", context: str = "", repo: str = None, pr_number: int = None, parsed_diff: ParsedDiff = None, prior_results: Dict[str, FileReviewResult] = None, triage: TriageSettings = None) -> Dict[str, Any]:
+        """Async `review`: files are reviewed concurrently."""
+        return await self.arun_inline_review(
+            raw_diff=diff,
+            pr_title=title,
+            custom_instructions=description,
+            repo_path=None,
+            pr_number=pr_number,
+            repo_name=repo,
+            parsed_diff=parsed_diff,
+            prior_results=prior_results,
+            triage=triage,
         )
 
-    def _fix_malformed_json(self, text: str) -> str:
-        """
-        Aggressively fix malformed JSON by handling common issues.
-        """
-        # First pass: escape unescaped quotes and newlines inside string values
-        result = []
-        in_string = False
-        escape_next = False
-        
-        for i, char in enumerate(text):
-            if escape_next:
-                result.append(char)
-                escape_next = False
-                continue
-            
-            if char == '\\':
-                result.append(char)
-                escape_next = True
-                continue
-            
-            if char == '"' and (i == 0 or text[i-1] != '\\'):
-                in_string = not in_string
-                result.append(char)
-            elif in_string and char == '\n':
-                # Replace literal newline with escaped newline
-                result.append('\\n')
-            elif in_string and char == '\r':
-                result.append('\\r')
-            elif in_string and char == '\t':
-                result.append('\\t')
-            else:
-                result.append(char)
-        
-        return ''.join(result)
-    
     def _extract_and_parse_json(self, response: str) -> dict:
         """
-        Extract JSON from response with multiple fallback strategies.
+        Extract a JSON object from the response, repairing it locally (fences,
+        raw newlines in strings, trailing commas, truncation...) before the
+        caller falls back to re-prompting.
         ALWAYS returns a dict or raises ValueError.
         """
-        import json
-        response = response.strip()
-        
-        # Pre-check: if no '{' anywhere, this is definitely not a JSON object
-        if '{' not in response:
-            raise ValueError(f"Response contains no JSON object (starts with: {response[:80]}...)")
-        
-        def _validate_dict(parsed):
-            """Ensure parsed result is a dict, not a float/int/list/str."""
-            if not isinstance(parsed, dict):
-                raise ValueError(f"Parsed JSON is {type(parsed).__name__}, not dict")
-            return parsed
-        
-        # Strategy 1: Try direct parse
-        try:
-            return _validate_dict(json.loads(response))
-        except (json.JSONDecodeError, ValueError):
-            pass
-        
-        # Strategy 2: Remove markdown code blocks
-        if "```json" in response:
-            extracted = response.split("```json")[1].split("```")[0].strip()
-            try:
-                return _validate_dict(json.loads(extracted))
-            except (json.JSONDecodeError, ValueError):
-                pass
-        
-        if "```" in response:
-            parts = response.split("```")
-            for part in parts:
-                if part.strip().startswith('{'):
-                    try:
-                        return _validate_dict(json.loads(part.strip()))
-                    except (json.JSONDecodeError, ValueError):
-                        pass
-        
-        # Strategy 3: Find JSON object by braces
-        start_idx = response.find('{')
-        if start_idx >= 0:
-            brace_count = 0
-            end_idx = -1
-            
-            for i in range(start_idx, len(response)):
-                if response[i] == '{':
-                    brace_count += 1
-                elif response[i] == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        end_idx = i + 1
-                        break
-            
-            if end_idx > start_idx:
-                potential_json = response[start_idx:end_idx]
-                
-                # Try direct parse
-                try:
-                    return _validate_dict(json.loads(potential_json))
-                except (json.JSONDecodeError, ValueError):
-                    pass
-                
-                # Try fixing the JSON
-                try:
-                    fixed = self._fix_malformed_json(potential_json)
-                    return _validate_dict(json.loads(fixed))
-                except (json.JSONDecodeError, ValueError) as e:
-                    # Last resort: try to truncate at the error point
-                    if hasattr(e, 'pos'):
-                        print(f"  [Apex] Attempting JSON recovery at position {e.pos}")
-                        try:
-                            return _validate_dict(json.loads(potential_json[:e.pos] + '}' * brace_count))
-                        except:
-                            pass
-        
-        # If all parsing fails
-        raise ValueError(f"Could not extract valid JSON dict from response (starts with: {response[:80]}...)")
+        return parse_llm_json(response, source="reviewer")
 
     def _compress_diff(self, raw_diff: str) -> str:
         """
@@ -243,13 +345,13 @@ class ReviewerAgent:
         # Join back together
         return "\n".join(compressed_lines)
 
-    def run(self, raw_diff: str, pr_title: str, custom_instructions: str) -> str:
+    async def run(self, raw_diff: str, pr_title: str, custom_instructions: str) -> str:
         """Run the Axiom Ultra review."""
-        file_reviews = self.run_multi_file(raw_diff, pr_title, custom_instructions)
+        file_reviews = await self.run_multi_file(raw_diff, pr_title, custom_instructions)
         # return the single review string directly
         return list(file_reviews.values())[0] if file_reviews else "No changes to review."
 
-    def run_multi_file(self, raw_diff: str, pr_title: str, custom_instructions: str, custom_checks: list = None) -> dict:
+    async def run_multi_file(self, raw_diff: str, pr_title: str, custom_instructions: str, custom_checks: list = None) -> dict:
         """
         Generates a comprehensive Axiom Ultra review.
         Returns: {"axiom_review": "full markdown review"}
@@ -510,7 +612,7 @@ If reviewing ML / AI pipelines, evaluate data leakage, prompt injection, and uns
 """
 
         try:
-            ai_response = self.llm.chat(
+            ai_response = await self.llm.chat(
                 messages=[{"role": "user", "content": prompt}]
             )
             
@@ -522,7 +624,21 @@ If reviewing ML / AI pipelines, evaluate data leakage, prompt injection, and uns
             traceback.print_exc()
             return {"error": f" AI Review Failed: {str(e)[:100]}"}
 
-    def run_inline_review(self, raw_diff: str, pr_title: str, custom_instructions: str, custom_checks: list = None, repo_path: str = None, pr_number: int = None, commit_id: str = None, repo_name: str = None) -> dict:
+    def run_inline_review(self, raw_diff: str, pr_title: str, custom_instructions: str, custom_checks: list = None, repo_path: str = None, pr_number: int = None, commit_id: str = None, repo_name: str = None, parsed_diff: ParsedDiff = None, prior_results: Dict[str, FileReviewResult] = None, triage: TriageSettings = None) -> dict:
+        """Blocking wrapper around `arun_inline_review` for scripts and tests."""
+        return asyncio.run(self.arun_inline_review(
+            raw_diff, pr_title, custom_instructions,
+            custom_checks=custom_checks,
+            repo_path=repo_path,
+            pr_number=pr_number,
+            commit_id=commit_id,
+            repo_name=repo_name,
+            parsed_diff=parsed_diff,
+            prior_results=prior_results,
+            triage=triage,
+        ))
+
+    async def arun_inline_review(self, raw_diff: str, pr_title: str, custom_instructions: str, custom_checks: list = None, repo_path: str = None, pr_number: int = None, commit_id: str = None, repo_name: str = None, parsed_diff: ParsedDiff = None, prior_results: Dict[str, FileReviewResult] = None, triage: TriageSettings = None) -> dict:
         """
         Generates CONCISE inline review data for GitHub PR review comments (Coderabbit-style).
         
@@ -538,98 +654,261 @@ If reviewing ML / AI pipelines, evaluate data leakage, prompt injection, and uns
             "verdict": "APPROVE" | "REQUEST_CHANGES" | "COMMENT"
         }
 
+        `parsed_diff` (built in the fetch stage) must describe `raw_diff`; it is
+        parsed here when not supplied. At most REVIEW_FILE_CONCURRENCY requests
+        are in flight; each LLM call is metered per provider by AsyncLLMService.
+        Files served from the review cache make no call, and small files are
+        packed several to a request (core.file_packing). Results are aggregated in diff order.
+
+        `prior_results` (incremental review) are per-file results from the last
+        reviewed commit for files that did not change since; they are carried
+        over without an LLM call and their inline comments are not re-posted.
+
+        With `triage` enabled, files are first classified clean / suspicious
+        (core.triage) and only suspicious ones get the deep-review prompt.
         """
-        file_diffs = self.diff_parser.parse_diff(raw_diff)
+        parsed = parsed_diff if parsed_diff is not None else ParsedDiff.parse(raw_diff)
+        file_diffs = parsed.file_diffs()
         if not file_diffs:
             return {"summary": "No files changed.", "clean_files": [], "inline_comments": [], "verdict": "APPROVE"}
 
-        # Build annotated diffs & Intelligent Context
-        files_section = ""
-        all_inline_comments = []
-        files_reviewed_count = 0
-        issues_found_count = 0
-        critical_issues_count = 0
-        
-        # --- PASS 1: PLANNER --- (Existing logic)
-        # Convert diffs to format planner expects
+        prior_results = prior_results or {}
+        changed_diffs = {path: diff for path, diff in file_diffs.items() if path not in prior_results}
+        if prior_results:
+            print(f"  [Reviewer] Incremental: {len(prior_results)} unchanged file(s) carried over, {len(changed_diffs)} to review")
+
+        if changed_diffs:
+            plan = await self._plan_review(parsed, changed_diffs, repo_path)
+        else:
+            plan = {"high_risk_files": set(), "ignore_files": set(), "focus_instructions": ""}
+        files = self._files_to_review(changed_diffs, plan)
+        semaphore = asyncio.Semaphore(max(1, config.REVIEW_FILE_CONCURRENCY))
+
+        async def prepare_one(filepath: str, diff_content: str) -> FilePrompt:
+            async with semaphore:
+                return await self._prepare_file(
+                    filepath, diff_content, parsed, pr_title, repo_path, plan, custom_checks=custom_checks,
+                )
+
+        prepared = await asyncio.gather(*(prepare_one(f, d) for f, d in files))
+        negative_constraints = self.feedback.get_negative_constraints()
+
+        triage_result, triaged = None, []
+        if triage and triage.enabled:
+            prepared, triaged, triage_result = await self._triage(prepared, parsed, plan, pr_title, triage)
+
+        deep_seconds, deep_files = 0.0, 0
+
+        async def review_unit(unit: List[FilePrompt]) -> List[FileReviewResult]:
+            nonlocal deep_seconds, deep_files
+            async with semaphore:
+                started = time.monotonic()
+                if len(unit) == 1:
+                    outcomes = [await self._review_prepared(unit[0])]
+                else:
+                    outcomes = await self._review_pack(unit, pr_title, negative_constraints)
+                if not all(o.cached for o in outcomes):
+                    deep_seconds += time.monotonic() - started
+                    deep_files += len(unit)
+                return outcomes
+
+        units = self._pack_units(prepared, plan)
+        reviewed = [o for outcomes in await asyncio.gather(*(review_unit(u) for u in units)) for o in outcomes]
+        by_path = {outcome.filepath: outcome for outcome in reviewed + triaged}
+        for path, prior in prior_results.items():
+            by_path[path] = FileReviewResult.from_dict({**prior.to_dict(), "carried_over": True, "cached": False})
+
+        triage_stats = None
+        if triage_result:
+            triage_stats = triage_result.stats(seconds_per_file=deep_seconds / deep_files if deep_files else None)
+        return self._aggregate([by_path[path] for path in file_diffs if path in by_path], triage_stats=triage_stats)
+
+    async def _triage(self, prepared: List[FilePrompt], parsed: ParsedDiff, plan: dict, pr_title: str, settings: TriageSettings) -> tuple:
+        """Cascade tier 1: files triaged clean skip the deep review. Returns (still to review, clean outcomes, TriageResult)."""
+        candidates = [p for p in prepared if p.cached_result is None]
+        if not candidates:
+            return prepared, [], None
+        result = await triage_files(
+            [
+                TriageFile(
+                    p.filepath, p.safe_diff,
+                    additions=parsed.get(p.filepath).additions,
+                    deletions=parsed.get(p.filepath).deletions,
+                    high_risk=p.filepath in plan["high_risk_files"],
+                )
+                for p in candidates
+            ],
+            settings, self.llm, pr_title=pr_title,
+        )
+        system_tokens = self._system_prompt_tokens()
+        result.deep_tokens_avoided = sum(
+            count_tokens(p.user_prompt) + system_tokens for p in candidates if p.filepath in result.clean
+        )
+        print(f"  [Apex] Triage ({settings.mode}): {len(result.clean)} clean, {len(result.suspicious)} suspicious of {len(candidates)} files")
+        clean = [
+            FileReviewResult(
+                filepath, reviewed=True, clean=True, triaged=True,
+                lgtm_note=f"Triaged as low risk ({reason}); deep review skipped.",
+            )
+            for filepath, reason in result.clean.items()
+        ]
+        return [p for p in prepared if p.filepath not in result.clean], clean, result
+
+    async def _plan_review(self, parsed: ParsedDiff, file_diffs: Dict[str, str], repo_path: str = None) -> dict:
+        """PASS 1: ask the planner which files are high risk and which to skip."""
         planner_files = []
+        # Full files only feed the planner's local fast path, which skips large PRs anyway
+        read_content = config.PLANNER_FAST_PATH and len(file_diffs) <= config.PLANNER_FAST_PATH_MAX_FILES
         for filepath, diff_content in file_diffs.items():
+            file_info = parsed.get(filepath)
             planner_files.append({
                 "filename": filepath,
-                "patch": diff_content[:500], # Snippet
-                # Additions/Deletions are harder to get from raw string without parsing, 
-                # but planner just needs rough idea.
-                # We could use DiffParser.annotate... to count lines but let's keep it simple for MVP.
+                "patch": diff_content,  # the planner trims snippets to its token budget
+                "additions": file_info.additions,
+                "deletions": file_info.deletions,
+                "changed_lines": file_info.added_lines(),  # for the risk scorer's complexity check
+                "content": self._read_repo_file(repo_path, filepath) if read_content else "",
             })
             
         print(f"  [Reviewer] Calling Planner for {len(planner_files)} files...")
-        plan = self.planner.analyze_pr_complexity(planner_files)
+        raw_plan = await self.planner.analyze_pr_complexity(planner_files)
         
-        high_risk_files = set(plan.get("high_risk_files", []))
-        ignore_files = set(plan.get("ignore_files", []))
-        focus_instructions = plan.get("focus_instructions", "")
-        
-        print(f"  [Reviewer] Plan: Focus on {high_risk_files}, Ignore {ignore_files}")
+        plan = {
+            "high_risk_files": set(raw_plan.get("high_risk_files", [])),
+            "ignore_files": set(raw_plan.get("ignore_files", [])),
+            "focus_instructions": raw_plan.get("focus_instructions", ""),
+        }
+        print(f"  [Reviewer] Plan: Focus on {plan['high_risk_files']}, Ignore {plan['ignore_files']}")
+        return plan
 
-        # ═══════════════════════════════════════════════════════════
-        # PASS 2: APEX DEEP REVIEW ENGINE
-        # ═══════════════════════════════════════════════════════════
-        clean_files = []
-        file_summaries = {}  # filepath -> change_summary for walkthrough table
-        all_nitpicks = {}    # filepath -> list of nitpick findings (for body dropdown)
-        lgtm_notes = {}      # filepath -> lgtm note for clean files
-        all_raw_findings = {}  # filepath -> list of raw findings (for fix prompt)
-        
+    @staticmethod
+    def _read_repo_file(repo_path: str, filepath: str) -> str:
+        if not repo_path:
+            return ""
+        try:
+            with open(os.path.join(repo_path, filepath), "r", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return ""
+
+    def _files_to_review(self, file_diffs: Dict[str, str], plan: dict) -> List[tuple]:
+        """(filepath, diff) pairs in diff order, minus the files the planner ignores."""
+        files = []
         for filepath, diff_content in file_diffs.items():
-            if filepath in ignore_files:
+            if filepath in plan["ignore_files"]:
                 print(f"  [Apex] Skipping {filepath} (Ignored by Planner)")
                 continue
-                
-            # 1. Annotated Diff
-            annotated = DiffParser.annotate_diff_with_line_numbers(diff_content)
-            if len(annotated) > 8000:
-                annotated = annotated[:8000] + "\n... [truncated]"
-            
-            # 2. Load full file content for semantic understanding
-            full_file_content = ""
-            if repo_path:
-                try:
-                    local_path = os.path.join(repo_path, filepath)
-                    if os.path.exists(local_path):
-                        with open(local_path, "r", encoding="utf-8") as f:
-                            full_file_content = f.read()
-                except Exception:
-                    pass
-
-            # 3. Intelligent Context (Graph & Vector)
-            context_section = ""
-            if repo_path and full_file_content:
-                try:
-                    ctx = self.context_builder.build_context(local_path, full_file_content, diff_content)
-                    formatted_ctx = ctx.get("formatted_prompt", "").strip()
-                    if formatted_ctx:
-                        context_section = formatted_ctx
-                except Exception as e:
-                    print(f"  [Apex] Context build failed for {filepath}: {e}")
-
-            # 4. Focus Instructions
-            focus_note = ""
-            if filepath in high_risk_files:
-                focus_note = f"CRITICAL FOCUS: This file is HIGH RISK. {focus_instructions}"
-
-            # 5. Redaction & constraints
-            safe_diff = self.scanner.redact(annotated)
-            safe_context = self.scanner.redact(context_section)
-            safe_full_file = self.scanner.redact(full_file_content[:5000]) if full_file_content else "[file content not available]"
-            negative_constraints = self.feedback.get_negative_constraints()
-            
-            # Detect language
-            ext = filepath.split('.')[-1] if '.' in filepath else ''
-            lang_map = {'py': 'Python', 'js': 'JavaScript', 'ts': 'TypeScript', 'java': 'Java', 'cpp': 'C++', 'c': 'C', 'go': 'Go', 'rs': 'Rust', 'rb': 'Ruby', 'php': 'PHP', 'cs': 'C#', 'yml': 'YAML', 'yaml': 'YAML', 'json': 'JSON', 'sql': 'SQL'}
-            language = lang_map.get(ext, ext.upper() if ext else 'Unknown')
-            
-            # ── Build Review Prompt (CodeRabbit style with classification) ──
-            user_prompt = f"""Review the following {language} file change.
+            files.append((filepath, diff_content))
+        return files
+
+    # ═══════════════════════════════════════════════════════════
+    # PASS 2: APEX DEEP REVIEW ENGINE
+    # ═══════════════════════════════════════════════════════════
+    async def _prepare_file(self, filepath: str, diff_content: str, parsed: ParsedDiff, pr_title: str, repo_path: str, plan: dict, custom_checks: list = None) -> FilePrompt:
+        """Build one file's prompt sections and look it up in the review cache."""
+        high_risk_files = plan["high_risk_files"]
+        focus_instructions = plan["focus_instructions"]
+
+        # 1. Annotated Diff
+        annotated = parsed.annotate(filepath)
+        
+        # 2. Load full file content for semantic understanding
+        full_file_content = ""
+        if repo_path:
+            try:
+                local_path = os.path.join(repo_path, filepath)
+                if os.path.exists(local_path):
+                    with open(local_path, "r", encoding="utf-8") as f:
+                        full_file_content = f.read()
+            except Exception:
+                pass
+
+        # 3. Intelligent Context (Graph & Vector)
+        context_sections = {}
+        if repo_path and full_file_content:
+            try:
+                ctx = await asyncio.to_thread(
+                    self._build_context, local_path, full_file_content, diff_content,
+                    parsed.get(filepath).added_lines(),
+                )
+                context_sections = ctx.get("sections") or {}
+            except Exception as e:
+                print(f"  [Apex] Context build failed for {filepath}: {e}")
+
+        # 4. Focus Instructions & reply budget
+        focus_note = ""
+        if filepath in high_risk_files:
+            focus_note = f"CRITICAL FOCUS: This file is HIGH RISK. {focus_instructions}"
+        changes = parsed.get(filepath)
+        changed_lines = changes.additions + changes.deletions if changes else 0
+        high_risk = filepath in high_risk_files
+        max_tokens = output_budget(changed_lines, high_risk, self._model_limits())
+        compact = not high_risk and changed_lines <= config.REVIEW_COMPACT_MAX_LINES
+
+        # 5. Redaction & constraints
+        negative_constraints = self.feedback.get_negative_constraints()
+        
+        # Detect language
+        ext = filepath.split('.')[-1] if '.' in filepath else ''
+        lang_map = {'py': 'Python', 'js': 'JavaScript', 'ts': 'TypeScript', 'java': 'Java', 'cpp': 'C++', 'c': 'C', 'go': 'Go', 'rs': 'Rust', 'rb': 'Ruby', 'php': 'PHP', 'cs': 'C#', 'yml': 'YAML', 'yaml': 'YAML', 'json': 'JSON', 'sql': 'SQL'}
+        language = lang_map.get(ext, ext.upper() if ext else 'Unknown')
+
+        # 6. Token budget: diff > changed symbols > graph impact > similar code > full file
+        omitted_file = "[file content omitted: token budget]" if full_file_content else "[file content not available]"
+        fixed_tokens = self._system_prompt_tokens() + count_tokens(
+            self._file_prompt(language, pr_title, filepath, focus_note, "", omitted_file, "", negative_constraints, compact)
+        )
+        if context_sections:
+            # Section headings added by format_sections
+            fixed_tokens += count_tokens(ContextBuilder.format_sections(dict.fromkeys(("impact", "changed_symbols", "similar"), " ")))
+        budget = TokenBudget(self._model_limits(), fixed_tokens=fixed_tokens)
+        allocated = budget.allocate([
+            ("diff", self.scanner.redact(annotated)),
+            ("changed_symbols", self.scanner.redact(context_sections.get("changed_symbols", ""))),
+            ("impact", self.scanner.redact(context_sections.get("impact", ""))),
+            ("similar", self.scanner.redact(context_sections.get("similar", ""))),
+            ("full_file", self.scanner.redact(full_file_content)),
+        ])
+        safe_diff = allocated["diff"]
+        has_context = any(allocated[k] for k in ("changed_symbols", "impact", "similar"))
+        safe_context = ContextBuilder.format_sections(allocated).strip() if has_context else ""
+        safe_full_file = allocated["full_file"] or omitted_file
+        
+        user_prompt = self._file_prompt(language, pr_title, filepath, focus_note, safe_context, safe_full_file, safe_diff, negative_constraints, compact)
+
+        prepared = FilePrompt(
+            filepath=filepath,
+            language=language,
+            focus_note=focus_note,
+            safe_context=safe_context,
+            safe_full_file=safe_full_file,
+            safe_diff=safe_diff,
+            user_prompt=user_prompt,
+            max_tokens=max_tokens,
+            compact=compact,
+        )
+        prepared.tokens = count_tokens(self._pack_section(prepared))
+
+        # ── Review cache: identical inputs reuse the parsed result ──
+        if self.review_cache:
+            prepared.cache_key = ReviewCache.make_key(
+                file_diff=diff_content,
+                full_file=full_file_content,
+                context="\n".join([pr_title, focus_note, safe_context, negative_constraints]),
+                model=getattr(self.llm, "model_fingerprint", type(self.llm).__name__),
+                prompt_version=REVIEW_PROMPT_VERSION,
+                custom_checks=custom_checks,
+            )
+            prepared.cached_result = await self.review_cache.get(prepared.cache_key)
+            if prepared.cached_result is not None:
+                print(f"  [Apex] Cache hit for {filepath}")
+                record_cache_hit("review_cache")
+        return prepared
+
+    def _file_prompt(self, language: str, pr_title: str, filepath: str, focus_note: str, safe_context: str, safe_full_file: str, safe_diff: str, negative_constraints: str, compact: bool = False) -> str:
+        """The single-file review request; the instructions are in FILE_REVIEW_SYSTEM_PROMPT."""
+        closing = f"Review this {language} file change." + (f" {COMPACT_REVIEW_NOTE}" if compact else "")
+        return f"""{negative_constraints}
 
 <issue_context>
 PR Title: {pr_title}
@@ -650,262 +929,398 @@ Language: {language}
 {safe_diff}
 </diff>
 
-{negative_constraints}
+{closing}
+Return ONLY valid JSON."""
 
-Perform a thorough code review of this file. Analyze the code's correctness, security, performance, maintainability, and any other relevant concerns.
+    def _pack_output_limit(self) -> int:
+        return min(config.REVIEW_OUTPUT_TOKENS, self._model_limits().max_output)
 
-For each issue, provide a CLEAR, NATURAL LANGUAGE explanation in professional prose. Reference specific code elements using backtick formatting (e.g. `functionName`, `variableName`). Explain WHY it matters and provide a concrete fix.
+    def _model_limits(self) -> ModelLimits:
+        """Limits of the fallback chain's models (the smallest window wins)."""
+        return chain_limits(getattr(self.llm, attr, None) for attr in ("groq_model", "gemini_model", "openrouter_model"))
 
-CLASSIFY each finding into one of these types:
-- "actionable": Bugs, security issues, correctness problems, performance issues, reliability concerns — things that MUST or SHOULD be fixed
-- "nitpick": Style improvements, refactoring suggestions, naming conventions, code organization, minor optimizations — things that are nice-to-have but not required
+    def _system_prompt_tokens(self) -> int:
+        if getattr(self, "_system_tokens", None) is None:
+            self._system_tokens = count_tokens(FILE_REVIEW_SYSTEM_PROMPT)
+        return self._system_tokens
 
-For each finding, provide:
-- "line": The exact line number from the diff
-- "end_line": The ending line number if the issue spans multiple lines (same as line if single line)
-- "severity": One of "CRITICAL", "HIGH", "MEDIUM", "LOW", "INFO" (as defined in your system prompt)
-- "category": One of "SECURITY", "CORRECTNESS", "PERFORMANCE", "RELIABILITY", "ARCHITECTURE", "OBSERVABILITY", "TESTABILITY", "MAINTAINABILITY", "COMPATIBILITY", "DEPENDENCY" (as defined in your system prompt)
-- "title": A short, bold headline summarizing the issue (e.g., "Fix the incorrect input operator.", "Remove hardcoded API key.")
-- "message": A clear, professional explanation of the issue in natural language. Reference specific code identifiers in backticks. Explain the problem AND its impact. Write as a senior engineer would in a PR comment.
-- "suggestion": The corrected code that can replace the problematic code. This should be a concrete, copy-pasteable fix. If no code fix is applicable, leave empty string.
-- "type": Either "actionable" or "nitpick"
-- "original_code": The original problematic code being replaced (for diff rendering). ALWAYS provide this when a suggestion is given, regardless of finding type.
+    async def _review_prepared(self, prepared: FilePrompt) -> FileReviewResult:
+        """Review one file in a request of its own (or from the cache)."""
+        if prepared.cached_result is not None:
+            return self._build_outcome(prepared.filepath, prepared.cached_result, cached=True)
 
-Also provide:
-- "change_summary": One paragraph describing what this change does and its purpose
-- "file_comments": Array of overall observations about the file (good practices noticed, architectural notes, etc.)
-- "lgtm_note": If the file is clean or largely well-written, provide a short LGTM note explaining what's good about the code (e.g. "Good use of context managers for file handling" or "Clean separation of concerns"). If there are significant issues, set to empty string.
+        try:
+            result = await self._request_review(prepared.filepath, prepared.user_prompt, prepared.safe_full_file, max_tokens=prepared.max_tokens)
+        except Exception as e:
+            print(f"  [Apex]  Review failed for {prepared.filepath}: {e}")
+            return FileReviewResult(prepared.filepath)
+        if result is not None:
+            await self._cache_store(prepared, result)
+        return self._build_outcome(prepared.filepath, result)
 
-Return STRICT JSON only:
-{{
-  "change_summary": "This change introduces...",
-  "findings": [
-    {{
-      "line": 15,
-      "end_line": 15,
-      "severity": "CRITICAL",
-      "category": "SECURITY",
-      "title": "Remove hardcoded API key.",
-      "message": "The `API_KEY` is hardcoded as a string literal instead of being read from environment variables. This is a security risk as credentials committed to version control can be extracted from git history even after removal.",
-      "suggestion": "key = os.environ.get('API_KEY')\\nif not key:\\n    raise ValueError('API_KEY environment variable is not set')",
-      "type": "actionable",
-      "original_code": "API_KEY = 'sk-1234567890'"
-    }},
-    {{
-      "line": 3,
-      "end_line": 5,
-      "severity": "LOW",
-      "category": "MAINTAINABILITY",
-      "title": "Consolidate duplicate imports.",
-      "message": "Lines 3 and 5 both import from `'../controllers/authController'`. These can be consolidated into a single import statement for better maintainability.",
-      "suggestion": "const {{\\n  register,\\n  login,\\n  getMe,\\n  logout,\\n  refreshToken,\\n  updateUser,\\n  forgotPassword,\\n  resetPassword\\n}} = require('../controllers/authController');",
-      "type": "nitpick",
-      "original_code": "const {{ register, login, getMe }} = require('../controllers/authController');\\nconst {{ protect }} = require('../middleware/auth');\\nconst {{ logout, refreshToken, updateUser, forgotPassword, resetPassword }} = require('../controllers/authController');"
-    }}
-  ],
-  "file_comments": ["Good use of context managers for file handling"],
-  "lgtm_note": ""
-}}
+    async def _review_pack(self, pack: List[FilePrompt], pr_title: str, negative_constraints: str) -> List[FileReviewResult]:
+        """Review several small files in one request; files missing from the reply are retried alone."""
+        paths = [p.filepath for p in pack]
+        print(f"  [Apex] Packing {len(pack)} small files into one request: {paths}")
 
-Be EXHAUSTIVE. Check EVERY line of the diff. Miss nothing. If the file is genuinely clean, return empty findings and a meaningful lgtm_note.
-Return ONLY valid JSON. No markdown. No commentary outside the JSON."""
+        try:
+            result = await self._request_review(
+                f"pack of {len(pack)} files", self._pack_prompt(pack, pr_title, negative_constraints),
+                json_keys="files", system_prompt=PACK_REVIEW_SYSTEM_PROMPT,
+                max_tokens=min(sum(p.max_tokens for p in pack), self._pack_output_limit()),
+            )
+        except Exception as e:
+            print(f"  [Apex]  Packed review failed for {paths}: {e}")
+            result = None
+        per_file = split_pack_response(result, paths)
+
+        outcomes = []
+        for prepared in pack:
+            file_result = per_file.get(prepared.filepath)
+            if file_result is None:
+                print(f"  [Apex] {prepared.filepath} missing from packed reply, reviewing it alone")
+                outcomes.append(await self._review_prepared(prepared))
+                continue
+            await self._cache_store(prepared, file_result)
+            outcomes.append(self._build_outcome(prepared.filepath, file_result))
+        return outcomes
+
+    def _pack_units(self, prepared: List[FilePrompt], plan: dict) -> List[List[FilePrompt]]:
+        """Small, uncached, non-high-risk files are packed together; everything else goes alone."""
+        if self.pack_token_budget <= 0:
+            return [[p] for p in prepared]
+        packable = {
+            p.filepath: p.tokens for p in prepared
+            if p.cached_result is None
+            and p.filepath not in plan["high_risk_files"]
+            and p.tokens <= self.pack_max_file_tokens
+        }
+        by_path = {p.filepath: p for p in prepared}
+        units = [[by_path[path] for path in pack] for pack in pack_files(packable, self.pack_token_budget, self.pack_max_files)]
+        units += [[p] for p in prepared if p.filepath not in packable]
+        return units
+
+    def _pack_section(self, prepared: FilePrompt) -> str:
+        """A file's block inside a packed prompt."""
+        return f"""<file path="{prepared.filepath}" language="{prepared.language}">
+{prepared.focus_note}
+<codebase_conventions>
+{prepared.safe_context if prepared.safe_context else "No additional codebase context available."}
+</codebase_conventions>
 
-            try:
-                # ── Robust LLM Call with Retry ──
-                result = None
-                max_retries = 3
-                
-                for attempt in range(1, max_retries + 1):
-                    try:
-                        # Build messages
-                        messages = [
-                            {"role": "system", "content": APEX_SYSTEM_PROMPT},
-                            {"role": "user", "content": user_prompt}
-                        ]
-                        
-                        # On retry, add explicit correction
-                        if attempt > 1:
-                            messages.append({"role": "assistant", "content": "0e400"})
-                            messages.append({"role": "user", "content": "That is NOT valid JSON. You returned a number, not a JSON object. You MUST return a JSON object starting with { and ending with }. Return the review as a JSON object with keys: change_summary, findings, security_audit, positive_observations, recommendation. Start your response with { immediately."})
-                        
-                        content = self.llm.chat(
-                            messages=messages,
-                            response_format={"type": "json_object"},
-                            temperature=0.1
-                        )
-                        
-                        # Guard: empty response
-                        if not content:
-                            print(f"  [Apex] Empty response for {filepath} (attempt {attempt}). Retrying...")
-                            if attempt == 1:
-                                # Retry with shorter prompt
-                                user_prompt = user_prompt.replace(safe_full_file, "[file content omitted]")
-                            continue
-                        
-                        print(f"  [Apex] Response for {filepath} (attempt {attempt}): {content[:120]}...")
-                        
-                        # Pre-check: does it even look like a JSON object?
-                        if '{' not in content:
-                            print(f"  [Apex]  No JSON object in response (attempt {attempt}). Got: {content[:80]}")
-                            continue
-                        
-                        result = self._extract_and_parse_json(content)
-                        break  # Success!
-                        
-                    except ValueError as ve:
-                        print(f"  [Apex]  Parse failed (attempt {attempt}): {ve}")
-                        continue
-                
-                if result is None:
-                    print(f"  [Apex]  All {max_retries} attempts failed for {filepath}. Skipping.")
-                    files_reviewed_count += 1
-                    clean_files.append(filepath)
+<full_file>
+{prepared.safe_full_file}
+</full_file>
+
+<diff>
+{prepared.safe_diff}
+</diff>
+</file>"""
+
+    def _pack_prompt(self, pack: List[FilePrompt], pr_title: str, negative_constraints: str) -> str:
+        """The packed review request; the instructions are in PACK_REVIEW_SYSTEM_PROMPT."""
+        sections = "\n\n".join(self._pack_section(p) for p in pack)
+        return f"""{negative_constraints}
+
+<issue_context>
+PR Title: {pr_title}
+</issue_context>
+
+{sections}
+
+Review each of these {len(pack)} file changes. {COMPACT_REVIEW_NOTE}
+Return ONLY valid JSON with one entry per file."""
+
+    async def _cache_store(self, prepared: FilePrompt, result: Dict[str, Any]):
+        if result.get("partial"):
+            return  # salvaged from a cut-off reply; let the next run try again
+        if self.review_cache and prepared.cache_key:
+            await self.review_cache.set(prepared.cache_key, result)
+
+    def _build_outcome(self, filepath: str, result: Optional[Dict[str, Any]], cached: bool = False) -> FileReviewResult:
+        """Turn one file's parsed LLM reply into inline comments, nitpicks and raw findings."""
+        outcome = FileReviewResult(filepath, cached=cached)
+        if result is None:
+            outcome.reviewed = True
+            outcome.clean = True
+            return outcome
+
+        try:
+            # Extract findings
+            findings = result.get("findings", [])
+            # Fallback: also check "comments" key for backwards compat
+            if not findings:
+                findings = result.get("comments", [])
+            
+            # Store per-file change summary for walkthrough table
+            change_summary = result.get("change_summary", "")
+            outcome.change_summary = change_summary
+            
+            # Store LGTM note for clean files
+            lgtm_note = result.get("lgtm_note", "")
+            
+            print(f"  [Apex]  {len(findings)} findings in {filepath}")
+            
+            actionable_count = 0
+            nitpick_count = 0
+            
+            for finding in findings:
+                # Handle case where LLM returns a string instead of dict
+                if isinstance(finding, str):
+                    finding = {"message": finding, "type": "actionable"}
+                if not isinstance(finding, dict):
                     continue
                 
-                # Extract findings
-                findings = result.get("findings", [])
-                # Fallback: also check "comments" key for backwards compat
-                if not findings:
-                    findings = result.get("comments", [])
+                message = finding.get("message", finding.get("finding", "Issue detected"))
+                suggestion = finding.get("suggestion", finding.get("fix", ""))
+                finding_type = finding.get("type", "actionable")
+                original_code = finding.get("original_code", "")
+                line = finding.get("line")
+                end_line = finding.get("end_line", line)
                 
-                # Store per-file change summary for walkthrough table
-                change_summary = result.get("change_summary", "")
-                if change_summary:
-                    file_summaries[filepath] = change_summary
+                # Track raw findings for fix prompt generator
+                outcome.raw_findings.append({
+                    "line": line,
+                    "end_line": end_line,
+                    "message": message,
+                    "suggestion": suggestion,
+                    "type": finding_type,
+                    "original_code": original_code
+                })
                 
-                # Store LGTM note for clean files
-                lgtm_note = result.get("lgtm_note", "")
-                
-                print(f"  [Apex]  {len(findings)} findings in {filepath}")
-                
-                actionable_count = 0
-                nitpick_count = 0
-                
-                for finding in findings:
-                    # Handle case where LLM returns a string instead of dict
-                    if isinstance(finding, str):
-                        finding = {"message": finding, "type": "actionable"}
-                    if not isinstance(finding, dict):
-                        continue
-                    
-                    message = finding.get("message", finding.get("finding", "Issue detected"))
-                    suggestion = finding.get("suggestion", finding.get("fix", ""))
-                    finding_type = finding.get("type", "actionable")
-                    original_code = finding.get("original_code", "")
-                    line = finding.get("line")
-                    end_line = finding.get("end_line", line)
-                    
-                    # Track raw findings for fix prompt generator
-                    if filepath not in all_raw_findings:
-                        all_raw_findings[filepath] = []
-                    all_raw_findings[filepath].append({
+                if finding_type == "nitpick":
+                    # Nitpick → goes to body dropdown, NOT inline
+                    outcome.nitpicks.append({
                         "line": line,
                         "end_line": end_line,
                         "message": message,
                         "suggestion": suggestion,
-                        "type": finding_type,
                         "original_code": original_code
                     })
+                    nitpick_count += 1
+                else:
+                    # Actionable → posted as inline comment (CodeRabbit style)
+                    severity = finding.get("severity", "MEDIUM").upper()
+                    category = finding.get("category", "CORRECTNESS").upper()
+                    title = finding.get("title", message.split('.')[0] + '.' if '.' in message else message)
                     
-                    if finding_type == "nitpick":
-                        # Nitpick → goes to body dropdown, NOT inline
-                        if filepath not in all_nitpicks:
-                            all_nitpicks[filepath] = []
-                        all_nitpicks[filepath].append({
-                            "line": line,
-                            "end_line": end_line,
-                            "message": message,
-                            "suggestion": suggestion,
-                            "original_code": original_code
-                        })
-                        nitpick_count += 1
-                    else:
-                        # Actionable → posted as inline comment (CodeRabbit style)
-                        severity = finding.get("severity", "MEDIUM").upper()
-                        category = finding.get("category", "CORRECTNESS").upper()
-                        title = finding.get("title", message.split('.')[0] + '.' if '.' in message else message)
-                        
-                        # Severity badge mapping
-                        severity_badges = {
-                            "CRITICAL": " Potential issue | 🔴 Critical",
-                            "HIGH": " Potential issue | 🟠 High",
-                            "MEDIUM": " Potential issue | 🟡 Medium",
-                            "LOW": "💡 Suggestion | 🔵 Low",
-                            "INFO": "ℹ️ Note | ⚪ Info"
-                        }
-                        badge = severity_badges.get(severity, severity_badges["MEDIUM"])
-                        
-                        # Build rich body
-                        body = f"{badge}\n\n"
-                        body += f"**{title}**\n\n"
-                        body += f"{message}\n\n"
-                        
-                        # 🔎 Proposed fix (diff block)
-                        if suggestion and original_code:
-                            body += "<details>\n"
-                            body += "<summary>🔎 Proposed fix</summary>\n\n"
-                            body += "```diff\n"
-                            for ol in original_code.split('\n'):
-                                body += f"-{ol}\n"
-                            for sl in suggestion.split('\n'):
-                                body += f"+{sl}\n"
-                            body += "```\n\n"
-                            body += "</details>\n\n"
-                        
-                        #  Committable suggestion
-                        if suggestion:
-                            body += "<details>\n"
-                            body += "<summary> Committable suggestion</summary>\n\n"
-                            body += "> ‼️ **IMPORTANT**\n"
-                            body += "> Carefully review the code before committing. Ensure that it accurately replaces the highlighted code, contains no missing lines, and has no issues with indentation. Thoroughly test & benchmark the code to ensure it meets the requirements.\n\n"
-                            body += f"```suggestion\n{suggestion}\n```\n\n"
-                            body += "</details>\n\n"
-                        
-                        # 🤖 Prompt for AI Agents
-                        if end_line and end_line != line:
-                            line_ref = f"around line {line}-{end_line}"
-                        else:
-                            line_ref = f"around line {line}"
-                        ai_prompt = f"In @{filepath} {line_ref}, {message}"
-                        if suggestion:
-                            ai_prompt += f" Apply the following fix: replace the existing code with the corrected version as specified in the suggestion."
-                        
+                    # Severity badge mapping
+                    severity_badges = {
+                        "CRITICAL": " Potential issue | 🔴 Critical",
+                        "HIGH": " Potential issue | 🟠 High",
+                        "MEDIUM": " Potential issue | 🟡 Medium",
+                        "LOW": "💡 Suggestion | 🔵 Low",
+                        "INFO": "ℹ️ Note | ⚪ Info"
+                    }
+                    badge = severity_badges.get(severity, severity_badges["MEDIUM"])
+                    
+                    # Build rich body
+                    body = f"{badge}\n\n"
+                    body += f"**{title}**\n\n"
+                    body += f"{message}\n\n"
+                    
+                    # 🔎 Proposed fix (diff block)
+                    if suggestion and original_code:
                         body += "<details>\n"
-                        body += "<summary>🤖 Prompt for AI Agents</summary>\n\n"
-                        body += f"{ai_prompt}\n\n"
-                        body += "</details>"
-                        
-                        all_inline_comments.append({
-                            "path": filepath,
-                            "line": line,
-                            "body": body,
-                            "side": "RIGHT"
-                        })
-                        actionable_count += 1
-                        issues_found_count += 1
+                        body += "<summary>🔎 Proposed fix</summary>\n\n"
+                        body += "```diff\n"
+                        for ol in original_code.split('\n'):
+                            body += f"-{ol}\n"
+                        for sl in suggestion.split('\n'):
+                            body += f"+{sl}\n"
+                        body += "```\n\n"
+                        body += "</details>\n\n"
                     
-                    # Track severity for verdict (actionable only)
-                    if finding_type == "actionable":
-                        severity = finding.get("severity", "MEDIUM").upper()
-                        if severity == "CRITICAL":
-                            critical_issues_count += 1
+                    #  Committable suggestion
+                    if suggestion:
+                        body += "<details>\n"
+                        body += "<summary> Committable suggestion</summary>\n\n"
+                        body += "> ‼️ **IMPORTANT**\n"
+                        body += "> Carefully review the code before committing. Ensure that it accurately replaces the highlighted code, contains no missing lines, and has no issues with indentation. Thoroughly test & benchmark the code to ensure it meets the requirements.\n\n"
+                        body += f"```suggestion\n{suggestion}\n```\n\n"
+                        body += "</details>\n\n"
+                    
+                    # 🤖 Prompt for AI Agents
+                    if end_line and end_line != line:
+                        line_ref = f"around line {line}-{end_line}"
+                    else:
+                        line_ref = f"around line {line}"
+                    ai_prompt = f"In @{filepath} {line_ref}, {message}"
+                    if suggestion:
+                        ai_prompt += f" Apply the following fix: replace the existing code with the corrected version as specified in the suggestion."
+                    
+                    body += "<details>\n"
+                    body += "<summary>🤖 Prompt for AI Agents</summary>\n\n"
+                    body += f"{ai_prompt}\n\n"
+                    body += "</details>"
+                    
+                    outcome.inline_comments.append({
+                        "path": filepath,
+                        "line": line,
+                        "body": body,
+                        "side": "RIGHT"
+                    })
+                    actionable_count += 1
+                
+                # Track severity for verdict (actionable only)
+                if finding_type == "actionable":
+                    severity = finding.get("severity", "MEDIUM").upper()
+                    if severity == "CRITICAL":
+                        outcome.critical += 1
+            
+            if not findings:
+                outcome.clean = True
+                if lgtm_note:
+                    outcome.lgtm_note = lgtm_note
+            elif actionable_count == 0 and nitpick_count > 0:
+                # Only nitpicks, no actionable issues — still "clean" for LGTM
+                if lgtm_note:
+                    outcome.lgtm_note = lgtm_note
+            
+            print(f"  [Apex]   → {actionable_count} actionable, {nitpick_count} nitpick")
+            outcome.reviewed = True
+
+        except Exception as e:
+            print(f"  [Apex]  Review failed for {filepath}: {e}")
+            import traceback
+            traceback.print_exc()
+
+        return outcome
+
+    async def _request_review(self, filepath: str, user_prompt: str, safe_full_file: str = "", json_keys: str = "change_summary, findings, security_audit, positive_observations, recommendation", system_prompt: str = FILE_REVIEW_SYSTEM_PROMPT, max_tokens: int = None) -> Optional[dict]:
+        """
+        Ask the LLM for a review (one file or a pack), retrying on empty or non-JSON replies.
+        `max_tokens` bounds the reply; one cut off there is continued by the
+        LLM service rather than retried.
+        When streaming, findings are parsed as they arrive and a reply that is
+        cut off is salvaged (flagged "partial") instead of retried. Malformed
+        JSON is repaired locally (core.json_repair) before any re-prompt.
+        """
+        # ── Robust LLM Call with Retry ──
+        result = None
+        max_retries = 3
+        array_key = "files" if json_keys == "files" else "findings"
+        
+        for attempt in range(1, max_retries + 1):
+            try:
+                # Build messages
+                messages = [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ]
                 
-                if not findings:
-                    clean_files.append(filepath)
-                    if lgtm_note:
-                        lgtm_notes[filepath] = lgtm_note
-                elif actionable_count == 0 and nitpick_count > 0:
-                    # Only nitpicks, no actionable issues — still "clean" for LGTM
-                    if lgtm_note:
-                        lgtm_notes[filepath] = lgtm_note
+                # On retry, add explicit correction
+                if attempt > 1:
+                    messages.append({"role": "assistant", "content": "0e400"})
+                    messages.append({"role": "user", "content": f"That is NOT valid JSON. You returned a number, not a JSON object. You MUST return a JSON object starting with {{ and ending with }}. Return the review as a JSON object with keys: {json_keys}. Start your response with {{ immediately."})
                 
-                print(f"  [Apex]   → {actionable_count} actionable, {nitpick_count} nitpick")
-                files_reviewed_count += 1
+                salvaged = None
+                if self.stream_reviews and hasattr(self.llm, "chat_stream"):
+                    content, salvaged = await self._stream_review(messages, filepath, array_key, max_tokens)
+                else:
+                    content = await self.llm.chat(
+                        messages=messages,
+                        response_format={"type": "json_object"},
+                        temperature=0.1,
+                        max_tokens=max_tokens,
+                    )
+                
+                # Guard: empty response
+                if not content:
+                    print(f"  [Apex] Empty response for {filepath} (attempt {attempt}). Retrying...")
+                    if attempt == 1 and safe_full_file:
+                        # Retry with shorter prompt
+                        user_prompt = user_prompt.replace(safe_full_file, "[file content omitted]")
+                    continue
+                
+                print(f"  [Apex] Response for {filepath} (attempt {attempt}): {content[:120]}...")
+                
+                # Pre-check: does it even look like a JSON object?
+                if '{' not in content:
+                    print(f"  [Apex]  No JSON object in response (attempt {attempt}). Got: {content[:80]}")
+                    continue
+                
+                if salvaged:
+                    print(f"  [Apex] Using {len(salvaged[array_key])} complete {array_key} salvaged from the cut-off reply for {filepath}")
+                    result = salvaged
+                else:
+                    result = self._extract_and_parse_json(content)
+                break  # Success!
+                
+            except ValueError as ve:
+                print(f"  [Apex]  Parse failed (attempt {attempt}): {ve}")
+                continue
+        
+        if result is None:
+            print(f"  [Apex]  All {max_retries} attempts failed for {filepath}. Skipping.")
+        return result
 
-            except Exception as e:
-                print(f"  [Apex]  Review failed for {filepath}: {e}")
-                import traceback
-                traceback.print_exc()
+    async def _stream_review(self, messages: list, filepath: str, array_key: str, max_tokens: int = None) -> tuple:
+        """
+        Stream one reply. Returns (text received, salvage): salvage holds the
+        complete items of a reply that was cut off, None if the reply finished.
+        """
+        parser = IncrementalJSONParser(array_key=array_key)
+        started = time.monotonic()
+        try:
+            async for chunk in self.llm.chat_stream(
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.1,
+                max_tokens=max_tokens,
+            ):
+                if parser.feed(chunk) and len(parser.items) == 1:
+                    print(f"  [Apex] First {array_key} item for {filepath} after {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            print(f"  [Apex]  Stream for {filepath} cut off after {len(parser.text)} chars: {e}")
+        return parser.text, (None if parser.done else parser.salvage())
+
+    def _build_context(self, local_path: str, full_file_content: str, diff_content: str, changed_lines: List[int]) -> dict:
+        """ContextBuilder is CPU/IO bound and its graph is not thread-safe: one caller at a time."""
+        with self._context_lock:
+            return self.context_builder.build_context(
+                local_path, full_file_content, diff_content, changed_lines=changed_lines,
+            )
+
+    def _aggregate(self, outcomes: List[FileReviewResult], triage_stats: Dict[str, Any] = None) -> dict:
+        """Merge per-file results (in diff order) into the review payload."""
+        all_inline_comments = []
+        files_reviewed_count = 0
+        issues_found_count = 0
+        critical_issues_count = 0
+        cached_files = 0
+        carried_over_files = 0
+        triaged_files = 0
+        clean_files = []
+        file_summaries = {}  # filepath -> change_summary for walkthrough table
+        all_nitpicks = {}    # filepath -> list of nitpick findings (for body dropdown)
+        lgtm_notes = {}      # filepath -> lgtm note for clean files
+        all_raw_findings = {}  # filepath -> list of raw findings (for fix prompt)
+
+        for outcome in outcomes:
+            filepath = outcome.filepath
+            if outcome.reviewed:
+                files_reviewed_count += 1
+            if outcome.clean:
+                clean_files.append(filepath)
+            if outcome.change_summary:
+                file_summaries[filepath] = outcome.change_summary
+            if outcome.lgtm_note:
+                lgtm_notes[filepath] = outcome.lgtm_note
+            if outcome.raw_findings:
+                all_raw_findings[filepath] = outcome.raw_findings
+            if outcome.nitpicks:
+                all_nitpicks[filepath] = outcome.nitpicks
+            if outcome.carried_over:
+                # Already posted on the PR by the earlier review
+                all_inline_comments.extend({**c, "carried_over": True} for c in outcome.inline_comments)
+            else:
+                all_inline_comments.extend(outcome.inline_comments)
+            issues_found_count += len(outcome.inline_comments)
+            critical_issues_count += outcome.critical
+            cached_files += outcome.cached
+            carried_over_files += outcome.carried_over
+            triaged_files += outcome.triaged
 
         # ═══════════════════════════════════════════════════════════
         # DETERMINE VERDICT
@@ -934,8 +1349,13 @@ Return ONLY valid JSON. No markdown. No commentary outside the JSON."""
                 "total_findings": issues_found_count + total_nitpicks,
                 "actionable": issues_found_count,
                 "nitpick_count": total_nitpicks,
-                "critical": critical_issues_count
-            }
+                "critical": critical_issues_count,
+                "cached_files": cached_files,
+                "carried_over_files": carried_over_files,
+                "triaged_files": triaged_files,
+                "triage": triage_stats,
+            },
+            "file_results": [outcome.to_dict() for outcome in outcomes],
         }
 
 
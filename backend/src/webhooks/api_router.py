@@ -18,7 +18,7 @@ from sqlalchemy import or_
 from sqlmodel import select
 from database import get_session
 from models import Job, AgentResult, User, ActivatedRepo
-from auth import get_current_user
+from auth import get_admin_user, get_current_user
 from core.security import verify_github_signature
 from core.logger import get_logger, set_log_context, clear_log_context
 from config import config as app_config
@@ -242,6 +242,7 @@ async def trigger_manual_review(
             "title": title,
             "description": description,
             "branch_name": branch,
+            "action": "manual",
         })
     except Exception:
         # Fallback: run in-process
@@ -382,7 +383,10 @@ async def github_webhook(request: Request, background_tasks: BackgroundTasks):
 
     # 4. Enqueue to durable queue (with BackgroundTasks fallback)
     try:
+        from core.mirror_cache import request_prewarm
         queue = request.app.state.queue
+        # Start cloning a missing mirror while the fetch stage is still downloading the diff
+        await request_prewarm(queue, metadata.repo_full_name, "webhook", only_if_missing=True)
         await queue.enqueue("review:fetch", {
             "job_id": job_id,
             "repo_full_name": metadata.repo_full_name,
@@ -391,6 +395,7 @@ async def github_webhook(request: Request, background_tasks: BackgroundTasks):
             "title": metadata.title,
             "description": metadata.description,
             "branch_name": metadata.branch_name,
+            "action": payload.get("action"),
         })
         logger.info("Successfully enqueued durable worker task")
         clear_log_context()
@@ -662,10 +667,13 @@ async def list_activated_repos(
 @router.post("/activated-repos")
 async def activate_repo(
     req: ActivateRepoRequest,
+    request: Request,
     user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
-    """Activate a repository for review."""
+    """Activate a repository for review and prewarm its mirror."""
+    from core.mirror_cache import request_prewarm
+
     # Check if already activated
     result = await session.execute(
         select(ActivatedRepo).where(
@@ -688,6 +696,9 @@ async def activate_repo(
     session.add(repo)
     await session.commit()
     await session.refresh(repo)
+
+    # Clone the mirror now so the first review doesn't pay for it
+    await request_prewarm(getattr(request.app.state, "queue", None), req.repo_full_name, "activated")
     return {"status": "activated", "id": repo.id}
 
 
@@ -712,6 +723,104 @@ async def deactivate_repo(
     return {"status": "deactivated"}
 
 
+async def _activated_repo_names(session: AsyncSession, user: User) -> List[str]:
+    result = await session.execute(
+        select(ActivatedRepo.repo_full_name).where(ActivatedRepo.user_id == user.id)
+    )
+    return list(result.scalars().all())
+
+
+@router.get("/admin/mirrors")
+async def list_mirrors(
+    request: Request,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Mirror freshness of the user's activated repos, as recorded by the fetch and warm workers."""
+    import time
+    from core.mirror_cache import get_mirror_freshness
+
+    queue = getattr(request.app.state, "queue", None)
+    if not queue or not queue.is_connected:
+        raise HTTPException(status_code=503, detail="Redis unavailable")
+
+    repos = set(await _activated_repo_names(session, user))
+    now = time.time()
+    mirrors = []
+    for repo_full_name, entry in sorted((await get_mirror_freshness(queue.redis)).items()):
+        if repo_full_name not in repos:
+            continue
+        last_fetch = entry.get("last_fetch")
+        mirrors.append({
+            "repo_full_name": repo_full_name,
+            "ok": entry.get("ok"),
+            "last_fetch": last_fetch,
+            "age_seconds": int(now - last_fetch) if last_fetch else None,
+            "fresh": bool(last_fetch) and now - last_fetch < app_config.MIRROR_FRESH_SECONDS,
+            "duration_ms": entry.get("duration_ms"),
+            "host": entry.get("host"),
+        })
+    return {"mirrors": mirrors, "total": len(mirrors)}
+
+
+@router.get("/admin/json-repair")
+async def json_repair_stats(request: Request, user: User = Depends(get_admin_user)):
+    """How often malformed LLM JSON was repaired locally instead of re-prompting."""
+    from core.json_repair import get_repair_stats
+
+    queue = getattr(request.app.state, "queue", None)
+    if not queue or not queue.is_connected:
+        raise HTTPException(status_code=503, detail="Redis unavailable")
+
+    sources = await get_repair_stats(queue.redis)
+    return {
+        "sources": sources,
+        "retries_avoided": sum(s["repaired"] for s in sources.values()),
+    }
+
+
+@router.get("/admin/llm-usage")
+async def llm_usage_report(
+    repo: Optional[str] = None,
+    days: int = 30,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Per-repo LLM requests, tokens, cost and latency percentiles over the last `days` days, for the user's activated repos."""
+    from datetime import datetime, timedelta
+    from core.llm_usage import usage_report
+    from models import LLMUsage
+
+    repos = await _activated_repo_names(session, user)
+    if repo:
+        if repo not in repos:
+            raise HTTPException(status_code=404, detail="Activated repo not found")
+        repos = [repo]
+    query = select(LLMUsage).where(
+        LLMUsage.created_at >= datetime.utcnow() - timedelta(days=days),
+        LLMUsage.repo_full_name.in_(repos),
+    )
+    rows = (await session.execute(query)).scalars().all()
+    return {"days": days, "repos": usage_report(rows)}
+
+
+@router.get("/admin/llm-router")
+async def llm_router_state(request: Request, user: User = Depends(get_admin_user)):
+    """Per provider/model latency, error rates and circuit state (shared across workers when ROUTER_SHARED), plus this process's hedge counts."""
+    from core.provider_router import ROUTER_KEY, get_router
+
+    router = get_router()
+    providers = router.snapshot()
+    queue = getattr(request.app.state, "queue", None)
+    if queue and queue.is_connected:
+        for key, raw in (await queue.redis.hgetall(ROUTER_KEY)).items():
+            try:
+                providers[key] = json.loads(raw)
+            except (TypeError, ValueError):
+                continue
+    return {"providers": providers, "hedges": router.hedges}
+
+
 # ═══════════════════════════════════════════
 # 7. GITHUB PROXY (user-authenticated)
 # ═══════════════════════════════════════════
@@ -5,7 +5,7 @@ Handles:
   1. GitHub OAuth flow (redirect → callback → token exchange)
   2. Bitbucket OAuth 2.0 flow (redirect → callback → token exchange)
   3. JWT creation and verification
-  4. Auth dependency for protected endpoints
+  4. Auth dependencies for protected and admin-only endpoints
 """
 
 import os
@@ -116,6 +116,17 @@ async def get_current_user(
     return user
 
 
+async def get_admin_user(user: User = Depends(get_current_user)) -> User:
+    """
+    FastAPI dependency: the current user, if listed in ADMIN_USERS
+    ("github:alice,bitbucket:bob"). Guards process-wide operational endpoints.
+    """
+    admins = {a.strip().lower() for a in _cfg("ADMIN_USERS").split(",") if a.strip()}
+    if f"{user.provider or 'github'}:{user.username}".lower() not in admins:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
 # ═══════════════════════════════════════════
 # GitHub OAuth Endpoints
 # ═══════════════════════════════════════════
@@ -13,7 +13,7 @@ class Config:
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     MODEL = os.getenv("MODEL", "meta-llama/llama-3.1-405b-instruct:free")
     
-    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openrouter")
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openrouter")  # "fake": offline stand-in (core.fake_llm)
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
     
@@ -21,6 +21,50 @@ class Config:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
     
+    # Shared async HTTP pool (AsyncLLMService, one per worker process)
+    LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+    LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))  # seconds per request
+    LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "120"))  # idle connections kept open
+    LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"  # needs the h2 package (httpx[http2])
+    LLM_PREWARM_CONNECTIONS = int(os.getenv("LLM_PREWARM_CONNECTIONS", "4"))  # per provider at worker start (HTTP/1.1)
+    
+    # Provider router: EWMA latency / error ranking and circuit breakers (core.provider_router)
+    ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.3"))
+    ROUTER_DEFAULT_LATENCY = float(os.getenv("ROUTER_DEFAULT_LATENCY", "5"))  # assumed for providers with no data
+    ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))  # consecutive errors (a 429 opens at once)
+    ROUTER_COOLDOWN_SECONDS = float(os.getenv("ROUTER_COOLDOWN_SECONDS", "30"))  # until the half-open probe, doubled per failed probe
+    ROUTER_MAX_COOLDOWN_SECONDS = float(os.getenv("ROUTER_MAX_COOLDOWN_SECONDS", "600"))
+    ROUTER_SHARED = os.getenv("ROUTER_SHARED", "true").lower() == "true"  # mirror state through Redis
+    ROUTER_SYNC_SECONDS = float(os.getenv("ROUTER_SYNC_SECONDS", "5"))
+    ROUTER_LATENCY_WINDOW = int(os.getenv("ROUTER_LATENCY_WINDOW", "50"))  # samples kept per provider for p90
+    
+    # Hedging: re-send a request to the next healthy provider once the first passes its p90 latency
+    LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+    LLM_HEDGE_BUDGET_RATIO = float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.1"))  # max extra requests per request
+    LLM_HEDGE_MAX_BURST = float(os.getenv("LLM_HEDGE_MAX_BURST", "5"))  # unused budget that can accumulate
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))  # latencies needed before hedging
+    LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))  # seconds
+    
+    # Single-flight: identical concurrent LLM requests share one provider call (core.single_flight)
+    LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+    LLM_SINGLE_FLIGHT_SHARED = os.getenv("LLM_SINGLE_FLIGHT_SHARED", "true").lower() == "true"  # across workers via Redis
+    LLM_SINGLE_FLIGHT_WAIT = float(os.getenv("LLM_SINGLE_FLIGHT_WAIT", "180"))  # max seconds to wait on another worker's call
+    LLM_SINGLE_FLIGHT_RESULT_TTL = int(os.getenv("LLM_SINGLE_FLIGHT_RESULT_TTL", "60"))  # seconds a shared reply stays readable
+    
+    # Per-job usage accounting (core.llm_usage): USD per million prompt/completion tokens
+    LLM_PRICES = os.getenv("LLM_PRICES", "")  # e.g. "groq=0.15/0.60,gemini=0.10/0.40"
+    
+    # Fake provider (LLM_PROVIDER=fake): deterministic offline replies for load tests
+    FAKE_LLM_MODEL = os.getenv("FAKE_LLM_MODEL", "fake-reviewer")
+    FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))  # median per call
+    FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))  # log-normal spread, 0 = fixed
+    FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))  # share of calls failing with a 500
+    FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))  # share of calls failing with a 429
+    FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+    FAKE_LLM_STREAM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_STREAM_CHUNK_CHARS", "80"))
+    FAKE_RPM_LIMIT = int(os.getenv("FAKE_RPM_LIMIT", "0"))  # optional quota to exercise the rate limiter
+    FAKE_TPM_LIMIT = int(os.getenv("FAKE_TPM_LIMIT", "0"))
+    
     # ─── Timeouts and Limits ────────────────────────────────────
     LINT_TIMEOUT = 30
     STATIC_TIMEOUT = 60
@@ -46,14 +90,97 @@ class Config:
     WORKER_CONCURRENCY_ANALYZE = int(os.getenv("WORKER_CONCURRENCY_ANALYZE", "2"))
     WORKER_CONCURRENCY_REVIEW = int(os.getenv("WORKER_CONCURRENCY_REVIEW", "3"))
     WORKER_CONCURRENCY_PUBLISH = int(os.getenv("WORKER_CONCURRENCY_PUBLISH", "6"))
+    WORKER_CONCURRENCY_WARM = int(os.getenv("WORKER_CONCURRENCY_WARM", "1"))  # background mirror prewarming
+    
+    # Skip prewarming mirrors fetched more recently than this
+    MIRROR_FRESH_SECONDS = int(os.getenv("MIRROR_FRESH_SECONDS", "300"))
     
     # Per-repo concurrency cap
     MAX_CONCURRENT_PER_REPO = int(os.getenv("MAX_CONCURRENT_PER_REPO", "2"))
     
+    # Files reviewed in parallel within one PR (each takes an LLM rate-limit token)
+    REVIEW_FILE_CONCURRENCY = int(os.getenv("REVIEW_FILE_CONCURRENCY", "4"))
+    
+    # Stream review replies; findings are parsed as they arrive and cut-off replies salvaged
+    REVIEW_STREAMING = os.getenv("REVIEW_STREAMING", "true").lower() == "true"
+    
     # ─── Rate Limiting ──────────────────────────────────────────
     LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "30"))  # requests per minute
+    RATE_LIMIT_TICKET_LEASE = float(os.getenv("RATE_LIMIT_TICKET_LEASE", "30"))  # seconds before a silent waiter loses its place
+    # Per provider/model buckets charged around every LLM call (0 = unmetered)
+    GROQ_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", "30"))
+    GROQ_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", "8000"))
+    GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "10"))
+    GEMINI_TPM_LIMIT = int(os.getenv("GEMINI_TPM_LIMIT", "250000"))
+    OPENROUTER_RPM_LIMIT = int(os.getenv("OPENROUTER_RPM_LIMIT", "20"))
+    OPENROUTER_TPM_LIMIT = int(os.getenv("OPENROUTER_TPM_LIMIT", "0"))
+    LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "1024"))  # reserved when max_tokens is unset
+    LLM_RATE_LIMIT_WAIT = float(os.getenv("LLM_RATE_LIMIT_WAIT", "60"))  # seconds to wait on the last provider in the chain
     GITHUB_API_BUFFER = int(os.getenv("GITHUB_API_BUFFER", "100"))  # remaining calls before backoff
     
+    # ─── Review Cache ───────────────────────────────────────────
+    REVIEW_CACHE_TTL_SECONDS = int(os.getenv("REVIEW_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "20000"))  # least recently used evicted beyond this
+    
+    # ─── Token Budget ───────────────────────────────────────────
+    # Review prompts are sized in tokens for the smallest context window in the provider chain
+    REVIEW_PROMPT_MAX_TOKENS = int(os.getenv("REVIEW_PROMPT_MAX_TOKENS", "24000"))  # cap per request, even on 1M-token models
+    REVIEW_OUTPUT_TOKENS = int(os.getenv("REVIEW_OUTPUT_TOKENS", "8192"))  # reserved for the reply; also the max_tokens ceiling
+    # Per-file max_tokens: min + per changed line, times the factor for high-risk files
+    REVIEW_OUTPUT_MIN_TOKENS = int(os.getenv("REVIEW_OUTPUT_MIN_TOKENS", "1024"))
+    REVIEW_OUTPUT_TOKENS_PER_LINE = int(os.getenv("REVIEW_OUTPUT_TOKENS_PER_LINE", "12"))
+    REVIEW_OUTPUT_HIGH_RISK_FACTOR = float(os.getenv("REVIEW_OUTPUT_HIGH_RISK_FACTOR", "2.0"))
+    REVIEW_COMPACT_MAX_LINES = int(os.getenv("REVIEW_COMPACT_MAX_LINES", "60"))  # low-risk files up to this many changed lines get compact findings
+    LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))  # a reply cut off at max_tokens is continued, not re-run
+    CONTEXT_TOKEN_LIMIT = int(os.getenv("CONTEXT_TOKEN_LIMIT", "8000"))  # ContextBuilder's own formatted_prompt
+    PLANNER_PATCH_TOKENS = int(os.getenv("PLANNER_PATCH_TOKENS", "6000"))  # diff snippets shared by all files
+    PLANNER_MIN_SNIPPET_TOKENS = int(os.getenv("PLANNER_MIN_SNIPPET_TOKENS", "40"))
+    
+    # ─── Planner Fast Path ──────────────────────────────────────
+    # PRs up to these sizes are planned by the local risk scorer unless a file is ambiguous
+    PLANNER_FAST_PATH = os.getenv("PLANNER_FAST_PATH", "true").lower() == "true"
+    PLANNER_FAST_PATH_MAX_FILES = int(os.getenv("PLANNER_FAST_PATH_MAX_FILES", "10"))
+    PLANNER_FAST_PATH_MAX_LINES = int(os.getenv("PLANNER_FAST_PATH_MAX_LINES", "400"))
+    
+    # ─── Triage Cascade ─────────────────────────────────────────
+    # A cheap model (or the local heuristics) screens files; only suspicious ones get the deep review.
+    # `triage:` in .pr-reviewer.yml (read from the PR head) can only tighten these.
+    # Off by default: the diff under review can talk the model into "clean"
+    TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "false").lower() == "true"
+    TRIAGE_MODE = os.getenv("TRIAGE_MODE", "model")  # "model" or "heuristic"
+    TRIAGE_MIN_RISK_SCORE = int(os.getenv("TRIAGE_MIN_RISK_SCORE", "4"))  # at/above: always deep-reviewed
+    TRIAGE_MIN_CLEAN_CONFIDENCE = float(os.getenv("TRIAGE_MIN_CLEAN_CONFIDENCE", "0.8"))
+    TRIAGE_GROQ_MODEL = os.getenv("TRIAGE_GROQ_MODEL", "llama-3.1-8b-instant")
+    TRIAGE_GEMINI_MODEL = os.getenv("TRIAGE_GEMINI_MODEL", "gemini-2.0-flash-lite")
+    TRIAGE_OPENROUTER_MODEL = os.getenv("TRIAGE_OPENROUTER_MODEL", "meta-llama/llama-3.2-3b-instruct:free")
+    TRIAGE_PROMPT_TOKENS = int(os.getenv("TRIAGE_PROMPT_TOKENS", "6000"))  # diffs shared by all files
+    TRIAGE_OUTPUT_TOKENS = int(os.getenv("TRIAGE_OUTPUT_TOKENS", "1024"))
+    
+    # ─── File Packing ───────────────────────────────────────────
+    # Small files share one LLM request; 0 disables packing
+    REVIEW_PACK_TOKEN_BUDGET = int(os.getenv("REVIEW_PACK_TOKEN_BUDGET", "6000"))
+    REVIEW_PACK_MAX_FILE_TOKENS = int(os.getenv("REVIEW_PACK_MAX_FILE_TOKENS", "1500"))  # larger files are reviewed alone
+    REVIEW_PACK_MAX_FILES = int(os.getenv("REVIEW_PACK_MAX_FILES", "8"))
+    
+    # ─── Incremental Review ─────────────────────────────────────
+    # On `synchronize`, files unchanged since the last reviewed commit keep their prior results
+    INCREMENTAL_REVIEW = os.getenv("INCREMENTAL_REVIEW", "true").lower() == "true"
+    
+    # ─── Diff Intake ────────────────────────────────────────────
+    DIFF_MAX_FILE_BYTES = int(os.getenv("DIFF_MAX_FILE_BYTES", "100000"))  # per-file cap, larger diffs are truncated
+    DIFF_MAX_TOTAL_BYTES = int(os.getenv("DIFF_MAX_TOTAL_BYTES", "2000000"))  # files past this are skipped
+    DIFF_SKIP_PATTERNS = [p.strip() for p in os.getenv("DIFF_SKIP_PATTERNS", "").split(",") if p.strip()]  # extra globs to skip
+    
+    # ─── Workspace GC ───────────────────────────────────────────
+    GC_INTERVAL_SECONDS = int(os.getenv("GC_INTERVAL_SECONDS", "600"))
+    WORKSPACE_DISK_HIGH_WATER = float(os.getenv("WORKSPACE_DISK_HIGH_WATER", "0.85"))  # start evicting above this
+    WORKSPACE_DISK_LOW_WATER = float(os.getenv("WORKSPACE_DISK_LOW_WATER", "0.75"))  # evict down to this
+    WORKSPACE_MAX_BYTES = int(os.getenv("WORKSPACE_MAX_BYTES", "0"))  # 0 = no byte quota
+    MIRROR_MAX_IDLE_DAYS = int(os.getenv("MIRROR_MAX_IDLE_DAYS", "14"))
+    GC_RUN_GRACE_SECONDS = int(os.getenv("GC_RUN_GRACE_SECONDS", "600"))  # keep finished run dirs this long
+    GC_HOT_MIRROR_HOURS = int(os.getenv("GC_HOT_MIRROR_HOURS", "24"))  # mirrors fetched within this window get maintenance
+    GC_MAINTENANCE_INTERVAL_HOURS = int(os.getenv("GC_MAINTENANCE_INTERVAL_HOURS", "24"))
+    
     # ─── Environment ────────────────────────────────────────────
     FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:8080")
     PRODUCTION = os.getenv("PRODUCTION", "").lower() in ("true", "1", "yes")
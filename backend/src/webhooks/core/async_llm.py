@@ -0,0 +1,694 @@
+"""
+Async LLM Service
+=================
+Native asyncio counterpart of `core.llm.LLMService` for code running inside
+the worker event loop. Same fallback chain (Groq → Gemini → OpenRouter), but:
+
+  - calls go through each provider's async client (`AsyncGroq`,
+    `genai.Client(...).aio`, `AsyncOpenAI`), so a slow provider no longer
+    blocks every other consumer in the process
+  - Groq and OpenRouter share one long-lived `httpx.AsyncClient` connection
+    pool per event loop (HTTP/2 when `h2` is installed), created on first use
+    and reused by every AsyncLLMService instance and every agent built on
+    one; workers pre-warm it at start (`prewarm_shared_clients()`) and close
+    it on shutdown (`close_shared_clients()`)
+  - retry backoff uses `asyncio.sleep`
+  - `chat_stream` yields the reply as it is generated (see core.json_stream)
+  - provider order and circuit breaking come from the process-wide
+    core.provider_router (optionally shared through Redis)
+  - every provider call is charged to that provider/model's RPM + TPM
+    buckets (core.rate_limiter.ProviderRateLimiter); a provider out of quota
+    is skipped while another remains, so load spills over instead of 429ing
+  - identical concurrent requests share one provider call
+    (core.single_flight, optionally across processes through Redis)
+  - every call's tokens, latency and retries are recorded for the current
+    job (core.llm_usage)
+  - a reply cut off at max_tokens is continued on the same provider (the
+    partial reply goes back as an assistant turn) up to
+    LLM_MAX_CONTINUATIONS times, instead of the prompt being re-run
+  - LLM_PROVIDER=fake swaps every provider for the offline stand-in in
+    core.fake_llm (load testing without keys or network)
+"""
+
+import asyncio
+import importlib.util
+import time
+import weakref
+from typing import AsyncIterator, List, Optional
+
+from config import config
+from core.llm import build_gemini_request, is_truncated, log_empty_response
+from core.llm_usage import CallUsage, note_response_usage, note_retry, note_truncated, record, record_cache_hit, track_call
+from core.provider_router import ProviderRouter, get_router, is_rate_limit
+from core.rate_limiter import ProviderRateLimiter, get_provider_limiter
+from core.single_flight import SingleFlight, get_single_flight, request_key
+from core.token_budget import count_tokens
+
+
+CONTINUE_PROMPT = (
+    "Your reply was cut off at the output limit. Continue exactly where it stopped: "
+    "output only the rest, without repeating anything or adding commentary."
+)
+
+
+def continuation_messages(messages: list, partial: str) -> list:
+    """`messages` plus the cut-off reply and a request to go on; later rounds extend the same assistant turn."""
+    if len(messages) >= 2 and messages[-1].get("content") == CONTINUE_PROMPT and messages[-2].get("role") == "assistant":
+        messages, partial = messages[:-2], messages[-2]["content"] + partial
+    return messages + [{"role": "assistant", "content": partial}, {"role": "user", "content": CONTINUE_PROMPT}]
+
+
+def finished_text(response, text: str) -> str:
+    """The reply stripped, or as-is when it stopped at max_tokens (a continuation is joined onto it)."""
+    if is_truncated(response):
+        note_truncated()
+        return text
+    return text.strip()
+
+
+# ─── Shared Clients ───────────────────────────────────────────────────────────
+
+class SharedLLMClients:
+    """Provider clients and the HTTP pool behind them, bound to one event loop."""
+
+    def __init__(self):
+        # Offline stand-in only: no network clients at all
+        self.fake = None
+        if config.LLM_PROVIDER.lower() == "fake":
+            from core.fake_llm import FakeLLMClient
+            self.fake = FakeLLMClient()
+            self.http, self.http2 = None, False
+            self.groq = self.gemini = self.openrouter = None
+            print(f"  [LLM] ✓ Fake provider ready (model: {config.FAKE_LLM_MODEL}, ~{config.FAKE_LLM_LATENCY_MS:.0f}ms)")
+            return
+
+        import httpx
+
+        # HTTP/2 multiplexes concurrent requests over one connection per provider
+        self.http2 = config.LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+        self.http = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=config.LLM_HTTP_KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(config.LLM_HTTP_TIMEOUT, connect=10),
+        )
+
+        # 1. Groq (Primary)
+        self.groq = None
+        if config.GROQ_API_KEY:
+            try:
+                from groq import AsyncGroq
+                self.groq = AsyncGroq(api_key=config.GROQ_API_KEY, max_retries=0, http_client=self.http)
+                print(f"  [LLM] ✓ Groq async client ready (model: {config.GROQ_MODEL})")
+            except Exception as e:
+                print(f"  [LLM] ✗ Groq async init failed: {e}")
+
+        # 2. Gemini (manages its own pool)
+        self.gemini = None
+        if config.GEMINI_API_KEY:
+            try:
+                from google import genai
+                self.gemini = genai.Client(api_key=config.GEMINI_API_KEY).aio
+                print(f"  [LLM] ✓ Gemini async client ready (model: {config.GEMINI_MODEL})")
+            except Exception as e:
+                print(f"  [LLM] ✗ Gemini async init failed: {e}")
+
+        # 3. OpenRouter
+        self.openrouter = None
+        if config.OPENROUTER_API_KEY:
+            try:
+                from openai import AsyncOpenAI
+                self.openrouter = AsyncOpenAI(
+                    base_url="https://openrouter.ai/api/v1",
+                    api_key=config.OPENROUTER_API_KEY,
+                    http_client=self.http,
+                )
+                print(f"  [LLM] ✓ OpenRouter async client ready (model: {config.MODEL})")
+            except Exception as e:
+                print(f"  [LLM] ✗ OpenRouter async init failed: {e}")
+
+    async def prewarm(self) -> dict:
+        """
+        Open pooled connections (DNS, TCP, TLS) to the Groq and OpenRouter
+        endpoints before the first job needs them. Any HTTP status counts:
+        only the connection matters. Returns {provider: connections warmed}.
+        Gemini's SDK keeps its own pool and warms on first use.
+        """
+        connections = 1 if self.http2 else config.LLM_PREWARM_CONNECTIONS
+        targets = [(name, client) for name, client in (("groq", self.groq), ("openrouter", self.openrouter)) if client]
+
+        async def touch(url: str) -> bool:
+            try:
+                await self.http.head(url, timeout=10)
+                return True
+            except Exception as e:
+                print(f"  [LLM] ⚠ Pre-warm of {url} failed: {e}")
+                return False
+
+        warmed = {}
+        for name, client in targets:
+            url = str(client.base_url)
+            results = await asyncio.gather(*(touch(url) for _ in range(connections)))
+            warmed[name] = sum(results)
+        if warmed:
+            protocol = "HTTP/2" if self.http2 else "HTTP/1.1"
+            print(f"  [LLM] ✓ Pre-warmed {protocol} connections: " + ", ".join(f"{k}={v}" for k, v in warmed.items()))
+        return warmed
+
+    async def aclose(self):
+        if self.http is not None:
+            await self.http.aclose()
+
+
+# httpx pools can't cross event loops, so keep one set of clients per loop
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SharedLLMClients]" = weakref.WeakKeyDictionary()
+
+
+def get_shared_clients() -> SharedLLMClients:
+    """Clients for the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    clients = _shared_clients.get(loop)
+    if clients is None:
+        clients = _shared_clients[loop] = SharedLLMClients()
+    return clients
+
+
+async def prewarm_shared_clients() -> dict:
+    """Create the running loop's clients and warm their connection pool (worker start)."""
+    return await get_shared_clients().prewarm()
+
+
+async def close_shared_clients():
+    """Close the running loop's connection pool (worker shutdown)."""
+    clients = _shared_clients.pop(asyncio.get_running_loop(), None)
+    if clients:
+        await clients.aclose()
+
+
+# ─── Service ──────────────────────────────────────────────────────────────────
+
+class AsyncLLMService:
+    """
+    Multi-provider async LLM service with automatic fallback across:
+      1. Groq (fastest, free)
+      2. Gemini (reliable, Google)
+      3. OpenRouter (broad model selection)
+
+    Each request goes to the provider the router currently ranks best
+    (configured order until latency data exists); if it fails or returns
+    empty, the next one is tried.
+    """
+
+    def __init__(self, clients: Optional[SharedLLMClients] = None, router: Optional[ProviderRouter] = None, limiter: Optional[ProviderRateLimiter] = None, flights: Optional[SingleFlight] = None):
+        self._clients = clients  # default: the running loop's shared clients
+        self._router = router  # default: the process-wide router
+        self._limiter = limiter  # default: the process-wide provider buckets
+        self._flights = flights  # default: the process-wide single-flight table
+        self.groq_model = config.GROQ_MODEL
+        self.gemini_model = config.GEMINI_MODEL
+        self.openrouter_model = config.MODEL
+        self.fake_model = config.FAKE_LLM_MODEL
+
+    @property
+    def clients(self) -> SharedLLMClients:
+        return self._clients or get_shared_clients()
+
+    @property
+    def router(self) -> ProviderRouter:
+        return self._router or get_router()
+
+    @property
+    def limiter(self) -> ProviderRateLimiter:
+        return self._limiter or get_provider_limiter()
+
+    @property
+    def flights(self) -> Optional[SingleFlight]:
+        if not config.LLM_SINGLE_FLIGHT:
+            return None
+        return self._flights or get_single_flight()
+
+    @staticmethod
+    def _prompt_tokens(messages: list) -> int:
+        return sum(count_tokens(str(m.get("content") or "")) for m in messages)
+
+    def _chain(self, available: List[tuple]) -> dict:
+        """{router key: (provider name, call)} for the configured providers, in configured order."""
+        return {
+            self.router.key(name, model): (name, fn)
+            for name, client, model, fn in available if client
+        }
+
+    @property
+    def model_fingerprint(self) -> str:
+        """The configured model chain (part of the review cache key)."""
+        if config.LLM_PROVIDER.lower() == "fake":
+            return f"fake:{self.fake_model}"  # never share cached reviews with real models
+        return f"groq:{self.groq_model}|gemini:{self.gemini_model}|openrouter:{self.openrouter_model}"
+
+    async def chat(self, messages: list, temperature: float = 0.7, max_tokens: int = None, response_format: dict = None) -> str:
+        """
+        Unified chat with automatic fallback (see `_chat_chain`). An identical
+        request already in flight is joined instead of sent again.
+        """
+        flights = self.flights
+        if flights is None:
+            return await self._chat_chain(messages, temperature, max_tokens, response_format)
+
+        key = request_key(self.model_fingerprint, messages, temperature, max_tokens, response_format)
+        reply = await flights.join(key)
+        if reply is not None:
+            print("  [LLM] ⇄ Joined an identical in-flight request")
+            record_cache_hit("single_flight")
+            return reply
+        reply = ""
+        try:
+            reply = await self._chat_chain(messages, temperature, max_tokens, response_format)
+            return reply
+        finally:
+            await flights.finish(key, reply)
+
+    async def _chat_chain(self, messages: list, temperature: float, max_tokens: int, response_format: dict) -> str:
+        """
+        One request through the fallback chain, best-ranked provider first.
+
+        Failures and 429s feed the shared router: a provider whose circuit is
+        open is only tried after all the others. With LLM_HEDGING, a request
+        still running past its provider's p90 latency is also sent to the
+        next healthy provider; the first answer wins and the other call is
+        cancelled (within the router's hedge budget). A provider without
+        RPM/TPM quota left is skipped unless it is the last one to try.
+        """
+        clients = self.clients
+        chain = self._chain([
+            ("groq", clients.groq, self.groq_model, self._chat_groq),
+            ("gemini", clients.gemini, self.gemini_model, self._chat_gemini),
+            ("openrouter", clients.openrouter, self.openrouter_model, self._chat_openrouter),
+            ("fake", getattr(clients, "fake", None), self.fake_model, self._chat_fake),
+        ])
+
+        if not chain:
+            print("  [LLM] ❌ No LLM providers available!")
+            return ""
+
+        router = self.router
+        await router.sync()
+        router.note_request()
+        args = (messages, temperature, max_tokens, response_format)
+        keys = router.order(list(chain))
+        while keys:
+            key = keys.pop(0)
+            backup = next((k for k in keys if router.healthy(k)), None) if config.LLM_HEDGING else None
+            delay = router.hedge_delay(key) if backup else None
+            if delay is None:
+                result = await self._attempt(chain, key, args, wait=not keys)
+            else:
+                result, hedged = await self._hedged(chain, key, backup, delay, args)
+                if hedged:
+                    keys.remove(backup)
+            if result:
+                return result
+
+        print("  [LLM] ❌ All providers failed!")
+        return ""
+
+    async def _attempt(self, chain: dict, key: str, args: tuple, wait: bool = False, continued: int = 0) -> str:
+        """
+        One provider call with its outcome recorded on the router; "" on
+        failure or an empty reply. Charged to the provider's buckets first:
+        without quota it returns "" at once, or with `wait` waits up to
+        LLM_RATE_LIMIT_WAIT for it. A reply cut off at max_tokens is
+        continued on the same provider; if the continuation fails, the
+        partial reply is returned.
+        """
+        router, limiter = self.router, self.limiter
+        provider_name, chat_fn = chain[key]
+        messages, max_tokens = args[0], args[2]
+        prompt_tokens = self._prompt_tokens(messages)
+        reserved = prompt_tokens + (max_tokens or config.LLM_COMPLETION_TOKEN_ESTIMATE)
+        if not await limiter.acquire(key, provider_name, reserved, timeout=config.LLM_RATE_LIMIT_WAIT if wait else 0):
+            print(f"  [LLM] ⏳ {provider_name} is out of RPM/TPM quota, trying next provider...")
+            return ""
+
+        router.begin(key)
+        started = time.monotonic()
+        with track_call(provider_name, key.split(":", 1)[1]) as call:
+            try:
+                result = await chat_fn(*args)
+            except asyncio.CancelledError:
+                router.release(key)  # lost a hedge race: no verdict on the provider
+                self._account(call, started, prompt_tokens, "")
+                raise
+            except Exception as e:
+                print(f"  [LLM] ❌ {provider_name} failed: {e}")
+                router.record_failure(key, e)
+                self._account(call, started, prompt_tokens, "")
+                return ""
+            else:
+                self._account(call, started, prompt_tokens, result)
+            finally:
+                # Shielded so a cancelled call (hedge loser, job timeout) still settles its reservation
+                await asyncio.shield(limiter.reconcile(key, provider_name, reserved, call.total_tokens))
+        if result:
+            router.record_success(key, time.monotonic() - started)
+            if call.truncated and continued < config.LLM_MAX_CONTINUATIONS:
+                print(f"  [LLM] ↻ {provider_name} reply hit max_tokens, continuing...")
+                continuation = (continuation_messages(messages, result), args[1], max_tokens, None)
+                result += await self._attempt(chain, key, continuation, wait=True, continued=continued + 1)
+            return result
+        router.release(key)
+        print(f"  [LLM] ⚠ {provider_name} returned empty response, trying next provider...")
+        return ""
+
+    @staticmethod
+    def _account(call: CallUsage, started: float, prompt_tokens: int, reply: str):
+        """Finish `call` (counting tokens the provider didn't report) and record it on the job."""
+        if not call.reported:
+            call.prompt_tokens, call.completion_tokens = prompt_tokens, count_tokens(reply or "")
+        call.latency = time.monotonic() - started
+        call.ok = bool(reply)
+        record(call)
+
+    async def _hedged(self, chain: dict, primary: str, backup: str, delay: float, args: tuple) -> tuple:
+        """
+        Run `primary`; if it hasn't answered after `delay` seconds, race it
+        against `backup`. Returns (first non-empty answer or "", backup used).
+        """
+        router = self.router
+        primary_task = asyncio.create_task(self._attempt(chain, primary, args))
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done or not router.take_hedge():
+            return await primary_task, False
+
+        print(f"  [LLM] ⏱ {chain[primary][0]} slower than its p90 ({delay:.1f}s), hedging with {chain[backup][0]}")
+        backup_task = asyncio.create_task(self._attempt(chain, backup, args))
+        pending = {primary_task, backup_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result():
+                        if task is backup_task:
+                            router.hedges["won"] += 1
+                        return task.result(), True
+            return "", True
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def chat_stream(self, messages: list, temperature: float = 0.7, max_tokens: int = None, response_format: dict = None) -> AsyncIterator[str]:
+        """
+        Streaming `chat` (see `_stream_chain`). When an identical request is
+        already in flight its complete reply is yielded as a single chunk.
+        """
+        flights = self.flights
+        if flights is None:
+            async for chunk in self._stream_chain(messages, temperature, max_tokens, response_format):
+                yield chunk
+            return
+
+        key = request_key(self.model_fingerprint, messages, temperature, max_tokens, response_format)
+        reply = await flights.join(key)
+        if reply is not None:
+            print("  [LLM] ⇄ Joined an identical in-flight request")
+            record_cache_hit("single_flight")
+            yield reply
+            return
+        received, complete = [], False
+        try:
+            async for chunk in self._stream_chain(messages, temperature, max_tokens, response_format):
+                received.append(chunk)
+                yield chunk
+            complete = True
+        finally:
+            await flights.finish(key, "".join(received) if complete else "")
+
+    async def _stream_chain(self, messages: list, temperature: float, max_tokens: int, response_format: dict) -> AsyncIterator[str]:
+        """
+        One streamed request through the fallback chain: yields text chunks as they arrive.
+
+        Falls back to the next provider only while nothing has been yielded;
+        a provider failing mid-stream raises, so the caller can keep what it
+        already received. Closing the iterator (or cancelling its consumer)
+        closes the provider stream. Rate-limit buckets are charged as in
+        `chat`.
+        """
+        clients = self.clients
+        chain = self._chain([
+            ("groq", clients.groq, self.groq_model, self._stream_groq),
+            ("gemini", clients.gemini, self.gemini_model, self._stream_gemini),
+            ("openrouter", clients.openrouter, self.openrouter_model, self._stream_openrouter),
+            ("fake", getattr(clients, "fake", None), self.fake_model, self._stream_fake),
+        ])
+
+        if not chain:
+            print("  [LLM] ❌ No LLM providers available!")
+            return
+
+        router, limiter = self.router, self.limiter
+        await router.sync()
+        prompt_tokens = self._prompt_tokens(messages)
+        reserved = prompt_tokens + (max_tokens or config.LLM_COMPLETION_TOKEN_ESTIMATE)
+        keys = router.order(list(chain))
+        for index, key in enumerate(keys):
+            provider_name, stream_fn = chain[key]
+            wait = config.LLM_RATE_LIMIT_WAIT if index == len(keys) - 1 else 0
+            if not await limiter.acquire(key, provider_name, reserved, timeout=wait):
+                print(f"  [LLM] ⏳ {provider_name} is out of RPM/TPM quota, trying next provider...")
+                continue
+            router.begin(key)
+            started = time.monotonic()
+            first_chunk = None  # seconds to the first chunk: the latency the router ranks by
+            received = []
+            call = CallUsage(provider_name, key.split(":", 1)[1])
+            try:
+                async for chunk in stream_fn(messages, temperature, max_tokens, response_format, call):
+                    if chunk:
+                        if first_chunk is None:
+                            first_chunk = time.monotonic() - started
+                        received.append(chunk)
+                        yield chunk
+                self._account(call, started, prompt_tokens, "".join(received))
+                if first_chunk is not None:
+                    router.record_success(key, first_chunk)
+                    break
+                router.release(key)
+                print(f"  [LLM] ⚠ {provider_name} streamed an empty response, trying next provider...")
+            except Exception as e:
+                print(f"  [LLM] ❌ {provider_name} stream failed: {e}")
+                router.record_failure(key, e)
+                self._account(call, started, prompt_tokens, "".join(received))
+                if first_chunk is not None:
+                    raise
+                continue
+            except BaseException:
+                router.release(key)  # closed by the consumer or cancelled: no verdict on the provider
+                self._account(call, started, prompt_tokens, "".join(received))
+                raise
+            finally:
+                await asyncio.shield(limiter.reconcile(key, provider_name, reserved, call.total_tokens))
+        else:
+            print("  [LLM] ❌ All providers failed!")
+            return
+
+        if call.truncated:
+            async for chunk in self._continue_stream(key, chain[key], messages, "".join(received), temperature, max_tokens):
+                yield chunk
+
+    async def _continue_stream(self, key: str, link: tuple, messages: list, text: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        """
+        Continue a stream cut off at max_tokens on the same provider, up to
+        LLM_MAX_CONTINUATIONS rounds. A failure raises, like any mid-stream
+        failure, so the caller keeps what it already received.
+        """
+        provider_name, stream_fn = link
+        limiter = self.limiter
+        for _ in range(config.LLM_MAX_CONTINUATIONS):
+            request = continuation_messages(messages, text)
+            prompt_tokens = self._prompt_tokens(request)
+            reserved = prompt_tokens + (max_tokens or config.LLM_COMPLETION_TOKEN_ESTIMATE)
+            if not await limiter.acquire(key, provider_name, reserved, timeout=config.LLM_RATE_LIMIT_WAIT):
+                return
+            print(f"  [LLM] ↻ {provider_name} stream hit max_tokens, continuing...")
+            started = time.monotonic()
+            call = CallUsage(provider_name, key.split(":", 1)[1])
+            received = []
+            try:
+                async for chunk in stream_fn(request, temperature, max_tokens, None, call):
+                    if chunk:
+                        received.append(chunk)
+                        yield chunk
+            finally:
+                self._account(call, started, prompt_tokens, "".join(received))
+                await asyncio.shield(limiter.reconcile(key, provider_name, reserved, call.total_tokens))
+            text += "".join(received)
+            if not call.truncated or not received:
+                return
+
+    async def _stream_openai_compatible(self, client, model: str, messages: list, temperature: float, max_tokens: int, response_format: dict, call: CallUsage = None) -> AsyncIterator[str]:
+        """Groq and OpenRouter share the OpenAI streaming shape. `call` is flagged when the stream stops at max_tokens."""
+        kwargs = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+        }
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        if response_format:
+            kwargs["response_format"] = response_format
+
+        stream = await client.chat.completions.create(**kwargs)
+        try:
+            async for event in stream:
+                if call is not None and is_truncated(event):
+                    call.truncated = True
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    def _stream_groq(self, messages: list, temperature: float, max_tokens: int, response_format: dict, call: CallUsage = None) -> AsyncIterator[str]:
+        return self._stream_openai_compatible(self.clients.groq, self.groq_model, messages, temperature, max_tokens, response_format, call)
+
+    def _stream_openrouter(self, messages: list, temperature: float, max_tokens: int, response_format: dict, call: CallUsage = None) -> AsyncIterator[str]:
+        return self._stream_openai_compatible(self.clients.openrouter, self.openrouter_model, messages, temperature, max_tokens, response_format, call)
+
+    def _stream_fake(self, messages: list, temperature: float, max_tokens: int, response_format: dict, call: CallUsage = None) -> AsyncIterator[str]:
+        return self._stream_openai_compatible(self.clients.fake, self.fake_model, messages, temperature, max_tokens, response_format, call)
+
+    async def _stream_gemini(self, messages: list, temperature: float, max_tokens: int, response_format: dict, call: CallUsage = None) -> AsyncIterator[str]:
+        contents, gen_config = build_gemini_request(messages, temperature, max_tokens, response_format)
+        stream = await self.clients.gemini.models.generate_content_stream(
+            model=self.gemini_model,
+            contents=contents,
+            config=gen_config,
+        )
+        try:
+            async for chunk in stream:
+                if call is not None and is_truncated(chunk):
+                    call.truncated = True
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+
+    # ─── GROQ ──────────────────────────────────────────────────
+    async def _chat_groq(self, messages: list, temperature: float, max_tokens: int, response_format: dict) -> str:
+        """Send chat to Groq. On 429 rate limit, immediately fails to let the fallback chain try Gemini."""
+        kwargs = {
+            "model": self.groq_model,
+            "messages": messages,
+            "temperature": temperature,
+        }
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        if response_format:
+            kwargs["response_format"] = response_format
+
+        max_retries = 2  # Keep low — fall through to Gemini quickly on failure
+        for attempt in range(1, max_retries + 1):
+            try:
+                response = await self.clients.groq.chat.completions.create(**kwargs)
+                note_response_usage(response)
+
+                if not response.choices or not response.choices[0].message.content:
+                    log_empty_response("Groq", self.groq_model, response, attempt, max_retries)
+                    if attempt < max_retries:
+                        backoff = 2 ** attempt
+                        print(f"  [LLM] ⚠ Retrying Groq after {backoff}s...")
+                        note_retry()
+                        await asyncio.sleep(backoff)
+                        continue
+                    return ""
+
+                return finished_text(response, response.choices[0].message.content)
+
+            except Exception as e:
+                if is_rate_limit(e):
+                    print("  [LLM] ⚡ Groq rate-limited (429) — switching to Gemini fallback")
+                    raise
+
+                print(f"  [LLM] ❌ Groq error (attempt {attempt}/{max_retries}): {e}")
+                if attempt < max_retries:
+                    backoff = 2 ** attempt
+                    print(f"  [LLM] ⚠ Retrying Groq after {backoff}s...")
+                    note_retry()
+                    await asyncio.sleep(backoff)
+                else:
+                    raise
+
+        return ""
+
+    # ─── GEMINI ────────────────────────────────────────────────
+    async def _chat_gemini(self, messages: list, temperature: float, max_tokens: int, response_format: dict) -> str:
+        """Send chat to Google Gemini."""
+        contents, gen_config = build_gemini_request(messages, temperature, max_tokens, response_format)
+
+        response = await self.clients.gemini.models.generate_content(
+            model=self.gemini_model,
+            contents=contents,
+            config=gen_config,
+        )
+        note_response_usage(response)
+
+        if not response.text:
+            return ""
+        return finished_text(response, response.text)
+
+    # ─── OPENROUTER ────────────────────────────────────────────
+    async def _chat_openrouter(self, messages: list, temperature: float, max_tokens: int, response_format: dict) -> str:
+        """Send chat to OpenRouter via the async OpenAI SDK."""
+        kwargs = {
+            "model": self.openrouter_model,
+            "messages": messages,
+            "temperature": temperature,
+        }
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        if response_format:
+            kwargs["response_format"] = response_format
+
+        max_retries = 2
+        for attempt in range(1, max_retries + 1):
+            try:
+                response = await self.clients.openrouter.chat.completions.create(**kwargs)
+                note_response_usage(response)
+
+                if not response.choices or not response.choices[0].message.content:
+                    log_empty_response("OpenRouter", self.openrouter_model, response, attempt, max_retries)
+                    if attempt < max_retries:
+                        note_retry()
+                        await asyncio.sleep(2 * attempt)
+                        continue
+                    return ""
+
+                return finished_text(response, response.choices[0].message.content)
+
+            except Exception as e:
+                print(f"  [LLM] ❌ OpenRouter error (attempt {attempt}/{max_retries}): {e}")
+                if attempt < max_retries:
+                    note_retry()
+                    await asyncio.sleep(2 * attempt)
+                else:
+                    raise
+
+        return ""
+
+    # ─── FAKE ──────────────────────────────────────────────────
+    async def _chat_fake(self, messages: list, temperature: float, max_tokens: int, response_format: dict) -> str:
+        """Offline stand-in (LLM_PROVIDER=fake); injected errors raise like real ones."""
+        response = await self.clients.fake.chat.completions.create(
+            model=self.fake_model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=response_format,
+        )
+        note_response_usage(response)
+        return finished_text(response, response.choices[0].message.content)
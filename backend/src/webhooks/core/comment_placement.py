@@ -0,0 +1,134 @@
+"""
+Comment Placement
+=================
+Maps LLM-reported line numbers onto positions GitHub accepts for RIGHT-side
+review comments, i.e. new-side lines inside a diff hunk.
+
+Commentable lines of a file are contiguous per hunk, so each file is indexed
+as two sorted arrays (hunk start / end lines). Validating or snapping a line
+is a bisect over those arrays — O(log hunks) per comment instead of
+rebuilding a set of every visible line and scanning all of it.
+
+Snapping is hunk-aware: a line outside every hunk moves to the nearest edge
+of one of the two hunks bordering its gap (within `max_distance`), never
+further across the file.
+"""
+
+import bisect
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from core.parsed_diff import FileDiff, ParsedDiff
+
+SNAP_DISTANCE = 20
+
+
+@dataclass
+class Placement:
+    """Outcome of placing one comment."""
+
+    path: str
+    line: Optional[int]  # final line, None if the comment can't be placed
+    original_line: Optional[int]
+    reason: str = ""  # why placement failed: "invalid_line" | "file_not_in_diff" | "too_far"
+
+    @property
+    def snapped(self) -> bool:
+        return self.line is not None and self.line != self.original_line
+
+
+class FileLineIndex:
+    """Sorted hunk ranges of one file's commentable (new-side) lines."""
+
+    def __init__(self, file_diff: FileDiff):
+        ranges = sorted((h.new_start, h.new_end) for h in file_diff.hunks if h.new_count > 0)
+        self.starts = [start for start, _ in ranges]
+        self.ends = [end for _, end in ranges]
+
+    def __bool__(self) -> bool:
+        return bool(self.starts)
+
+    def contains(self, line: int) -> bool:
+        i = bisect.bisect_right(self.starts, line) - 1
+        return i >= 0 and line <= self.ends[i]
+
+    def nearest(self, line: int) -> Tuple[Optional[int], int]:
+        """
+        Closest commentable line and its distance. Only the hunks on either
+        side of `line` are considered; ties go to the earlier line.
+        """
+        i = bisect.bisect_right(self.starts, line) - 1
+        if i >= 0 and line <= self.ends[i]:
+            return line, 0
+
+        best, best_distance = None, 0
+        if i >= 0:  # hunk ending before the line
+            best, best_distance = self.ends[i], line - self.ends[i]
+        if i + 1 < len(self.starts):  # hunk starting after the line
+            distance = self.starts[i + 1] - line
+            if best is None or distance < best_distance:
+                best, best_distance = self.starts[i + 1], distance
+        return best, best_distance
+
+
+class CommentPlacer:
+    """Validates and snaps inline comments against a ParsedDiff."""
+
+    def __init__(self, parsed_diff: ParsedDiff, max_distance: int = SNAP_DISTANCE):
+        self.parsed_diff = parsed_diff
+        self.max_distance = max_distance
+        self._indexes: Dict[str, FileLineIndex] = {}
+
+    def index_for(self, path: str) -> Optional[FileLineIndex]:
+        if path not in self._indexes:
+            file_diff = self.parsed_diff.get(path)
+            if file_diff is None:
+                return None
+            self._indexes[path] = FileLineIndex(file_diff)
+        return self._indexes[path]
+
+    def place(self, path: str, line) -> Placement:
+        try:
+            line = int(line)
+        except (ValueError, TypeError):
+            return Placement(path, None, None, "invalid_line")
+
+        index = self.index_for(path)
+        if not index:
+            return Placement(path, None, line, "file_not_in_diff")
+
+        target, distance = index.nearest(line)
+        if target is None or distance > self.max_distance:
+            return Placement(path, None, line, "too_far")
+        return Placement(path, target, line)
+
+    def place_comments(self, comments: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, Placement]]]:
+        """
+        Split comments into GitHub-ready inline comments (path/line/side/body
+        only) and the (comment, placement) pairs that could not be placed.
+        """
+        placed, rejected = [], []
+        for comment in comments:
+            if comment.get("line") is None:
+                continue
+            placement = self.place(comment.get("path", ""), comment.get("line"))
+            if placement.line is None:
+                rejected.append((comment, placement))
+                continue
+            placed.append({
+                "path": placement.path,
+                "line": placement.line,
+                "side": "RIGHT",
+                "body": comment.get("body", "Issue found"),
+            })
+        return placed, rejected
+
+
+def describe_rejection(comment: Dict, placement: Placement) -> str:
+    """One markdown bullet explaining why a comment was not posted inline."""
+    path = comment.get("path", "unknown")
+    if placement.reason == "file_not_in_diff":
+        return f"- **{path}**: {comment.get('body', 'No message')[:80]} (File not in diff)"
+    if placement.reason == "too_far":
+        return f"- **{path}**: Line {placement.original_line} not in diff"
+    return f"- **{path}**: Invalid line {comment.get('line')!r}"
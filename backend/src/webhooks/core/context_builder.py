@@ -6,12 +6,13 @@ to build the perfect context for the LLM.
 """
 
 import os
-import re
-import tiktoken
 from typing import Dict, Any, List, Set, Tuple
+from config import config
 from .indexing.vector_store import CodeVectorStore
 from .indexing.graph import SymbolGraph
 from .indexing.parser import UniversalParser, CodeNode
+from .parsed_diff import HunkWalker
+from .token_budget import count_tokens
 
 class ContextBuilder:
     """
@@ -26,65 +27,44 @@ class ContextBuilder:
         # Allow injection or lazy load
         self.vector_store = vector_store if vector_store else CodeVectorStore()
         self.graph = graph if graph else SymbolGraph()
-        
-        # Tiktoken encoder for token counting (approximate for context window)
-        try:
-            self.encoder = tiktoken.get_encoding("cl100k_base")
-        except:
-            self.encoder = None
 
     def _count_tokens(self, text: str) -> int:
-        """Count tokens using tiktoken or simple fallback."""
-        if not text:
-            return 0
-        if self.encoder:
-            return len(self.encoder.encode(text))
-        return len(text.split())  # Rough fallback
+        """Count tokens (tiktoken cl100k_base, or ~4 chars per token)."""
+        return count_tokens(text)
 
     def _parse_diff_changed_lines(self, diff_text: str) -> List[int]:
         """
         Parses a unified diff to find line numbers of added/modified lines in the new file.
         Returns a list of 1-based line numbers.
         """
+        walker = HunkWalker()
         changed_lines = []
-        current_line = 0
-        
-        # Regex for chunk header: @@ -old_start,old_len +new_start,new_len @@
-        hunk_header_re = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
-
         for line in diff_text.splitlines():
-            match = hunk_header_re.match(line)
-            if match:
-                current_line = int(match.group(1)) - 1 # We'll start incrementing immediatelly
-                continue
-            
-            if line.startswith("+++") or line.startswith("---"):
-                continue
-                
-            if line.startswith("+"):
-                current_line += 1
-                changed_lines.append(current_line)
-            elif line.startswith("-"):
-                # Deleted line, doesn't exist in new file, so doesn't advance current_line
-                pass
-            else:
-                # Context line
-                current_line += 1
-                
+            kind, _, new_line = walker.classify(line)
+            if kind == "add":
+                changed_lines.append(new_line)
         return changed_lines
 
-    def build_context(self, file_path: str, full_file_content: str, diff_text: str = "") -> Dict[str, Any]:
+    def build_context(self, file_path: str, full_file_content: str, diff_text: str = "", changed_lines: List[int] = None, token_limit: int = None) -> Dict[str, Any]:
         """
         Analyzes a changed file and builds context for the LLM.
+        Pass `changed_lines` (e.g. from ParsedDiff) to skip re-parsing `diff_text`.
         Priority:
         1. Changed Nodes (Impact Analysis)
         2. Changed Nodes (Source Code)
-        3. Similar Code (Vector Search) - Pruned if tokens > 8000
+        3. Similar Code (Vector Search) - Pruned if tokens > `token_limit`
+           (CONTEXT_TOKEN_LIMIT by default)
+
+        Besides `formatted_prompt`, `sections` holds the unpruned
+        "changed_symbols", "impact" and "similar" text, for callers that
+        budget the whole prompt themselves (see `format_sections`).
         """
+        token_limit = token_limit or config.CONTEXT_TOKEN_LIMIT
         context = {
             "file_path": file_path,
             "analysis": [],
-            "formatted_prompt": ""
+            "formatted_prompt": "",
+            "sections": {},
         }
 
         # 1. Parsing & Diff Analysis
@@ -93,7 +73,8 @@ class ContextBuilder:
         # Update ephemeral graph
         self.graph.build_from_nodes(nodes)
 
-        changed_lines = self._parse_diff_changed_lines(diff_text) if diff_text else []
+        if changed_lines is None:
+            changed_lines = self._parse_diff_changed_lines(diff_text) if diff_text else []
         
         # Identify changed nodes
         # If no diff provided, treat everything as "changed" (or nothing? Let's assume all for now if empty diff)
@@ -121,7 +102,6 @@ class ContextBuilder:
         similar_sections = []
 
         total_tokens = 0
-        TOKEN_LIMIT = 8000
 
         for node in relevant_nodes:
             # A. Impact (Graph) - Highest Priority (cheap in tokens, high value)
@@ -160,32 +140,48 @@ class ContextBuilder:
                 pass # Vector store might fail or be empty
 
         # 3. Pruning & Assembly
+        kept_similar = []
+        for sim_msg in similar_sections:
+            sim_tokens = self._count_tokens(sim_msg)
+            if total_tokens + sim_tokens >= token_limit:
+                kept_similar.append("\n[...Matched code omitted due to token limit...]\n")
+                break
+            kept_similar.append(sim_msg + "\n")
+            total_tokens += sim_tokens
+
+        final_prompt = self.format_sections({
+            "impact": "\n".join(impact_sections),
+            "changed_symbols": "\n".join(code_sections),
+            "similar": "".join(kept_similar),
+        })
+        context["sections"] = {
+            "changed_symbols": "\n".join(code_sections),
+            "impact": "\n".join(impact_sections),
+            "similar": "\n".join(similar_sections),
+        }
+        context["formatted_prompt"] = final_prompt
+        # Keep raw analysis for debugging/structured use
+        context["analysis"] = [n.name for n in relevant_nodes]
+        
+        return context
+
+    @staticmethod
+    def format_sections(sections: Dict[str, str]) -> str:
+        """Render "impact", "changed_symbols" and "similar" text as the context prompt."""
         final_prompt = "## Context Analysis\n\n"
         
         # Add Impact
-        if impact_sections:
+        if sections.get("impact"):
             final_prompt += "### 1. Impact Analysis (Dependencies)\n"
-            final_prompt += "\n".join(impact_sections) + "\n\n"
+            final_prompt += sections["impact"] + "\n\n"
             
         # Add Changed Code
-        if code_sections:
+        if sections.get("changed_symbols"):
             final_prompt += "### 2. Changed Code Context\n"
-            final_prompt += "\n".join(code_sections) + "\n\n"
+            final_prompt += sections["changed_symbols"] + "\n\n"
             
-        # Add Similar Code (if budget allows)
-        if similar_sections:
+        # Add Similar Code
+        if sections.get("similar"):
             final_prompt += "### 3. Related Code Examples\n"
-            for sim_msg in similar_sections:
-                sim_tokens = self._count_tokens(sim_msg)
-                if total_tokens + sim_tokens < TOKEN_LIMIT:
-                    final_prompt += sim_msg + "\n"
-                    total_tokens += sim_tokens
-                else:
-                    final_prompt += "\n[...Matched code omitted due to token limit...]\n"
-                    break
-
-        context["formatted_prompt"] = final_prompt
-        # Keep raw analysis for debugging/structured use
-        context["analysis"] = [n.name for n in relevant_nodes]
-        
-        return context
+            final_prompt += sections["similar"]
+        return final_prompt
@@ -1,6 +1,7 @@
-import re
 from typing import Dict
 
+from core.parsed_diff import ParsedDiff, HunkWalker, annotate_lines
+
 class DiffParser:
     """Parses unified diff format and extracts per-file changes."""
     
@@ -9,31 +10,10 @@ class DiffParser:
         """
         Splits a unified diff into individual file diffs.
         Returns: {"path/to/file.py": "diff content..."}
+
+        Callers that need more than the text should use ParsedDiff directly.
         """
-        file_diffs = {}
-        current_file = None
-        current_diff_lines = []
-        
-        for line in raw_diff.split('\n'):
-            # Detect new file header
-            if line.startswith('diff --git'):
-                # Save previous file
-                if current_file:
-                    file_diffs[current_file] = '\n'.join(current_diff_lines)
-                
-                # Extract new filename (e.g., "a/src/app.py b/src/app.py")
-                match = re.search(r'b/(.+)$', line)
-                if match:
-                    current_file = match.group(1)
-                    current_diff_lines = [line]
-            elif current_file:
-                current_diff_lines.append(line)
-        
-        # Save last file
-        if current_file:
-            file_diffs[current_file] = '\n'.join(current_diff_lines)
-        
-        return file_diffs
+        return ParsedDiff.parse(raw_diff).file_diffs()
     
     @staticmethod
     def format_diff_block(diff_content: str, max_context_lines: int = 5) -> str:
@@ -105,34 +85,7 @@ class DiffParser:
         Annotates a single file's diff with new-side line numbers (Lxx).
         This helps the LLM reference exact line numbers for inline comments.
         """
-        lines = file_diff.split('\n')
-        annotated = []
-        new_line = 0
-
-        for line in lines:
-            if line.startswith('@@'):
-                match = re.search(r'\+(\d+)', line)
-                if match:
-                    new_line = int(match.group(1))
-                annotated.append(line)
-            elif line.startswith('+++') or line.startswith('---') or line.startswith('diff --git') or line.startswith('index ') or line.startswith('\\'):
-                annotated.append(line)
-            elif line.startswith('+'):
-                annotated.append(f"L{new_line:>4} {line}")
-                new_line += 1
-            elif line.startswith('-'):
-                annotated.append(f"      {line}")
-            elif not line.strip(): # Ignore empty lines (often from split)
-                annotated.append(line)
-            else:
-                # Context line
-                if new_line > 0:
-                    annotated.append(f"L{new_line:>4} {line}")
-                    new_line += 1
-                else:
-                    annotated.append(line)
-
-        return '\n'.join(annotated)
+        return annotate_lines(file_diff.split('\n'))
 
     @staticmethod
     def get_valid_right_lines(file_diff: str) -> set:
@@ -140,27 +93,10 @@ class DiffParser:
         Returns all line numbers visible on the RIGHT side of the diff.
         These are the only valid positions for inline review comments.
         """
-        lines = file_diff.split('\n')
+        walker = HunkWalker()
         valid = set()
-        new_line = 0
-
-        for line in lines:
-            if line.startswith('@@'):
-                match = re.search(r'\+(\d+)', line)
-                if match:
-                    new_line = int(match.group(1))
-            elif line.startswith('+++') or line.startswith('---') or line.startswith('diff --git') or line.startswith('index ') or line.startswith('\\'):
-                continue
-            elif line.startswith('+'):
+        for line in file_diff.split('\n'):
+            kind, _, new_line = walker.classify(line)
+            if kind in ("add", "ctx"):
                 valid.add(new_line)
-                new_line += 1
-            elif line.startswith('-'):
-                pass
-            elif not line.strip(): # Ignore empty context lines (usually split artifact)
-                continue 
-            else:
-                if new_line > 0:
-                    valid.add(new_line)
-                    new_line += 1
-
         return valid
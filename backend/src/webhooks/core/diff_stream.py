@@ -0,0 +1,270 @@
+"""
+Streaming Diff Reader
+=====================
+Reads a unified diff incrementally (the httpx response body of the GitHub
+diff endpoint) and yields one file at a time, so huge PRs never sit in memory as
+one string plus a dict of per-file copies.
+
+Per file, before anything is buffered:
+  - skip rules drop lockfiles, generated artifacts, vendored trees and binary
+    patches (only the path and reason are kept)
+  - the kept text is capped at DIFF_MAX_FILE_BYTES; the hunk being cut has its
+    header rewritten to the lines actually kept, and a `\\ AgenticPR: ...`
+    marker line records how much was dropped
+  - once DIFF_MAX_TOTAL_BYTES of kept diff is reached, remaining files are
+    skipped with reason "total_limit"
+
+`StreamingDiffParser.collect()` assembles the kept files into the reduced
+diff text and its ParsedDiff in the same pass.
+"""
+
+import codecs
+import fnmatch
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+from config import config
+from core.parsed_diff import (
+    HUNK_HEADER_RE, DiffBuilder, HunkWalker, ParsedDiff, path_from_git_header,
+)
+
+logger = logging.getLogger("agenticpr.diff_stream")
+
+
+# ─── Skip Rules ───────────────────────────────────────────────────────────────
+
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml",
+    "bun.lockb", "poetry.lock", "Pipfile.lock", "uv.lock", "Cargo.lock",
+    "composer.lock", "Gemfile.lock", "go.sum", "mix.lock", "pubspec.lock",
+    "Podfile.lock", "packages.lock.json", "flake.lock",
+}
+
+GENERATED_PATTERNS = [
+    "*.min.js", "*.min.css", "*.map", "*.snap",
+    "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h",
+    "*.generated.*", "*.g.dart", "*.designer.cs",
+    "dist/*", "*/dist/*", "__generated__/*", "*/__generated__/*",
+]
+
+VENDORED_DIRS = ("vendor/", "node_modules/", "third_party/", "bower_components/", ".yarn/")
+
+
+def classify_path(path: str, extra_patterns: Optional[List[str]] = None) -> str:
+    """Return the skip reason for a path, or "" if it should be reviewed."""
+    name = path.rsplit("/", 1)[-1]
+    if name in LOCKFILE_NAMES:
+        return "lockfile"
+    if any(path.startswith(d) or f"/{d}" in path for d in VENDORED_DIRS):
+        return "vendored"
+    if any(fnmatch.fnmatch(path, p) or fnmatch.fnmatch(name, p) for p in GENERATED_PATTERNS):
+        return "generated"
+    if extra_patterns and any(fnmatch.fnmatch(path, p) for p in extra_patterns):
+        return "custom"
+    return ""
+
+
+# ─── Results ──────────────────────────────────────────────────────────────────
+
+@dataclass
+class StreamedFile:
+    """One file's kept diff lines, or the reason it was skipped."""
+
+    path: str
+    lines: List[str] = field(default_factory=list)  # without trailing newlines
+    skip_reason: str = ""
+    truncated_lines: int = 0
+    size_bytes: int = 0  # size of the original file diff
+
+
+@dataclass
+class StreamedDiff:
+    """Reduced diff assembled from the kept files."""
+
+    text: str
+    parsed: ParsedDiff
+    skipped: List[Dict[str, str]]
+    truncated: List[str]
+    bytes_read: int
+
+
+# ─── Parser ───────────────────────────────────────────────────────────────────
+
+class StreamingDiffParser:
+    """Splits a stream of diff lines into capped, filtered per-file diffs."""
+
+    def __init__(
+        self,
+        max_file_bytes: int = None,
+        max_total_bytes: int = None,
+        extra_skip_patterns: Optional[List[str]] = None,
+    ):
+        self.max_file_bytes = max_file_bytes or config.DIFF_MAX_FILE_BYTES
+        self.max_total_bytes = max_total_bytes or config.DIFF_MAX_TOTAL_BYTES
+        self.extra_skip_patterns = extra_skip_patterns if extra_skip_patterns is not None else config.DIFF_SKIP_PATTERNS
+        self.bytes_read = 0
+
+    async def iter_files(self, lines: AsyncIterator[str]) -> AsyncIterator[StreamedFile]:
+        walker = HunkWalker()
+        state: Optional[_FileState] = None
+        kept_total = 0
+
+        async for line in lines:
+            self.bytes_read += len(line) + 1
+            kind, _, _ = walker.classify(line)
+
+            if kind == "file":
+                if state:
+                    finished = state.finish(self.max_file_bytes)
+                    kept_total += state.kept_bytes
+                    yield finished
+                path = path_from_git_header(line)
+                state = _FileState(path, min(self.max_file_bytes, self.max_total_bytes - kept_total))
+                if kept_total >= self.max_total_bytes:
+                    state.skip("total_limit")
+                else:
+                    state.skip(classify_path(path, self.extra_skip_patterns))
+                state.add(line, kind, walker)
+                continue
+
+            if state is None:
+                continue  # preamble before the first file header
+            if kind == "meta" and not state.in_hunks and (
+                line.startswith("Binary files ") or line.startswith("GIT binary patch")
+            ):
+                state.skip("binary")
+            state.add(line, kind, walker)
+
+        if state:
+            yield state.finish(self.max_file_bytes)
+
+    async def collect(self, lines: AsyncIterator[str]) -> StreamedDiff:
+        builder = DiffBuilder()
+        kept: List[str] = []
+        skipped: List[Dict[str, str]] = []
+        truncated: List[str] = []
+
+        async for f in self.iter_files(lines):
+            if f.skip_reason:
+                skipped.append({"path": f.path, "reason": f.skip_reason})
+                continue
+            if f.truncated_lines:
+                truncated.append(f.path)
+            for line in f.lines:
+                builder.feed(line, len(line) + 1)
+            kept.extend(f.lines)
+
+        text = "\n".join(kept) + "\n" if kept else ""
+        return StreamedDiff(
+            text=text,
+            parsed=ParsedDiff(text, builder.finish()),
+            skipped=skipped,
+            truncated=truncated,
+            bytes_read=self.bytes_read,
+        )
+
+
+class _FileState:
+    """Buffer for the file currently being read."""
+
+    def __init__(self, path: str, cap: int):
+        self.path = path
+        self.cap = cap
+        self.lines: List[str] = []
+        self.kept_bytes = 0
+        self.size_bytes = 0
+        self.skip_reason = ""
+        self.in_hunks = False
+        self.truncated = False
+        self.dropped = 0
+        # Current hunk: index of its header in self.lines and lines kept so far
+        self._hunk_index = -1
+        self._hunk_header = (0, 0, 0, 0)
+        self._hunk_suffix = ""
+        self._kept_old = 0
+        self._kept_new = 0
+
+    def skip(self, reason: str):
+        if reason and not self.skip_reason:
+            self.skip_reason = reason
+            self.lines = []
+            self.kept_bytes = 0
+
+    def add(self, line: str, kind: str, walker: HunkWalker):
+        self.size_bytes += len(line) + 1
+        if self.skip_reason:
+            return
+        if self.truncated:
+            self.dropped += 1
+            return
+
+        if self.kept_bytes + len(line) + 1 > self.cap and kind != "file":
+            self._truncate()
+            self.dropped += 1
+            return
+
+        if kind == "hunk":
+            self.in_hunks = True
+            self._close_hunk()
+            self._hunk_index = len(self.lines)
+            self._hunk_header = walker.header
+            self._hunk_suffix = line[HUNK_HEADER_RE.match(line).end():]
+        elif kind in ("add", "ctx"):
+            self._kept_new += 1
+        if kind in ("del", "ctx"):
+            self._kept_old += 1
+
+        self.lines.append(line)
+        self.kept_bytes += len(line) + 1
+
+    def _close_hunk(self):
+        self._hunk_index = -1
+        self._kept_old = self._kept_new = 0
+
+    def _truncate(self):
+        """Cut the file here, shrinking the open hunk to the lines actually kept."""
+        self.truncated = True
+        if self._hunk_index < 0:
+            return
+        if not (self._kept_old or self._kept_new):
+            del self.lines[self._hunk_index:]
+            return
+        old_start, _, new_start, _ = self._hunk_header
+        self.lines[self._hunk_index] = (
+            f"@@ -{old_start},{self._kept_old} +{new_start},{self._kept_new} @@{self._hunk_suffix}"
+        )
+
+    def finish(self, max_file_bytes: int) -> StreamedFile:
+        if self.truncated and not any(line.startswith("@@") for line in self.lines):
+            # Nothing reviewable fit in the budget
+            self.skip("total_limit" if self.cap < max_file_bytes else "too_large")
+        lines = self.lines
+        if self.truncated and not self.skip_reason:
+            lines.append(
+                f"\\ AgenticPR: diff truncated, {self.dropped} more lines not shown "
+                f"(file diff over {max_file_bytes // 1024} KB)"
+            )
+        return StreamedFile(
+            path=self.path,
+            lines=lines,
+            skip_reason=self.skip_reason,
+            truncated_lines=self.dropped if self.truncated else 0,
+            size_bytes=self.size_bytes,
+        )
+
+
+# ─── Sources ──────────────────────────────────────────────────────────────────
+
+async def aiter_lines(chunks: AsyncIterator[Union[bytes, str]]) -> AsyncIterator[str]:
+    """Turn a stream of byte/str chunks into lines (without the newline)."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
@@ -0,0 +1,239 @@
+"""
+Fake LLM Provider
+=================
+Deterministic, offline stand-in for Groq / Gemini / OpenRouter, selected with
+LLM_PROVIDER=fake, so the worker pipeline (fetch → analyze → review →
+publish) can be load-tested on a laptop with no keys and no network.
+
+`FakeLLMClient` has the OpenAI client shape (`chat.completions.create`, with
+and without `stream=True`), so it runs through the real AsyncLLMService path:
+router, rate-limit buckets, hedging, single-flight and usage accounting.
+
+Replies are derived from the prompt and are identical for identical prompts:
+
+  review (single file or packed)  schema-valid findings JSON: an actionable
+                                  finding per added line matching one of the
+                                  risk scorer's sensitive APIs, a nitpick per
+                                  TODO/FIXME or over-long added line
+  planner                         a plan from the listed files
+  triage                          clean for docs/tests, suspicious otherwise
+  anything else (fix prompt, …)   plain text
+
+A reply longer than `max_tokens` is cut there with finish_reason "length";
+a continuation request (the partial reply as an assistant turn) gets the
+rest of the same reply.
+
+Latency is log-normal around FAKE_LLM_LATENCY_MS (FAKE_LLM_LATENCY_SIGMA = 0
+makes it fixed); FAKE_LLM_ERROR_RATE and FAKE_LLM_RATE_LIMIT_RATE inject 500s
+and 429s. Sampling uses FAKE_LLM_SEED, so a run is reproducible. Responses
+carry `usage` (prompt/completion tokens counted locally), with a system
+message seen before reported as `cached_tokens`, the way providers' prefix
+caches do.
+"""
+
+import asyncio
+import json
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from config import config
+from core.risk_scorer import SENSITIVE_APIS
+from core.token_budget import count_tokens, truncate_to_tokens
+
+ADDED_LINE = re.compile(r"^L\s*(\d+) \+(.*)$", re.MULTILINE)
+FILE_SECTION = re.compile(r'<file path="([^"]+)"[^>]*>(.*?)</file>', re.DOTALL)
+SINGLE_FILE = re.compile(r"^File: (.+)$", re.MULTILINE)
+DIFF_BLOCK = re.compile(r"<diff>\n(.*?)\n</diff>", re.DOTALL)
+TRIAGE_FILE = re.compile(r"^### (\S+) \(\+(\d+)/-(\d+)\)$", re.MULTILINE)
+PLANNER_FILE = re.compile(r"^\s*- (\S+): \+(\d+)/-(\d+) lines", re.MULTILINE)
+
+NON_CODE = re.compile(r"\.(md|rst|txt|lock)$|(^|/)(LICENSE|CHANGELOG)|\.gitignore$", re.IGNORECASE)
+TEST_OR_DOC = re.compile(r"(^|/)(tests?|docs?)/|test_|_test\.|\.(md|rst|txt)$", re.IGNORECASE)
+
+
+# ─── Replies ──────────────────────────────────────────────────────────────────
+
+def _findings(diff: str) -> List[Dict[str, Any]]:
+    findings = []
+    for match in ADDED_LINE.finditer(diff):
+        line, code = int(match.group(1)), match.group(2)
+        for pattern, reason in SENSITIVE_APIS:
+            if pattern.search(code):
+                findings.append({
+                    "line": line, "end_line": line, "severity": "HIGH", "category": "SECURITY",
+                    "title": f"Review {reason}.",
+                    "message": f"This line introduces {reason}: `{code.strip()[:80]}`. Make sure its input is trusted.",
+                    "suggestion": "", "type": "actionable", "original_code": code,
+                })
+                break
+        else:
+            if "TODO" in code or "FIXME" in code or len(code) > 120:
+                findings.append({
+                    "line": line, "end_line": line, "severity": "LOW", "category": "MAINTAINABILITY",
+                    "title": "Resolve the leftover note." if len(code) <= 120 else "Wrap the long line.",
+                    "message": "Leftover TODO/FIXME or over-long line in the added code.",
+                    "suggestion": "", "type": "nitpick", "original_code": code,
+                })
+    return findings
+
+
+def _file_review(path: str, diff: str) -> Dict[str, Any]:
+    findings = _findings(diff)
+    added = len(ADDED_LINE.findall(diff))
+    return {
+        "file": path,
+        "change_summary": f"This change adds {added} line(s) to `{path}`.",
+        "findings": findings,
+        "file_comments": [],
+        "lgtm_note": "" if findings else "No issues found in the added lines.",
+    }
+
+
+def _plan(prompt: str) -> Dict[str, Any]:
+    files = [(path, int(a) + int(d)) for path, a, d in PLANNER_FILE.findall(prompt)]
+    return {
+        "review_strategy": "focus_on_critical" if any(n >= 200 for _, n in files) else "broad_review",
+        "high_risk_files": [p for p, n in files if not NON_CODE.search(p) and n >= 50],
+        "ignore_files": [p for p, _ in files if NON_CODE.search(p)],
+        "focus_instructions": "Focus on correctness of the changed logic.",
+    }
+
+
+def _triage(prompt: str) -> Dict[str, Any]:
+    return {"files": [
+        {
+            "path": path,
+            "verdict": "clean" if TEST_OR_DOC.search(path) else "suspicious",
+            "confidence": 0.9 if TEST_OR_DOC.search(path) else 0.6,
+            "reason": "tests/docs only" if TEST_OR_DOC.search(path) else "source change",
+        }
+        for path, _, _ in TRIAGE_FILE.findall(prompt)
+    ]}
+
+
+def fake_reply(messages: list) -> str:
+    """The deterministic reply to `messages`."""
+    if len(messages) >= 3 and messages[-2].get("role") == "assistant":
+        # a continuation (or a re-prompt after a bad reply): answer the original request
+        full, partial = fake_reply(messages[:-2]), str(messages[-2].get("content") or "")
+        return full[len(partial):] if partial and full.startswith(partial) else full
+
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    prompt = str(messages[-1].get("content") or "") if messages else ""
+
+    if "You triage pull request diffs" in system:
+        return json.dumps(_triage(prompt))
+    if "Tech Lead triaging files" in prompt:
+        return json.dumps(_plan(prompt))
+    sections = FILE_SECTION.findall(prompt)
+    if sections:
+        files = []
+        for path, body in sections:
+            diff = DIFF_BLOCK.search(body)
+            files.append(_file_review(path, diff.group(1) if diff else ""))
+        return json.dumps({"files": files})
+    path, diff = SINGLE_FILE.search(prompt), DIFF_BLOCK.search(prompt)
+    if path and diff:
+        review = _file_review(path.group(1).strip(), diff.group(1))
+        review.pop("file")
+        return json.dumps(review)
+    return (
+        "Fake provider reply (LLM_PROVIDER=fake). Address the findings listed above file by file, "
+        "starting with the actionable ones; nitpicks can follow in a separate commit."
+    )
+
+
+# ─── Client ───────────────────────────────────────────────────────────────────
+
+class _Stream:
+    """OpenAI-style stream of `text` in FAKE_LLM_STREAM_CHUNK_CHARS chunks."""
+
+    def __init__(self, text: str, delay: float, finish_reason: str = "stop"):
+        size = max(1, config.FAKE_LLM_STREAM_CHUNK_CHARS)
+        self._chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self._delay = delay / max(1, len(self._chunks))
+        self._finish_reason = finish_reason
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._chunks:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._delay)
+        chunk = self._chunks.pop(0)
+        finish_reason = None if self._chunks else self._finish_reason
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk), finish_reason=finish_reason)])
+
+    async def close(self):
+        self._chunks = []
+
+
+class _Completions:
+    def __init__(self, client: "FakeLLMClient"):
+        self._client = client
+
+    async def create(self, model: str, messages: list, stream: bool = False, max_tokens: Optional[int] = None, **kwargs):
+        client = self._client
+        latency = client.sample_latency()
+        fault = client.sample_fault()
+        if fault:
+            await asyncio.sleep(latency / 4)  # errors come back faster than answers
+            raise RuntimeError(fault)
+
+        text, finish_reason = fake_reply(messages), "stop"
+        if max_tokens and count_tokens(text) > max_tokens:
+            text, finish_reason = truncate_to_tokens(text, max_tokens, marker=""), "length"
+        if stream:
+            return _Stream(text, latency, finish_reason)
+        await asyncio.sleep(latency)
+        prompt_tokens = sum(count_tokens(str(m.get("content") or "")) for m in messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason=finish_reason)],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens, completion_tokens=count_tokens(text),
+                prompt_tokens_details=SimpleNamespace(cached_tokens=client.cached_prefix_tokens(messages)),
+            ),
+            model=model,
+        )
+
+
+class FakeLLMClient:
+    """Stands in for an AsyncOpenAI client; see the module docstring."""
+
+    base_url = "fake://llm/"
+
+    def __init__(self, latency_ms: float = None, sigma: float = None, error_rate: float = None, rate_limit_rate: float = None, seed: Optional[int] = None):
+        self.latency_ms = config.FAKE_LLM_LATENCY_MS if latency_ms is None else latency_ms
+        self.sigma = config.FAKE_LLM_LATENCY_SIGMA if sigma is None else sigma
+        self.error_rate = config.FAKE_LLM_ERROR_RATE if error_rate is None else error_rate
+        self.rate_limit_rate = config.FAKE_LLM_RATE_LIMIT_RATE if rate_limit_rate is None else rate_limit_rate
+        self._random = random.Random(config.FAKE_LLM_SEED if seed is None else seed)
+        self._prefixes: set = set()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def sample_latency(self) -> float:
+        """Seconds; log-normal with median `latency_ms`."""
+        if self.sigma <= 0:
+            return self.latency_ms / 1000
+        return self._random.lognormvariate(0, self.sigma) * self.latency_ms / 1000
+
+    def cached_prefix_tokens(self, messages: list) -> int:
+        """Tokens of a system message this client has already seen (0 the first time)."""
+        system = next((str(m["content"]) for m in messages if m.get("role") == "system"), "")
+        if not system:
+            return 0
+        if system in self._prefixes:
+            return count_tokens(system)
+        self._prefixes.add(system)
+        return 0
+
+    def sample_fault(self) -> Optional[str]:
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return "Error code: 429 - fake provider rate limit"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "Error code: 500 - fake provider error"
+        return None
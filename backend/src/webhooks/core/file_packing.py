@@ -0,0 +1,73 @@
+"""
+File Packing
+============
+Small file diffs don't need a request each: every request re-sends the full
+Apex system prompt and the JSON schema example, which for a three-line diff
+is most of the tokens. The reviewer groups small files into shared requests
+("packs") and splits the multi-file reply back into per-file results.
+
+Packing is first-fit decreasing over each file's prompt-section token count:
+files are sorted largest first and each goes into the first pack with room
+left under the token budget and file limit. Files keep diff order inside a
+pack, and packs are returned in the diff order of their first file.
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+def pack_files(sizes: Dict[str, int], token_budget: int, max_files: int) -> List[List[str]]:
+    """
+    Group paths (in diff order, mapped to their token counts) into packs of
+    at most `token_budget` tokens and `max_files` files. A file larger than
+    the budget gets a pack of its own.
+    """
+    order = {path: i for i, path in enumerate(sizes)}
+    packs: List[List[Any]] = []  # [tokens used, paths]
+    for path in sorted(sizes, key=lambda p: (-sizes[p], order[p])):
+        size = sizes[path]
+        for pack in packs:
+            if pack[0] + size <= token_budget and len(pack[1]) < max_files:
+                pack[0] += size
+                pack[1].append(path)
+                break
+        else:
+            packs.append([size, [path]])
+
+    grouped = [sorted(paths, key=order.get) for _, paths in packs]
+    return sorted(grouped, key=lambda paths: order[paths[0]])
+
+
+def _normalize_path(path: str) -> str:
+    path = (path or "").strip()
+    for prefix in ("a/", "b/", "./"):
+        if path.startswith(prefix):
+            return path[len(prefix):]
+    return path
+
+
+def split_pack_response(result: Optional[Dict[str, Any]], paths: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-file results from a multi-file reply, keyed by path.
+
+    Accepts `{"files": [{"file": path, ...}, ...]}` (the requested shape) or
+    `{"files": {path: {...}}}`. Entries for paths outside the pack are
+    dropped; paths missing from the reply are simply absent so the caller
+    can review them on their own.
+    """
+    if not isinstance(result, dict):
+        return {}
+    entries = result.get("files")
+    if isinstance(entries, dict):
+        entries = [{**value, "file": key} for key, value in entries.items() if isinstance(value, dict)]
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = {_normalize_path(p): p for p in paths}
+    per_file = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        path = wanted.get(_normalize_path(entry.get("file") or entry.get("path") or ""))
+        if path and path not in per_file:
+            per_file[path] = {k: v for k, v in entry.items() if k not in ("file", "path")}
+    return per_file
@@ -28,14 +28,8 @@ class GitHubClient:
                 resp = await client.request(method, url, **kwargs)
                 
                 # Check for rate limiting (403 with specific header or 429)
-                if resp.status_code == 429 or (resp.status_code == 403 and "x-ratelimit-remaining" in resp.headers and resp.headers.get("x-ratelimit-remaining") == "0") or (resp.status_code == 403 and "secondary rate limit" in resp.text.lower()):
-                    
-                    delay = base_delay * (2 ** attempt)
-                    # Check if GitHub provided a Retry-After header
-                    retry_after = resp.headers.get("Retry-After")
-                    if retry_after and retry_after.isdigit():
-                        delay = max(delay, int(retry_after))
-                    
+                if self._is_rate_limited(resp):
+                    delay = self._backoff_delay(resp, base_delay, attempt)
                     if attempt < max_retries - 1:
                         logger.warning(f"GitHub Rate Limit hit on {url}. Backing off for {delay}s...")
                         await asyncio.sleep(delay)
@@ -45,6 +39,19 @@ class GitHubClient:
                 return resp
         raise Exception(f"Failed after {max_retries} attempts")
 
+    @staticmethod
+    def _is_rate_limited(resp: httpx.Response) -> bool:
+        return resp.status_code == 429 or (resp.status_code == 403 and "x-ratelimit-remaining" in resp.headers and resp.headers.get("x-ratelimit-remaining") == "0") or (resp.status_code == 403 and "secondary rate limit" in resp.text.lower())
+
+    @staticmethod
+    def _backoff_delay(resp: httpx.Response, base_delay: int, attempt: int) -> int:
+        delay = base_delay * (2 ** attempt)
+        # Check if GitHub provided a Retry-After header
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        return delay
+
     async def get_pr_diff(self, repo: str, pr_number: int) -> str:
         url = f"https://api.github.com/repos/{repo}/pulls/{pr_number}"
         headers = self.headers.copy()
@@ -52,6 +59,30 @@ class GitHubClient:
         resp = await self._request_with_backoff("GET", url, headers=headers)
         return resp.text
 
+    async def stream_pr_diff(self, repo: str, pr_number: int, chunk_size: int = 65536):
+        """Yields the PR diff body in chunks instead of buffering the whole response."""
+        url = f"https://api.github.com/repos/{repo}/pulls/{pr_number}"
+        headers = self.headers.copy()
+        headers["Accept"] = "application/vnd.github.v3.diff"
+        max_retries = 5
+        base_delay = 2
+
+        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=120.0)) as client:
+            for attempt in range(max_retries):
+                async with client.stream("GET", url, headers=headers) as resp:
+                    if resp.status_code in (403, 429):
+                        await resp.aread()  # small error body, needed for the rate-limit check
+                        if self._is_rate_limited(resp) and attempt < max_retries - 1:
+                            delay = self._backoff_delay(resp, base_delay, attempt)
+                            logger.warning(f"GitHub Rate Limit hit on {url}. Backing off for {delay}s...")
+                            await asyncio.sleep(delay)
+                            continue
+                    resp.raise_for_status()
+                    async for chunk in resp.aiter_bytes(chunk_size):
+                        yield chunk
+                    return
+        raise Exception(f"Failed after {max_retries} attempts")
+
     # --- NEW: Smart Commenting Logic ---
     async def post_or_update_comment(self, repo: str, pr_number: int, body: str):
         # 1. Append Signature so we can find this later
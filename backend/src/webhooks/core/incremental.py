@@ -0,0 +1,195 @@
+"""
+Incremental Review
+==================
+On `synchronize` (a push to an open PR) only files whose change actually moved
+since the last reviewed commit go back to the LLM; the rest carry their prior
+results over.
+
+A file is reused when all of these hold:
+  - the last COMPLETED job for the PR saved a review snapshot (AgentResult
+    "reviewer") containing a result for it
+  - its per-file PR diff hashes to the same value as in that snapshot
+  - it is not touched by `git diff <last reviewed sha> <new head>` in the
+    repo mirror (catches content changes the PR diff alone would hide, e.g.
+    a base merge)
+
+If the inter-diff can't be computed (no mirror, old SHA gone after a force
+push) the whole PR is reviewed.
+"""
+
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from core.parsed_diff import ParsedDiff
+
+logger = logging.getLogger("agenticpr.incremental")
+
+SNAPSHOT_AGENT = "reviewer"
+GIT_TIMEOUT = 30
+
+
+def file_diff_hashes(parsed_diff: ParsedDiff) -> Dict[str, str]:
+    """sha256 of each file's diff text, keyed by path."""
+    return {
+        path: hashlib.sha256(parsed_diff.text(path).encode("utf-8", errors="replace")).hexdigest()
+        for path in parsed_diff.paths
+    }
+
+
+def select_reusable_files(
+    new_hashes: Dict[str, str],
+    prior_hashes: Dict[str, str],
+    prior_reviewed: Set[str],
+    changed_since: Set[str],
+) -> List[str]:
+    """Paths (in diff order) whose prior review result still applies."""
+    return [
+        path for path, digest in new_hashes.items()
+        if path in prior_reviewed
+        and prior_hashes.get(path) == digest
+        and path not in changed_since
+    ]
+
+
+async def changed_paths_between(repo_dir: str, old_sha: str, new_sha: str) -> Optional[Set[str]]:
+    """Paths touched between two commits (both sides of renames), or None on failure."""
+    proc = await asyncio.create_subprocess_exec(
+        "git", "diff", "--name-only", "--no-renames", "-z", old_sha, new_sha,
+        cwd=repo_dir,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=GIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        logger.warning(f"Inter-diff {old_sha[:7]}..{new_sha[:7]} timed out")
+        return None
+    if proc.returncode != 0:
+        logger.info(f"Inter-diff {old_sha[:7]}..{new_sha[:7]} unavailable: {stderr.decode(errors='replace').strip()}")
+        return None
+    return {p for p in stdout.decode("utf-8", errors="replace").split("\0") if p}
+
+
+# ─── Snapshots ────────────────────────────────────────────────────────────────
+
+async def load_last_snapshot(db_session_factory, repo_full_name: str, pr_number: int, exclude_job_id: int) -> Optional[Dict[str, Any]]:
+    """Review snapshot of the most recent completed job for this PR."""
+    from sqlmodel import select
+    from models import AgentResult, Job, JobStatus
+
+    async with db_session_factory() as session:
+        result = await session.execute(
+            select(Job.id, AgentResult.output_json)
+            .join(AgentResult, AgentResult.job_id == Job.id)
+            .where(
+                Job.repo_full_name == repo_full_name,
+                Job.pr_number == pr_number,
+                Job.status == JobStatus.COMPLETED,
+                Job.id != exclude_job_id,
+                AgentResult.agent_name == SNAPSHOT_AGENT,
+            )
+            .order_by(Job.finished_at.desc(), Job.id.desc())
+            .limit(1)
+        )
+        row = result.first()
+    return _parse_snapshot(row[0], row[1]) if row else None
+
+
+async def load_snapshot(db_session_factory, job_id: int) -> Optional[Dict[str, Any]]:
+    """Review snapshot saved by a specific job."""
+    from sqlmodel import select
+    from models import AgentResult
+
+    async with db_session_factory() as session:
+        result = await session.execute(
+            select(AgentResult.output_json).where(
+                AgentResult.job_id == job_id, AgentResult.agent_name == SNAPSHOT_AGENT,
+            )
+        )
+        output_json = result.scalars().first()
+    return _parse_snapshot(job_id, output_json) if output_json else None
+
+
+def _parse_snapshot(job_id: int, output_json: str) -> Optional[Dict[str, Any]]:
+    try:
+        snapshot = json.loads(output_json)
+    except (TypeError, ValueError):
+        return None
+    if "file_results" not in snapshot or "commit_sha" not in snapshot:
+        return None  # written by the in-process orchestrator, not resumable
+    snapshot["job_id"] = job_id
+    return snapshot
+
+
+async def save_snapshot(
+    db_session_factory,
+    job_id: int,
+    commit_sha: str,
+    file_hashes: Dict[str, str],
+    review_result: Dict[str, Any],
+    file_results: List[Dict[str, Any]],
+):
+    """Store (or replace, on retry) this job's review snapshot."""
+    from sqlalchemy import delete
+    from models import AgentResult
+
+    snapshot = {
+        "commit_sha": commit_sha,
+        "file_hashes": file_hashes,
+        "file_results": file_results,
+        "verdict": review_result.get("verdict"),
+        "summary": review_result.get("summary"),
+        "stats": review_result.get("stats", {}),
+    }
+    async with db_session_factory() as session:
+        await session.execute(
+            delete(AgentResult).where(AgentResult.job_id == job_id, AgentResult.agent_name == SNAPSHOT_AGENT)
+        )
+        session.add(AgentResult(job_id=job_id, agent_name=SNAPSHOT_AGENT, output_json=json.dumps(snapshot)))
+        await session.commit()
+
+
+# ─── Planning ─────────────────────────────────────────────────────────────────
+
+async def plan_incremental(
+    db_session_factory,
+    repo_full_name: str,
+    pr_number: int,
+    job_id: int,
+    commit_sha: str,
+    file_hashes: Dict[str, str],
+    repo_dir: Optional[str],
+) -> Optional[Dict[str, Any]]:
+    """
+    Decide which files of this push can reuse the last review.
+    Returns {"base_job_id", "base_sha", "reuse_files"} or None for a full review.
+    """
+    snapshot = await load_last_snapshot(db_session_factory, repo_full_name, pr_number, job_id)
+    if not snapshot:
+        return None
+    base_sha = snapshot["commit_sha"]
+    if base_sha == commit_sha or not repo_dir:
+        return None
+
+    changed_since = await changed_paths_between(repo_dir, base_sha, commit_sha)
+    if changed_since is None:
+        return None
+
+    prior_reviewed = {r.get("filepath") for r in snapshot["file_results"] if r.get("reviewed")}
+    reuse = select_reusable_files(file_hashes, snapshot.get("file_hashes", {}), prior_reviewed, changed_since)
+    logger.info(
+        f"Incremental review for {repo_full_name}#{pr_number}: {len(reuse)}/{len(file_hashes)} "
+        f"file(s) unchanged since {base_sha[:7]} (job {snapshot['job_id']})"
+    )
+    return {"base_job_id": snapshot["job_id"], "base_sha": base_sha, "reuse_files": reuse}
+
+
+def prior_results_for(snapshot_file_results: List[Dict[str, Any]], reuse_files: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Pick the snapshot entries of the files being carried over, keyed by path."""
+    wanted = set(reuse_files)
+    return {r["filepath"]: r for r in snapshot_file_results if r.get("filepath") in wanted}
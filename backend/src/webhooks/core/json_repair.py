@@ -0,0 +1,225 @@
+"""
+JSON Repair
+===========
+Local repair of malformed LLM JSON, tried before any re-prompt (each
+re-prompt is a full LLM round trip).
+
+`parse_llm_json` parses strictly first, then runs `repair_json`, which
+handles what models actually send back:
+  - markdown fences and prose around the object
+  - raw newlines / tabs / control characters inside strings
+  - stray quotes inside strings and invalid backslash escapes
+  - trailing commas, Python literals (True / False / None)
+  - replies cut off mid-string / mid-array / mid-object, closed at the last
+    complete value
+
+Outcomes are counted per caller ("reviewer", "planner", ...): `clean`,
+`repaired` (an LLM retry avoided) and `failed`. Workers flush the counts to
+Redis (`flush_repair_stats`); `/api/admin/json-repair` reads them back.
+"""
+
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger("agenticpr.json_repair")
+
+STATS_KEY = "metrics:json_repair"
+
+_ESCAPABLE = set('"\\/bfnrtu')
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# ─── Stats ────────────────────────────────────────────────────────────────────
+
+_stats: Counter = Counter()
+
+
+def record(source: str, outcome: str):
+    _stats[f"{source}:{outcome}"] += 1
+
+
+def drain_stats() -> Dict[str, int]:
+    """Counts since the last drain (then reset)."""
+    counts = dict(_stats)
+    _stats.clear()
+    return counts
+
+
+async def flush_repair_stats(redis):
+    """Add this process's counts to the shared Redis hash."""
+    counts = drain_stats()
+    if not counts or not redis:
+        return
+    try:
+        for field, count in counts.items():
+            await redis.hincrby(STATS_KEY, field, count)
+    except Exception as e:
+        logger.debug(f"Could not flush JSON repair stats: {e}")
+
+
+async def get_repair_stats(redis) -> Dict[str, Dict[str, int]]:
+    """{source: {"clean": n, "repaired": n, "failed": n}} across all workers."""
+    raw = await redis.hgetall(STATS_KEY)
+    stats: Dict[str, Dict[str, int]] = {}
+    for field, value in raw.items():
+        source, _, outcome = field.rpartition(":")
+        stats.setdefault(source, {"clean": 0, "repaired": 0, "failed": 0})[outcome] = int(value)
+    return stats
+
+
+# ─── Parsing ──────────────────────────────────────────────────────────────────
+
+def parse_llm_json(text: str, source: str = "llm") -> Dict[str, Any]:
+    """Parse an LLM reply into a dict, repairing it locally if needed. Raises ValueError."""
+    try:
+        parsed = json.loads(text.strip())
+        if isinstance(parsed, dict):
+            record(source, "clean")
+            return parsed
+    except (ValueError, AttributeError):
+        pass
+    try:
+        repaired = repair_json(text)
+    except ValueError:
+        record(source, "failed")
+        raise
+    record(source, "repaired")
+    logger.info(f"Repaired malformed JSON from {source} locally (LLM retry avoided)")
+    return repaired
+
+
+def repair_json(text: str) -> Dict[str, Any]:
+    """Best-effort repair of a malformed JSON object. Raises ValueError if nothing usable remains."""
+    body = _strip_fences(text or "")
+    start = body.find("{")
+    if start < 0:
+        raise ValueError(f"No JSON object in response (starts with: {body[:80]!r})")
+
+    fixed, stack, in_string, safe_points = _rewrite(body[start:])
+    candidates = [_close(fixed, stack, in_string)]
+    # Truncated mid-value: fall back to the last points where a value was complete
+    candidates += [_close(fixed[:pos], list(snapshot), False) for pos, snapshot in reversed(safe_points[-20:])]
+
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    raise ValueError(f"Could not repair JSON (starts with: {body[:80]!r})")
+
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    if "```" not in text:
+        return text
+    parts = text.split("```")
+    # Odd-indexed parts are fenced blocks; prefer one that holds an object
+    for block in parts[1::2]:
+        if block.startswith("json"):
+            block = block[4:]
+        if block.strip().startswith("{"):
+            return block.strip()
+    return text.replace("```json", "").replace("```", "")
+
+
+def _next_significant(text: str, i: int) -> str:
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return text[i] if i < len(text) else ""
+
+
+def _rewrite(text: str) -> Tuple[str, List[str], bool, List[Tuple[int, Tuple[str, ...]]]]:
+    """
+    One pass over the text: fixes strings, trailing commas and literals, and
+    stops when the root object closes. Returns (output, open containers,
+    ended inside a string, safe cut points).
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    safe_points: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                nxt = text[i + 1] if i + 1 < len(text) else ""
+                if nxt in _ESCAPABLE and nxt:
+                    out.append(ch + nxt)
+                    i += 2
+                    continue
+                out.append("\\\\")  # invalid escape such as \d: keep the backslash literally
+            elif ch == '"':
+                # A quote closes the string only if JSON structure follows
+                if _next_significant(text, i + 1) in (",", "}", "]", ":", ""):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            elif ord(ch) < 0x20:
+                out.append(f"\\u{ord(ch):04x}")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            safe_points.append((len(out), tuple(stack)))
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # root closed; ignore trailing prose
+            safe_points.append((len(out), tuple(stack)))
+        elif ch == ",":
+            _drop_trailing_comma(out)  # collapse ",,"
+            safe_points.append((len(out), tuple(stack)))
+            out.append(ch)
+        elif ch.isalpha():
+            j = i
+            while j < len(text) and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out), stack, in_string, safe_points
+
+
+def _drop_trailing_comma(out: List[str]):
+    j = len(out) - 1
+    while j >= 0 and out[j] in (" ", "\t", "\r", "\n"):
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+
+def _close(fixed: str, stack: List[str], in_string: bool) -> str:
+    """Terminate a cut-off string, drop a dangling comma or key, close open containers."""
+    if in_string:
+        fixed += '"'
+    fixed = fixed.rstrip()
+    if fixed.endswith(","):
+        fixed = fixed[:-1]
+    elif fixed.endswith(":"):
+        fixed += " null"
+    return fixed + "".join(reversed(stack))
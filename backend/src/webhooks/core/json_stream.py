@@ -0,0 +1,119 @@
+"""
+Incremental JSON Parsing
+========================
+Parses a streamed LLM reply as it arrives. The reply is expected to be one
+JSON object (anything before its opening brace, e.g. a markdown fence, is
+skipped); every object inside an array under `array_key` ("findings" for a
+file review, "files" for a packed review) is decoded and returned by `feed`
+the moment its closing brace arrives.
+
+If the stream is cut off, `salvage()` rebuilds what was complete: the
+top-level string fields seen so far plus the closed array items, flagged
+`"partial": True`.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class _Frame:
+    kind: str  # "{" or "["
+    key: Optional[str]  # key this container sits under (array items inherit the array's)
+    start: int
+
+
+class IncrementalJSONParser:
+    def __init__(self, array_key: str = "findings"):
+        self.array_key = array_key
+        self.items: List[Dict[str, Any]] = []
+        self.fields: Dict[str, str] = {}  # top-level string values
+        self.done = False
+        self._buf = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._expect_value = False
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add a chunk; returns the array items it completed."""
+        self._buf += chunk
+        buf = self._buf
+        emitted = []
+        i = self._pos
+        while i < len(buf) and not self.done:
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string(buf[self._string_start:i + 1])
+            elif not self._stack:
+                if ch == "{":
+                    self._stack.append(_Frame("{", None, i))
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._stack.append(_Frame(ch, self._value_key(), i))
+                self._expect_value = False
+            elif ch in "}]":
+                frame = self._stack.pop()
+                parent = self._stack[-1] if self._stack else None
+                if ch == "}" and parent and parent.kind == "[" and parent.key == self.array_key:
+                    try:
+                        item = json.loads(buf[frame.start:i + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        self.items.append(item)
+                        emitted.append(item)
+                if not self._stack:
+                    self.done = True
+            elif ch == ":":
+                self._pending_key = self._last_key
+                self._expect_value = True
+            elif ch == ",":
+                self._expect_value = False
+            i += 1
+        self._pos = i
+        return emitted
+
+    def _value_key(self) -> Optional[str]:
+        parent = self._stack[-1]
+        if parent.kind == "{":
+            return self._pending_key if self._expect_value else None
+        return parent.key
+
+    def _on_string(self, literal: str):
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            value = literal[1:-1]
+        top = self._stack[-1]
+        if top.kind != "{":
+            return
+        if self._expect_value:
+            if len(self._stack) == 1 and self._pending_key:
+                self.fields[self._pending_key] = value
+            self._expect_value = False
+        else:
+            self._last_key = value
+
+    def salvage(self) -> Optional[Dict[str, Any]]:
+        """What a cut-off reply completed, or None if nothing usable arrived."""
+        if not self.items and not self.fields:
+            return None
+        return {**self.fields, self.array_key: list(self.items), "partial": True}
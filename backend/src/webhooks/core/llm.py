@@ -2,21 +2,84 @@ import time
 import traceback
 from openai import OpenAI
 from config import config
+from core.provider_router import get_router, is_rate_limit
+
+
+# ─── Shared helpers (also used by core.async_llm) ─────────────
+def build_gemini_request(messages: list, temperature: float, max_tokens: int, response_format: dict):
+    """Convert chat messages into Gemini `contents` and a GenerateContentConfig."""
+    from google.genai import types
+    
+    system_instruction = None
+    contents = []
+    
+    for msg in messages:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        
+        if role == "system":
+            system_instruction = content
+        elif role == "assistant":
+            contents.append(types.Content(
+                role="model",
+                parts=[types.Part.from_text(text=content)]
+            ))
+        else:
+            contents.append(types.Content(
+                role="user",
+                parts=[types.Part.from_text(text=content)]
+            ))
+    
+    config_kwargs = {"temperature": temperature}
+    if max_tokens:
+        config_kwargs["max_output_tokens"] = max_tokens
+    if response_format and response_format.get("type") == "json_object":
+        config_kwargs["response_mime_type"] = "application/json"
+    
+    gen_config = types.GenerateContentConfig(
+        **config_kwargs,
+        system_instruction=system_instruction,
+    )
+    return contents, gen_config
+
+
+def log_empty_response(provider: str, model: str, response, attempt: int, max_retries: int):
+    """Log diagnostic info when a response is empty."""
+    print(f"  [LLM] ⚠ Empty response from {provider}/{model} (attempt {attempt}/{max_retries}):")
+    print(f"    Choices count: {len(response.choices) if response.choices else 0}")
+    if response.choices:
+        choice = response.choices[0]
+        print(f"    Finish reason: {getattr(choice, 'finish_reason', 'unknown')}")
+        print(f"    Content: {repr(choice.message.content) if choice.message else 'no message'}")
+    print(f"    Usage: {getattr(response, 'usage', 'unknown')}")
+
+
+def is_truncated(response) -> bool:
+    """Whether a reply (or the last stream chunk) stopped at max_tokens: OpenAI-style or Gemini finish reason."""
+    choices = getattr(response, "choices", None)
+    if choices:
+        return getattr(choices[0], "finish_reason", None) == "length"
+    candidates = getattr(response, "candidates", None)
+    if candidates:
+        return "MAX_TOKENS" in str(getattr(candidates[0], "finish_reason", ""))
+    return False
 
 
 class LLMService:
     """
-    Multi-provider LLM Service with automatic fallback chain:
+    Multi-provider LLM Service with automatic fallback across:
       1. Groq (fastest, free)
       2. Gemini (reliable, Google)
       3. OpenRouter (broad model selection)
     
-    If a provider fails or returns empty, automatically tries the next one.
+    Providers are tried in the order the process-wide router
+    (core.provider_router) ranks them; if one fails or returns empty,
+    the next one is tried.
     """
     
-    def __init__(self):
+    def __init__(self, router=None):
         self.provider = config.LLM_PROVIDER.lower()  # kept for backward compat
-        self._failed_providers = set()  # Track providers that failed this session
+        self.router = router or get_router()
         
         # --- Initialize ALL available providers ---
         
@@ -67,46 +130,37 @@ class LLMService:
 
     def chat(self, messages: list, temperature: float = 0.7, max_tokens: int = None, response_format: dict = None) -> str:
         """
-        Unified chat with automatic fallback: Groq → Gemini → OpenRouter.
+        Unified chat with automatic fallback, best-ranked provider first.
         
-        If a provider fails, it's skipped for subsequent calls in this session.
+        Failures and 429s feed the shared router: a provider whose circuit is
+        open is only tried after all the others.
         """
-        # Build provider chain in priority order
-        providers = []
-        if self.groq_client and "groq" not in self._failed_providers:
-            providers.append(("groq", self._chat_groq))
-        if self.gemini_client and "gemini" not in self._failed_providers:
-            providers.append(("gemini", self._chat_gemini))
-        if self.openrouter_client and "openrouter" not in self._failed_providers:
-            providers.append(("openrouter", self._chat_openrouter))
-        
-        # Also add failed providers at the end as last resort
-        if self.groq_client and "groq" in self._failed_providers:
-            providers.append(("groq", self._chat_groq))
-        if self.gemini_client and "gemini" in self._failed_providers:
-            providers.append(("gemini", self._chat_gemini))
-        if self.openrouter_client and "openrouter" in self._failed_providers:
-            providers.append(("openrouter", self._chat_openrouter))
+        available = [
+            ("groq", self.groq_client, self.groq_model, self._chat_groq),
+            ("gemini", self.gemini_client, self.gemini_model, self._chat_gemini),
+            ("openrouter", self.openrouter_client, self.openrouter_model, self._chat_openrouter),
+        ]
+        chain = {self.router.key(name, model): (name, fn) for name, client, model, fn in available if client}
         
-        if not providers:
+        if not chain:
             print("  [LLM] ❌ No LLM providers available!")
             return ""
         
-        for provider_name, chat_fn in providers:
+        for key in self.router.order(list(chain)):
+            provider_name, chat_fn = chain[key]
+            self.router.begin(key)
+            started = time.monotonic()
             try:
                 result = chat_fn(messages, temperature, max_tokens, response_format)
-                if result:
-                    # Success — un-fail this provider if it was marked
-                    if provider_name in self._failed_providers:
-                        print(f"  [LLM] ✓ {provider_name} recovered!")
-                        self._failed_providers.discard(provider_name)
-                    return result
-                else:
-                    print(f"  [LLM] ⚠ {provider_name} returned empty response, trying next provider...")
             except Exception as e:
                 print(f"  [LLM] ❌ {provider_name} failed: {e}")
-                self._failed_providers.add(provider_name)
+                self.router.record_failure(key, e)
                 continue
+            if result:
+                self.router.record_success(key, time.monotonic() - started)
+                return result
+            self.router.release(key)
+            print(f"  [LLM] ⚠ {provider_name} returned empty response, trying next provider...")
         
         print(f"  [LLM] ❌ All providers failed!")
         return ""
@@ -141,9 +195,8 @@ class LLMService:
                 return response.choices[0].message.content.strip()
                 
             except Exception as e:
-                error_str = str(e).lower()
                 # On 429 rate limit, immediately bail to let Gemini handle it
-                if "429" in str(e) or "rate" in error_str or "too many" in error_str:
+                if is_rate_limit(e):
                     print(f"  [LLM] ⚡ Groq rate-limited (429) — switching to Gemini fallback")
                     raise  # Let the fallback chain catch it
                 
@@ -160,38 +213,7 @@ class LLMService:
     # ─── GEMINI ────────────────────────────────────────────────
     def _chat_gemini(self, messages: list, temperature: float, max_tokens: int, response_format: dict) -> str:
         """Send chat to Google Gemini."""
-        from google.genai import types
-        
-        system_instruction = None
-        contents = []
-        
-        for msg in messages:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            
-            if role == "system":
-                system_instruction = content
-            elif role == "assistant":
-                contents.append(types.Content(
-                    role="model",
-                    parts=[types.Part.from_text(text=content)]
-                ))
-            else:
-                contents.append(types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=content)]
-                ))
-        
-        config_kwargs = {"temperature": temperature}
-        if max_tokens:
-            config_kwargs["max_output_tokens"] = max_tokens
-        if response_format and response_format.get("type") == "json_object":
-            config_kwargs["response_mime_type"] = "application/json"
-        
-        gen_config = types.GenerateContentConfig(
-            **config_kwargs,
-            system_instruction=system_instruction,
-        )
+        contents, gen_config = build_gemini_request(messages, temperature, max_tokens, response_format)
         
         response = self.gemini_client.models.generate_content(
             model=self.gemini_model,
@@ -241,14 +263,7 @@ class LLMService:
 
     # ─── HELPERS ───────────────────────────────────────────────
     def _log_empty_response(self, provider: str, model: str, response, attempt: int, max_retries: int):
-        """Log diagnostic info when a response is empty."""
-        print(f"  [LLM] ⚠ Empty response from {provider}/{model} (attempt {attempt}/{max_retries}):")
-        print(f"    Choices count: {len(response.choices) if response.choices else 0}")
-        if response.choices:
-            choice = response.choices[0]
-            print(f"    Finish reason: {getattr(choice, 'finish_reason', 'unknown')}")
-            print(f"    Content: {repr(choice.message.content) if choice.message else 'no message'}")
-        print(f"    Usage: {getattr(response, 'usage', 'unknown')}")
+        log_empty_response(provider, model, response, attempt, max_retries)
 
     def generate_summary(self, diff_text: str, title: str) -> dict:
         """Generates a summary using the LLM."""
@@ -0,0 +1,253 @@
+"""
+LLM Usage Accounting
+====================
+Structured usage for every LLM call, aggregated per job into the `LLMUsage`
+table (one row per job and stage) and reported per repo by
+`GET /api/admin/llm-usage` for capacity planning.
+
+A worker opens a `usage_scope(recorder)` around a stage; every provider
+call made inside it (including concurrent per-file tasks, which inherit the
+context) is recorded with its provider/model, prompt and completion tokens,
+latency, retries and outcome. Tokens come from the provider's reported
+usage when the response carries it and are counted locally otherwise
+(streams, errors); `estimated_tokens` says how many were counted. Review
+cache hits and joined single-flight requests are recorded as cache hits.
+`cached_tokens` are prompt tokens the provider served from its own prefix
+cache (OpenAI-style `prompt_tokens_details.cached_tokens`, Gemini
+`cached_content_token_count`); the report gives their share of prompt tokens.
+Replies cut off at max_tokens are counted as `truncated` (each continuation
+is a call of its own).
+
+Cost uses LLM_PRICES ("groq=0.15/0.60,gemini=0.10/0.40": USD per million
+prompt/completion tokens per provider); unlisted providers cost 0.
+"""
+
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger("agenticpr.llm_usage")
+
+
+@dataclass
+class CallUsage:
+    provider: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens served from the provider's prefix cache
+    reported: bool = False  # token counts came from the provider
+    retries: int = 0
+    latency: float = 0.0
+    ok: bool = False
+    truncated: bool = False  # stopped at max_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class UsageRecorder:
+    """Every call and cache hit of one job stage."""
+
+    def __init__(self):
+        self.calls: List[CallUsage] = []
+        self.cache_hits: Counter = Counter()
+        self.started = time.monotonic()
+
+    def add(self, call: CallUsage):
+        self.calls.append(call)
+
+    def summary(self) -> Dict[str, Any]:
+        providers: Dict[str, Dict[str, Any]] = {}
+        for call in self.calls:
+            entry = providers.setdefault(f"{call.provider}:{call.model}", {
+                "requests": 0, "failures": 0, "retries": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "seconds": 0.0,
+            })
+            entry["requests"] += 1
+            entry["failures"] += not call.ok
+            entry["retries"] += call.retries
+            entry["prompt_tokens"] += call.prompt_tokens
+            entry["completion_tokens"] += call.completion_tokens
+            entry["cached_tokens"] += call.cached_tokens
+            entry["seconds"] = round(entry["seconds"] + call.latency, 3)
+        return {
+            "requests": len(self.calls),
+            "failures": sum(not c.ok for c in self.calls),
+            "retries": sum(c.retries for c in self.calls),
+            "truncated": sum(c.truncated for c in self.calls),
+            "prompt_tokens": sum(c.prompt_tokens for c in self.calls),
+            "completion_tokens": sum(c.completion_tokens for c in self.calls),
+            "cached_tokens": sum(c.cached_tokens for c in self.calls),
+            "estimated_tokens": sum(c.total_tokens for c in self.calls if not c.reported),
+            "cache_hits": sum(self.cache_hits.values()),
+            "cache_hit_kinds": dict(self.cache_hits),
+            "llm_seconds": round(sum(c.latency for c in self.calls), 3),
+            "wall_seconds": round(time.monotonic() - self.started, 3),
+            "cost_usd": round(sum(call_cost(c) for c in self.calls), 6),
+            "latencies_ms": [int(c.latency * 1000) for c in self.calls if c.ok],
+            "providers": providers,
+        }
+
+
+_recorder: ContextVar[Optional[UsageRecorder]] = ContextVar("llm_usage_recorder", default=None)
+_call: ContextVar[Optional[CallUsage]] = ContextVar("llm_usage_call", default=None)
+
+
+@contextmanager
+def usage_scope(recorder: UsageRecorder):
+    """Record every LLM call made in this context (and tasks started from it) on `recorder`."""
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def track_call(provider: str, model: str):
+    """The usage of one provider call; provider helpers fill it in through `note_*`."""
+    call = CallUsage(provider, model)
+    token = _call.set(call)
+    try:
+        yield call
+    finally:
+        _call.reset(token)
+
+
+def record(call: CallUsage):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.add(call)
+
+
+def record_cache_hit(kind: str):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.cache_hits[kind] += 1
+
+
+def note_retry():
+    call = _call.get()
+    if call is not None:
+        call.retries += 1
+
+
+def note_truncated():
+    call = _call.get()
+    if call is not None:
+        call.truncated = True
+
+
+def note_response_usage(response):
+    """Provider-reported token counts (OpenAI/Groq `usage`, Gemini `usage_metadata`), if any."""
+    call = _call.get()
+    if call is None:
+        return
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        prompt, completion = usage.prompt_tokens, usage.completion_tokens
+        cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    else:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None or getattr(usage, "prompt_token_count", None) is None:
+            return
+        prompt, completion = usage.prompt_token_count, usage.candidates_token_count
+        cached = getattr(usage, "cached_content_token_count", None)
+    try:
+        call.prompt_tokens, call.completion_tokens = int(prompt), int(completion or 0)
+        call.cached_tokens = int(cached or 0)
+        call.reported = True
+    except (TypeError, ValueError):
+        pass
+
+
+# ─── Cost & Reporting ─────────────────────────────────────────────────────────
+
+def _prices() -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for entry in (config.LLM_PRICES or "").split(","):
+        name, _, rates = entry.partition("=")
+        prompt, _, completion = rates.partition("/")
+        try:
+            prices[name.strip().lower()] = (float(prompt), float(completion or 0))
+        except ValueError:
+            continue
+    return prices
+
+
+def call_cost(call: CallUsage) -> float:
+    prompt, completion = _prices().get(call.provider, (0.0, 0.0))
+    return (call.prompt_tokens * prompt + call.completion_tokens * completion) / 1_000_000
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def usage_report(rows: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+    """Per-repo totals and latency percentiles from LLMUsage rows."""
+    repos: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        repo = repos.setdefault(row.repo_full_name, {
+            "jobs": set(), "requests": 0, "failures": 0, "retries": 0, "truncated": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cache_hits": 0, "cost_usd": 0.0,
+            "_call_ms": [], "_job_seconds": {}, "providers": {},
+        })
+        repo["jobs"].add(row.job_id)
+        for field in ("requests", "failures", "retries", "truncated", "prompt_tokens", "completion_tokens", "cached_tokens", "cache_hits", "cost_usd"):
+            repo[field] += getattr(row, field)
+        repo["_call_ms"].extend(json.loads(row.latencies_json or "[]"))
+        repo["_job_seconds"][row.job_id] = repo["_job_seconds"].get(row.job_id, 0.0) + row.llm_seconds
+        for key, stats in json.loads(row.providers_json or "{}").items():
+            totals = repo["providers"].setdefault(key, Counter())
+            totals.update({k: v for k, v in stats.items() if isinstance(v, (int, float))})
+
+    report = {}
+    for name, repo in repos.items():
+        call_ms, job_seconds = repo.pop("_call_ms"), list(repo.pop("_job_seconds").values())
+        jobs = len(repo.pop("jobs"))
+        report[name] = {
+            **repo,
+            "jobs": jobs,
+            "cost_usd": round(repo["cost_usd"], 6),
+            "tokens_per_job": round((repo["prompt_tokens"] + repo["completion_tokens"]) / jobs),
+            "prompt_cache_hit_rate": round(repo["cached_tokens"] / repo["prompt_tokens"], 3) if repo["prompt_tokens"] else 0.0,
+            "call_latency_ms": {f"p{q}": percentile(call_ms, q / 100) for q in (50, 90, 99)},
+            "job_llm_seconds": {f"p{q}": percentile(job_seconds, q / 100) for q in (50, 90)},
+            "providers": {k: dict(v) for k, v in repo["providers"].items()},
+        }
+    return report
+
+
+async def save_usage(db_session_factory, job_id: int, repo_full_name: str, stage: str, recorder: UsageRecorder):
+    """Store (or replace, on retry) the LLMUsage row for this job and stage."""
+    from sqlalchemy import delete
+    from models import LLMUsage
+
+    summary = recorder.summary()
+    if not summary["requests"] and not summary["cache_hits"]:
+        return
+    row = LLMUsage(
+        job_id=job_id,
+        repo_full_name=repo_full_name,
+        stage=stage,
+        latencies_json=json.dumps(summary.pop("latencies_ms")),
+        providers_json=json.dumps(summary.pop("providers")),
+        **{k: v for k, v in summary.items() if k != "cache_hit_kinds"},
+    )
+    async with db_session_factory() as session:
+        await session.execute(delete(LLMUsage).where(LLMUsage.job_id == job_id, LLMUsage.stage == stage))
+        session.add(row)
+        await session.commit()
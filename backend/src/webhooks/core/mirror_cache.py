@@ -0,0 +1,253 @@
+"""
+Mirror Cache
+============
+Owns the bare mirrors under `workspaces/mirrors/` that run dirs are cloned
+from with `--reference`.
+
+  - `ensure_mirror()` fetches an existing mirror or clones a new one. New
+    mirrors are cloned into a `.partial-*` dir and renamed into place, so a
+    half-finished clone is never mistaken for a usable mirror.
+  - A per-repo lock (in-process + Redis) serialises the fetch stage and the
+    warm worker, so a webhook arriving during a prewarm waits for the clone
+    already in flight instead of starting a second one.
+  - Freshness is recorded in the Redis hash `mirrors:freshness` so the API
+    (which does not mount the worker volume) can tell which repos are warm.
+
+`request_prewarm()` is the API-side hook: it enqueues a low-priority task on
+`review:warm` for repos whose mirror is missing or stale.
+"""
+
+import os
+import json
+import shutil
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from config import config
+from core.repo_manager import remove_readonly
+from core.workspace_gc import mirror_dir_for, mark_mirror_fetched
+
+logger = logging.getLogger("agenticpr.mirrors")
+
+WARM_QUEUE = "review:warm"
+FRESHNESS_KEY = "mirrors:freshness"
+LOCK_KEY_PREFIX = "mirrors:lock:"
+PENDING_KEY_PREFIX = "mirrors:warm_pending:"
+
+FETCH_TIMEOUT = 60
+CLONE_TIMEOUT = 90
+LOCK_TTL = CLONE_TIMEOUT + 30
+
+
+class MirrorCache:
+    """Creates and refreshes repository mirrors on this worker host."""
+
+    # Shared by every MirrorCache in the process (fetch + warm workers)
+    _local_locks: Dict[str, asyncio.Lock] = {}
+
+    def __init__(self, redis=None):
+        self.redis = redis
+
+    async def ensure_mirror(self, repo_full_name: str, clone_url: str) -> Optional[str]:
+        """Fetch or clone the mirror for a repo. Returns its path, or None on failure."""
+        mirror_dir = mirror_dir_for(repo_full_name)
+        start = time.time()
+
+        async with self._lock(repo_full_name):
+            if os.path.isdir(mirror_dir):
+                ok = await self._run_git(
+                    ["git", "fetch", "--all", "--prune"], cwd=mirror_dir, timeout=FETCH_TIMEOUT
+                )
+            else:
+                ok = await self._clone_mirror(clone_url, mirror_dir)
+
+            if ok:
+                mark_mirror_fetched(mirror_dir)
+            await self._record_freshness(repo_full_name, ok, start)
+
+        if not ok:
+            logger.warning(f"Mirror update failed for {repo_full_name}")
+            return mirror_dir if os.path.isdir(mirror_dir) else None
+        return mirror_dir
+
+    async def _clone_mirror(self, clone_url: str, mirror_dir: str) -> bool:
+        """Clone into a partial dir, then rename into place."""
+        parent = os.path.dirname(mirror_dir)
+        os.makedirs(parent, exist_ok=True)
+
+        # Leftovers from a crashed clone of this repo
+        base = os.path.basename(mirror_dir)
+        for name in os.listdir(parent):
+            if name.startswith(base + ".partial-"):
+                shutil.rmtree(os.path.join(parent, name), onerror=remove_readonly)
+
+        partial = f"{mirror_dir}.partial-{uuid.uuid4().hex[:8]}"
+        try:
+            ok = await self._run_git(
+                ["git", "clone", "--mirror", clone_url, partial], timeout=CLONE_TIMEOUT
+            )
+            if ok:
+                os.rename(partial, mirror_dir)
+            return ok
+        finally:
+            if os.path.isdir(partial):
+                shutil.rmtree(partial, onerror=remove_readonly)
+
+    async def _run_git(self, args: List[str], cwd: Optional[str] = None, timeout: int = 60) -> bool:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.warning(f"`{' '.join(args[:2])}` timed out after {timeout}s")
+            return False
+        return proc.returncode == 0
+
+    # ─── Locking ──────────────────────────────────────────────
+
+    @asynccontextmanager
+    async def _lock(self, repo_full_name: str):
+        """Hold the in-process and the Redis lock for one repo."""
+        key = LOCK_KEY_PREFIX + repo_full_name
+        token = uuid.uuid4().hex
+        local = self._local_locks.setdefault(repo_full_name, asyncio.Lock())
+        async with local:
+            held = await self._acquire_redis_lock(key, token)
+            try:
+                yield
+            finally:
+                if held:
+                    await self._release_redis_lock(key, token)
+
+    @asynccontextmanager
+    async def try_lock(self, repo_full_name: str, ttl: int = LOCK_TTL):
+        """
+        Take the repo lock only if nobody holds it; yields whether it was
+        taken. The GC uses this before deleting or repacking a mirror.
+        """
+        key = LOCK_KEY_PREFIX + repo_full_name
+        token = uuid.uuid4().hex
+        local = self._local_locks.setdefault(repo_full_name, asyncio.Lock())
+        if local.locked():
+            yield False
+            return
+        async with local:
+            taken, held = True, False
+            if self.redis:
+                try:
+                    held = taken = bool(await self.redis.set(key, token, nx=True, ex=ttl))
+                except Exception as e:
+                    logger.debug(f"Mirror lock unavailable ({e}) — continuing without it")
+            try:
+                yield taken
+            finally:
+                if held:
+                    await self._release_redis_lock(key, token)
+
+    async def _acquire_redis_lock(self, key: str, token: str) -> bool:
+        """Wait for the cross-process lock. Gives up after LOCK_TTL seconds."""
+        if not self.redis:
+            return False
+        deadline = time.time() + LOCK_TTL
+        while time.time() < deadline:
+            try:
+                if await self.redis.set(key, token, nx=True, ex=LOCK_TTL):
+                    return True
+            except Exception as e:
+                logger.debug(f"Mirror lock unavailable ({e}) — continuing without it")
+                return False
+            await asyncio.sleep(1)
+        logger.warning(f"Timed out waiting for {key} — continuing without it")
+        return False
+
+    async def _release_redis_lock(self, key: str, token: str):
+        try:
+            if await self.redis.get(key) == token:
+                await self.redis.delete(key)
+        except Exception:
+            pass
+
+    # ─── Freshness ────────────────────────────────────────────
+
+    async def _record_freshness(self, repo_full_name: str, ok: bool, start: float):
+        if not self.redis:
+            return
+        entry = {
+            "ok": ok,
+            "checked_at": time.time(),
+            "duration_ms": int((time.time() - start) * 1000),
+            "host": socket.gethostname(),
+        }
+        try:
+            previous = await self.redis.hget(FRESHNESS_KEY, repo_full_name)
+            if ok:
+                entry["last_fetch"] = entry["checked_at"]
+            elif previous:
+                entry["last_fetch"] = json.loads(previous).get("last_fetch")
+            await self.redis.hset(FRESHNESS_KEY, repo_full_name, json.dumps(entry))
+        except Exception as e:
+            logger.debug(f"Could not record mirror freshness for {repo_full_name}: {e}")
+
+
+# ─── API-side helpers ─────────────────────────────────────────────────────────
+
+async def get_mirror_freshness(redis) -> Dict[str, Dict[str, Any]]:
+    """All recorded mirror states, keyed by repo."""
+    raw = await redis.hgetall(FRESHNESS_KEY)
+    return {repo: json.loads(value) for repo, value in raw.items()}
+
+
+async def forget_mirror(redis, repo_full_name: str):
+    """Drop the freshness entry of an evicted mirror so it gets prewarmed again."""
+    await redis.hdel(FRESHNESS_KEY, repo_full_name)
+
+
+async def request_prewarm(queue, repo_full_name: str, reason: str, only_if_missing: bool = False) -> bool:
+    """
+    Enqueue a warm task unless the mirror is fresh or a warm is already pending.
+
+    `only_if_missing` skips repos that have ever been mirrored (webhook path —
+    the fetch stage refreshes those anyway). Returns True if a task was enqueued.
+    """
+    if not queue or not queue.is_connected or not repo_full_name:
+        return False
+    redis = queue.redis
+    try:
+        raw = await redis.hget(FRESHNESS_KEY, repo_full_name)
+        last_fetch = (json.loads(raw).get("last_fetch") or 0) if raw else 0
+        if last_fetch and only_if_missing:
+            return False
+        if last_fetch and time.time() - last_fetch < config.MIRROR_FRESH_SECONDS:
+            return False
+
+        # Dedupe bursts of webhooks / activations for the same repo
+        if not await redis.set(PENDING_KEY_PREFIX + repo_full_name, "1", nx=True, ex=LOCK_TTL * 2):
+            return False
+
+        await queue.enqueue(WARM_QUEUE, {
+            "repo_full_name": repo_full_name,
+            "reason": reason,
+        })
+        logger.info(f"Prewarm enqueued for {repo_full_name} ({reason})")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not enqueue prewarm for {repo_full_name}: {e}")
+        return False
+
+
+async def clear_prewarm_pending(redis, repo_full_name: str):
+    try:
+        await redis.delete(PENDING_KEY_PREFIX + repo_full_name)
+    except Exception:
+        pass
@@ -8,8 +8,10 @@ from core.custom_checks import CustomCheckLoader
 from core.repo_manager import RepoManager
 from core.project_context import ProjectContextBuilder
 from core.types import PRMetadata
-from core.diff_parser import DiffParser
+from core.diff_stream import StreamingDiffParser, aiter_lines
+from core.comment_placement import CommentPlacer, describe_rejection
 from core.summary_builder import build_report_card_block
+from core.triage import TriageSettings
 from core.docker_runner import DockerRunner
 from agents.reviewer import ReviewerAgent
 from agents.fix_prompt_agent import FixPromptAgent
@@ -25,7 +27,7 @@ class Orchestrator:
     def __init__(self):
         self.gh = GitHubClient()
         self.reviewer = ReviewerAgent()
-        self.fix_prompt_agent = FixPromptAgent()
+        self.fix_prompt_agent = FixPromptAgent(llm_service=self.reviewer.llm)
         self.docker_runner = DockerRunner()
         self.indexer = IndexManager()
 
@@ -62,12 +64,19 @@ class Orchestrator:
                 repo_path = manager.clone_and_checkout()
 
                 try:
-                    # 4. Get changed files for targeted linting
-                    raw_diff = await self.gh.get_pr_diff(metadata.repo_full_name, metadata.pr_number)
-                    
-                    # Extract changed file paths from diff
-                    file_diffs = DiffParser.parse_diff(raw_diff)
-                    changed_files = list(file_diffs.keys())
+                    # 4. Stream the diff with the fetch stage's skip rules and size caps;
+                    # it is parsed in the same pass and reused for the review and comment validation
+                    streamed = await StreamingDiffParser().collect(
+                        aiter_lines(self.gh.stream_pr_diff(metadata.repo_full_name, metadata.pr_number))
+                    )
+                    if streamed.skipped or streamed.truncated:
+                        logger.info(
+                            f"Job {job_id}: Skipped {len(streamed.skipped)} file(s), truncated {len(streamed.truncated)} "
+                            f"({streamed.bytes_read} bytes read, {len(streamed.text)} kept)"
+                        )
+                    raw_diff = streamed.text
+                    parsed_diff = streamed.parsed
+                    changed_files = parsed_diff.paths
                     
                     # 5. Run Linters + Security in Docker container
                     docker_results = {"lint": {}, "security": {}}
@@ -124,56 +133,21 @@ class Orchestrator:
                     custom_checks = repo_config.get("custom_checks", [])
                     
                     # 9. Generate Inline Review (concise, line-specific)
-                    review_result = self.reviewer.run_inline_review(
+                    review_result = await self.reviewer.arun_inline_review(
                         raw_diff, 
                         metadata.title, 
                         full_instructions,
                         custom_checks=custom_checks,
-                        repo_path=repo_path
+                        repo_path=repo_path,
+                        parsed_diff=parsed_diff,
+                        triage=TriageSettings.from_repo_config(repo_config),
                     )
                     
                     # 10. Build Inline GitHub Comments
-                    inline_comments = []      # Only path/line/side/body for GitHub API
-                    comments_failed_validation = []
-                    
-                    for comment in review_result.get("inline_comments", []):
-                        file_diff = file_diffs.get(comment.get("path", ""), "")
-                        valid_lines = DiffParser.get_valid_right_lines(file_diff)
-                        
-                        line = comment.get("line")
-                        if line is None:
-                            continue
-                        try:
-                            line = int(line)
-                        except (ValueError, TypeError):
-                            continue
-                        original_line = line
-                        
-                        # Validate line is part of the PR diff
-                        if not valid_lines:
-                             comments_failed_validation.append(f"- **{comment.get('path', 'unknown')}**: {comment.get('body', 'No message')[:80]} (File not in diff)")
-                             continue
-                             
-                        if line not in valid_lines:
-                            # Snap to nearest valid diff line (generous: 20 lines)
-                            if valid_lines:
-                                nearest = min(valid_lines, key=lambda x: abs(x - line))
-                                if abs(nearest - line) <= 20:
-                                    line = nearest
-                                else:
-                                    comments_failed_validation.append(f"- **{comment.get('path', 'unknown')}**: Line {original_line} not in diff")
-                                    continue
-                            else:
-                                comments_failed_validation.append(f"- **{comment.get('path', 'unknown')}**: No valid lines in diff")
-                                continue
-                        
-                        # GitHub API: ONLY path, line, side, body (no extra fields!)
-                        inline_comments.append({
-                            "path": comment.get("path", "unknown"),
-                            "line": line,
-                            "side": "RIGHT",
-                            "body": comment.get("body", "Issue found")
-                        })
+                    # Validate / snap lines against the diff (GitHub API: only path, line, side, body)
+                    placer = CommentPlacer(parsed_diff)
+                    inline_comments, rejected = placer.place_comments(review_result.get("inline_comments", []))
+                    comments_failed_validation = [describe_rejection(c, p) for c, p in rejected]
                     
                     # ═══════════════════════════════════════════════════════
                     # 11. BUILD CODERABBIT-STYLE SUMMARY (Dynamic Dropdowns)
@@ -193,7 +167,7 @@ class Orchestrator:
                         inline_comments=inline_comments,
                         nitpicks=nitpicks,
                         clean_files=clean_files,
-                        all_files=list(file_diffs.keys()),
+                        all_files=parsed_diff.paths,
                         all_raw_findings=all_raw_findings,
                         lint_results=lint_results,
                         sec_results=sec_results,
@@ -215,7 +189,7 @@ class Orchestrator:
                     summary += "| Cohort / File(s) | Summary |\n"
                     summary += "|---|---|\n"
                     lang_names = {'py': 'Python', 'js': 'JavaScript', 'ts': 'TypeScript', 'java': 'Java', 'cpp': 'C++', 'c': 'C', 'go': 'Go', 'rs': 'Rust', 'rb': 'Ruby', 'php': 'PHP', 'cs': 'C#', 'yml': 'YAML', 'yaml': 'YAML', 'json': 'JSON', 'sql': 'SQL', 'html': 'HTML', 'css': 'CSS', 'jsx': 'React JSX', 'tsx': 'React TSX', 'md': 'Documentation'}
-                    for fp in file_diffs.keys():
+                    for fp in parsed_diff.paths:
                         ext = fp.rsplit('.', 1)[-1] if '.' in fp else ''
                         cohort = lang_names.get(ext, ext.upper() if ext else 'File')
                         change_desc = file_summaries.get(fp, "Modified in this PR")
@@ -314,14 +288,14 @@ class Orchestrator:
                     
                     # ── DROPDOWN 4: ✨ Finishing touches (dynamic) ──
                     finishing = []
-                    has_python = any(f.endswith('.py') for f in file_diffs.keys())
+                    has_python = any(f.endswith('.py') for f in parsed_diff.paths)
                     if has_python:
                         finishing.append("📄 Add or update docstrings for changed functions")
-                    has_tests = any('test' in f.lower() for f in file_diffs.keys())
-                    if not has_tests and len(file_diffs) > 1:
+                    has_tests = any('test' in f.lower() for f in parsed_diff.paths)
+                    if not has_tests and len(parsed_diff.files) > 1:
                         finishing.append("🧪 Add unit tests for the new or modified code")
-                    has_changelog = any('changelog' in f.lower() or 'changes' in f.lower() for f in file_diffs.keys())
-                    if not has_changelog and len(file_diffs) > 2:
+                    has_changelog = any('changelog' in f.lower() or 'changes' in f.lower() for f in parsed_diff.paths)
+                    if not has_changelog and len(parsed_diff.files) > 2:
                         finishing.append("📋 Update CHANGELOG or release notes")
                     
                     if finishing:
@@ -354,7 +328,7 @@ class Orchestrator:
                     # ── BLOCK 2 DROPDOWN 1: Fix all issues with AI Agents 🤖 ──
                     if all_raw_findings:
                         try:
-                            fix_prompt = self.fix_prompt_agent.generate_fix_prompt(
+                            fix_prompt = await self.fix_prompt_agent.generate_fix_prompt(
                                 all_raw_findings, pr_title=metadata.title
                             )
                         except Exception as e:
@@ -432,7 +406,7 @@ class Orchestrator:
                     review_body += "</details>\n\n"
                     
                     # Sub-dropdown: 📒 Files selected for processing (N)
-                    all_files = list(file_diffs.keys())
+                    all_files = parsed_diff.paths
                     review_body += "<details>\n"
                     review_body += f"<summary>📒 Files selected for processing ({len(all_files)})</summary>\n\n"
                     for af in all_files:
@@ -493,6 +467,12 @@ class Orchestrator:
                     
                     # 13. Post to GitHub (Block 1 + Block 2 combined at same level)
                     full_body = summary + "\n\n" + review_body
+                    if comments_failed_validation:
+                        full_body += (
+                            f"\n\n<details>\n<summary>💬 Comments outside the diff ({len(comments_failed_validation)})</summary>\n\n"
+                            + "\n".join(comments_failed_validation)
+                            + "\n\n</details>"
+                        )
                     
                     event = "REQUEST_CHANGES" if verdict in ("REQUEST_CHANGES", "BLOCK") else "COMMENT"
                     if verdict in ("APPROVE", "APPROVE_WITH_SUGGESTIONS") and not inline_comments:
@@ -533,8 +513,8 @@ class Orchestrator:
                         job_id=job.id, 
                         agent_name="reviewer", 
                         output_json=json.dumps({
-                            "file_count": len(file_diffs),
-                            "files": list(file_diffs.keys()),
+                            "file_count": len(parsed_diff.files),
+                            "files": parsed_diff.paths,
                             "clean_files": len(clean_files),
                             "inline_comments": all_raw_findings,
                             "nitpicks": all_nitpicks,
@@ -550,7 +530,7 @@ class Orchestrator:
                     session.add(job)
                     await session.commit()
                     
-                    logger.info(f"Job {job_id}: COMPLETED - {len(file_diffs)} files, {len(inline_comments)} inline comments, {len(clean_files)} clean")
+                    logger.info(f"Job {job_id}: COMPLETED - {len(parsed_diff.files)} files, {len(inline_comments)} inline comments, {len(clean_files)} clean")
 
                 finally:
                     manager.cleanup()
@@ -0,0 +1,389 @@
+"""
+Parsed Diff — structured unified diff, built once per job.
+==========================================================
+The raw PR diff used to be re-split and re-scanned by every stage (changed
+files in fetch, per-file split / annotation / valid-line checks in the
+reviewer and orchestrator, changed-line detection in the context builder).
+`ParsedDiff.parse()` does a single pass and records, per file:
+
+  - char span of the file (and of each hunk) inside the raw diff text
+  - hunks with their header ranges and added/removed line bitsets
+  - rename / new / deleted / binary flags and +/- counts
+
+Hunk bodies are consumed by their header counts rather than by guessing from
+line prefixes, so blank context lines, `--`-prefixed deletions and
+"\\ No newline" markers are all counted correctly.
+
+The structure is serialized with `to_dict()` (spans + hex bitsets, no text)
+and travels with the job next to `diff_text`; `from_dict()` re-attaches it.
+"""
+
+import re
+import bisect
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+FORMAT_VERSION = 1
+
+
+# ─── Data Model ───────────────────────────────────────────────────────────────
+
+@dataclass
+class Hunk:
+    """One `@@` block. Line masks are relative to the hunk's start lines."""
+
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    added_mask: int = 0  # bit i set → new line (new_start + i) is an addition
+    removed_mask: int = 0  # bit i set → old line (old_start + i) is a deletion
+    start: int = 0  # char span of the hunk (header included) in the raw diff
+    end: int = 0
+
+    @property
+    def new_end(self) -> int:
+        """Last new-side line covered by the hunk (new_start - 1 if empty)."""
+        return self.new_start + self.new_count - 1
+
+    def is_added(self, new_line: int) -> bool:
+        offset = new_line - self.new_start
+        return 0 <= offset < self.new_count and bool(self.added_mask >> offset & 1)
+
+    def added_lines(self) -> List[int]:
+        return [self.new_start + i for i in range(self.new_count) if self.added_mask >> i & 1]
+
+    def to_list(self) -> list:
+        return [
+            self.old_start, self.old_count, self.new_start, self.new_count,
+            format(self.added_mask, "x"), format(self.removed_mask, "x"),
+            self.start, self.end,
+        ]
+
+    @classmethod
+    def from_list(cls, values: list) -> "Hunk":
+        old_start, old_count, new_start, new_count, added, removed, start, end = values
+        return cls(
+            old_start, old_count, new_start, new_count,
+            int(added, 16), int(removed, 16), start, end,
+        )
+
+
+@dataclass
+class FileDiff:
+    """All hunks of one file, plus header flags."""
+
+    path: str
+    old_path: str = ""
+    start: int = 0  # char span of the whole file diff in the raw diff
+    end: int = 0
+    hunks: List[Hunk] = field(default_factory=list)
+    is_new: bool = False
+    is_deleted: bool = False
+    is_rename: bool = False
+    is_binary: bool = False
+    additions: int = 0
+    deletions: int = 0
+    _right_lines: Optional[Set[int]] = field(default=None, init=False, repr=False, compare=False)
+    _hunk_starts: Optional[List[int]] = field(default=None, init=False, repr=False, compare=False)
+
+    def right_lines(self) -> Set[int]:
+        """
+        New-side lines visible in the diff (additions + context) — the only
+        valid positions for RIGHT-side inline comments.
+        """
+        if self._right_lines is None:
+            lines: Set[int] = set()
+            for h in self.hunks:
+                lines.update(range(h.new_start, h.new_start + h.new_count))
+            self._right_lines = lines
+        return self._right_lines
+
+    def added_lines(self) -> List[int]:
+        lines = []
+        for h in self.hunks:
+            lines.extend(h.added_lines())
+        return lines
+
+    def hunk_for(self, new_line: int) -> Optional[Hunk]:
+        """The hunk whose new-side range contains `new_line`, if any."""
+        if self._hunk_starts is None:
+            self._hunk_starts = [h.new_start for h in self.hunks]
+        i = bisect.bisect_right(self._hunk_starts, new_line) - 1
+        if i >= 0 and new_line <= self.hunks[i].new_end:
+            return self.hunks[i]
+        return None
+
+    def old_line_for(self, new_line: int) -> Optional[int]:
+        """Old-side line number of a context line (None for additions / lines outside hunks)."""
+        hunk = self.hunk_for(new_line)
+        if hunk is None or hunk.is_added(new_line):
+            return None
+        # Context lines pair up, in order, with the old lines that were not removed
+        k = sum(1 for i in range(new_line - hunk.new_start) if not hunk.added_mask >> i & 1)
+        for i in range(hunk.old_count):
+            if not hunk.removed_mask >> i & 1:
+                if k == 0:
+                    return hunk.old_start + i
+                k -= 1
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "old_path": self.old_path,
+            "start": self.start,
+            "end": self.end,
+            "is_new": self.is_new,
+            "is_deleted": self.is_deleted,
+            "is_rename": self.is_rename,
+            "is_binary": self.is_binary,
+            "additions": self.additions,
+            "deletions": self.deletions,
+            "hunks": [h.to_list() for h in self.hunks],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FileDiff":
+        hunks = [Hunk.from_list(h) for h in data.get("hunks", [])]
+        return cls(
+            path=data["path"],
+            old_path=data.get("old_path", ""),
+            start=data["start"],
+            end=data["end"],
+            hunks=hunks,
+            is_new=data.get("is_new", False),
+            is_deleted=data.get("is_deleted", False),
+            is_rename=data.get("is_rename", False),
+            is_binary=data.get("is_binary", False),
+            additions=data.get("additions", 0),
+            deletions=data.get("deletions", 0),
+        )
+
+
+class ParsedDiff:
+    """A raw unified diff plus its per-file structure."""
+
+    def __init__(self, raw: str, files: Dict[str, FileDiff]):
+        self.raw = raw
+        self.files = files
+
+    @classmethod
+    def parse(cls, raw: str) -> "ParsedDiff":
+        builder = DiffBuilder()
+        lines = raw.split("\n")
+        last = len(lines) - 1
+        for i, line in enumerate(lines):
+            builder.feed(line, len(line) + (1 if i < last else 0))
+        return cls(raw, builder.finish())
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], raw: str) -> "ParsedDiff":
+        """Re-attach a serialized structure to its raw diff (reparses if it doesn't match)."""
+        if not data or data.get("version") != FORMAT_VERSION or data.get("length") != len(raw):
+            return cls.parse(raw)
+        files = {}
+        for fd in data.get("files", []):
+            f = FileDiff.from_dict(fd)
+            files[f.path] = f
+        return cls(raw, files)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": FORMAT_VERSION,
+            "length": len(self.raw),
+            "files": [f.to_dict() for f in self.files.values()],
+        }
+
+    # ─── Accessors ────────────────────────────────────────────
+
+    @property
+    def paths(self) -> List[str]:
+        return list(self.files.keys())
+
+    def get(self, path: str) -> Optional[FileDiff]:
+        return self.files.get(path)
+
+    def text(self, path: str) -> str:
+        """Raw diff text of one file (same shape as `DiffParser.parse_diff` values)."""
+        f = self.files.get(path)
+        if f is None:
+            return ""
+        return self.raw[f.start:f.end].rstrip("\n")
+
+    def file_diffs(self) -> Dict[str, str]:
+        return {path: self.text(path) for path in self.files}
+
+    def right_lines(self, path: str) -> Set[int]:
+        f = self.files.get(path)
+        return f.right_lines() if f else set()
+
+    def annotate(self, path: str) -> str:
+        """File diff with new-side line numbers (Lxx) for the LLM to reference."""
+        return annotate_lines(self.text(path).split("\n"))
+
+
+# ─── Line Classification ──────────────────────────────────────────────────────
+
+class HunkWalker:
+    """
+    Classifies diff lines one at a time, bounded by hunk header counts.
+
+    `classify()` returns (kind, old_line, new_line) where kind is one of
+    "file", "hunk", "add", "del", "ctx", "nonl" (the "\\ No newline" marker)
+    or "meta" (any header line outside a hunk body).
+    """
+
+    def __init__(self):
+        self.old_remaining = 0
+        self.new_remaining = 0
+        self.old_line = 0
+        self.new_line = 0
+        self.header: Optional[Tuple[int, int, int, int]] = None
+
+    def classify(self, line: str) -> Tuple[str, int, int]:
+        if line.startswith("diff --git "):
+            self.old_remaining = self.new_remaining = 0
+            return "file", 0, 0
+
+        if line.startswith("@@"):
+            match = HUNK_HEADER_RE.match(line)
+            if match:
+                old_start, old_count, new_start, new_count = match.groups()
+                old_count = 1 if old_count is None else int(old_count)
+                new_count = 1 if new_count is None else int(new_count)
+                self.header = (int(old_start), old_count, int(new_start), new_count)
+                self.old_line, self.new_line = int(old_start), int(new_start)
+                self.old_remaining, self.new_remaining = old_count, new_count
+                return "hunk", 0, 0
+
+        if self.old_remaining <= 0 and self.new_remaining <= 0:
+            if line.startswith("\\"):
+                return "nonl", 0, 0
+            return "meta", 0, 0
+
+        tag = line[:1]
+        if tag == "\\":
+            return "nonl", 0, 0
+        if tag == "+":
+            new_line = self.new_line
+            self.new_line += 1
+            self.new_remaining -= 1
+            return "add", 0, new_line
+        if tag == "-":
+            old_line = self.old_line
+            self.old_line += 1
+            self.old_remaining -= 1
+            return "del", old_line, 0
+
+        # Context — including blank lines whose leading space was stripped
+        old_line, new_line = self.old_line, self.new_line
+        self.old_line += 1
+        self.new_line += 1
+        self.old_remaining -= 1
+        self.new_remaining -= 1
+        return "ctx", old_line, new_line
+
+
+def annotate_lines(lines) -> str:
+    """Prefix new-side line numbers to additions and context lines."""
+    walker = HunkWalker()
+    annotated = []
+    for line in lines:
+        kind, _, new_line = walker.classify(line)
+        if kind in ("add", "ctx"):
+            annotated.append(f"L{new_line:>4} {line}")
+        elif kind == "del":
+            annotated.append(f"      {line}")
+        else:
+            annotated.append(line)
+    return "\n".join(annotated)
+
+
+# ─── Builder ──────────────────────────────────────────────────────────────────
+
+class DiffBuilder:
+    """Incrementally builds FileDiffs from diff lines and their char lengths."""
+
+    def __init__(self):
+        self.files: Dict[str, FileDiff] = {}
+        self._walker = HunkWalker()
+        self._file: Optional[FileDiff] = None
+        self._hunk: Optional[Hunk] = None
+        self._offset = 0
+
+    def feed(self, line: str, length: int):
+        """Consume one line (without its newline); `length` includes the newline."""
+        kind, old_line, new_line = self._walker.classify(line)
+        start = self._offset
+        self._offset += length
+
+        if kind == "file":
+            self._close_file()
+            self._file = FileDiff(path=path_from_git_header(line), start=start)
+            self._hunk = None
+        elif self._file is None:
+            return
+        elif kind == "hunk":
+            old_start, old_count, new_start, new_count = self._walker.header
+            self._hunk = Hunk(old_start, old_count, new_start, new_count, start=start)
+            self._file.hunks.append(self._hunk)
+        elif kind == "add" and self._hunk:
+            self._hunk.added_mask |= 1 << (new_line - self._hunk.new_start)
+            self._file.additions += 1
+        elif kind == "del" and self._hunk:
+            self._hunk.removed_mask |= 1 << (old_line - self._hunk.old_start)
+            self._file.deletions += 1
+        elif kind == "meta" and not self._file.hunks:
+            _apply_header_line(self._file, line)
+
+        self._file.end = self._offset
+        if self._hunk:
+            self._hunk.end = self._offset
+
+    def finish(self) -> Dict[str, FileDiff]:
+        self._close_file()
+        return self.files
+
+    def _close_file(self):
+        if self._file is not None:
+            self.files[self._file.path] = self._file
+            self._file = None
+
+
+def path_from_git_header(line: str) -> str:
+    # "diff --git a/src/app.py b/src/app.py" — take the last " b/" so that
+    # directories named "b" don't confuse the split; "+++ b/" refines it later.
+    rest = line[len("diff --git "):]
+    if " b/" in rest:
+        return rest.rsplit(" b/", 1)[1]
+    return rest.split(" ")[-1]
+
+
+def _apply_header_line(f: FileDiff, line: str):
+    if line.startswith("+++ "):
+        target = line[4:].rstrip("\t\r")
+        if target == "/dev/null":
+            f.is_deleted = True
+        elif target.startswith("b/"):
+            f.path = target[2:]
+    elif line.startswith("--- "):
+        source = line[4:].rstrip("\t\r")
+        if source == "/dev/null":
+            f.is_new = True
+        elif source.startswith("a/"):
+            f.old_path = source[2:]
+    elif line.startswith("new file mode"):
+        f.is_new = True
+    elif line.startswith("deleted file mode"):
+        f.is_deleted = True
+    elif line.startswith("rename from "):
+        f.is_rename = True
+        f.old_path = line[len("rename from "):]
+    elif line.startswith("rename to "):
+        f.is_rename = True
+        f.path = line[len("rename to "):]
+    elif line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+        f.is_binary = True
@@ -0,0 +1,268 @@
+"""
+Provider Router
+===============
+Process-wide routing for the LLM fallback chain (Groq / Gemini / OpenRouter),
+shared by every LLMService / AsyncLLMService in the process instead of each
+instance keeping its own `_failed_providers` set.
+
+Per provider/model it tracks EWMA latency, error rate and 429 rate, and a
+circuit breaker:
+
+  closed     normal routing
+  open       skipped; opened by a 429 (the provider asked us to back off) or
+             by ROUTER_FAILURE_THRESHOLD consecutive errors
+  half_open  after the cooldown one probe request is let through; success
+             closes the circuit, failure re-opens it with a doubled cooldown
+
+`order()` ranks the available providers by expected latency inflated by
+their error rate; providers with no data yet are assumed at
+ROUTER_DEFAULT_LATENCY and configured order breaks ties. Open circuits go last, as a last resort, so a request never
+fails just because every breaker is open.
+
+It also backs request hedging (AsyncLLMService): `hedge_delay()` is a
+provider's observed p90 latency, and `take_hedge()` spends from a budget
+that earns LLM_HEDGE_BUDGET_RATIO of a hedge per request, so hedges never
+exceed that share of traffic.
+
+With ROUTER_SHARED, state is mirrored to the Redis hash `llm:router` so all
+workers see a provider's circuit open as soon as one of them trips it
+(`attach_redis` + `sync`; last writer wins per provider/model).
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict, List, Optional
+
+from config import config
+
+logger = logging.getLogger("agenticpr.provider_router")
+
+ROUTER_KEY = "llm:router"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+# Fallback for errors without a status: whole phrases only ("rate" alone matches "generateContent")
+RATE_LIMIT_TEXT = re.compile(r"\b429\b|rate[ _-]?limit|too many requests|resource_exhausted|quota exceeded|exceeded (?:your |the )?(?:current )?quota")
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """A 429 / quota error: by the SDK exception's status when it has one, else by its message."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)  # google-genai APIError
+    if getattr(error, "status", None) == "RESOURCE_EXHAUSTED" or status == 429:
+        return True
+    if isinstance(status, int):
+        return False
+    return bool(RATE_LIMIT_TEXT.search(str(error).lower()))
+
+
+@dataclass
+class ProviderState:
+    latency: Optional[float] = None  # EWMA seconds of successful calls
+    error_rate: float = 0.0  # EWMA of failures (0..1)
+    rate_limit_rate: float = 0.0  # EWMA of 429s (0..1)
+    calls: int = 0
+    consecutive_failures: int = 0
+    circuit: str = CLOSED
+    opened_at: float = 0.0
+    cooldown: float = 0.0
+    updated_at: float = 0.0
+    samples: List[float] = field(default_factory=list)  # recent successful latencies (p90 for hedging)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProviderState":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ProviderRouter:
+    def __init__(self, alpha: float = None, failure_threshold: int = None, cooldown: float = None, max_cooldown: float = None):
+        self.alpha = alpha if alpha is not None else config.ROUTER_EWMA_ALPHA
+        self.failure_threshold = failure_threshold or config.ROUTER_FAILURE_THRESHOLD
+        self.base_cooldown = cooldown if cooldown is not None else config.ROUTER_COOLDOWN_SECONDS
+        self.max_cooldown = max_cooldown if max_cooldown is not None else config.ROUTER_MAX_COOLDOWN_SECONDS
+        self._states: Dict[str, ProviderState] = {}
+        self._probing: set = set()  # half-open keys with a probe in flight
+        self._dirty: set = set()  # keys changed since the last Redis sync
+        self._lock = threading.Lock()  # LLMService calls from worker threads
+        self._redis = None
+        self._last_sync = 0.0
+        self._hedge_credit = 0.0
+        self.hedges = {"fired": 0, "won": 0, "denied": 0}
+
+    @staticmethod
+    def key(provider: str, model: str) -> str:
+        return f"{provider}:{model}"
+
+    def state(self, key: str) -> ProviderState:
+        with self._lock:
+            return self._states.setdefault(key, ProviderState())
+
+    # ─── Routing ──────────────────────────────────────────────────────────────
+
+    def order(self, keys: List[str], now: float = None) -> List[str]:
+        """`keys` (in configured order) best first; open circuits last, soonest-to-probe first."""
+        now = now if now is not None else time.time()
+        available, blocked = [], []
+        with self._lock:
+            for index, key in enumerate(keys):
+                state = self._states.setdefault(key, ProviderState())
+                if state.circuit == OPEN and now - state.opened_at >= state.cooldown:
+                    state.circuit = HALF_OPEN  # cooldown over: allow one probe
+                    self._dirty.add(key)
+                if state.circuit == CLOSED or (state.circuit == HALF_OPEN and key not in self._probing):
+                    available.append((self._score(state), index, key))
+                else:
+                    blocked.append((state.opened_at + state.cooldown, index, key))
+        return [k for *_, k in sorted(available)] + [k for *_, k in sorted(blocked)]
+
+    @staticmethod
+    def _score(state: ProviderState) -> float:
+        if state.latency is None:
+            return config.ROUTER_DEFAULT_LATENCY  # no data yet: assumed, configured order breaks ties
+        return state.latency / max(0.1, 1.0 - state.error_rate)
+
+    def begin(self, key: str):
+        """Mark a request as started; a half-open provider admits only this probe."""
+        with self._lock:
+            if self._states.setdefault(key, ProviderState()).circuit == HALF_OPEN:
+                self._probing.add(key)
+
+    def release(self, key: str):
+        """A request ended without a verdict (e.g. empty reply): free the half-open probe slot."""
+        with self._lock:
+            self._probing.discard(key)
+
+    # ─── Outcomes ─────────────────────────────────────────────────────────────
+
+    def record_success(self, key: str, latency: float):
+        with self._lock:
+            state = self._states.setdefault(key, ProviderState())
+            state.latency = latency if state.latency is None else self._ewma(state.latency, latency)
+            state.samples = (state.samples + [round(latency, 3)])[-config.ROUTER_LATENCY_WINDOW:]
+            state.error_rate = self._ewma(state.error_rate, 0.0)
+            state.rate_limit_rate = self._ewma(state.rate_limit_rate, 0.0)
+            state.calls += 1
+            state.consecutive_failures = 0
+            if state.circuit != CLOSED:
+                logger.info(f"Circuit closed for {key}")
+                print(f"  [LLM] ✓ {key} recovered!")
+            state.circuit, state.cooldown = CLOSED, 0.0
+            self._touch(key, state)
+
+    def record_failure(self, key: str, error: Exception = None, rate_limited: bool = None):
+        rate_limited = is_rate_limit(error) if rate_limited is None and error is not None else bool(rate_limited)
+        with self._lock:
+            state = self._states.setdefault(key, ProviderState())
+            state.error_rate = self._ewma(state.error_rate, 1.0)
+            state.rate_limit_rate = self._ewma(state.rate_limit_rate, 1.0 if rate_limited else 0.0)
+            state.calls += 1
+            state.consecutive_failures += 1
+            if state.circuit == HALF_OPEN or rate_limited or state.consecutive_failures >= self.failure_threshold:
+                previous = state.cooldown if state.circuit == HALF_OPEN else 0.0
+                state.cooldown = min(self.max_cooldown, previous * 2 if previous else self.base_cooldown)
+                state.circuit, state.opened_at = OPEN, time.time()
+                logger.warning(f"Circuit open for {key} ({state.cooldown:.0f}s): {error}")
+            self._touch(key, state)
+
+    def _ewma(self, previous: float, sample: float) -> float:
+        return self.alpha * sample + (1 - self.alpha) * previous
+
+    def _touch(self, key: str, state: ProviderState):
+        state.updated_at = time.time()
+        self._probing.discard(key)
+        self._dirty.add(key)
+
+    # ─── Hedging ──────────────────────────────────────────────────────────────
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """How long to wait on `key` before hedging: its p90 latency, None until enough samples."""
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or len(state.samples) < config.LLM_HEDGE_MIN_SAMPLES:
+                return None
+            return max(config.LLM_HEDGE_MIN_DELAY, state.percentile(0.9))
+
+    def healthy(self, key: str) -> bool:
+        with self._lock:
+            state = self._states.get(key)
+            return state is None or state.circuit == CLOSED
+
+    def note_request(self):
+        """Every primary request earns a fraction of a hedge (capped burst)."""
+        with self._lock:
+            self._hedge_credit = min(config.LLM_HEDGE_MAX_BURST, self._hedge_credit + config.LLM_HEDGE_BUDGET_RATIO)
+
+    def take_hedge(self) -> bool:
+        """Spend one hedge from the budget; False when hedging would exceed its share."""
+        with self._lock:
+            if self._hedge_credit >= 1.0:
+                self._hedge_credit -= 1.0
+                self.hedges["fired"] += 1
+                return True
+            self.hedges["denied"] += 1
+            return False
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {key: state.to_dict() for key, state in self._states.items()}
+
+    # ─── Redis Sharing ────────────────────────────────────────────────────────
+
+    def attach_redis(self, redis):
+        """Share state with other processes (no-op unless ROUTER_SHARED)."""
+        if config.ROUTER_SHARED and redis is not None:
+            self._redis = redis
+
+    async def sync(self, force: bool = False):
+        """Push local changes and pull newer remote ones, at most every ROUTER_SYNC_SECONDS."""
+        if self._redis is None or (not force and time.time() - self._last_sync < config.ROUTER_SYNC_SECONDS):
+            return
+        self._last_sync = time.time()
+        with self._lock:
+            dirty = {key: self._states[key].to_dict() for key in self._dirty if key in self._states}
+            self._dirty.clear()
+        try:
+            if dirty:
+                await self._redis.hset(ROUTER_KEY, mapping={k: json.dumps(v) for k, v in dirty.items()})
+            remote = await self._redis.hgetall(ROUTER_KEY)
+        except Exception as e:
+            logger.debug(f"Router sync failed: {e}")
+            return
+        with self._lock:
+            for key, raw in remote.items():
+                try:
+                    theirs = ProviderState.from_dict(json.loads(raw))
+                except (TypeError, ValueError):
+                    continue
+                mine = self._states.get(key)
+                if mine is None or theirs.updated_at > mine.updated_at:
+                    self._states[key] = theirs
+
+
+_router: Optional[ProviderRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ProviderRouter:
+    """The process-wide router, created on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter()
+        return _router
@@ -1,85 +1,369 @@
 """
 Enterprise Redis-based Rate Limiter (Token Bucket).
 Prevents LLM quota exhaustion.
+
+TokenBucketRateLimiter is one global LLM_RPM_LIMIT bucket the caller charges
+explicitly. ProviderRateLimiter is what AsyncLLMService charges around every
+provider call: one bucket pair per provider/model, metering requests per
+minute and tokens per minute the way the providers do. A call reserves its
+estimated prompt + completion tokens up front and `reconcile` settles the
+difference once the real count is known. Its waiters are served in ticket
+order.
 """
 
 import time
+import bisect
 import asyncio
+import itertools
 import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
 from config import config
 
 logger = logging.getLogger("agenticpr.ratelimit")
 
+# ─── Scripts ──────────────────────────────────────────────────────────────────
+
+class RedisScript:
+    """
+    A Lua script sent to Redis once (SCRIPT LOAD) and then run by SHA
+    (EVALSHA). Reloaded if the server lost it (restart, SCRIPT FLUSH).
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha: Optional[str] = None
+
+    async def __call__(self, redis, keys: list, args: list):
+        if self.sha is None:
+            self.sha = await redis.script_load(self.source)
+        try:
+            return await redis.evalsha(self.sha, len(keys), *keys, *args)
+        except Exception as e:
+            if "NOSCRIPT" not in str(e):
+                raise
+            self.sha = await redis.script_load(self.source)
+            return await redis.evalsha(self.sha, len(keys), *keys, *args)
+
+
+# ─── Global Bucket ────────────────────────────────────────────────────────────
+
+# Returns {allowed, seconds until `requested` tokens will have accrued}.
+TOKEN_BUCKET_LUA = """
+local bucket = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+local state = redis.call("HMGET", bucket, "tokens", "last_refill")
+local tokens = tonumber(state[1])
+local last_refill = tonumber(state[2])
+if not tokens or not last_refill then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + math.max(0, now - last_refill) * refill_rate)
+end
+
+local allowed = 0
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    wait = (requested - tokens) / refill_rate
+end
+
+redis.call("HSET", bucket, "tokens", tokens, "last_refill", now)
+redis.call("EXPIRE", bucket, 300)
+return {allowed, tostring(wait)}
+"""
+
+
 class TokenBucketRateLimiter:
     """
     Redis-backed Token Bucket for LLM RPM (Requests Per Minute).
+
+    Waiters sleep exactly until the script says enough tokens will have
+    accrued.
     """
+    script = RedisScript(TOKEN_BUCKET_LUA)
+
     def __init__(self, queue_manager):
         self.redis = queue_manager.redis
         self.capacity = getattr(config, "LLM_RPM_LIMIT", 30)
         self.refill_rate = self.capacity / 60.0  # tokens per second
         self.key = "ratelimit:llm_bucket"
-    
+
     async def acquire(self, tokens: int = 1, timeout: int = 300) -> bool:
         """
         Wait until tokens are available (up to timeout seconds).
         Uses a Lua script for atomic bucket updates.
         """
-        lua_script = """
-        local key = KEYS[1]
-        local capacity = tonumber(ARGV[1])
-        local refill_rate = tonumber(ARGV[2])
-        local requested = tonumber(ARGV[3])
-        local now = tonumber(ARGV[4])
-        
-        local bucket = redis.call("HMGET", key, "tokens", "last_refill")
-        local tokens = tonumber(bucket[1])
-        local last_refill = tonumber(bucket[2])
-        
-        if not tokens or not last_refill then
-            tokens = capacity
-            last_refill = now
-        else
-            local elapsed = math.max(0, now - last_refill)
-            local refill = elapsed * refill_rate
-            tokens = math.min(capacity, tokens + refill)
-            last_refill = now
-        end
-        
-        if tokens >= requested then
-            tokens = tokens - requested
-            redis.call("HMSET", key, "tokens", tokens, "last_refill", last_refill)
-            redis.call("EXPIRE", key, 300)
-            return {1, tokens}
-        else
-            redis.call("HMSET", key, "tokens", tokens, "last_refill", last_refill)
-            redis.call("EXPIRE", key, 300)
-            return {0, tokens}
-        end
-        """
-        
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            now = time.time()
-            logger.debug(f"Executing Redis Lua script: {lua_script.strip()}")
-            logger.debug(f"Args: key={self.key}, capacity={self.capacity}, rate={self.refill_rate}, requested={tokens}, now={now}")
-            
+        deadline = time.monotonic() + timeout
+        while True:
             try:
-                result = await self.redis.eval(
-                    lua_script, 1, self.key, 
-                    self.capacity, self.refill_rate, tokens, now
+                allowed, wait = await self.script(
+                    self.redis, [self.key], [self.capacity, self.refill_rate, tokens, time.time()],
                 )
             except Exception as e:
-                logger.error(f"Redis eval failed: {e}")
-                logger.error(f"Failed script: {lua_script}")
+                logger.error(f"Redis rate limit script failed: {e}")
                 raise
-            
-            allowed = result[0] == 1
-            if allowed:
+
+            if int(allowed) == 1:
                 return True
-                
-            # Sleep if not enough tokens
-            await asyncio.sleep(2)
-            
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(max(float(wait), 0.05), remaining))
+
         logger.warning("Timeout waiting for LLM tokens.")
         return False
+
+
+# ─── Per-Provider Buckets ─────────────────────────────────────────────────────
+
+@dataclass
+class ProviderLimits:
+    rpm: int = 0  # requests per minute, 0 = unmetered
+    tpm: int = 0  # prompt + completion tokens per minute, 0 = unmetered
+
+
+def provider_limits(provider: str) -> ProviderLimits:
+    """Configured quota for `provider` ("groq", "gemini", "openrouter")."""
+    name = provider.upper()
+    return ProviderLimits(
+        rpm=getattr(config, f"{name}_RPM_LIMIT", 0),
+        tpm=getattr(config, f"{name}_TPM_LIMIT", 0),
+    )
+
+
+QUEUE_POLL = 0.05  # seconds between checks while others are ahead in the queue
+
+
+def _take(bucket: Optional[list], limits: ProviderLimits, tokens: int, now: float, ahead: int = 0) -> tuple:
+    """
+    Refill `bucket` ([requests, tokens, last_refill]) and take one request
+    plus `tokens` from it. Returns (new bucket, seconds to wait); nothing is
+    taken unless the wait is 0. A waiter with `ahead` others queued before
+    it takes nothing and waits until there is enough for them (assumed to
+    want as much) and then it. Same arithmetic as PROVIDER_BUCKET_LUA.
+    """
+    requests, available, last = bucket or (limits.rpm, limits.tpm, now)
+    elapsed = max(0.0, now - last)
+    requests = min(limits.rpm, requests + elapsed * limits.rpm / 60.0)
+    available = min(limits.tpm, available + elapsed * limits.tpm / 60.0)
+    calls = ahead + 1
+    wait = 0.0
+    if limits.rpm > 0 and requests < calls:
+        wait = (calls - requests) * 60.0 / limits.rpm
+    if limits.tpm > 0 and available < tokens * calls:
+        wait = max(wait, (tokens * calls - available) * 60.0 / limits.tpm)
+    if ahead:
+        wait = max(wait, QUEUE_POLL)
+    if wait == 0:
+        requests, available = requests - 1, available - tokens
+    return [requests, available, now], wait
+
+
+# Waiters queue in a sorted set (score = ticket number). Only the head may
+# take from the buckets, so a small newcomer can't slip in ahead of a large
+# reservation that has been waiting for the TPM bucket to refill. Each call
+# renews the caller's lease; a head whose lease ran out (its process died)
+# is dropped. Returns the seconds to wait, "0" once taken.
+PROVIDER_BUCKET_LUA = """
+local key = KEYS[1]
+local queue = KEYS[2]
+local leases = KEYS[3]
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local ticket = ARGV[5]
+local lease = tonumber(ARGV[6])
+local poll = tonumber(ARGV[7])
+
+redis.call("ZADD", queue, "NX", ticket, ticket)
+redis.call("HSET", leases, ticket, now + lease)
+while true do
+    local head = redis.call("ZRANGE", queue, 0, 0)[1]
+    if not head then break end
+    local expires = tonumber(redis.call("HGET", leases, head))
+    if expires and expires >= now then break end
+    redis.call("ZREM", queue, head)
+    redis.call("HDEL", leases, head)
+end
+local ahead = redis.call("ZRANK", queue, ticket)
+local calls = ahead + 1
+
+local bucket = redis.call("HMGET", key, "requests", "tokens", "last_refill")
+local requests = tonumber(bucket[1]) or rpm
+local available = tonumber(bucket[2]) or tpm
+local last = tonumber(bucket[3]) or now
+
+local elapsed = math.max(0, now - last)
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+available = math.min(tpm, available + elapsed * tpm / 60)
+
+local wait = 0
+if rpm > 0 and requests < calls then
+    wait = (calls - requests) * 60 / rpm
+end
+if tpm > 0 and available < wanted * calls then
+    wait = math.max(wait, (wanted * calls - available) * 60 / tpm)
+end
+if ahead > 0 then
+    wait = math.max(wait, poll)
+end
+if wait == 0 then
+    requests = requests - 1
+    available = available - wanted
+    redis.call("ZREM", queue, ticket)
+    redis.call("HDEL", leases, ticket)
+end
+
+redis.call("HSET", key, "requests", requests, "tokens", available, "last_refill", now)
+redis.call("EXPIRE", key, 300)
+redis.call("EXPIRE", queue, 300)
+redis.call("EXPIRE", leases, 300)
+return tostring(wait)
+"""
+
+
+class ProviderRateLimiter:
+    """
+    RPM + TPM token buckets per provider/model (router keys, "groq:<model>").
+
+    Buckets live in Redis (`ratelimit:llm:<key>`) once `attach_redis` is
+    called, so every worker draws from the same quota; until then, or if
+    Redis errors, they are kept in process. Waiters take a ticket and are
+    served first come, first served; each sleeps until the script says
+    there will be enough for it and everyone ahead (capped at a third of
+    RATE_LIMIT_TICKET_LEASE to keep its lease alive).
+    """
+    script = RedisScript(PROVIDER_BUCKET_LUA)
+
+    def __init__(self, limits: Dict[str, ProviderLimits] = None):
+        self._limits = limits  # provider -> limits; default from config
+        self._local: Dict[str, list] = {}
+        self._queues: Dict[str, list] = {}  # key -> waiting tickets, oldest first
+        self._tickets = itertools.count(1)
+        self._lock = threading.Lock()
+        self._redis = None
+        self.lease = config.RATE_LIMIT_TICKET_LEASE
+
+    def attach_redis(self, redis):
+        if redis is not None:
+            self._redis = redis
+
+    def limits(self, provider: str) -> ProviderLimits:
+        if self._limits is not None:
+            return self._limits.get(provider, ProviderLimits())
+        return provider_limits(provider)
+
+    async def acquire(self, key: str, provider: str, tokens: int, timeout: float = 60) -> bool:
+        """
+        Take one request and `tokens` (estimated prompt + completion) from
+        `key`'s buckets, waiting up to `timeout` seconds for them to refill
+        and for earlier waiters to be served.
+        """
+        limits = self.limits(provider)
+        if not limits.rpm and not limits.tpm:
+            return True
+        if limits.tpm:
+            tokens = min(tokens, limits.tpm)  # larger than a full bucket would never fit
+        ticket = await self._ticket(key)
+        deadline = time.monotonic() + timeout
+        acquired = False
+        try:
+            while True:
+                wait = await self._take(key, limits, tokens, ticket)
+                if wait <= 0:
+                    acquired = True
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                await asyncio.sleep(min(wait, remaining, self.lease / 3))
+        finally:
+            if not acquired:
+                await self._leave(key, ticket)
+
+    async def reconcile(self, key: str, provider: str, reserved: int, used: int):
+        """Return over-reserved tokens to `key`'s TPM bucket (or charge the shortfall)."""
+        limits = self.limits(provider)
+        if not limits.tpm or reserved == used:
+            return
+        refund = min(reserved, limits.tpm) - used
+        if self._redis is not None:
+            try:
+                await self._redis.hincrbyfloat(self._redis_key(key), "tokens", refund)
+                return
+            except Exception as e:
+                logger.warning(f"Provider bucket reconcile failed for {key}: {e}")
+        with self._lock:
+            bucket = self._local.get(key)
+            if bucket:
+                bucket[1] = min(limits.tpm, bucket[1] + refund)
+
+    async def _ticket(self, key: str) -> int:
+        if self._redis is not None:
+            try:
+                return int(await self._redis.incr(f"{self._redis_key(key)}:tickets"))
+            except Exception as e:
+                logger.warning(f"Provider queue ticket failed for {key}, using local queue: {e}")
+        return next(self._tickets)
+
+    async def _take(self, key: str, limits: ProviderLimits, tokens: int, ticket: int) -> float:
+        if self._redis is not None:
+            name = self._redis_key(key)
+            try:
+                wait = await self.script(
+                    self._redis, [name, f"{name}:queue", f"{name}:leases"],
+                    [limits.rpm, limits.tpm, tokens, time.time(), ticket, self.lease, QUEUE_POLL],
+                )
+                return float(wait)
+            except Exception as e:
+                logger.warning(f"Provider bucket script failed for {key}, using local bucket: {e}")
+        with self._lock:
+            queue = self._queues.setdefault(key, [])
+            if ticket not in queue:
+                bisect.insort(queue, ticket)
+            self._local[key], wait = _take(self._local.get(key), limits, tokens, time.time(), queue.index(ticket))
+            if wait <= 0:
+                queue.remove(ticket)
+        return wait
+
+    async def _leave(self, key: str, ticket: int):
+        """Give up our place in the queue (timeout or cancellation)."""
+        with self._lock:
+            queue = self._queues.get(key, [])
+            if ticket in queue:
+                queue.remove(ticket)
+        if self._redis is not None:
+            name = self._redis_key(key)
+            try:
+                await self._redis.zrem(f"{name}:queue", ticket)
+                await self._redis.hdel(f"{name}:leases", ticket)
+            except Exception as e:
+                logger.debug(f"Failed to leave provider queue for {key}: {e}")
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"ratelimit:llm:{key}"
+
+
+_provider_limiter: Optional[ProviderRateLimiter] = None
+_provider_limiter_lock = threading.Lock()
+
+
+def get_provider_limiter() -> ProviderRateLimiter:
+    """The process-wide per-provider limiter, created on first use."""
+    global _provider_limiter
+    with _provider_limiter_lock:
+        if _provider_limiter is None:
+            _provider_limiter = ProviderRateLimiter()
+        return _provider_limiter
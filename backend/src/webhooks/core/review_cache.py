@@ -0,0 +1,99 @@
+"""
+Review Cache
+============
+Per-file cache of parsed LLM review results, so re-running a review (manual
+re-review, reopen, retry) does not re-send files whose inputs are unchanged.
+
+The key hashes everything that shapes the per-file prompt: the file diff,
+the full file content, the surrounding context (PR title, planner focus,
+codebase context, feedback constraints), the model chain, the prompt version
+and the repo's custom checks. Any change to one of them is a miss.
+
+Entries live in Redis:
+  - `reviewcache:entry:<key>`  JSON result, expires after REVIEW_CACHE_TTL_SECONDS
+  - `reviewcache:index`        ZSET key -> last use, trimmed to
+                               REVIEW_CACHE_MAX_ENTRIES (least recently used first)
+
+Cache errors are logged and treated as misses; they never fail a review.
+"""
+
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from config import config
+
+logger = logging.getLogger("agenticpr.review_cache")
+
+ENTRY_KEY_PREFIX = "reviewcache:entry:"
+INDEX_KEY = "reviewcache:index"
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8", errors="replace")).hexdigest()
+
+
+class ReviewCache:
+    """Redis-backed, TTL- and size-bounded cache of per-file review results."""
+
+    def __init__(self, redis, ttl_seconds: int = None, max_entries: int = None):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds or config.REVIEW_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or config.REVIEW_CACHE_MAX_ENTRIES
+
+    @staticmethod
+    def make_key(
+        file_diff: str,
+        full_file: str,
+        context: str,
+        model: str,
+        prompt_version: str,
+        custom_checks: Optional[Iterable[Any]] = None,
+    ) -> str:
+        parts = {
+            "diff": _digest(file_diff),
+            "file": _digest(full_file),
+            "context": _digest(context),
+            "model": model,
+            "prompt": prompt_version,
+            "checks": _digest(json.dumps(list(custom_checks or []), sort_keys=True, default=str)),
+        }
+        return _digest(json.dumps(parts, sort_keys=True))
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.redis:
+            return None
+        try:
+            raw = await self.redis.get(ENTRY_KEY_PREFIX + key)
+            if raw is None:
+                return None
+            await self.redis.zadd(INDEX_KEY, {key: time.time()})
+            return json.loads(raw)
+        except Exception as e:
+            logger.debug(f"Review cache read failed: {e}")
+            return None
+
+    async def set(self, key: str, result: Dict[str, Any]):
+        if not self.redis:
+            return
+        try:
+            now = time.time()
+            await self.redis.set(ENTRY_KEY_PREFIX + key, json.dumps(result), ex=self.ttl_seconds)
+            await self.redis.zadd(INDEX_KEY, {key: now})
+            await self._evict(now)
+        except Exception as e:
+            logger.debug(f"Review cache write failed: {e}")
+
+    async def _evict(self, now: float):
+        """Drop index entries past their TTL, then the least recently used beyond max_entries."""
+        await self.redis.zremrangebyscore(INDEX_KEY, "-inf", now - self.ttl_seconds)
+        overflow = await self.redis.zcard(INDEX_KEY) - self.max_entries
+        if overflow <= 0:
+            return
+        stale = await self.redis.zrange(INDEX_KEY, 0, overflow - 1)
+        if stale:
+            await self.redis.delete(*(ENTRY_KEY_PREFIX + k for k in stale))
+            await self.redis.zrem(INDEX_KEY, *stale)
+            logger.info(f"Review cache evicted {len(stale)} entries")
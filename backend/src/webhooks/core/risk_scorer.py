@@ -0,0 +1,203 @@
+"""
+Heuristic Risk Scorer
+=====================
+Local fast path for the review planner (Pass 1). Scores each changed file
+without an LLM call, using:
+  - path patterns (auth, payments, crypto, migrations, APIs, ...)
+  - file type (docs / lockfiles / assets are ignored, source is never ignored)
+  - diff size
+  - cyclomatic complexity of the changed functions (tree-sitter `CodeNode.complexity`,
+    or the same keyword estimate over the added lines when the file can't be parsed)
+  - security-sensitive APIs on added lines (eval, subprocess, pickle, raw SQL, ...)
+
+`heuristic_plan` returns a planner-shaped plan for small PRs whose files all
+land clearly on one side of the high-risk threshold, and None for large or
+ambiguous PRs, which still go to the LLM planner.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import config
+
+logger = logging.getLogger("agenticpr.risk_scorer")
+
+HIGH_RISK_SCORE = 4
+AMBIGUOUS_MARGIN = 1  # scores in [HIGH_RISK_SCORE - margin, HIGH_RISK_SCORE) go to the LLM
+
+SOURCE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".go", ".rs", ".rb", ".php",
+    ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".kt", ".swift", ".scala", ".sql", ".sh",
+}
+CONFIG_EXTENSIONS = {".yml", ".yaml", ".json", ".toml", ".ini", ".cfg", ".conf", ".env", ".xml", ".gradle"}
+MARKUP_EXTENSIONS = {".html", ".htm", ".css", ".scss", ".less", ".vue", ".svelte", ".jinja", ".j2"}
+CONFIG_NAMES = {"dockerfile", "makefile", "docker-compose.yml", "requirements.txt", "pyproject.toml", "setup.py"}
+IGNORE_EXTENSIONS = {
+    ".md", ".rst", ".txt", ".lock", ".svg", ".png", ".jpg", ".jpeg", ".gif", ".ico",
+    ".pdf", ".woff", ".woff2", ".ttf", ".snap",
+}
+IGNORE_NAMES = {
+    "readme", "changelog", "license", "licence", "authors", "contributors", "notice",
+    ".gitignore", ".gitattributes", ".dockerignore", ".editorconfig",
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "cargo.lock", "go.sum",
+}
+
+# (pattern over the lower-cased path, points, reason)
+PATH_RULES = [
+    (re.compile(r"auth|login|passw|secret|crypt|token|session|permission|oauth|jwt|acl|payment|billing"), 4, "security-sensitive path"),
+    (re.compile(r"migrat|schema|database|/db/|models?\b|sql|quer"), 2, "data layer"),
+    (re.compile(r"api|router|route|handler|middleware|webhook|endpoint|controller"), 2, "request handling"),
+]
+
+# (pattern over added lines, reason); each distinct hit adds SENSITIVE_API_POINTS
+SENSITIVE_APIS = [
+    (re.compile(r"\beval\s*\(|\bexec\s*\(|new Function\("), "dynamic code execution"),
+    (re.compile(r"subprocess\.|os\.system|os\.popen|child_process|Runtime\.getRuntime\(\)\.exec"), "shell/process execution"),
+    (re.compile(r"pickle\.loads?|yaml\.load\(|marshal\.loads|ObjectInputStream"), "unsafe deserialization"),
+    (re.compile(r"(execute|raw|query)\s*\(\s*f?[\"'].*(\{|%s|\+)", re.IGNORECASE), "raw SQL"),
+    (re.compile(r"innerHTML|dangerouslySetInnerHTML|document\.write|mark_safe|\|\s*safe\b"), "unescaped HTML"),
+    (re.compile(r"verify\s*=\s*False|ssl\._create_unverified|InsecureSkipVerify|rejectUnauthorized:\s*false"), "TLS verification disabled"),
+    (re.compile(r"\b(md5|sha1)\s*\(|hashlib\.(md5|sha1)|Math\.random\(\)|random\.(random|randint|choice)\("), "weak crypto/randomness"),
+    (re.compile(r"(api_key|apikey|secret|password|token)\s*[:=]\s*[\"'][^\"']{6,}", re.IGNORECASE), "hard-coded credential"),
+    (re.compile(r"chmod\s*\(.*0?o?777|shutil\.rmtree|os\.remove|unlink\("), "filesystem mutation"),
+]
+SENSITIVE_API_POINTS = 4
+
+
+@dataclass
+class FileRisk:
+    filename: str
+    score: int = 0
+    ignore: bool = False
+    source: bool = False
+    known_type: bool = True
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def high_risk(self) -> bool:
+        return not self.ignore and self.score >= HIGH_RISK_SCORE
+
+    @property
+    def ambiguous(self) -> bool:
+        if not self.known_type:
+            return True
+        return not self.ignore and HIGH_RISK_SCORE - AMBIGUOUS_MARGIN <= self.score < HIGH_RISK_SCORE
+
+
+# ─── File Classification ──────────────────────────────────────────────────────
+
+def _classify(filename: str) -> str:
+    """'source', 'config', 'markup', 'ignore' or 'unknown'."""
+    base = os.path.basename(filename).lower()
+    stem, ext = os.path.splitext(base)
+    if ext in SOURCE_EXTENSIONS:
+        return "source"
+    if base in IGNORE_NAMES or stem in IGNORE_NAMES or ext in IGNORE_EXTENSIONS or filename.lower().startswith("docs/"):
+        return "ignore"
+    if ext in MARKUP_EXTENSIONS:
+        return "markup"
+    if base in CONFIG_NAMES or ext in CONFIG_EXTENSIONS or base.startswith(".env"):
+        return "config"
+    return "unknown"
+
+
+def _added_code(patch: str) -> str:
+    return "\n".join(
+        line[1:] for line in (patch or "").splitlines()
+        if line.startswith("+") and not line.startswith("+++")
+    )
+
+
+def _changed_complexity(filename: str, content: str, added: str, changed_lines: List[int]) -> int:
+    """Highest complexity among the functions the diff touches (0 if unknown)."""
+    try:
+        from core.indexing.parser import UniversalParser, _estimate_complexity
+    except Exception:
+        return 0  # tree-sitter not installed
+    language = UniversalParser.detect_language(filename)
+    if not language:
+        return 0
+    if content and changed_lines:
+        try:
+            nodes = UniversalParser().parse_code(content, filename)
+            touched = [
+                n.complexity for n in nodes
+                if n.type != "class" and any(n.start_line <= line <= n.end_line for line in changed_lines)
+            ]
+            if touched:
+                return max(touched)
+        except Exception as e:
+            logger.debug(f"Could not parse {filename} for complexity: {e}")
+    return _estimate_complexity(added, language) if added else 0
+
+
+# ─── Scoring ──────────────────────────────────────────────────────────────────
+
+def score_file(f: Dict[str, Any]) -> FileRisk:
+    """
+    Score one planner file entry: {"filename", "patch", "additions", "deletions"},
+    optionally "content" (the full new file) and "changed_lines" (added line numbers).
+    """
+    filename = f.get("filename") or ""
+    kind = _classify(filename)
+    risk = FileRisk(filename=filename, source=kind == "source", known_type=kind != "unknown")
+    if kind == "ignore":
+        risk.ignore = True
+        risk.reasons.append("docs/lockfile/asset")
+        return risk
+
+    path = filename.lower()
+    for pattern, points, reason in PATH_RULES:
+        if pattern.search(path):
+            risk.score += points
+            risk.reasons.append(reason)
+
+    added = _added_code(f.get("patch", ""))
+    for pattern, reason in SENSITIVE_APIS:
+        if pattern.search(added):
+            risk.score += SENSITIVE_API_POINTS
+            risk.reasons.append(reason)
+
+    changed = f.get("additions", 0) + f.get("deletions", 0)
+    if changed >= 200:
+        risk.score += 2
+        risk.reasons.append(f"{changed} lines changed")
+    elif changed >= 50:
+        risk.score += 1
+
+    if risk.source:
+        complexity = _changed_complexity(filename, f.get("content", ""), added, f.get("changed_lines") or [])
+        if complexity >= 15:
+            risk.score += 2
+            risk.reasons.append(f"complexity {complexity}")
+        elif complexity >= 8:
+            risk.score += 1
+    return risk
+
+
+def heuristic_plan(pr_files: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """A planner plan decided locally, or None when the LLM planner should decide."""
+    if not pr_files or len(pr_files) > config.PLANNER_FAST_PATH_MAX_FILES:
+        return None
+    total = sum(f.get("additions", 0) + f.get("deletions", 0) for f in pr_files)
+    if total > config.PLANNER_FAST_PATH_MAX_LINES:
+        return None
+
+    risks = [score_file(f) for f in pr_files]
+    ambiguous = [r.filename for r in risks if r.ambiguous]
+    if ambiguous:
+        logger.info(f"Risk scorer: ambiguous files {ambiguous}, deferring to the LLM planner")
+        return None
+
+    high_risk = [r for r in risks if r.high_risk]
+    focus = "; ".join(f"{r.filename}: {', '.join(r.reasons)}" for r in high_risk)
+    return {
+        "review_strategy": "focus_on_critical" if high_risk else "broad_review",
+        "high_risk_files": [r.filename for r in high_risk],
+        "ignore_files": [r.filename for r in risks if r.ignore],
+        "focus_instructions": f"Check these risk signals closely: {focus}." if focus else "",
+        "planner": "heuristic",
+    }
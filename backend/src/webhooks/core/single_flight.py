@@ -0,0 +1,125 @@
+"""
+Single-Flight LLM Requests
+==========================
+Coalesces identical concurrent LLM requests, e.g. two jobs reviewing the
+same commit (a manual re-run racing the webhook, or a reclaimed duplicate)
+that would otherwise send the same per-file prompt to the provider twice.
+
+The first caller for a request key leads and makes the provider call;
+identical callers arriving while it is in flight wait for its reply instead.
+If the leader fails (empty reply, error, cancellation) one waiter takes
+over, so coalescing never turns one failure into many.
+
+In process this is a future per key. With LLM_SINGLE_FLIGHT_SHARED the
+leader also holds a Redis lock (`llm:flight:<key>:lock`) and publishes its
+reply to `llm:flight:<key>:result` (kept LLM_SINGLE_FLIGHT_RESULT_TTL
+seconds), so leaders in other worker processes are joined too.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from config import config
+
+logger = logging.getLogger("agenticpr.single_flight")
+
+FLIGHT_PREFIX = "llm:flight"
+
+# Between checks for another process's reply
+REMOTE_POLL_SECONDS = 0.25
+
+
+def request_key(model: str, messages: list, temperature: float, max_tokens: Optional[int], response_format: Optional[dict]) -> str:
+    """Stable hash of everything that determines the reply."""
+    payload = json.dumps([model, messages, temperature, max_tokens, response_format], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._local: Dict[str, asyncio.Future] = {}
+        self._remote_locks: set = set()  # keys whose Redis lock this process holds
+        self._redis = None
+        self.stats = {"led": 0, "coalesced": 0}
+
+    def attach_redis(self, redis):
+        """Coalesce across processes too (no-op unless LLM_SINGLE_FLIGHT_SHARED)."""
+        if config.LLM_SINGLE_FLIGHT_SHARED and redis is not None:
+            self._redis = redis
+
+    async def join(self, key: str) -> Optional[str]:
+        """
+        The reply of an identical request already in flight, or None: the
+        caller is then the leader, makes the call itself and must call
+        `finish(key, reply)` afterwards, whatever the outcome.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            future = self._local.get(key)
+            if future is None or future.get_loop() is not loop:
+                break
+            reply = await asyncio.shield(future)
+            if reply:
+                self.stats["coalesced"] += 1
+                return reply
+            # the leader failed; the first waiter back here leads the retry
+
+        self._local[key] = loop.create_future()
+        if self._redis is not None:
+            reply = await self._join_remote(key)
+            if reply:
+                self.stats["coalesced"] += 1
+                self._resolve(key, reply)
+                return reply
+        self.stats["led"] += 1
+        return None
+
+    async def finish(self, key: str, reply: str):
+        """Hand the leader's reply ("" on failure) to everyone waiting on `key`."""
+        self._resolve(key, reply)
+        if key not in self._remote_locks:
+            return
+        self._remote_locks.discard(key)
+        try:
+            if reply:
+                await self._redis.set(f"{FLIGHT_PREFIX}:{key}:result", reply, ex=config.LLM_SINGLE_FLIGHT_RESULT_TTL)
+            await self._redis.delete(f"{FLIGHT_PREFIX}:{key}:lock")
+        except Exception as e:
+            logger.debug(f"Single-flight publish failed: {e}")
+
+    def _resolve(self, key: str, reply: str):
+        future = self._local.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(reply or "")
+
+    async def _join_remote(self, key: str) -> Optional[str]:
+        """Another process's reply, or None once this process holds the lock (or gave up waiting)."""
+        lock, result = f"{FLIGHT_PREFIX}:{key}:lock", f"{FLIGHT_PREFIX}:{key}:result"
+        deadline = time.monotonic() + config.LLM_SINGLE_FLIGHT_WAIT
+        try:
+            while time.monotonic() < deadline:
+                reply = await self._redis.get(result)
+                if reply:
+                    return reply.decode() if isinstance(reply, bytes) else reply
+                if await self._redis.set(lock, "1", nx=True, ex=int(config.LLM_SINGLE_FLIGHT_WAIT)):
+                    self._remote_locks.add(key)
+                    return None
+                await asyncio.sleep(REMOTE_POLL_SECONDS)
+        except Exception as e:
+            logger.debug(f"Single-flight lock failed, calling the provider directly: {e}")
+        return None
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    """The process-wide instance, created on first use."""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,156 @@
+"""
+Token Budget
+============
+Sizes review prompts in tokens instead of fixed character cutoffs.
+
+  - `MODEL_LIMITS` knows the context window and output limit of the models
+    the fallback chain uses; since any provider in the chain may end up
+    answering, a prompt is sized for the smallest window (`chain_limits`)
+  - `TokenBudget` measures every prompt section once and hands out the input
+    budget (window − reserved output − fixed prompt text, capped at
+    REVIEW_PROMPT_MAX_TOKENS) in priority order: a section that does not fit
+    is truncated to what is left, and everything after it is dropped
+  - `output_budget` sets a review's max_tokens from the diff size and risk,
+    so trivial files cannot run up long replies
+
+Counting uses tiktoken's cl100k_base encoding when available (close enough
+for every provider in the chain), else ~4 characters per token.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import config
+
+TRUNCATION_MARKER = "\n... [truncated]"
+CHARS_PER_TOKEN = 4
+
+
+# ─── Model Limits ─────────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class ModelLimits:
+    context_window: int
+    max_output: int
+
+
+# Matched as prefixes of the configured model name, longest first
+MODEL_LIMITS: Dict[str, ModelLimits] = {
+    # Groq
+    "openai/gpt-oss-120b": ModelLimits(131072, 65536),
+    "openai/gpt-oss-20b": ModelLimits(131072, 65536),
+    "llama-3.3-70b-versatile": ModelLimits(131072, 32768),
+    "llama-3.1-8b-instant": ModelLimits(131072, 131072),
+    "qwen/qwen3-32b": ModelLimits(131072, 40960),
+    # Gemini
+    "gemini-1.5": ModelLimits(1048576, 8192),
+    "gemini-2.0": ModelLimits(1048576, 8192),
+    "gemini-2.5": ModelLimits(1048576, 65536),
+    "gemini-3": ModelLimits(1048576, 65536),
+    # OpenRouter
+    "meta-llama/llama-3.1-405b-instruct": ModelLimits(131072, 4096),
+    "meta-llama/llama-3.3-70b-instruct": ModelLimits(131072, 4096),
+    "provider-5/gpt-oss-20b": ModelLimits(131072, 32768),
+}
+
+# Unknown models get a conservative window
+DEFAULT_LIMITS = ModelLimits(32768, 4096)
+
+
+def limits_for(model: str) -> ModelLimits:
+    name = (model or "").split(":", 1)[0]  # drop OpenRouter variants like ":free"
+    for prefix in sorted(MODEL_LIMITS, key=len, reverse=True):
+        if name.startswith(prefix):
+            return MODEL_LIMITS[prefix]
+    return DEFAULT_LIMITS
+
+
+def chain_limits(models: Iterable[Optional[str]]) -> ModelLimits:
+    """Limits every model in a fallback chain can honour."""
+    limits = [limits_for(m) for m in models if isinstance(m, str) and m]
+    if not limits:
+        return DEFAULT_LIMITS
+    return ModelLimits(
+        context_window=min(lim.context_window for lim in limits),
+        max_output=min(lim.max_output for lim in limits),
+    )
+
+
+# ─── Counting ─────────────────────────────────────────────────────────────────
+
+_encoding = None
+_encoding_checked = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_checked
+    if not _encoding_checked:
+        _encoding_checked = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = TRUNCATION_MARKER, tokens: int = None) -> str:
+    """Cut `text` to at most `max_tokens` tokens (marker included), or "" if nothing fits."""
+    if (count_tokens(text) if tokens is None else tokens) <= max_tokens:
+        return text
+    room = max_tokens - count_tokens(marker)
+    if room <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:room * CHARS_PER_TOKEN] + marker
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:room]) + marker
+
+
+# ─── Allocation ───────────────────────────────────────────────────────────────
+
+class TokenBudget:
+    """Input budget for one prompt, handed out to sections by priority."""
+
+    def __init__(self, limits: ModelLimits, fixed_tokens: int = 0, output_tokens: int = None, max_prompt_tokens: int = None):
+        self.limits = limits
+        self.output_tokens = min(output_tokens or config.REVIEW_OUTPUT_TOKENS, limits.max_output)
+        max_prompt_tokens = max_prompt_tokens or config.REVIEW_PROMPT_MAX_TOKENS
+        # Tokenizers differ between providers; keep 5% of the window spare
+        window_room = int(limits.context_window * 0.95) - self.output_tokens
+        self.total = max(0, min(window_room, max_prompt_tokens) - fixed_tokens)
+
+    def allocate(self, sections: List[Tuple[str, str]]) -> Dict[str, str]:
+        """
+        `sections` are (name, text) pairs, highest priority first. Returns the
+        text each section keeps: whole while it fits, truncated for the first
+        one that doesn't, "" after that.
+        """
+        remaining = self.total
+        allocated = {}
+        for name, text in sections:
+            tokens = count_tokens(text)
+            if tokens <= remaining:
+                allocated[name] = text
+                remaining -= tokens
+            else:
+                allocated[name] = truncate_to_tokens(text, remaining, tokens=tokens)
+                remaining = 0
+        return allocated
+
+
+def output_budget(changed_lines: int, high_risk: bool, limits: ModelLimits) -> int:
+    """max_tokens for one file's review, capped by REVIEW_OUTPUT_TOKENS and the model's output limit."""
+    tokens = config.REVIEW_OUTPUT_MIN_TOKENS + changed_lines * config.REVIEW_OUTPUT_TOKENS_PER_LINE
+    if high_risk:
+        tokens *= config.REVIEW_OUTPUT_HIGH_RISK_FACTOR
+    return int(min(tokens, config.REVIEW_OUTPUT_TOKENS, limits.max_output))
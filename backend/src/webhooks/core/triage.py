@@ -0,0 +1,243 @@
+"""
+Review Triage
+=============
+Two-tier cascade in front of the APEX deep review. Each file diff is
+classified clean / suspicious before its deep-review request:
+
+  1. local heuristics (core.risk_scorer): planner high-risk files and files
+     scoring at or above `min_risk_score` are always suspicious
+  2. the rest go to a cheap, fast model in one batched request
+     (`mode: model`), or are taken as clean outright (`mode: heuristic`)
+
+Only suspicious files get the deep-review prompt. Anything the cheap model
+does not answer, or calls clean with less than `min_clean_confidence`, is
+treated as suspicious, and any triage failure falls back to deep-reviewing
+everything.
+
+Per-repo overrides live under `triage:` in `.pr-reviewer.yml`:
+
+    triage:
+      enabled: false
+      mode: heuristic        # or "model"
+      min_risk_score: 3
+      min_clean_confidence: 0.9
+
+The file is read from the PR's own head, which the PR author controls, so
+it can only tighten the service defaults (config.TRIAGE_*): turn triage
+off, switch to `heuristic`, lower `min_risk_score` or raise
+`min_clean_confidence`. Anything looser is ignored.
+
+Each job's outcome and estimated savings (deep-review tokens and LLM seconds
+avoided vs. what triage cost) are returned in the review stats and stored as
+the job's "triage" AgentResult.
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import config
+from core.json_repair import parse_llm_json
+from core.risk_scorer import score_file
+from core.token_budget import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger("agenticpr.triage")
+
+TRIAGE_AGENT = "triage"
+MODES = ("model", "heuristic")
+
+TRIAGE_SYSTEM_PROMPT = """You triage pull request diffs before an expensive code review.
+For each file, answer "suspicious" if the change could plausibly contain a bug, security
+issue, performance problem or broken behaviour, and "clean" only if it is obviously safe
+(renames, formatting, comments, docs, trivial constants, straightforward tests).
+When unsure, answer "suspicious".
+Return ONLY JSON: {"files": [{"path": "...", "verdict": "clean" | "suspicious", "confidence": 0.0-1.0, "reason": "..."}]}"""
+
+
+@dataclass
+class TriageSettings:
+    enabled: bool = False
+    mode: str = "model"
+    min_risk_score: int = 4
+    min_clean_confidence: float = 0.8
+
+    @classmethod
+    def from_repo_config(cls, repo_config: Optional[Dict[str, Any]] = None) -> "TriageSettings":
+        """Service defaults (config.TRIAGE_*), tightened (never loosened) by the repo's `triage:` block."""
+        settings = cls(
+            enabled=config.TRIAGE_ENABLED,
+            mode=config.TRIAGE_MODE,
+            min_risk_score=config.TRIAGE_MIN_RISK_SCORE,
+            min_clean_confidence=config.TRIAGE_MIN_CLEAN_CONFIDENCE,
+        )
+        if settings.mode not in MODES:
+            logger.warning(f"Unknown triage mode {settings.mode!r}, using 'model'")
+            settings.mode = "model"
+        overrides = (repo_config or {}).get("triage")
+        if isinstance(overrides, bool):
+            overrides = {"enabled": overrides}
+        if isinstance(overrides, dict):
+            try:
+                settings.enabled = settings.enabled and bool(overrides.get("enabled", True))
+                if overrides.get("mode") == "heuristic":
+                    settings.mode = "heuristic"
+                settings.min_risk_score = min(settings.min_risk_score, int(overrides.get("min_risk_score", settings.min_risk_score)))
+                settings.min_clean_confidence = max(
+                    settings.min_clean_confidence,
+                    float(overrides.get("min_clean_confidence", settings.min_clean_confidence)),
+                )
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Ignoring invalid triage settings in .pr-reviewer.yml: {e}")
+        return settings
+
+
+def load_triage_settings(workspace_dir: Optional[str]) -> TriageSettings:
+    """Triage settings for a job, reading `.pr-reviewer.yml` from its checkout if present."""
+    repo_config = None
+    path = os.path.join(workspace_dir, ".pr-reviewer.yml") if workspace_dir else None
+    if path and os.path.isfile(path):
+        try:
+            import yaml
+            with open(path, "r", encoding="utf-8") as f:
+                repo_config = yaml.safe_load(f) or {}
+        except Exception as e:
+            logger.warning(f"Could not read {path}: {e}")
+    return TriageSettings.from_repo_config(repo_config if isinstance(repo_config, dict) else None)
+
+
+@dataclass
+class TriageFile:
+    filepath: str
+    diff: str  # redacted diff sent to the cheap model
+    additions: int = 0
+    deletions: int = 0
+    high_risk: bool = False  # flagged by the planner
+
+
+@dataclass
+class TriageResult:
+    clean: Dict[str, str] = field(default_factory=dict)  # filepath -> reason
+    suspicious: List[str] = field(default_factory=list)
+    mode: str = "model"
+    model_files: int = 0  # files sent to the cheap model
+    tokens: int = 0  # cheap-model prompt + reply tokens
+    seconds: float = 0.0
+    deep_tokens_avoided: int = 0  # prompt tokens of the skipped deep reviews (set by the reviewer)
+
+    def stats(self, seconds_per_file: Optional[float]) -> Dict[str, Any]:
+        """
+        Per-job record: what triage cost vs. the deep reviews it skipped.
+        Seconds avoided are estimated from this job's mean deep-review time per file.
+        """
+        seconds_avoided = round(seconds_per_file * len(self.clean), 2) if seconds_per_file is not None else None
+        return {
+            "mode": self.mode,
+            "clean_files": sorted(self.clean),
+            "suspicious_files": len(self.suspicious),
+            "model_files": self.model_files,
+            "triage_tokens": self.tokens,
+            "triage_seconds": round(self.seconds, 2),
+            "deep_tokens_avoided": self.deep_tokens_avoided,
+            "deep_seconds_avoided": seconds_avoided,
+            "net_tokens_saved": self.deep_tokens_avoided - self.tokens,
+        }
+
+
+# ─── Cheap Model ──────────────────────────────────────────────────────────────
+
+def cheap_llm(llm):
+    """A copy of the review LLM service pointed at the triage models (same clients and fallback chain)."""
+    if not hasattr(llm, "groq_model"):
+        return llm  # not an AsyncLLMService (tests, custom services): use as is
+    from core.async_llm import AsyncLLMService
+
+    triage = AsyncLLMService(
+        clients=getattr(llm, "_clients", None),
+        router=getattr(llm, "_router", None),
+        limiter=getattr(llm, "_limiter", None),
+        flights=getattr(llm, "_flights", None),
+    )
+    triage.groq_model = config.TRIAGE_GROQ_MODEL
+    triage.gemini_model = config.TRIAGE_GEMINI_MODEL
+    triage.openrouter_model = config.TRIAGE_OPENROUTER_MODEL
+    return triage
+
+
+def _triage_prompt(files: List[TriageFile], pr_title: str) -> str:
+    per_file = max(100, config.TRIAGE_PROMPT_TOKENS // max(1, len(files)))
+    sections = [
+        f"### {f.filepath} (+{f.additions}/-{f.deletions})\n```diff\n{truncate_to_tokens(f.diff, per_file)}\n```"
+        for f in files
+    ]
+    return f"PR: {pr_title}\n\n" + "\n\n".join(sections)
+
+
+# ─── Classification ───────────────────────────────────────────────────────────
+
+async def triage_files(files: List[TriageFile], settings: TriageSettings, llm, pr_title: str = "") -> TriageResult:
+    """
+    Split `files` into clean and suspicious. Never raises: on failure every
+    file is suspicious.
+    """
+    result = TriageResult(mode=settings.mode)
+    undecided = []
+    for f in files:
+        risk = score_file({"filename": f.filepath, "patch": f.diff, "additions": f.additions, "deletions": f.deletions})
+        if f.high_risk or risk.score >= settings.min_risk_score:
+            result.suspicious.append(f.filepath)
+        else:
+            undecided.append(f)
+
+    if settings.mode == "heuristic":
+        for f in undecided:
+            result.clean[f.filepath] = "no risk signals"
+        return result
+    if not undecided:
+        return result
+
+    result.model_files = len(undecided)
+    prompt = _triage_prompt(undecided, pr_title)
+    started = time.monotonic()
+    verdicts: Dict[str, Dict[str, Any]] = {}
+    try:
+        reply = await cheap_llm(llm).chat(
+            messages=[{"role": "system", "content": TRIAGE_SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+            temperature=0.0,
+            max_tokens=config.TRIAGE_OUTPUT_TOKENS,
+            response_format={"type": "json_object"},
+        )
+        result.tokens = count_tokens(TRIAGE_SYSTEM_PROMPT) + count_tokens(prompt) + count_tokens(reply or "")
+        for entry in parse_llm_json(reply or "", source="triage").get("files", []):
+            if isinstance(entry, dict) and entry.get("path"):
+                verdicts[entry["path"]] = entry
+    except Exception as e:
+        logger.warning(f"Triage model failed, deep-reviewing all files: {e}")
+    result.seconds = time.monotonic() - started
+
+    for f in undecided:
+        verdict = verdicts.get(f.filepath, {})
+        try:
+            confidence = float(verdict.get("confidence", 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if verdict.get("verdict") == "clean" and confidence >= settings.min_clean_confidence:
+            result.clean[f.filepath] = str(verdict.get("reason") or "triaged clean")
+        else:
+            result.suspicious.append(f.filepath)
+    return result
+
+
+async def save_triage_stats(db_session_factory, job_id: int, stats: Dict[str, Any]):
+    """Store (or replace, on retry) a job's triage outcome and savings as its "triage" AgentResult."""
+    from sqlalchemy import delete
+    from models import AgentResult
+
+    async with db_session_factory() as session:
+        await session.execute(
+            delete(AgentResult).where(AgentResult.job_id == job_id, AgentResult.agent_name == TRIAGE_AGENT)
+        )
+        session.add(AgentResult(job_id=job_id, agent_name=TRIAGE_AGENT, output_json=json.dumps(stats)))
+        await session.commit()
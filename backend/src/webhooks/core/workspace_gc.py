@@ -0,0 +1,424 @@
+"""
+Workspace & Mirror Garbage Collector
+====================================
+Keeps `workspaces/` bounded on worker hosts.
+
+  - Run dirs (`workspaces/runs/<job_id>`) are normally removed by the publish
+    stage. Jobs that fail, get superseded or land in the DLQ never reach it,
+    so their clones leak. The GC removes any run dir whose job is terminal
+    (or no longer exists).
+  - Mirrors (`workspaces/mirrors/<owner>/<repo>.git`) are evicted LRU by last
+    fetch time (largest first among equally stale mirrors) once the disk
+    crosses the high-water mark, or when they have been idle too long.
+  - Hot mirrors get periodic `git maintenance run --auto` (falling back to
+    `git gc --auto`) so packfiles stay compact and fetches stay fast.
+
+Mirrors used by an active job are never evicted: run dirs are cloned with
+`--reference`, so deleting the mirror would break them mid-review. Eviction
+and maintenance also take the MirrorCache repo lock (without waiting), so a
+mirror being fetched or cloned right now is left for the next cycle.
+"""
+
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Set
+
+from config import config
+
+logger = logging.getLogger("agenticpr.gc")
+
+LAST_FETCH_MARKER = "agenticpr-last-fetch"
+LAST_MAINTENANCE_MARKER = "agenticpr-last-maintenance"
+GC_LOCK_KEY = "gc:workspaces:lock"
+GC_LOCK_TTL = 120  # renewed every GC_LOCK_TTL / 3 while a cycle runs
+MAINTENANCE_TIMEOUT = 600
+
+
+# ─── Workspace Layout ─────────────────────────────────────────────────────────
+
+def workspaces_root() -> str:
+    return os.path.join(os.getcwd(), "workspaces")
+
+
+def mirrors_root() -> str:
+    return os.path.join(workspaces_root(), "mirrors")
+
+
+def runs_root() -> str:
+    return os.path.join(workspaces_root(), "runs")
+
+
+def mirror_dir_for(repo_full_name: str) -> str:
+    return os.path.join(mirrors_root(), repo_full_name.replace("/", os.sep) + ".git")
+
+
+def run_dir_for(job_id: int) -> str:
+    return os.path.join(runs_root(), str(job_id))
+
+
+def mark_mirror_fetched(mirror_dir: str):
+    """Record the time of the last successful clone/fetch of a mirror."""
+    _write_marker(os.path.join(mirror_dir, LAST_FETCH_MARKER))
+
+
+def mirror_last_fetch(mirror_dir: str) -> float:
+    """Last fetch time of a mirror (falls back to the directory mtime)."""
+    return _read_marker(os.path.join(mirror_dir, LAST_FETCH_MARKER), mirror_dir)
+
+
+def _write_marker(path: str):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(str(time.time()))
+    except OSError as e:
+        logger.debug(f"Could not write marker {path}: {e}")
+
+
+def _read_timestamp(path: str) -> float:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return float(f.read().strip())
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _read_marker(path: str, fallback_dir: str) -> float:
+    return _read_timestamp(path) or _safe_mtime(fallback_dir)
+
+
+def dir_size(path: str) -> int:
+    """Total size in bytes of all files under `path` (symlinks not followed)."""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+# ─── Eviction Policy ──────────────────────────────────────────────────────────
+
+@dataclass
+class MirrorInfo:
+    """A cached bare mirror on disk."""
+
+    repo_full_name: str
+    path: str
+    size_bytes: int
+    last_fetch: float
+    last_maintenance: float = 0.0
+
+
+def select_mirrors_to_evict(
+    mirrors: List[MirrorInfo],
+    bytes_to_free: int,
+    now: float,
+    max_idle_seconds: float,
+    protected: Set[str],
+) -> List[MirrorInfo]:
+    """
+    Pick mirrors to delete.
+
+    Mirrors idle longer than `max_idle_seconds` are always evicted. After that,
+    the least recently fetched mirrors (largest first on ties) are evicted
+    until `bytes_to_free` is covered. Mirrors in `protected` are never chosen.
+    """
+    candidates = [m for m in mirrors if m.repo_full_name not in protected]
+    candidates.sort(key=lambda m: (m.last_fetch, -m.size_bytes))
+
+    evicted = []
+    freed = 0
+    for m in candidates:
+        idle_too_long = max_idle_seconds > 0 and now - m.last_fetch > max_idle_seconds
+        if idle_too_long or freed < bytes_to_free:
+            evicted.append(m)
+            freed += m.size_bytes
+    return evicted
+
+
+# ─── Collector ────────────────────────────────────────────────────────────────
+
+class WorkspaceGC:
+    """Periodic garbage collector for run dirs and repo mirrors."""
+
+    def __init__(self, db_session_factory, redis=None):
+        self.db_session_factory = db_session_factory
+        self.redis = redis
+        self.interval = config.GC_INTERVAL_SECONDS
+        self.high_water = config.WORKSPACE_DISK_HIGH_WATER
+        self.low_water = config.WORKSPACE_DISK_LOW_WATER
+        self.max_bytes = config.WORKSPACE_MAX_BYTES
+        self.max_idle_seconds = config.MIRROR_MAX_IDLE_DAYS * 86400
+        self.run_grace_seconds = config.GC_RUN_GRACE_SECONDS
+        self.hot_window_seconds = config.GC_HOT_MIRROR_HOURS * 3600
+        self.maintenance_interval = config.GC_MAINTENANCE_INTERVAL_HOURS * 3600
+        self._running = False
+        self._stop_event = asyncio.Event()
+        self._lock_token = uuid.uuid4().hex
+
+    async def start(self):
+        """Run GC cycles until stopped."""
+        self._running = True
+        self._stop_event.clear()
+        logger.info(f"Workspace GC started (interval={self.interval}s, high_water={self.high_water:.0%})")
+        while self._running:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"GC cycle failed: {e}")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._running = False
+        self._stop_event.set()
+        logger.info("Workspace GC stopping")
+
+    async def run_once(self) -> Dict[str, int]:
+        """Run a single GC cycle. Returns counters for logging/tests."""
+        stats = {"runs_removed": 0, "mirrors_evicted": 0, "bytes_freed": 0, "mirrors_maintained": 0}
+
+        if not await self._acquire_lock():
+            logger.debug("Another process holds the GC lock — skipping cycle")
+            return stats
+
+        from core.mirror_cache import MirrorCache
+        cache = MirrorCache(self.redis)
+        renewal = asyncio.create_task(self._renew_lock()) if self.redis else None
+        try:
+            active_jobs, active_repos = await self._load_job_states()
+
+            # --- 1. Orphaned run dirs ---
+            for job_id, path in self._list_run_dirs():
+                if job_id in active_jobs:
+                    continue
+                if time.time() - _safe_mtime(path) < self.run_grace_seconds:
+                    continue
+                size = await asyncio.to_thread(dir_size, path)
+                if await asyncio.to_thread(_remove_tree, path):
+                    stats["runs_removed"] += 1
+                    stats["bytes_freed"] += size
+                    logger.info(f"[gc] Removed orphaned run dir for job {job_id} ({size // 1024} KiB)")
+
+            # --- 2. Mirror eviction (LRU + idle expiry) ---
+            mirrors = await asyncio.to_thread(self._scan_mirrors)
+            bytes_to_free = await asyncio.to_thread(self._bytes_over_quota, mirrors)
+            now = time.time()
+            for m in select_mirrors_to_evict(
+                mirrors, bytes_to_free, now, self.max_idle_seconds, active_repos
+            ):
+                async with cache.try_lock(m.repo_full_name) as locked:
+                    if not locked:
+                        logger.debug(f"[gc] {m.repo_full_name} is being fetched — not evicting it this cycle")
+                        continue
+                    if mirror_last_fetch(m.path) > m.last_fetch:
+                        continue  # fetched since the scan
+                    removed = await asyncio.to_thread(_remove_tree, m.path)
+                if removed:
+                    stats["mirrors_evicted"] += 1
+                    stats["bytes_freed"] += m.size_bytes
+                    logger.info(
+                        f"[gc] Evicted mirror {m.repo_full_name} "
+                        f"({m.size_bytes // (1024 * 1024)} MiB, idle {int(now - m.last_fetch)}s)"
+                    )
+                    mirrors.remove(m)
+                    await self._forget_mirror(m.repo_full_name)
+
+            # --- 3. Maintenance on hot mirrors ---
+            for m in mirrors:
+                if now - m.last_fetch > self.hot_window_seconds:
+                    continue
+                if now - m.last_maintenance < self.maintenance_interval:
+                    continue
+                if m.repo_full_name in active_repos:
+                    continue
+                async with cache.try_lock(m.repo_full_name, ttl=MAINTENANCE_TIMEOUT + 30) as locked:
+                    if not locked:
+                        logger.debug(f"[gc] {m.repo_full_name} is being fetched — skipping maintenance")
+                        continue
+                    maintained = await self._maintain_mirror(m)
+                if maintained:
+                    stats["mirrors_maintained"] += 1
+        finally:
+            if renewal:
+                renewal.cancel()
+            await self._release_lock()
+
+        if any(stats.values()):
+            logger.info(f"[gc] Cycle complete: {stats}")
+        return stats
+
+    # ─── Job state ────────────────────────────────────────────
+
+    async def _load_job_states(self):
+        """
+        Return (active job ids among run dirs, repos with any active job).
+        Run dirs whose job is terminal or no longer exists are orphans.
+        """
+        from sqlmodel import select
+        from models import Job, JobStatus
+
+        run_ids = [job_id for job_id, _ in self._list_run_dirs()]
+        active_jobs: Set[int] = set()
+        terminal_statuses = {
+            JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.SUPERSEDED, JobStatus.CANCELED,
+        }
+
+        async with self.db_session_factory() as session:
+            if run_ids:
+                result = await session.execute(select(Job.id, Job.status).where(Job.id.in_(run_ids)))
+                for job_id, status in result.all():
+                    if status not in terminal_statuses:
+                        active_jobs.add(job_id)
+
+            result = await session.execute(
+                select(Job.repo_full_name).where(Job.status.notin_(list(terminal_statuses)))
+            )
+            active_repos = set(result.scalars().all())
+
+        return active_jobs, active_repos
+
+    # ─── Disk scanning ────────────────────────────────────────
+
+    def _list_run_dirs(self):
+        root = runs_root()
+        if not os.path.isdir(root):
+            return []
+        runs = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.isdigit() and os.path.isdir(path):
+                runs.append((int(name), path))
+        return runs
+
+    def _scan_mirrors(self) -> List[MirrorInfo]:
+        root = mirrors_root()
+        mirrors = []
+        if not os.path.isdir(root):
+            return mirrors
+        for owner in os.listdir(root):
+            owner_dir = os.path.join(root, owner)
+            if not os.path.isdir(owner_dir):
+                continue
+            for name in os.listdir(owner_dir):
+                path = os.path.join(owner_dir, name)
+                if not (name.endswith(".git") and os.path.isdir(path)):
+                    continue
+                mirrors.append(MirrorInfo(
+                    repo_full_name=f"{owner}/{name[:-4]}",
+                    path=path,
+                    size_bytes=dir_size(path),
+                    last_fetch=mirror_last_fetch(path),
+                    last_maintenance=_read_timestamp(os.path.join(path, LAST_MAINTENANCE_MARKER)),
+                ))
+        return mirrors
+
+    def _bytes_over_quota(self, mirrors: List[MirrorInfo]) -> int:
+        """Bytes that must be freed to get back under the low-water mark / quota."""
+        over = 0
+        root = workspaces_root()
+        if os.path.isdir(root):
+            usage = shutil.disk_usage(root)
+            if usage.total and usage.used / usage.total >= self.high_water:
+                over = int(usage.used - usage.total * self.low_water)
+
+        if self.max_bytes > 0:
+            mirror_bytes = sum(m.size_bytes for m in mirrors)
+            run_bytes = sum(dir_size(p) for _, p in self._list_run_dirs())
+            total = mirror_bytes + run_bytes
+            if total >= self.max_bytes * self.high_water:
+                over = max(over, int(total - self.max_bytes * self.low_water))
+
+        return max(over, 0)
+
+    # ─── Maintenance ──────────────────────────────────────────
+
+    async def _maintain_mirror(self, mirror: MirrorInfo) -> bool:
+        """Run `git maintenance run --auto`, falling back to `git gc --auto` on older git."""
+        for cmd in (["git", "maintenance", "run", "--auto"], ["git", "gc", "--auto", "--quiet"]):
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    cwd=mirror.path,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                await asyncio.wait_for(proc.wait(), timeout=MAINTENANCE_TIMEOUT)
+                if proc.returncode == 0:
+                    _write_marker(os.path.join(mirror.path, LAST_MAINTENANCE_MARKER))
+                    logger.info(f"[gc] Ran `{' '.join(cmd[1:3])}` on {mirror.repo_full_name}")
+                    return True
+            except Exception as e:
+                logger.debug(f"[gc] {' '.join(cmd)} failed for {mirror.repo_full_name}: {e}")
+        return False
+
+    # ─── Cross-process lock ───────────────────────────────────
+
+    async def _acquire_lock(self) -> bool:
+        if not self.redis:
+            return True
+        try:
+            return bool(await self.redis.set(GC_LOCK_KEY, self._lock_token, nx=True, ex=GC_LOCK_TTL))
+        except Exception as e:
+            logger.debug(f"GC lock unavailable ({e}) — running without it")
+            return True
+
+    async def _renew_lock(self):
+        """Keep the lock alive for as long as the cycle runs (maintenance alone can take minutes)."""
+        while True:
+            await asyncio.sleep(GC_LOCK_TTL / 3)
+            try:
+                if await self.redis.get(GC_LOCK_KEY) != self._lock_token:
+                    logger.warning("[gc] Lost the GC lock mid-cycle")
+                    return
+                await self.redis.expire(GC_LOCK_KEY, GC_LOCK_TTL)
+            except Exception as e:
+                logger.debug(f"[gc] Could not renew the GC lock: {e}")
+
+    async def _forget_mirror(self, repo_full_name: str):
+        """Clear the mirror's freshness entry so the next webhook prewarms it again."""
+        if not self.redis:
+            return
+        from core.mirror_cache import forget_mirror
+        try:
+            await forget_mirror(self.redis, repo_full_name)
+        except Exception as e:
+            logger.debug(f"[gc] Could not clear freshness for {repo_full_name}: {e}")
+
+    async def _release_lock(self):
+        """Delete the lock only if it is still ours (it may have expired and been taken)."""
+        if not self.redis:
+            return
+        try:
+            if await self.redis.get(GC_LOCK_KEY) == self._lock_token:
+                await self.redis.delete(GC_LOCK_KEY)
+        except Exception:
+            pass
+
+
+def _safe_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def _remove_tree(path: str) -> bool:
+    from core.repo_manager import remove_readonly
+    try:
+        shutil.rmtree(path, onerror=remove_readonly)
+        return True
+    except Exception as e:
+        logger.warning(f"[gc] Failed to remove {path}: {e}")
+        return False
@@ -28,6 +28,8 @@ async def lifespan(app: FastAPI):
     logger.info("Database and queue initialized")
     yield
     await app.state.queue.disconnect()
+    from core.async_llm import close_shared_clients
+    await close_shared_clients()
 
 app = FastAPI(title="AgenticPR - PR Review Bot", lifespan=lifespan)
 
@@ -165,7 +167,10 @@ async def receive_webhook(
 
     # --- 6. Enqueue to durable queue (with BackgroundTasks fallback) ---
     try:
+        from core.mirror_cache import request_prewarm
         queue: 'QueueManager' = request.app.state.queue
+        # Start cloning a missing mirror while the fetch stage is still downloading the diff
+        await request_prewarm(queue, repo_full_name, "webhook", only_if_missing=True)
         await queue.enqueue("review:fetch", {
             "job_id": new_job.id,
             "repo_full_name": repo_full_name,
@@ -174,6 +179,7 @@ async def receive_webhook(
             "title": metadata.title,
             "description": metadata.description,
             "branch_name": metadata.branch_name,
+            "action": action,
         })
         logger.info(f"")
         logger.info(f"══════════════════════════════════════════════════")
@@ -153,4 +153,27 @@ class ReviewEvent(SQLModel, table=True):
     job_id: Optional[int] = Field(default=None, foreign_key="job.id", index=True)
     event_type: str  # 'queued' | 'stage_started' | 'stage_completed' | 'failed' | etc.
     event_data: Optional[str] = Field(default=None)  # JSON
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class LLMUsage(SQLModel, table=True):
+    """LLM spend of one job stage: requests, tokens, retries, latency, cache hits (core.llm_usage)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="job.id", index=True)
+    repo_full_name: str = Field(index=True)
+    stage: str  # 'review' | 'publish'
+    requests: int = Field(default=0)
+    failures: int = Field(default=0)
+    retries: int = Field(default=0)
+    truncated: int = Field(default=0)  # replies cut off at max_tokens (then continued)
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    cached_tokens: int = Field(default=0)  # prompt tokens served from the provider's prefix cache
+    estimated_tokens: int = Field(default=0)  # counted locally: the provider reported no usage
+    cache_hits: int = Field(default=0)  # review cache + joined in-flight requests
+    llm_seconds: float = Field(default=0.0)  # summed call latency
+    wall_seconds: float = Field(default=0.0)
+    cost_usd: float = Field(default=0.0)
+    latencies_json: Optional[str] = Field(default=None)  # per-call ms, for percentiles
+    providers_json: Optional[str] = Field(default=None)  # per provider:model breakdown
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
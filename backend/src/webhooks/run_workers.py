@@ -11,6 +11,8 @@ For production with separate processes:
   python run_workers.py --workers analyze &
   python run_workers.py --workers review &
   python run_workers.py --workers publish &
+  python run_workers.py --workers warm &
+  python run_workers.py --workers gc &
 """
 
 import os
@@ -145,10 +147,34 @@ async def main(worker_types: list):
         )
         logger.info(f"  ✓ Publish worker (concurrency={config.WORKER_CONCURRENCY_PUBLISH})")
     
+    if "warm" in worker_types:
+        from workers.warm import WarmWorker
+        w = WarmWorker(queue, db_session_factory)
+        workers.append(w)
+        worker_tasks.append(
+            asyncio.create_task(w.start(concurrency=config.WORKER_CONCURRENCY_WARM))
+        )
+        logger.info(f"  ✓ Warm worker (concurrency={config.WORKER_CONCURRENCY_WARM})")
+    
+    if "gc" in worker_types:
+        from core.workspace_gc import WorkspaceGC
+        w = WorkspaceGC(db_session_factory, queue.redis)
+        workers.append(w)
+        worker_tasks.append(asyncio.create_task(w.start()))
+        logger.info(f"  ✓ Workspace GC (interval={config.GC_INTERVAL_SECONDS}s)")
+    
     if not worker_tasks:
-        logger.error("No workers selected! Use --workers fetch,analyze,review,publish")
+        logger.error("No workers selected! Use --workers fetch,analyze,review,publish,warm,gc")
         return
     
+    # Open LLM provider connections now rather than on the first job
+    if "review" in worker_types or "publish" in worker_types:
+        try:
+            from core.async_llm import prewarm_shared_clients
+            await prewarm_shared_clients()
+        except Exception as e:
+            logger.warning(f"LLM connection pre-warm failed: {e}")
+    
     logger.info(f"\n{'='*50}")
     logger.info(f"AgenticPR Workers running — {len(worker_tasks)} worker(s)")
     logger.info(f"Redis: {config.REDIS_URL}")
@@ -184,6 +210,8 @@ async def main(worker_types: list):
         logger.info("🧹 Cleaning up active jobs before shutdown...")
         await cleanup_stale_jobs(db_session_factory)
         await queue.disconnect()
+        from core.async_llm import close_shared_clients
+        await close_shared_clients()
         logger.info("Workers stopped.")
 
 
@@ -192,7 +220,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "--workers",
         type=str,
-        default="fetch,analyze,review,publish",
+        default="fetch,analyze,review,publish,warm,gc",
         help="Comma-separated list of workers to start (default: all)"
     )
     args = parser.parse_args()
@@ -0,0 +1,104 @@
+"""
+AsyncLLMService: provider fallback and non-blocking concurrent calls.
+"""
+import sys
+import os
+import time
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.async_llm import AsyncLLMService, SharedLLMClients
+from core.provider_router import OPEN, ProviderRouter
+from core.rate_limiter import ProviderRateLimiter
+
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeCompletions:
+    def __init__(self, text="", error=None, delay=0.0):
+        self.text, self.error, self.delay = text, error, delay
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return completion(self.text)
+
+
+def fake_client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+class TestAsyncLLMService(unittest.TestCase):
+    def test_falls_back_past_rate_limited_provider(self):
+        groq = FakeCompletions(error=RuntimeError("Error code: 429 - rate limit"))
+        openrouter = FakeCompletions(text=" ok ")
+        clients = SimpleNamespace(groq=fake_client(groq), gemini=None, openrouter=fake_client(openrouter))
+        llm = AsyncLLMService(clients=clients, router=ProviderRouter())
+
+        self.assertEqual(asyncio.run(llm.chat([{"role": "user", "content": "hi"}])), "ok")
+        self.assertEqual(groq.calls, 1)  # 429 is not retried
+        self.assertEqual(llm.router.state(f"groq:{llm.groq_model}").circuit, OPEN)
+
+        # Providers with an open circuit move to the back of the chain
+        asyncio.run(llm.chat([{"role": "user", "content": "again"}]))
+        self.assertEqual(groq.calls, 1)
+        self.assertEqual(openrouter.calls, 2)
+        print("  [PASS] Rate-limited provider falls through and is demoted")
+
+    def test_concurrent_calls_do_not_block_each_other(self):
+        groq = FakeCompletions(text="done", delay=0.1)
+        llm = AsyncLLMService(
+            clients=SimpleNamespace(groq=fake_client(groq), gemini=None, openrouter=None),
+            router=ProviderRouter(),
+            limiter=ProviderRateLimiter({}),  # unmetered: only the event loop is under test
+        )
+
+        async def many():
+            return await asyncio.gather(*(llm.chat([{"role": "user", "content": str(i)}]) for i in range(10)))
+
+        start = time.perf_counter()
+        results = asyncio.run(many())
+        elapsed = time.perf_counter() - start
+        self.assertEqual(results, ["done"] * 10)
+        self.assertLess(elapsed, 0.5)
+        print(f"  [PASS] 10 concurrent 100ms calls finished in {elapsed * 1000:.0f}ms")
+
+    def test_prewarm_opens_pooled_connections(self):
+        urls = []
+
+        class FakeHTTP:
+            async def head(self, url, timeout=None):
+                urls.append(url)
+                if "openrouter" in url:
+                    raise ConnectionError("offline")
+
+        clients = SharedLLMClients.__new__(SharedLLMClients)  # skip real client construction
+        clients.http, clients.http2, clients.gemini = FakeHTTP(), False, None
+        clients.groq = SimpleNamespace(base_url="https://api.groq.com")
+        clients.openrouter = SimpleNamespace(base_url="https://openrouter.ai/api/v1/")
+        warmed = asyncio.run(clients.prewarm())
+        self.assertEqual(warmed, {"groq": 4, "openrouter": 0})
+        self.assertEqual(len(urls), 8)
+
+        clients.http2 = True  # one multiplexed connection per provider is enough
+        urls.clear()
+        asyncio.run(clients.prewarm())
+        self.assertEqual(len(urls), 2)
+        print("  [PASS] Pre-warm opens pooled connections per provider, failures tolerated")
+
+    def test_no_providers(self):
+        llm = AsyncLLMService(clients=SimpleNamespace(groq=None, gemini=None, openrouter=None))
+        self.assertEqual(asyncio.run(llm.chat([{"role": "user", "content": "hi"}])), "")
+        print("  [PASS] No configured providers returns empty string")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Verification Script + Benchmark for Comment Placement
+=====================================================
+Checks bisect-based, hunk-aware line snapping against the old
+min-over-all-visible-lines approach, and times both on a PR with
+thousands of changed lines.
+"""
+import os
+import sys
+import time
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.parsed_diff import ParsedDiff
+from core.diff_parser import DiffParser
+from core.comment_placement import CommentPlacer
+
+
+def synthetic_diff(files: int, hunks_per_file: int, lines_per_hunk: int, gap: int) -> str:
+    parts = []
+    for f in range(files):
+        parts.append(f"diff --git a/src/mod_{f}.py b/src/mod_{f}.py\n--- a/src/mod_{f}.py\n+++ b/src/mod_{f}.py\n")
+        start = 1
+        for _ in range(hunks_per_file):
+            parts.append(f"@@ -{start},{lines_per_hunk} +{start},{lines_per_hunk} @@\n")
+            for i in range(lines_per_hunk):
+                parts.append(f"+line {start + i}\n" if i % 3 else f" ctx {start + i}\n")
+            start += lines_per_hunk + gap
+    return "".join(parts)
+
+
+def legacy_snap(file_diff: str, line: int, max_distance: int = 20):
+    """The previous orchestrator logic, recomputed per comment."""
+    valid_lines = DiffParser.get_valid_right_lines(file_diff)
+    if not valid_lines:
+        return None
+    if line in valid_lines:
+        return line
+    nearest = min(valid_lines, key=lambda x: abs(x - line))
+    return nearest if abs(nearest - line) <= max_distance else None
+
+
+class TestCommentPlacement(unittest.TestCase):
+    def setUp(self):
+        self.raw = synthetic_diff(files=1, hunks_per_file=3, lines_per_hunk=10, gap=30)
+        self.placer = CommentPlacer(ParsedDiff.parse(self.raw))
+        # Hunks cover new lines 1-10, 41-50, 81-90
+
+    def test_inside_hunk_kept(self):
+        self.assertEqual(self.placer.place("src/mod_0.py", 45).line, 45)
+        print("  [PASS] Lines inside a hunk are kept.")
+
+    def test_snaps_to_adjacent_hunk_edge(self):
+        self.assertEqual(self.placer.place("src/mod_0.py", 15).line, 10)
+        self.assertEqual(self.placer.place("src/mod_0.py", 37).line, 41)
+        self.assertEqual(self.placer.place("src/mod_0.py", 25).line, 10)  # tie → earlier line
+        print("  [PASS] Lines in a gap snap to the nearest bordering hunk.")
+
+    def test_rejections(self):
+        self.assertEqual(self.placer.place("src/mod_0.py", 200).reason, "too_far")
+        self.assertEqual(self.placer.place("missing.py", 3).reason, "file_not_in_diff")
+        self.assertEqual(self.placer.place("src/mod_0.py", "abc").reason, "invalid_line")
+        print("  [PASS] Unplaceable comments are rejected with a reason.")
+
+    def test_place_comments_output_shape(self):
+        placed, rejected = self.placer.place_comments([
+            {"path": "src/mod_0.py", "line": 12, "body": "x", "severity": "high"},
+            {"path": "src/mod_0.py", "line": 500, "body": "y"},
+        ])
+        self.assertEqual(placed, [{"path": "src/mod_0.py", "line": 10, "side": "RIGHT", "body": "x"}])
+        self.assertEqual(len(rejected), 1)
+        print("  [PASS] Placed comments carry only GitHub API fields.")
+
+    def test_benchmark_against_legacy(self):
+        raw = synthetic_diff(files=5, hunks_per_file=100, lines_per_hunk=20, gap=15)
+        parsed = ParsedDiff.parse(raw)
+        file_diffs = parsed.file_diffs()
+        rng = random.Random(7)
+        comments = [
+            {"path": f"src/mod_{rng.randrange(5)}.py", "line": rng.randrange(1, 3600), "body": "b"}
+            for _ in range(500)
+        ]
+
+        t0 = time.perf_counter()
+        legacy = [legacy_snap(file_diffs[c["path"]], c["line"]) for c in comments]
+        legacy_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        placer = CommentPlacer(parsed)
+        new = [placer.place(c["path"], c["line"]).line for c in comments]
+        new_s = time.perf_counter() - t0
+
+        for c, old_line, new_line in zip(comments, legacy, new):
+            self.assertEqual(old_line is None, new_line is None)
+            if old_line is not None:
+                self.assertEqual(abs(old_line - c["line"]), abs(new_line - c["line"]))
+
+        changed = sum(f.additions for f in parsed.files.values())
+        print(
+            f"  [BENCH] {len(comments)} comments, {changed} changed lines: "
+            f"legacy {legacy_s * 1000:.1f} ms, placer {new_s * 1000:.2f} ms "
+            f"({legacy_s / max(new_s, 1e-9):.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
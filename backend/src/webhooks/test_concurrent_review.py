@@ -0,0 +1,112 @@
+"""
+Concurrent per-file review: files are reviewed in parallel, results keep diff order.
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config
+from agents.reviewer import ReviewerAgent
+
+
+def make_diff(n_files):
+    parts = []
+    for i in range(n_files):
+        parts.append(
+            f"diff --git a/f{i}.py b/f{i}.py\n--- a/f{i}.py\n+++ b/f{i}.py\n"
+            f"@@ -1,1 +1,2 @@\n ctx\n+value_{i} = {i}\n"
+        )
+    return "".join(parts)
+
+
+class SlowLLM:
+    """Answers after a delay; the first files answer slowest."""
+
+    def __init__(self, n_files, delay=0.1):
+        self.n_files = n_files
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def chat(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        i = int(prompt.split("File: f", 1)[1].split(".py", 1)[0])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay * (self.n_files - i) / self.n_files)
+        self.in_flight -= 1
+        findings = [{"line": 2, "severity": "CRITICAL" if i == 0 else "LOW", "type": "actionable",
+                     "title": f"Issue {i}.", "message": f"Issue in f{i}."}]
+        if i % 2:
+            findings.append({"line": 2, "type": "nitpick", "message": f"Nit in f{i}."})
+        return json.dumps({"change_summary": f"Changes f{i}", "findings": findings, "lgtm_note": ""})
+
+
+def make_agent(llm):
+    agent = ReviewerAgent.__new__(ReviewerAgent)
+    agent.llm = llm
+    agent.planner = MagicMock()
+    agent.planner.analyze_pr_complexity = AsyncMock(return_value={"high_risk_files": [], "ignore_files": ["f3.py"]})
+    agent.scanner = MagicMock(redact=lambda text: text)
+    agent.feedback = MagicMock(get_negative_constraints=lambda: "")
+    agent.context_builder = MagicMock()
+    agent._context_lock = threading.Lock()
+    agent.review_cache = None
+    agent.pack_token_budget = 0  # one request per file
+    agent.stream_reviews = False
+    return agent
+
+
+class TestConcurrentReview(unittest.TestCase):
+    N = 8
+
+    def setUp(self):
+        self._concurrency = config.REVIEW_FILE_CONCURRENCY
+
+    def tearDown(self):
+        config.REVIEW_FILE_CONCURRENCY = self._concurrency
+
+    def _run(self, concurrency):
+        config.REVIEW_FILE_CONCURRENCY = concurrency
+        llm = SlowLLM(self.N)
+        start = time.perf_counter()
+        result = make_agent(llm).run_inline_review(make_diff(self.N), "Title", "")
+        return result, time.perf_counter() - start, llm
+
+    def test_parallel_matches_sequential(self):
+        sequential, seq_time, seq_llm = self._run(1)
+        parallel, par_time, par_llm = self._run(4)
+
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(seq_llm.max_in_flight, 1)
+        self.assertEqual(par_llm.max_in_flight, 4)
+        self.assertLess(par_time, seq_time)
+
+        paths = [c["path"] for c in parallel["inline_comments"]]
+        self.assertEqual(paths, [f"f{i}.py" for i in range(self.N) if i != 3])
+        self.assertEqual(list(parallel["nitpicks"]), ["f1.py", "f5.py", "f7.py"])
+        self.assertEqual(parallel["verdict"], "REQUEST_CHANGES")
+        self.assertEqual(parallel["stats"]["files_reviewed"], self.N - 1)
+        print(f"  [PASS] {self.N} files: sequential {seq_time * 1000:.0f}ms, "
+              f"4-way parallel {par_time * 1000:.0f}ms, identical output")
+
+    def test_async_path_matches_sync_path(self):
+        config.REVIEW_FILE_CONCURRENCY = 3
+        llm = SlowLLM(self.N, delay=0.02)
+
+        expected = make_agent(SlowLLM(self.N, delay=0)).run_inline_review(make_diff(self.N), "Title", "")
+        result = asyncio.run(make_agent(llm).arun_inline_review(make_diff(self.N), "Title", ""))
+        self.assertEqual(result, expected)
+        self.assertLessEqual(llm.max_in_flight, 3)
+        print("  [PASS] Async review matches the sync path with at most 3 requests in flight")
+
+
+if __name__ == "__main__":
+    unittest.main()
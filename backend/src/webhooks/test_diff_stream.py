@@ -0,0 +1,80 @@
+"""
+Verification Script for the Streaming Diff Reader
+=================================================
+Tests skip rules, per-file truncation and chunked decoding.
+"""
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.diff_stream import StreamingDiffParser, aiter_lines, classify_path
+
+
+def build_diff(big_lines: int) -> str:
+    return (
+        "diff --git a/package-lock.json b/package-lock.json\n"
+        "--- a/package-lock.json\n+++ b/package-lock.json\n"
+        "@@ -1,2 +1,2 @@\n-a\n+b\n c\n"
+        "diff --git a/src/big.py b/src/big.py\n"
+        "new file mode 100644\n--- /dev/null\n+++ b/src/big.py\n"
+        f"@@ -0,0 +1,{big_lines} @@\n"
+        + "".join(f"+value_{i} = {i}\n" for i in range(big_lines))
+        + "diff --git a/logo.png b/logo.png\n"
+        "Binary files a/logo.png and b/logo.png differ\n"
+        "diff --git a/src/ok.py b/src/ok.py\n"
+        "--- a/src/ok.py\n+++ b/src/ok.py\n"
+        "@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+    )
+
+
+async def chunked(text: str, size: int = 7):
+    data = text.encode("utf-8")
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def collect(text: str, **kwargs):
+    parser = StreamingDiffParser(**kwargs)
+    return asyncio.run(parser.collect(aiter_lines(chunked(text))))
+
+
+class TestDiffStream(unittest.TestCase):
+    def test_classify_path(self):
+        self.assertEqual(classify_path("web/yarn.lock"), "lockfile")
+        self.assertEqual(classify_path("vendor/github.com/x/y.go"), "vendored")
+        self.assertEqual(classify_path("static/app.min.js"), "generated")
+        self.assertEqual(classify_path("docs/a.md", ["docs/*"]), "custom")
+        self.assertEqual(classify_path("src/app.py"), "")
+        print("  [PASS] Skip rules classify lockfiles, vendored and generated paths.")
+
+    def test_skips_before_buffering(self):
+        result = collect(build_diff(5), extra_skip_patterns=[])
+        reasons = {s["path"]: s["reason"] for s in result.skipped}
+        self.assertEqual(reasons, {"package-lock.json": "lockfile", "logo.png": "binary"})
+        self.assertEqual(result.parsed.paths, ["src/big.py", "src/ok.py"])
+        self.assertNotIn("package-lock", result.text)
+        print("  [PASS] Lockfile and binary diffs are dropped.")
+
+    def test_truncation_rewrites_hunk_header(self):
+        result = collect(build_diff(1000), max_file_bytes=500, extra_skip_patterns=[])
+        self.assertEqual(result.truncated, ["src/big.py"])
+        big = result.parsed.get("src/big.py")
+        kept = len(big.added_lines())
+        self.assertGreater(kept, 0)
+        self.assertEqual(big.hunks[0].new_count, kept)
+        self.assertIn(f"{1000 - kept} more lines not shown", result.text)
+        # The file after the truncated one is unaffected
+        self.assertEqual(result.parsed.get("src/ok.py").added_lines(), [1])
+        print(f"  [PASS] Large file truncated to {kept} lines with a marker.")
+
+    def test_total_limit(self):
+        result = collect(build_diff(50), max_total_bytes=300, extra_skip_patterns=[])
+        self.assertIn({"path": "src/ok.py", "reason": "total_limit"}, result.skipped)
+        print("  [PASS] Files past the total budget are skipped.")
+
+
+if __name__ == "__main__":
+    unittest.main()
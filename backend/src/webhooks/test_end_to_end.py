@@ -111,13 +111,7 @@ class TestAsyncWorkerFlow(unittest.IsolatedAsyncioTestCase):
         # --- 4. EXECUTE REVIEWER ---
         print("[INFO] Simulating Review Worker (LLM)...")
         review_worker = ReviewWorker(mock_queue, mock_db_session_factory)
-        
-        # Mock Token Bucket inside ReviewWorker to return True
-        with patch("core.rate_limiter.TokenBucketRateLimiter") as mock_tb:
-            mock_tb_instance = mock_tb.return_value
-            mock_tb_instance.acquire = AsyncMock(return_value=True)
-            
-            review_result = await review_worker.process(review_data)
+        review_result = await review_worker.process(review_data)
         
         self.assertIsNotNone(review_result)
         self.assertEqual(review_result["findings_count"], 1)
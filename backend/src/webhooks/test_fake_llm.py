@@ -0,0 +1,208 @@
+"""
+Fake LLM provider: deterministic diff-derived replies, latency and fault injection.
+"""
+import sys
+import os
+import json
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config
+import core.token_budget as token_budget
+from core.async_llm import AsyncLLMService
+from core.fake_llm import FakeLLMClient, fake_reply
+from core.llm_usage import UsageRecorder, usage_scope
+from core.provider_router import ProviderRouter
+from core.rate_limiter import ProviderLimits, ProviderRateLimiter
+from core.single_flight import SingleFlight
+from test_concurrent_review import make_agent
+
+DIFF = (
+    "diff --git a/app/run.py b/app/run.py\n--- a/app/run.py\n+++ b/app/run.py\n"
+    "@@ -1,2 +1,4 @@\n import os\n ctx\n+os.system(cmd)\n+# TODO: tidy up\n"
+    "diff --git a/app/util.py b/app/util.py\n--- a/app/util.py\n+++ b/app/util.py\n"
+    "@@ -1,1 +1,2 @@\n ctx\n+value = 1\n"
+)
+
+
+def service(fake):
+    clients = SimpleNamespace(groq=None, gemini=None, openrouter=None, fake=fake)
+    return AsyncLLMService(clients=clients, router=ProviderRouter(), limiter=ProviderRateLimiter({}), flights=SingleFlight())
+
+
+def fake_agent(llm, pack_token_budget=0):
+    agent = make_agent(llm)
+    agent.pack_token_budget = pack_token_budget
+    agent.pack_max_file_tokens = 1500
+    agent.pack_max_files = 3
+    return agent
+
+
+class TestFakeLLM(unittest.TestCase):
+    def setUp(self):
+        # Deterministic ~4 chars per token, with or without tiktoken installed
+        self._encoding = (token_budget._encoding, token_budget._encoding_checked)
+        token_budget._encoding, token_budget._encoding_checked = None, True
+
+    def tearDown(self):
+        token_budget._encoding, token_budget._encoding_checked = self._encoding
+
+    def test_single_file_prompt_gets_findings_from_added_lines(self):
+        prompt = "File: app/run.py\n<diff>\nL  1  import os\nL  3 +os.system(cmd)\nL  4 +# TODO: tidy up\n</diff>"
+        reply = json.loads(fake_reply([{"role": "user", "content": prompt}]))
+
+        self.assertEqual([(f["line"], f["type"]) for f in reply["findings"]], [(3, "actionable"), (4, "nitpick")])
+        self.assertEqual(reply["findings"][0]["severity"], "HIGH")
+        self.assertEqual(reply, json.loads(fake_reply([{"role": "user", "content": prompt}])))
+        print("  [PASS] Findings follow the added lines and are deterministic")
+
+    def test_planner_and_triage_prompts(self):
+        plan = json.loads(fake_reply([{"role": "user", "content": (
+            "You are a Tech Lead triaging files.\n  - README.md: +3/-0 lines\n  - core/big.py: +180/-40 lines\n"
+        )}]))
+        self.assertEqual(plan["high_risk_files"], ["core/big.py"])
+        self.assertEqual(plan["ignore_files"], ["README.md"])
+        self.assertEqual(plan["review_strategy"], "focus_on_critical")
+
+        triage = json.loads(fake_reply([
+            {"role": "system", "content": "You triage pull request diffs."},
+            {"role": "user", "content": "### tests/test_a.py (+4/-0)\n...\n### core/a.py (+2/-1)\n..."},
+        ]))
+        self.assertEqual([f["verdict"] for f in triage["files"]], ["clean", "suspicious"])
+        print("  [PASS] Planner and triage prompts get their own reply shapes")
+
+    def test_review_runs_end_to_end(self):
+        llm = service(FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1))
+        recorder = UsageRecorder()
+
+        async def run():
+            with usage_scope(recorder):
+                return await fake_agent(llm).arun_inline_review(DIFF, "Title", "")
+
+        result = asyncio.run(run())
+        comments = [(c["path"], c["line"]) for c in result["inline_comments"]]
+        self.assertIn(("app/run.py", 3), comments)
+        self.assertEqual(result["verdict"], "COMMENT")
+
+        summary = recorder.summary()
+        self.assertEqual(summary["requests"], 2)
+        self.assertEqual(summary["estimated_tokens"], 0)  # the fake reports usage
+        self.assertIn(f"fake:{config.FAKE_LLM_MODEL}", summary["providers"])
+        self.assertGreater(summary["cached_tokens"], 0)  # the second file reuses the static system prompt
+        print(f"  [PASS] Review through the fake provider: {len(comments)} inline comment(s), usage recorded")
+
+    def test_packed_review_matches_per_file_review(self):
+        def fake():
+            return FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1)
+
+        per_file = asyncio.run(fake_agent(service(fake())).arun_inline_review(DIFF, "Title", ""))
+        packed = asyncio.run(fake_agent(service(fake()), pack_token_budget=100_000).arun_inline_review(DIFF, "Title", ""))
+        self.assertEqual(packed["inline_comments"], per_file["inline_comments"])
+        print("  [PASS] Packed prompts get the same findings as per-file prompts")
+
+    def test_latency_is_seeded(self):
+        first, second = FakeLLMClient(latency_ms=100, sigma=0.5, seed=7), FakeLLMClient(latency_ms=100, sigma=0.5, seed=7)
+        self.assertEqual([first.sample_latency() for _ in range(5)], [second.sample_latency() for _ in range(5)])
+        self.assertEqual(FakeLLMClient(latency_ms=100, sigma=0, seed=7).sample_latency(), 0.1)
+        print("  [PASS] Latency samples are reproducible per seed")
+
+    def test_injected_429_opens_the_circuit(self):
+        llm = service(FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=1, seed=1))
+        reply = asyncio.run(llm.chat([{"role": "user", "content": "hello"}]))
+
+        self.assertEqual(reply, "")
+        state = llm.router.snapshot()[f"fake:{config.FAKE_LLM_MODEL}"]
+        self.assertEqual(state["circuit"], "open")
+        self.assertGreater(state["rate_limit_rate"], 0)
+        print("  [PASS] Injected 429s reach the router like real ones")
+
+    def test_stream_yields_the_same_reply(self):
+        prompt = [{"role": "user", "content": "File: a.py\n<diff>\nL  1 +eval(x)\n</diff>"}]
+        llm = service(FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1))
+
+        async def run():
+            return "".join([chunk async for chunk in llm.chat_stream(prompt)])
+
+        self.assertEqual(asyncio.run(run()), fake_reply(prompt))
+        print("  [PASS] Streaming returns the same reply in chunks")
+
+    def test_closed_stream_refunds_its_reservation(self):
+        prompt = [{"role": "user", "content": "File: a.py\n<diff>\nL  1 +eval(x)\n</diff>"}]
+        clients = SimpleNamespace(groq=None, gemini=None, openrouter=None,
+                                  fake=FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1))
+        limiter = ProviderRateLimiter({"fake": ProviderLimits(tpm=100_000)})
+        llm = AsyncLLMService(clients=clients, router=ProviderRouter(), limiter=limiter)
+
+        async def run():
+            stream = llm.chat_stream(prompt, max_tokens=4000)
+            first = await stream.__anext__()
+            await stream.aclose()  # consumer stops after the first chunk
+            return first
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertGreater(limiter._local[f"fake:{config.FAKE_LLM_MODEL}"][1], 100_000 - 100)
+        print("  [PASS] A stream closed by its consumer gives its reserved tokens back")
+
+    def test_reply_cut_off_at_max_tokens_is_continued(self):
+        prompt = [{"role": "user", "content": "File: a.py\n<diff>\nL  1 +eval(x)\nL  2 +os.system(y)\nL  3 +# TODO\n</diff>"}]
+        full = fake_reply(prompt)
+        llm = service(FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1))
+        recorder = UsageRecorder()
+
+        async def run():
+            with usage_scope(recorder):
+                return await llm.chat(prompt, max_tokens=100, response_format={"type": "json_object"})
+
+        with patch("core.async_llm.config.LLM_MAX_CONTINUATIONS", 10):
+            reply = asyncio.run(run())
+        rounds = -(-len(full) // 400)  # 100 tokens of ~4 chars per call
+        self.assertGreater(rounds, 1)
+        self.assertEqual(reply.replace(" ", ""), full.replace(" ", ""))  # word gaps at a cut may be trimmed
+        self.assertEqual(len(json.loads(reply)["findings"]), 3)
+        summary = recorder.summary()
+        self.assertEqual((summary["requests"], summary["truncated"]), (rounds, rounds - 1))
+        print(f"  [PASS] Reply cut off at max_tokens continued in {rounds} calls, never re-run")
+
+    def test_continuations_are_capped(self):
+        prompt = [{"role": "user", "content": "File: a.py\n<diff>\nL  1 +eval(x)\nL  2 +os.system(y)\n</diff>"}]
+        llm = service(FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1))
+        recorder = UsageRecorder()
+
+        async def run():
+            with usage_scope(recorder):
+                return await llm.chat(prompt, max_tokens=20)
+
+        with patch("core.async_llm.config.LLM_MAX_CONTINUATIONS", 1):
+            reply = asyncio.run(run())
+        self.assertEqual(recorder.summary()["requests"], 2)
+        self.assertTrue(fake_reply(prompt).replace(" ", "").startswith(reply.replace(" ", "")))
+        print("  [PASS] Continuation stops after LLM_MAX_CONTINUATIONS, keeping the partial reply")
+
+    def test_stream_cut_off_at_max_tokens_is_continued(self):
+        prompt = [{"role": "user", "content": "File: a.py\n<diff>\nL  1 +eval(x)\nL  2 +os.system(y)\n</diff>"}]
+        llm = service(FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1))
+
+        async def run():
+            return "".join([chunk async for chunk in llm.chat_stream(prompt, max_tokens=60)])
+
+        with patch("core.async_llm.config.LLM_MAX_CONTINUATIONS", 10):
+            reply = asyncio.run(run())
+        self.assertEqual(reply, fake_reply(prompt))  # stream chunks are not trimmed
+        print("  [PASS] Stream cut off at max_tokens continued on the same provider")
+
+    def test_review_with_tight_output_budget(self):
+        llm = service(FakeLLMClient(latency_ms=1, sigma=0, error_rate=0, rate_limit_rate=0, seed=1))
+        expected = asyncio.run(fake_agent(service(FakeLLMClient(latency_ms=1, sigma=0, seed=1))).arun_inline_review(DIFF, "Title", ""))
+        with patch.object(config, "REVIEW_OUTPUT_MIN_TOKENS", 60), patch.object(config, "LLM_MAX_CONTINUATIONS", 10):
+            result = asyncio.run(fake_agent(llm).arun_inline_review(DIFF, "Title", ""))
+        self.assertEqual([(c["path"], c["line"]) for c in result["inline_comments"]],
+                         [(c["path"], c["line"]) for c in expected["inline_comments"]])
+        print("  [PASS] Review replies cut off by a tight budget are continued and parsed")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
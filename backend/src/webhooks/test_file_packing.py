@@ -0,0 +1,89 @@
+"""
+File packing: small file diffs share one LLM request and are split back per file.
+"""
+import sys
+import os
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.file_packing import pack_files, split_pack_response
+from test_concurrent_review import SlowLLM, make_agent, make_diff
+
+
+class PackLLM:
+    """Answers packed prompts with one entry per <file> block, optionally dropping one."""
+
+    def __init__(self, drop=None):
+        self.drop = drop
+        self.prompts = []
+
+    async def chat(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        if '<file path="' not in prompt:
+            return await SlowLLM(100, delay=0).chat(messages, **kwargs)
+        paths = [chunk.split('"', 1)[0] for chunk in prompt.split('<file path="')[1:]]
+        files = []
+        for path in paths:
+            if path == self.drop:
+                continue
+            files.append({"file": path, "change_summary": f"Changes {path}", "lgtm_note": "",
+                          "findings": [{"line": 2, "severity": "LOW", "type": "actionable",
+                                        "title": "Issue.", "message": f"Issue in {path}."}]})
+        return json.dumps({"files": files})
+
+
+def packing_agent(llm, budget=6000):
+    agent = make_agent(llm)
+    agent.pack_token_budget = budget
+    agent.pack_max_file_tokens = 1500
+    agent.pack_max_files = 3
+    return agent
+
+
+class TestFilePacking(unittest.TestCase):
+    def test_first_fit_decreasing(self):
+        sizes = {"a": 50, "b": 30, "c": 60, "d": 20, "e": 40, "big": 500}
+        packs = pack_files(sizes, token_budget=100, max_files=3)
+        # c+e, a+b+d (b and d fit beside a), big alone; diff order inside and across packs
+        self.assertEqual(packs, [["a", "b", "d"], ["c", "e"], ["big"]])
+        self.assertEqual(pack_files(sizes, token_budget=1000, max_files=2),
+                         [["a", "e"], ["b", "d"], ["c", "big"]])
+        print("  [PASS] Packs respect the token budget and file limit")
+
+    def test_split_pack_response(self):
+        reply = {"files": [{"file": "b/src/x.py", "findings": []}, {"file": "other.py"}, "junk",
+                           {"path": "y.py", "findings": [1]}]}
+        self.assertEqual(split_pack_response(reply, ["src/x.py", "y.py", "z.py"]),
+                         {"src/x.py": {"findings": []}, "y.py": {"findings": [1]}})
+        self.assertEqual(split_pack_response({"files": {"z.py": {"lgtm_note": "ok"}}}, ["z.py"]),
+                         {"z.py": {"lgtm_note": "ok"}})
+        self.assertEqual(split_pack_response(None, ["z.py"]), {})
+        print("  [PASS] Multi-file replies split back per file")
+
+    def test_small_files_share_requests(self):
+        n = 8  # f3.py is ignored by the planner, leaving 7 files -> packs of at most 3
+        llm = PackLLM()
+        result = packing_agent(llm).run_inline_review(make_diff(n), "Title", "")
+
+        self.assertEqual(len(llm.prompts), 3)
+        self.assertEqual(result["stats"]["files_reviewed"], n - 1)
+        self.assertEqual([c["path"] for c in result["inline_comments"]],
+                         [f"f{i}.py" for i in range(n) if i != 3])
+        self.assertEqual(result["file_summaries"]["f5.py"], "Changes f5.py")
+        print("  [PASS] Seven small files reviewed in three requests")
+
+    def test_missing_file_is_reviewed_alone(self):
+        llm = PackLLM(drop="f1.py")
+        result = packing_agent(llm).run_inline_review(make_diff(3), "Title", "")
+
+        self.assertEqual(len(llm.prompts), 2)
+        self.assertIn("File: f1.py", llm.prompts[1])
+        self.assertEqual(sorted(c["path"] for c in result["inline_comments"]), ["f0.py", "f1.py", "f2.py"])
+        print("  [PASS] File dropped from a packed reply falls back to its own request")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@
 import sys
 import os
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), "core"))
@@ -80,8 +80,9 @@ class TestHardening(unittest.TestCase):
         agent = ReviewerAgent()
         
         # Mock LLM to avoid real call
-        agent.llm.client.chat.completions.create = MagicMock(return_value=MagicMock(choices=[MagicMock(message=MagicMock(content='{"summary": "Fallback worked", "files": {}}'))]))
-        agent.planner.analyze_pr_complexity = MagicMock(return_value={"review_strategy": "quick", "high_risk_files": [], "ignore_files": []})
+        agent.llm.chat = AsyncMock(return_value='{"summary": "Fallback worked", "files": {}}')
+        agent.stream_reviews = False
+        agent.planner.analyze_pr_complexity = AsyncMock(return_value={"review_strategy": "quick", "high_risk_files": [], "ignore_files": []})
         agent.github.post_batch_review = MagicMock()
 
         # Run Review
@@ -0,0 +1,89 @@
+"""
+Incremental re-review: picking reusable files and carrying their results over.
+"""
+import sys
+import os
+import asyncio
+import subprocess
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agents.reviewer import FileReviewResult
+from core.parsed_diff import ParsedDiff
+from core.incremental import changed_paths_between, file_diff_hashes, prior_results_for, select_reusable_files
+from test_concurrent_review import SlowLLM, make_agent, make_diff
+
+
+def git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout.strip()
+
+
+class TestIncrementalReview(unittest.TestCase):
+    def test_only_unchanged_reviewed_files_are_reused(self):
+        new = {"a.py": "1", "b.py": "2", "c.py": "3", "d.py": "4"}
+        prior = {"a.py": "1", "b.py": "x", "c.py": "3", "d.py": "4"}
+        reuse = select_reusable_files(new, prior, prior_reviewed={"a.py", "b.py", "c.py"}, changed_since={"c.py"})
+        # b.py: diff changed, c.py: touched since, d.py: never reviewed
+        self.assertEqual(reuse, ["a.py"])
+        print("  [PASS] Only files with identical diffs, untouched since, are reused")
+
+    def test_file_hashes_follow_per_file_diff(self):
+        before = file_diff_hashes(ParsedDiff.parse(make_diff(3)))
+        after = file_diff_hashes(ParsedDiff.parse(make_diff(3).replace("value_1 = 1", "value_1 = 10")))
+        self.assertEqual(list(before), ["f0.py", "f1.py", "f2.py"])
+        self.assertEqual([p for p in before if before[p] != after[p]], ["f1.py"])
+        print("  [PASS] Per-file diff hashes change only for edited files")
+
+    def test_changed_paths_between_commits(self):
+        with tempfile.TemporaryDirectory() as repo:
+            git(repo, "init", "-q")
+            git(repo, "config", "user.email", "t@example.com")
+            git(repo, "config", "user.name", "t")
+            for name in ("a.py", "b.py"):
+                with open(os.path.join(repo, name), "w") as f:
+                    f.write("x = 1\n")
+            git(repo, "add", ".")
+            git(repo, "commit", "-q", "-m", "one")
+            old = git(repo, "rev-parse", "HEAD")
+            with open(os.path.join(repo, "b.py"), "w") as f:
+                f.write("x = 2\n")
+            git(repo, "commit", "-q", "-am", "two")
+            new = git(repo, "rev-parse", "HEAD")
+
+            self.assertEqual(asyncio.run(changed_paths_between(repo, old, new)), {"b.py"})
+            self.assertIsNone(asyncio.run(changed_paths_between(repo, "0" * 40, new)))
+        print("  [PASS] Inter-diff lists touched paths, None for unknown commits")
+
+    def test_reviewer_carries_over_prior_results(self):
+        n = 3
+        first = make_agent(SlowLLM(n, delay=0)).run_inline_review(make_diff(n), "Title", "")
+        by_path = {r["filepath"]: r for r in first["file_results"]}
+        prior = {p: FileReviewResult.from_dict(r) for p, r in prior_results_for(first["file_results"], ["f0.py"]).items()}
+
+        llm = SlowLLM(n, delay=0)
+        calls = []
+
+        async def counting_chat(messages, **kwargs):
+            calls.append(messages[-1]["content"])
+            return await SlowLLM(n, delay=0).chat(messages, **kwargs)
+
+        llm.chat = counting_chat
+        agent = make_agent(llm)
+        second = agent.run_inline_review(make_diff(n), "Title", "", prior_results=prior)
+
+        self.assertEqual(len(calls), n - 1)
+        self.assertTrue(all("File: f0.py" not in c for c in calls))
+        planned = agent.planner.analyze_pr_complexity.call_args.args
+        self.assertNotIn("f0.py", str(planned))
+        self.assertEqual(second["stats"]["carried_over_files"], 1)
+        carried = [c for c in second["inline_comments"] if c.get("carried_over")]
+        self.assertEqual([c["path"] for c in carried], ["f0.py"] * len(by_path["f0.py"]["inline_comments"]))
+        self.assertEqual(second["verdict"], first["verdict"])  # f0.py's critical finding still counts
+        self.assertEqual([r["filepath"] for r in second["file_results"]], ["f0.py", "f1.py", "f2.py"])
+        print("  [PASS] Unchanged files skip the LLM and keep their findings")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Local JSON repair: malformed LLM replies are fixed without a re-prompt.
+"""
+import sys
+import os
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import core.json_repair as json_repair
+from core.json_repair import parse_llm_json, repair_json, drain_stats
+from test_concurrent_review import make_agent, make_diff
+
+
+class TestJSONRepair(unittest.TestCase):
+    def setUp(self):
+        drain_stats()
+
+    def test_common_breakages(self):
+        cases = {
+            "fences and prose": 'Here you go:\n```json\n{"a": 1}\n```\nThanks!',
+            "trailing commas": '{"a": [1, 2,], "b": {"c": 3,},}',
+            "raw newline in string": '{"a": "line one\nline two\tend"}',
+            "stray quote": '{"a": "use the "fast" path", "b": 2}',
+            "invalid escape": '{"a": "match \\d+ digits"}',
+            "python literals": '{"a": True, "b": None, "c": "True"}',
+        }
+        expected = {
+            "fences and prose": {"a": 1},
+            "trailing commas": {"a": [1, 2], "b": {"c": 3}},
+            "raw newline in string": {"a": "line one\nline two\tend"},
+            "stray quote": {"a": 'use the "fast" path', "b": 2},
+            "invalid escape": {"a": "match \\d+ digits"},
+            "python literals": {"a": True, "b": None, "c": "True"},
+        }
+        for name, text in cases.items():
+            self.assertEqual(repair_json(text), expected[name], name)
+        print("  [PASS] Fences, commas, raw newlines, quotes, escapes and literals repaired")
+
+    def test_truncated_replies(self):
+        truncated = repair_json('{"summary": "ok", "findings": [{"line": 1, "message": "first"}, {"line": 2, "message": "sec')
+        self.assertEqual(truncated["findings"][0], {"line": 1, "message": "first"})
+        self.assertEqual(truncated["findings"][1]["message"], "sec")
+        self.assertEqual(repair_json('{"a": 1, "b":'), {"a": 1, "b": None})
+        self.assertEqual(repair_json('{"a": 1, "b"'), {"a": 1})
+        with self.assertRaises(ValueError):
+            repair_json("no json here")
+        print("  [PASS] Cut-off replies closed at the last complete value")
+
+    def test_stats_count_avoided_retries(self):
+        parse_llm_json('{"a": 1}', source="planner")
+        parse_llm_json('{"a": 1,}', source="planner")
+        with self.assertRaises(ValueError):
+            parse_llm_json("nothing", source="planner")
+        self.assertEqual(drain_stats(), {"planner:clean": 1, "planner:repaired": 1, "planner:failed": 1})
+
+        class FakeRedis:
+            def __init__(self):
+                self.hash = {}
+
+            async def hincrby(self, key, field, count):
+                self.hash[field] = self.hash.get(field, 0) + count
+
+            async def hgetall(self, key):
+                return {k: str(v) for k, v in self.hash.items()}
+
+        redis = FakeRedis()
+        json_repair.record("reviewer", "repaired")
+        asyncio.run(json_repair.flush_repair_stats(redis))
+        stats = asyncio.run(json_repair.get_repair_stats(redis))
+        self.assertEqual(stats, {"reviewer": {"clean": 0, "repaired": 1, "failed": 0}})
+        print("  [PASS] Repair outcomes counted and flushed to Redis")
+
+    def test_reviewer_repairs_instead_of_retrying(self):
+        calls = []
+
+        class SloppyLLM:
+            async def chat(self, messages, **kwargs):
+                calls.append(messages)
+                return '```json\n{"change_summary": "x", "findings": [{"line": 2, "type": "actionable", "message": "Bad\nthing."},], "lgtm_note": ""\n'
+
+        result = make_agent(SloppyLLM()).run_inline_review(make_diff(1), "Title", "")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(result["inline_comments"]), 1)
+        self.assertEqual(drain_stats().get("reviewer:repaired"), 1)
+        print("  [PASS] Reviewer repaired a truncated, fenced reply without re-prompting")
+
+
+if __name__ == "__main__":
+    unittest.main()
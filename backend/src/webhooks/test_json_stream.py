@@ -0,0 +1,114 @@
+"""
+Streaming review replies: incremental finding extraction and salvage of cut-off streams.
+"""
+import sys
+import os
+import json
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.json_stream import IncrementalJSONParser
+from core.async_llm import AsyncLLMService
+from core.provider_router import ProviderRouter
+from test_concurrent_review import make_agent, make_diff
+
+REPLY = json.dumps({
+    "change_summary": 'Adds a {"quoted"} value',
+    "findings": [
+        {"line": 2, "type": "actionable", "severity": "HIGH", "title": "A.", "message": "Brace } in text [x]."},
+        {"line": 2, "type": "nitpick", "message": 'Escaped " quote.', "nested": {"findings": []}},
+    ],
+    "lgtm_note": "",
+})
+
+
+class StreamLLM:
+    """Streams a canned reply in small chunks, optionally failing partway."""
+
+    def __init__(self, reply, fail_after=None, chunk=7):
+        self.reply = reply
+        self.fail_after = fail_after
+        self.chunk = chunk
+        self.streams = 0
+
+    async def chat_stream(self, messages, **kwargs):
+        self.streams += 1
+        for i in range(0, len(self.reply), self.chunk):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise ConnectionError("stream reset")
+            yield self.reply[i:i + self.chunk]
+
+
+class TestJSONStream(unittest.TestCase):
+    def test_findings_emitted_as_they_close(self):
+        parser = IncrementalJSONParser()
+        emitted_at = []
+        text = "```json\n" + REPLY + "\n```"
+        for i, ch in enumerate(text):
+            for item in parser.feed(ch):
+                emitted_at.append((i, item))
+
+        self.assertEqual([item for _, item in emitted_at], json.loads(REPLY)["findings"])
+        first_end = text.index("[x].\"}") + len("[x].\"}") - 1
+        self.assertEqual(emitted_at[0][0], first_end)  # emitted on its closing brace
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.fields["change_summary"], 'Adds a {"quoted"} value')
+        print("  [PASS] Each finding is emitted the moment its object closes")
+
+    def test_salvage_cut_off_reply(self):
+        parser = IncrementalJSONParser()
+        parser.feed(REPLY[:REPLY.index("Escaped")])
+        salvaged = parser.salvage()
+        self.assertEqual(salvaged["findings"], json.loads(REPLY)["findings"][:1])
+        self.assertEqual(salvaged["change_summary"], 'Adds a {"quoted"} value')
+        self.assertTrue(salvaged["partial"])
+        self.assertIsNone(IncrementalJSONParser().salvage())
+        print("  [PASS] Cut-off reply keeps the complete findings")
+
+    def test_stream_falls_back_only_before_first_chunk(self):
+        async def failing(*args):
+            raise ConnectionError("down")
+            yield  # pragma: no cover
+
+        async def chunks(*args):
+            for part in ("{", '"a": 1', "}"):
+                yield part
+
+        service = AsyncLLMService(clients=SimpleNamespace(groq=object(), gemini=None, openrouter=object()), router=ProviderRouter())
+        service._stream_groq, service._stream_openrouter = failing, chunks
+
+        async def collect():
+            return [c async for c in service.chat_stream([{"role": "user", "content": "x"}])]
+
+        self.assertEqual("".join(asyncio.run(collect())), '{"a": 1}')
+        self.assertEqual(service.router.state(f"groq:{service.groq_model}").consecutive_failures, 1)
+        print("  [PASS] Provider failing before its first chunk falls back")
+
+    def test_reviewer_salvages_interrupted_stream(self):
+        llm = StreamLLM(REPLY, fail_after=REPLY.index("Escaped"))
+        agent = make_agent(llm)
+        agent.stream_reviews = True
+        stored = []
+
+        class Cache:
+            async def get(self, key):
+                return None
+
+            async def set(self, key, value):
+                stored.append(value)
+
+        agent.review_cache = Cache()
+        result = agent.run_inline_review(make_diff(1), "Title", "")
+
+        self.assertEqual(llm.streams, 1)  # salvaged, not re-prompted
+        self.assertEqual(len(result["inline_comments"]), 1)
+        self.assertEqual(result["file_summaries"]["f0.py"], 'Adds a {"quoted"} value')
+        self.assertEqual(stored, [])  # partial results are not cached
+        print("  [PASS] Interrupted stream salvaged without a retry")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Hedged LLM requests: a slow primary is raced against the next healthy provider, within budget.
+"""
+import sys
+import os
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.async_llm import AsyncLLMService
+from core.provider_router import ProviderRouter
+from core.rate_limiter import ProviderLimits, ProviderRateLimiter
+
+
+class SlowCompletions:
+    def __init__(self, text, delay):
+        self.text, self.delay = text, delay
+        self.calls = self.cancelled = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))])
+
+
+def make_service(groq_delay, openrouter_delay, router, limiter=None):
+    groq, openrouter = SlowCompletions("groq", groq_delay), SlowCompletions("openrouter", openrouter_delay)
+    clients = SimpleNamespace(
+        groq=SimpleNamespace(chat=SimpleNamespace(completions=groq)),
+        gemini=None,
+        openrouter=SimpleNamespace(chat=SimpleNamespace(completions=openrouter)),
+    )
+    llm = AsyncLLMService(clients=clients, router=router, limiter=limiter or ProviderRateLimiter({}))
+    return llm, groq, openrouter
+
+
+def warmed_router(llm_model):
+    router = ProviderRouter()
+    for _ in range(30):  # groq usually answers in 50ms
+        router.record_success(f"groq:{llm_model}", 0.05)
+    return router
+
+
+@patch("core.provider_router.config.LLM_HEDGE_MIN_DELAY", 0.01)
+@patch("core.async_llm.config.LLM_HEDGING", True)
+class TestHedging(unittest.TestCase):
+    def ask(self, llm):
+        return asyncio.run(llm.chat([{"role": "user", "content": "x"}]))
+
+    def test_slow_primary_is_hedged(self):
+        router = warmed_router(AsyncLLMService(clients=SimpleNamespace()).groq_model)
+        router._hedge_credit = 1.0
+        llm, groq, openrouter = make_service(1.0, 0.05, router)
+
+        self.assertEqual(self.ask(llm), "openrouter")
+        self.assertEqual((groq.calls, groq.cancelled, openrouter.calls), (1, 1, 1))
+        self.assertEqual(router.hedges["won"], 1)
+        print("  [PASS] Slow primary hedged, loser cancelled")
+
+    def test_cancelled_loser_refunds_its_reservation(self):
+        router = warmed_router(AsyncLLMService(clients=SimpleNamespace()).groq_model)
+        router._hedge_credit = 1.0
+        limiter = ProviderRateLimiter({"groq": ProviderLimits(tpm=100_000)})
+        llm, groq, _ = make_service(1.0, 0.05, router, limiter)
+
+        self.assertEqual(self.ask(llm), "openrouter")
+        self.assertEqual(groq.cancelled, 1)
+        remaining = limiter._local["groq:" + llm.groq_model][1]
+        self.assertGreater(remaining, 100_000 - 50)  # only the loser's prompt stays charged
+        print("  [PASS] A cancelled hedge loser gives its reserved tokens back")
+
+    def test_fast_primary_not_hedged(self):
+        router = warmed_router(AsyncLLMService(clients=SimpleNamespace()).groq_model)
+        router._hedge_credit = 1.0
+        llm, groq, openrouter = make_service(0.01, 0.05, router)
+
+        self.assertEqual(self.ask(llm), "groq")
+        self.assertEqual(openrouter.calls, 0)
+        print("  [PASS] Primary answering within p90 is not hedged")
+
+    def test_budget_caps_hedges(self):
+        service = AsyncLLMService(clients=SimpleNamespace())
+        router = warmed_router(service.groq_model)
+        for _ in range(30):  # keep groq ranked first despite the hedges openrouter wins
+            router.record_success(f"openrouter:{service.openrouter_model}", 2.0)
+        with patch("core.provider_router.config.LLM_HEDGE_BUDGET_RATIO", 0.5):
+            llm, groq, openrouter = make_service(0.2, 0.01, router)
+            answers = [self.ask(llm) for _ in range(4)]
+        self.assertEqual(router.hedges["fired"], 2)  # half a hedge earned per request
+        self.assertEqual(answers.count("openrouter"), 2)
+        self.assertEqual(router.hedges["denied"], 2)
+        print("  [PASS] Hedges capped by the budget ratio")
+
+
+if __name__ == "__main__":
+    unittest.main()
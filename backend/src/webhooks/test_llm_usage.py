@@ -0,0 +1,132 @@
+"""
+LLM usage accounting: per-call tokens/latency/retries recorded per job, per-repo report.
+"""
+import sys
+import os
+import json
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import core.token_budget as token_budget
+from core.async_llm import AsyncLLMService
+from core.llm_usage import UsageRecorder, usage_report, usage_scope
+from core.provider_router import ProviderRouter
+from core.rate_limiter import ProviderRateLimiter
+from core.single_flight import SingleFlight
+
+
+class Completions:
+    def __init__(self, usage=None, error=None):
+        self.usage, self.error = usage, error
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="four words of reply"))],
+            usage=self.usage,
+        )
+
+
+def service(groq, openrouter):
+    clients = SimpleNamespace(
+        groq=SimpleNamespace(chat=SimpleNamespace(completions=groq)), gemini=None,
+        openrouter=SimpleNamespace(chat=SimpleNamespace(completions=openrouter)),
+    )
+    return AsyncLLMService(clients=clients, router=ProviderRouter(), limiter=ProviderRateLimiter({}), flights=SingleFlight())
+
+
+class TestLLMUsage(unittest.TestCase):
+    def setUp(self):
+        # Deterministic ~4 chars per token, with or without tiktoken installed
+        self._encoding = (token_budget._encoding, token_budget._encoding_checked)
+        token_budget._encoding, token_budget._encoding_checked = None, True
+
+    def tearDown(self):
+        token_budget._encoding, token_budget._encoding_checked = self._encoding
+
+    def test_records_every_call_of_the_job(self):
+        groq = Completions(error=RuntimeError("Error code: 429"))
+        openrouter = Completions(usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+        llm = service(groq, openrouter)
+        recorder = UsageRecorder()
+
+        async def run():
+            with usage_scope(recorder):  # per-file tasks inherit the scope
+                await asyncio.gather(*(llm.chat([{"role": "user", "content": f"file {i} " * 10}]) for i in range(3)))
+            await llm.chat([{"role": "user", "content": "outside the job"}])
+
+        with patch("core.llm_usage.config.LLM_PRICES", "openrouter=1/2"):
+            asyncio.run(run())
+            summary = recorder.summary()
+        self.assertEqual((summary["requests"], summary["failures"]), (6, 3))  # each file: groq 429, then openrouter
+        providers = summary["providers"]
+        self.assertEqual(providers[f"openrouter:{llm.openrouter_model}"]["prompt_tokens"], 360)  # reported usage
+        self.assertEqual(summary["estimated_tokens"], providers[f"groq:{llm.groq_model}"]["prompt_tokens"])
+        self.assertAlmostEqual(summary["cost_usd"], (360 * 1 + 90 * 2) / 1_000_000)
+        self.assertEqual(len(summary["latencies_ms"]), 3)
+        print("  [PASS] Provider-reported tokens, failures and cost recorded for the job only")
+
+    def test_joined_request_counts_as_cache_hit(self):
+        llm = service(Completions(usage=SimpleNamespace(prompt_tokens=5, completion_tokens=5)), Completions())
+        recorder = UsageRecorder()
+
+        async def run():
+            with usage_scope(recorder):
+                await asyncio.gather(*(llm.chat([{"role": "user", "content": "same"}]) for _ in range(2)))
+
+        asyncio.run(run())
+        summary = recorder.summary()
+        self.assertEqual((summary["requests"], summary["cache_hits"]), (1, 1))
+        self.assertEqual(summary["cache_hit_kinds"], {"single_flight": 1})
+        print("  [PASS] Coalesced requests are recorded as cache hits, not calls")
+
+    def test_provider_prefix_cache_tokens(self):
+        groq = Completions(usage=SimpleNamespace(
+            prompt_tokens=1000, completion_tokens=50, prompt_tokens_details=SimpleNamespace(cached_tokens=768),
+        ))
+        llm = service(groq, Completions())
+        recorder = UsageRecorder()
+
+        async def run():
+            with usage_scope(recorder):
+                await llm.chat([{"role": "user", "content": "first"}])
+                await llm.chat([{"role": "user", "content": "second"}])
+
+        asyncio.run(run())
+        summary = recorder.summary()
+        self.assertEqual(summary["cached_tokens"], 1536)
+        self.assertEqual(summary["providers"][f"groq:{llm.groq_model}"]["cached_tokens"], 1536)
+        print("  [PASS] Provider prefix-cache hits recorded as cached prompt tokens")
+
+    def test_repo_report(self):
+        def row(job_id, repo, latencies, llm_seconds):
+            return SimpleNamespace(
+                job_id=job_id, repo_full_name=repo, requests=len(latencies), failures=0, retries=1, truncated=0,
+                prompt_tokens=1000, completion_tokens=200, cached_tokens=600, cache_hits=2, cost_usd=0.01,
+                llm_seconds=llm_seconds, latencies_json=json.dumps(latencies),
+                providers_json=json.dumps({"groq:m": {"requests": len(latencies), "prompt_tokens": 1000}}),
+            )
+
+        rows = [
+            row(1, "a/b", [100, 200, 300], 0.6), row(1, "a/b", [400], 0.4),  # review + publish stages
+            row(2, "a/b", [1000], 1.0), row(3, "c/d", [50], 0.05),
+        ]
+        report = usage_report(rows)
+        repo = report["a/b"]
+        self.assertEqual((repo["jobs"], repo["requests"], repo["tokens_per_job"]), (2, 5, 1800))
+        self.assertEqual(repo["call_latency_ms"], {"p50": 300, "p90": 1000, "p99": 1000})
+        self.assertEqual(repo["job_llm_seconds"]["p50"], 1.0)
+        self.assertEqual(repo["prompt_cache_hit_rate"], 0.6)
+        self.assertEqual(repo["providers"]["groq:m"]["requests"], 5)
+        self.assertEqual(report["c/d"]["jobs"], 1)
+        print("  [PASS] Per-repo totals and latency percentiles from stored rows")
+
+
+if __name__ == "__main__":
+    unittest.main()
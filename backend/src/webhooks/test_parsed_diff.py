@@ -0,0 +1,89 @@
+"""
+Verification Script for ParsedDiff
+==================================
+Tests single-pass diff parsing: hunk-bounded line numbering, header flags
+and the serialized form that travels with the job.
+"""
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.parsed_diff import ParsedDiff
+from core.diff_parser import DiffParser
+
+SAMPLE_DIFF = """diff --git a/lib/b/app.py b/lib/b/app.py
+index 83db48f..bf269f4 100644
+--- a/lib/b/app.py
++++ b/lib/b/app.py
+@@ -1,4 +1,5 @@
+ import os
+
+--- old banner
++import sys
++
+ def main():
+@@ -20,2 +21,2 @@ def main():
+-    return 1
++    return 0
+ 
+\\ No newline at end of file
+diff --git a/old_name.py b/new_name.py
+similarity index 95%
+rename from old_name.py
+rename to new_name.py
+diff --git a/logo.png b/logo.png
+new file mode 100644
+Binary files /dev/null and b/logo.png differ
+"""
+
+
+class TestParsedDiff(unittest.TestCase):
+    def setUp(self):
+        self.parsed = ParsedDiff.parse(SAMPLE_DIFF)
+
+    def test_files_and_flags(self):
+        self.assertEqual(self.parsed.paths, ["lib/b/app.py", "new_name.py", "logo.png"])
+        renamed = self.parsed.get("new_name.py")
+        self.assertTrue(renamed.is_rename)
+        self.assertEqual(renamed.old_path, "old_name.py")
+        logo = self.parsed.get("logo.png")
+        self.assertTrue(logo.is_binary and logo.is_new)
+        print("  [PASS] File paths, rename and binary flags detected.")
+
+    def test_blank_context_lines_are_counted(self):
+        app = self.parsed.get("lib/b/app.py")
+        # Line 2 is a blank context line; "--- old banner" is a deletion, not a header
+        self.assertEqual(app.added_lines(), [3, 4, 21])
+        self.assertEqual(app.right_lines(), {1, 2, 3, 4, 5, 21, 22})
+        self.assertEqual((app.additions, app.deletions), (3, 2))
+        self.assertEqual(app.old_line_for(5), 4)
+        self.assertIsNone(app.old_line_for(3))
+        print("  [PASS] Hunk-bounded line numbering handles blank context lines.")
+
+    def test_roundtrip(self):
+        payload = json.loads(json.dumps(self.parsed.to_dict()))
+        restored = ParsedDiff.from_dict(payload, SAMPLE_DIFF)
+        self.assertEqual(restored.file_diffs(), self.parsed.file_diffs())
+        self.assertEqual(restored.get("lib/b/app.py").added_lines(), [3, 4, 21])
+        print("  [PASS] Serialized structure re-attaches to the raw diff.")
+
+    def test_stale_payload_is_reparsed(self):
+        payload = self.parsed.to_dict()
+        edited = SAMPLE_DIFF.replace("import sys", "import re")
+        restored = ParsedDiff.from_dict(payload, edited)
+        self.assertIn("+import re", restored.text("lib/b/app.py"))
+        print("  [PASS] Payload for different text falls back to parsing.")
+
+    def test_diff_parser_compat(self):
+        file_diffs = DiffParser.parse_diff(SAMPLE_DIFF)
+        app_diff = file_diffs["lib/b/app.py"]
+        self.assertEqual(DiffParser.get_valid_right_lines(app_diff), {1, 2, 3, 4, 5, 21, 22})
+        self.assertIn("L   2 ", DiffParser.annotate_diff_with_line_numbers(app_diff))
+        print("  [PASS] DiffParser helpers agree with ParsedDiff.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@
 import sys
 import os
 import json
+import asyncio
 from dotenv import load_dotenv
 
 # Add src to path
@@ -58,7 +59,7 @@ def main():
     # but mock if it fails (or checks output structure).
     
     # For this test, let's let the real LLM run to verify our Prompt Engineering!
-    plan = planner.analyze_pr_complexity(mock_files)
+    plan = asyncio.run(planner.analyze_pr_complexity(mock_files))
     
     print("\n  [Planner Output]:")
     print(json.dumps(plan, indent=2))
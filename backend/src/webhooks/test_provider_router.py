@@ -0,0 +1,128 @@
+"""
+Provider router: latency-aware ordering, circuit breakers, half-open probes, Redis sharing.
+"""
+import sys
+import os
+import time
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.async_llm import AsyncLLMService
+from core.provider_router import CLOSED, HALF_OPEN, OPEN, ProviderRouter, is_rate_limit
+
+KEYS = ["groq:m", "gemini:m", "openrouter:m"]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hash = {}
+
+    async def hset(self, key, mapping):
+        self.hash.update(mapping)
+
+    async def hgetall(self, key):
+        return dict(self.hash)
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code=None, code=None, status=None):
+        super().__init__(message)
+        self.status_code, self.code, self.status = status_code, code, status
+
+
+class TestProviderRouter(unittest.TestCase):
+    def test_rate_limit_classification(self):
+        gemini_400 = StatusError("400 INVALID_ARGUMENT. models/gemini:generateContent: moderate separate", code=400, status="INVALID_ARGUMENT")
+        self.assertFalse(is_rate_limit(gemini_400))
+        self.assertFalse(is_rate_limit(RuntimeError("Error in generateContent: moderate load")))
+        self.assertTrue(is_rate_limit(StatusError("quota", code=429, status="RESOURCE_EXHAUSTED")))
+        self.assertTrue(is_rate_limit(StatusError("slow down", status_code=429)))
+        self.assertFalse(is_rate_limit(StatusError("rate limit in the body of a 500", status_code=500)))
+        self.assertTrue(is_rate_limit(RuntimeError("Error code: 429 - fake provider rate limit")))
+        self.assertTrue(is_rate_limit(RuntimeError("Too Many Requests")))
+
+        router = ProviderRouter(failure_threshold=3, cooldown=60)
+        router.record_failure("gemini:m", gemini_400)
+        self.assertEqual(router.state("gemini:m").circuit, CLOSED)  # one 4xx does not take it out of rotation
+        print("  [PASS] 429s classified by status code; 'generateContent' is not a rate limit")
+
+    def test_routes_to_fastest(self):
+        router = ProviderRouter(alpha=0.5, failure_threshold=10)
+        self.assertEqual(router.order(KEYS), KEYS)  # no data: configured order
+        router.record_success("groq:m", 8.0)
+        router.record_success("gemini:m", 1.0)
+        self.assertEqual(router.order(KEYS), ["gemini:m", "openrouter:m", "groq:m"])  # unknown: assumed 5s
+
+        for _ in range(4):  # errors inflate gemini's expected latency past groq's
+            router.record_failure("gemini:m", RuntimeError("boom"))
+        self.assertEqual(router.order(KEYS[:2]), ["groq:m", "gemini:m"])
+        print("  [PASS] Requests go to the lowest error-weighted EWMA latency")
+
+    def test_circuit_half_open_probe(self):
+        router = ProviderRouter(failure_threshold=2, cooldown=10, max_cooldown=15)
+        router.record_failure("groq:m", RuntimeError("Error code: 429"))
+        self.assertEqual(router.state("groq:m").circuit, OPEN)  # a 429 opens at once
+        self.assertEqual(router.order(KEYS)[-1], "groq:m")
+
+        later = time.time() + 11
+        self.assertEqual(router.order(KEYS, now=later)[0], "groq:m")
+        self.assertEqual(router.state("groq:m").circuit, HALF_OPEN)
+        router.begin("groq:m")
+        self.assertEqual(router.order(KEYS, now=later)[-1], "groq:m")  # one probe at a time
+
+        router.record_failure("groq:m", RuntimeError("still down"))
+        self.assertEqual((router.state("groq:m").circuit, router.state("groq:m").cooldown), (OPEN, 15))
+
+        router.order(KEYS, now=time.time() + 16)
+        router.begin("groq:m")
+        router.record_success("groq:m", 0.5)
+        self.assertEqual(router.state("groq:m").circuit, CLOSED)
+
+        router.record_failure("gemini:m", RuntimeError("boom"))
+        self.assertEqual(router.state("gemini:m").circuit, CLOSED)  # below the threshold
+        router.record_failure("gemini:m", RuntimeError("boom"))
+        self.assertEqual(router.state("gemini:m").circuit, OPEN)
+        print("  [PASS] Circuits open on 429s / repeated errors and close after a good probe")
+
+    def test_shared_through_redis(self):
+        redis = FakeRedis()
+        with patch("core.provider_router.config.ROUTER_SHARED", True):
+            first, second = ProviderRouter(), ProviderRouter()
+            first.attach_redis(redis)
+            second.attach_redis(redis)
+        first.record_failure("groq:m", RuntimeError("429 Too Many Requests"))
+        asyncio.run(first.sync(force=True))
+        asyncio.run(second.sync(force=True))
+        self.assertEqual(second.state("groq:m").circuit, OPEN)
+        print("  [PASS] Circuit state shared across processes through Redis")
+
+    def test_state_survives_new_service_instances(self):
+        calls = []
+
+        class Completions:
+            def __init__(self, name, error=None):
+                self.name, self.error = name, error
+
+            async def create(self, **kwargs):
+                calls.append(self.name)
+                if self.error:
+                    raise self.error
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+        def client(name, error=None):
+            return SimpleNamespace(chat=SimpleNamespace(completions=Completions(name, error)))
+
+        router = ProviderRouter()
+        clients = SimpleNamespace(groq=client("groq", RuntimeError("429")), gemini=None, openrouter=client("openrouter"))
+        for _ in range(2):  # one service per job, as in ReviewWorker
+            asyncio.run(AsyncLLMService(clients=clients, router=router).chat([{"role": "user", "content": "x"}]))
+        self.assertEqual(calls, ["groq", "openrouter", "openrouter"])
+        print("  [PASS] A new AsyncLLMService keeps the shared circuit state")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+"""
+Per-provider RPM/TPM buckets: reservation, reconciliation, spill-over across providers.
+"""
+import sys
+import os
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import core.token_budget as token_budget
+from core.async_llm import AsyncLLMService
+from core.provider_router import ProviderRouter
+from core.rate_limiter import ProviderLimits, ProviderRateLimiter, TokenBucketRateLimiter, _take
+
+
+class Completions:
+    def __init__(self, name, calls, text="ok"):
+        self.name, self.calls, self.text = name, calls, text
+
+    async def create(self, **kwargs):
+        self.calls.append(self.name)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))])
+
+
+def clients(calls, **texts):
+    def client(name):
+        return SimpleNamespace(chat=SimpleNamespace(completions=Completions(name, calls, texts.get(name, "ok"))))
+    return SimpleNamespace(groq=client("groq"), gemini=None, openrouter=client("openrouter"))
+
+
+class BrokenRedis:
+    async def incr(self, *args):
+        raise ConnectionError("redis down")
+
+    async def script_load(self, *args):
+        raise ConnectionError("redis down")
+
+    async def hincrbyfloat(self, *args):
+        raise ConnectionError("redis down")
+
+
+class BucketRedis:
+    """TOKEN_BUCKET_LUA in Python (no Lua runtime here)."""
+
+    def __init__(self, tokens):
+        self.tokens, self.last = tokens, None
+        self.loads = 0
+        self.flushed = False
+
+    async def script_load(self, source):
+        self.loads += 1
+        return "sha"
+
+    async def evalsha(self, sha, numkeys, *args):
+        if self.flushed:
+            self.flushed = False
+            raise RuntimeError("NOSCRIPT No matching script. Please use EVAL.")
+        capacity, rate, requested, now = args[numkeys:numkeys + 4]
+        if self.last is not None:
+            self.tokens = min(capacity, self.tokens + (now - self.last) * rate)
+        self.last = now
+        if self.tokens >= requested:
+            self.tokens -= requested
+            return [1, "0"]
+        return [0, str((requested - self.tokens) / rate)]
+
+
+class QueueRedis:
+    """PROVIDER_BUCKET_LUA's buckets + ticket queue, in Python."""
+
+    def __init__(self):
+        self.bucket = None
+        self.queue = []
+        self.tickets = 0
+
+    async def incr(self, key):
+        self.tickets += 1
+        return self.tickets
+
+    async def script_load(self, source):
+        return "sha"
+
+    async def evalsha(self, sha, numkeys, *args):
+        rpm, tpm, wanted, now, ticket = args[numkeys:numkeys + 5]
+        if ticket not in self.queue:
+            self.queue = sorted(self.queue + [ticket])
+        ahead = self.queue.index(ticket)
+        self.bucket, wait = _take(self.bucket, ProviderLimits(rpm, tpm), wanted, now, ahead)
+        if wait == 0:
+            self.queue.remove(ticket)
+        return str(wait)
+
+    async def zrem(self, key, ticket):
+        if ticket in self.queue:
+            self.queue.remove(ticket)
+
+    async def hdel(self, key, ticket):
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    async def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+
+def token_bucket(redis, rpm=60):
+    with patch("core.rate_limiter.config.LLM_RPM_LIMIT", rpm):
+        limiter = TokenBucketRateLimiter(SimpleNamespace(redis=redis))
+    return limiter
+
+
+class TestTokenBucketRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = patch.multiple("core.rate_limiter", time=self.clock, asyncio=self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        TokenBucketRateLimiter.script.sha = None  # as in a fresh process
+
+    def test_sleeps_exactly_until_tokens_accrue(self):
+        redis = BucketRedis(tokens=1)
+        limiter = token_bucket(redis, rpm=6)  # one token per 10s
+
+        async def run():
+            return [await limiter.acquire(timeout=60) for _ in range(3)]
+
+        self.assertEqual(asyncio.run(run()), [True, True, True])
+        self.assertEqual(self.clock.sleeps, [10.0, 10.0])
+        self.assertEqual(redis.loads, 1)
+        print("  [PASS] Waiters sleep exactly the refill time; the script is loaded once")
+
+    def test_reloads_flushed_script(self):
+        redis = BucketRedis(tokens=5)
+        limiter = token_bucket(redis)
+
+        async def run():
+            await limiter.acquire()
+            redis.flushed = True
+            return await limiter.acquire()
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(redis.loads, 2)
+        print("  [PASS] NOSCRIPT reloads the script and retries")
+
+
+class TestProviderRateLimiter(unittest.TestCase):
+    def setUp(self):
+        # Deterministic ~4 chars per token, with or without tiktoken installed
+        self._encoding = (token_budget._encoding, token_budget._encoding_checked)
+        token_budget._encoding, token_budget._encoding_checked = None, True
+        ProviderRateLimiter.script.sha = None
+
+    def tearDown(self):
+        token_budget._encoding, token_budget._encoding_checked = self._encoding
+
+    def test_bucket_arithmetic(self):
+        limits = ProviderLimits(rpm=60, tpm=6000)
+        bucket, wait = _take(None, limits, 5000, now=0.0)
+        self.assertEqual((bucket[:2], wait), ([59, 1000], 0.0))
+        bucket, wait = _take(bucket, limits, 2000, now=0.0)
+        self.assertAlmostEqual(wait, 10.0)  # 1000 tokens short at 100 tokens/s
+        self.assertEqual(bucket[1], 1000)  # nothing taken while waiting
+        _, wait = _take(bucket, limits, 2000, now=10.0)
+        self.assertEqual(wait, 0.0)
+        print("  [PASS] Requests and tokens refill per minute; a short bucket reports its wait")
+
+    def test_reconcile_returns_unused_reservation(self):
+        limiter = ProviderRateLimiter({"groq": ProviderLimits(tpm=1000)})
+
+        async def run():
+            self.assertTrue(await limiter.acquire("groq:m", "groq", 900, timeout=0))
+            self.assertFalse(await limiter.acquire("groq:m", "groq", 900, timeout=0))
+            await limiter.reconcile("groq:m", "groq", reserved=900, used=100)
+            return await limiter.acquire("groq:m", "groq", 900, timeout=0)
+
+        self.assertTrue(asyncio.run(run()))
+        print("  [PASS] Reconciling with the real usage frees the over-reserved tokens")
+
+    def test_redis_failure_uses_local_bucket(self):
+        limiter = ProviderRateLimiter({"groq": ProviderLimits(rpm=1)})
+        limiter.attach_redis(BrokenRedis())
+
+        async def run():
+            return [await limiter.acquire("groq:m", "groq", 10, timeout=0) for _ in range(2)]
+
+        self.assertEqual(asyncio.run(run()), [True, False])
+        print("  [PASS] Redis errors fall back to in-process buckets")
+
+    def test_newcomer_waits_behind_queued_ticket(self):
+        redis = QueueRedis()
+        redis.queue = [0]  # a large reservation waiting for the TPM bucket (asleep right now)
+        limiter = ProviderRateLimiter({"groq": ProviderLimits(tpm=1000)})
+        limiter.attach_redis(redis)
+
+        self.assertFalse(asyncio.run(limiter.acquire("groq:m", "groq", 10, timeout=0)))
+        self.assertEqual(redis.queue, [0])  # the newcomer left the queue on timeout
+        self.assertEqual(redis.bucket[1], 1000)  # and didn't take the head's tokens
+        print("  [PASS] Tokens go to the longest waiter first")
+
+    def test_local_queue_serves_tickets_in_order(self):
+        limiter = ProviderRateLimiter({"groq": ProviderLimits(tpm=1000)})
+        limiter._queues["groq:m"] = [0]  # someone else queued first
+
+        self.assertFalse(asyncio.run(limiter.acquire("groq:m", "groq", 10, timeout=0)))
+        self.assertEqual(limiter._queues["groq:m"], [0])
+        limiter._queues["groq:m"].clear()  # the head is served
+        self.assertTrue(asyncio.run(limiter.acquire("groq:m", "groq", 10, timeout=0)))
+        print("  [PASS] The in-process queue is first come, first served too")
+
+    def test_spills_over_to_provider_with_quota(self):
+        calls = []
+        limiter = ProviderRateLimiter({"groq": ProviderLimits(rpm=2), "openrouter": ProviderLimits(rpm=100)})
+        llm = AsyncLLMService(clients=clients(calls), router=ProviderRouter(), limiter=limiter)
+
+        async def run():
+            return [await llm.chat([{"role": "user", "content": str(i)}]) for i in range(4)]
+
+        self.assertEqual(asyncio.run(run()), ["ok"] * 4)
+        self.assertEqual(calls, ["groq", "groq", "openrouter", "openrouter"])
+        print("  [PASS] A provider out of quota is skipped instead of drawing a 429")
+
+    def test_tokens_charged_per_call(self):
+        calls = []
+        limiter = ProviderRateLimiter({"groq": ProviderLimits(tpm=1000)})
+        llm = AsyncLLMService(clients=clients(calls, groq="short"), router=ProviderRouter(), limiter=limiter)
+        prompt = [{"role": "user", "content": "x" * 400}]  # ~100 tokens
+
+        async def run():
+            for _ in range(3):  # reserves 100 + 600 each: only fits because each settles at ~102
+                await llm.chat(prompt, max_tokens=600)
+
+        asyncio.run(run())
+        self.assertEqual(calls, ["groq", "groq", "groq"])
+        self.assertLess(limiter._local["groq:" + llm.groq_model][1], 1000 - 300)
+        print("  [PASS] Calls reserve prompt + max_tokens and settle at the real size")
+
+
+if __name__ == "__main__":
+    unittest.main()
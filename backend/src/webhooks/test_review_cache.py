@@ -0,0 +1,120 @@
+"""
+Review cache: keying, LRU/TTL-bounded storage, and reuse inside the reviewer.
+"""
+import sys
+import os
+import time
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.review_cache import ReviewCache, ENTRY_KEY_PREFIX
+from test_concurrent_review import SlowLLM, make_agent, make_diff
+
+
+class FakeRedis:
+    """The handful of Redis commands ReviewCache uses, in memory."""
+
+    def __init__(self):
+        self.kv = {}
+        self.zset = {}
+
+    async def get(self, key):
+        return self.kv.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.kv[key] = value
+
+    async def delete(self, *keys):
+        for k in keys:
+            self.kv.pop(k, None)
+
+    async def zadd(self, key, mapping):
+        self.zset.update(mapping)
+
+    async def zcard(self, key):
+        return len(self.zset)
+
+    async def zrange(self, key, start, stop):
+        ordered = sorted(self.zset, key=self.zset.get)
+        return ordered[start:stop + 1]
+
+    async def zrem(self, key, *members):
+        for m in members:
+            self.zset.pop(m, None)
+
+    async def zremrangebyscore(self, key, low, high):
+        for m in [m for m, score in self.zset.items() if score <= high]:
+            del self.zset[m]
+
+
+def key_for(**overrides):
+    parts = dict(file_diff="+a", full_file="a", context="ctx", model="m", prompt_version="v1", custom_checks=["x"])
+    parts.update(overrides)
+    return ReviewCache.make_key(**parts)
+
+
+class TestReviewCache(unittest.TestCase):
+    def test_key_covers_every_input(self):
+        base = key_for()
+        self.assertEqual(base, key_for())
+        for field, value in [("file_diff", "+b"), ("full_file", "b"), ("context", "other"),
+                             ("model", "m2"), ("prompt_version", "v2"), ("custom_checks", ["y"])]:
+            self.assertNotEqual(base, key_for(**{field: value}), field)
+        print("  [PASS] Cache key changes with every component")
+
+    def test_size_bound_evicts_least_recently_used(self):
+        redis = FakeRedis()
+        cache = ReviewCache(redis, ttl_seconds=3600, max_entries=3)
+
+        async def scenario():
+            for i in range(3):
+                await cache.set(f"k{i}", {"i": i})
+                await asyncio.sleep(0.001)
+            await cache.get("k0")  # k0 becomes most recently used
+            await asyncio.sleep(0.001)
+            await cache.set("k3", {"i": 3})
+
+        asyncio.run(scenario())
+        self.assertEqual(sorted(redis.zset), ["k0", "k2", "k3"])
+        self.assertNotIn(ENTRY_KEY_PREFIX + "k1", redis.kv)
+        print("  [PASS] Oldest unused entry evicted past max_entries")
+
+    def test_expired_index_entries_are_trimmed(self):
+        redis = FakeRedis()
+        cache = ReviewCache(redis, ttl_seconds=60, max_entries=10)
+        redis.zset["old"] = time.time() - 120
+        asyncio.run(cache.set("new", {}))
+        self.assertEqual(list(redis.zset), ["new"])
+        print("  [PASS] Index entries older than the TTL are trimmed")
+
+    def test_reviewer_reuses_cached_results(self):
+        n = 4
+        cache = ReviewCache(FakeRedis())
+        first_llm, second_llm = SlowLLM(n, delay=0), SlowLLM(n, delay=0)
+        first_agent, second_agent = make_agent(first_llm), make_agent(second_llm)
+        first_agent.review_cache = second_agent.review_cache = cache
+
+        first = first_agent.run_inline_review(make_diff(n), "Title", "")
+        calls = []
+
+        async def counting_chat(messages, **kwargs):
+            calls.append(messages)
+            return await SlowLLM(n, delay=0).chat(messages, **kwargs)
+
+        second_llm.chat = counting_chat
+        second = second_agent.run_inline_review(make_diff(n), "Title", "")
+
+        self.assertEqual(calls, [])
+        self.assertEqual(second["inline_comments"], first["inline_comments"])
+        self.assertEqual(second["stats"]["cached_files"], n - 1)  # f3.py is ignored by the planner
+
+        # A different PR title changes the context, so every file misses
+        second_agent.run_inline_review(make_diff(n), "Other title", "")
+        self.assertEqual(len(calls), n - 1)
+        print("  [PASS] Unchanged files are served from the cache")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Heuristic planner fast path: local risk scoring for small PRs, LLM planner for the rest.
+"""
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agents.planner import ReviewPlanner
+from core.risk_scorer import heuristic_plan, score_file
+
+
+def pr_file(filename, added="x = 1", additions=1, deletions=0):
+    patch = "@@ -0,0 +1 @@\n" + "\n".join("+" + line for line in added.splitlines())
+    return {"filename": filename, "patch": patch, "additions": additions, "deletions": deletions}
+
+
+class TestRiskScorer(unittest.TestCase):
+    def test_signals(self):
+        self.assertTrue(score_file(pr_file("backend/auth/login.py")).high_risk)
+        self.assertTrue(score_file(pr_file("utils/run.py", added="subprocess.call(cmd, shell=True)")).high_risk)
+        self.assertTrue(score_file(pr_file("README.md")).ignore)
+        self.assertTrue(score_file(pr_file("yarn.lock")).ignore)
+        self.assertFalse(score_file(pr_file("frontend/styles/main.css")).ambiguous)
+
+        plain = score_file(pr_file("utils/strings.py", added="def pad(s):\n    return s + ' '"))
+        self.assertFalse(plain.high_risk or plain.ignore or plain.ambiguous)
+
+        branchy = "\n".join(f"if a{i} and b{i}:" for i in range(8))
+        self.assertGreater(score_file(pr_file("utils/rules.py", added=branchy)).score, plain.score)
+        print("  [PASS] Path, file type, sensitive APIs and complexity scored")
+
+    def test_plan_for_small_clear_pr(self):
+        plan = heuristic_plan([
+            pr_file("backend/auth/login.py", added="password = request.form['p']"),
+            pr_file("utils/strings.py"),
+            pr_file("README.md"),
+        ])
+        self.assertEqual(plan["high_risk_files"], ["backend/auth/login.py"])
+        self.assertEqual(plan["ignore_files"], ["README.md"])
+        self.assertEqual(plan["review_strategy"], "focus_on_critical")
+        self.assertIn("security-sensitive path", plan["focus_instructions"])
+        print("  [PASS] Small PR planned locally")
+
+    def test_large_or_ambiguous_defer_to_llm(self):
+        self.assertIsNone(heuristic_plan([pr_file(f"f{i}.py") for i in range(50)]))
+        self.assertIsNone(heuristic_plan([pr_file("f.py", additions=5000)]))
+        self.assertIsNone(heuristic_plan([pr_file("assets/data.bin")]))  # unknown file type
+        self.assertIsNone(heuristic_plan([pr_file("api/users.py", additions=60)]))  # just under the threshold
+        print("  [PASS] Large and ambiguous PRs deferred to the LLM planner")
+
+    def test_planner_skips_llm_on_fast_path(self):
+        llm = MagicMock()
+        llm.chat = AsyncMock(return_value='{"high_risk_files": [], "ignore_files": []}')
+        planner = ReviewPlanner(llm_service=llm)
+
+        plan = asyncio.run(planner.analyze_pr_complexity([pr_file("utils/strings.py")]))
+        self.assertEqual(plan["planner"], "heuristic")
+        llm.chat.assert_not_called()
+
+        asyncio.run(planner.analyze_pr_complexity([pr_file(f"f{i}.py") for i in range(50)]))
+        llm.chat.assert_called_once()
+        print("  [PASS] Planner LLM called only for PRs the scorer defers")
+
+
+if __name__ == "__main__":
+    unittest.main()
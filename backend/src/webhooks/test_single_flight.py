@@ -0,0 +1,139 @@
+"""
+Single-flight: identical concurrent LLM requests share one provider call, in process and through Redis.
+"""
+import sys
+import os
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.async_llm import AsyncLLMService
+from core.provider_router import ProviderRouter
+from core.rate_limiter import ProviderRateLimiter
+from core.single_flight import SingleFlight
+
+
+class Completions:
+    def __init__(self, delay=0.05, fail_first=False):
+        self.calls = 0
+        self.delay, self.fail_first = delay, fail_first
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail_first and self.calls == 1:
+            raise RuntimeError("Error code: 429")  # not retried by the Groq helper
+        content = f"reply to {kwargs['messages'][-1]['content']}"
+        if kwargs.get("stream"):
+            return Stream(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class Stream:
+    def __init__(self, text):
+        self.chunks = [text[:5], text[5:]]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.chunks.pop(0)))])
+
+    async def close(self):
+        pass
+
+
+def service(completions, flights=None):
+    clients = SimpleNamespace(groq=SimpleNamespace(chat=SimpleNamespace(completions=completions)), gemini=None, openrouter=None)
+    return AsyncLLMService(clients=clients, router=ProviderRouter(failure_threshold=10), limiter=ProviderRateLimiter({}), flights=flights or SingleFlight())
+
+
+def ask(content):
+    return [{"role": "user", "content": content}]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_identical_requests_share_one_call(self):
+        completions = Completions()
+        llm = service(completions)
+
+        async def run():
+            return await asyncio.gather(
+                llm.chat(ask("a")), llm.chat(ask("a")), llm.chat(ask("a")), llm.chat(ask("b")),
+            )
+
+        self.assertEqual(asyncio.run(run()), ["reply to a"] * 3 + ["reply to b"])
+        self.assertEqual(completions.calls, 2)
+        self.assertEqual(llm.flights.stats, {"led": 2, "coalesced": 2})
+        print("  [PASS] Three identical concurrent prompts made one provider call")
+
+    def test_failed_leader_hands_over(self):
+        completions = Completions(fail_first=True)
+        llm = service(completions)
+
+        async def run():
+            return await asyncio.gather(llm.chat(ask("a")), llm.chat(ask("a")))
+
+        self.assertEqual(asyncio.run(run()), ["", "reply to a"])
+        self.assertEqual(completions.calls, 2)
+        print("  [PASS] A waiter makes its own call when the leader fails")
+
+    def test_stream_follower_gets_whole_reply(self):
+        completions = Completions()
+        llm = service(completions)
+
+        async def collect():
+            return [chunk async for chunk in llm.chat_stream(ask("a"))]
+
+        async def run():
+            return await asyncio.gather(collect(), collect())
+
+        leader, follower = asyncio.run(run())
+        self.assertEqual((leader, follower), (["reply", " to a"], ["reply to a"]))
+        self.assertEqual(completions.calls, 1)
+        print("  [PASS] A concurrent identical stream receives the leader's reply")
+
+    def test_coalesces_across_processes(self):
+        redis = FakeRedis()
+        with patch("core.single_flight.config.LLM_SINGLE_FLIGHT_SHARED", True):
+            first, second = SingleFlight(), SingleFlight()  # one per worker process
+            first.attach_redis(redis)
+            second.attach_redis(redis)
+        completions = Completions(delay=0.3)
+        a, b = service(completions, first), service(completions, second)
+
+        async def run():
+            leader = asyncio.create_task(a.chat(ask("a")))
+            await asyncio.sleep(0.05)
+            return await asyncio.gather(leader, b.chat(ask("a")))
+
+        self.assertEqual(asyncio.run(run()), ["reply to a"] * 2)
+        self.assertEqual(completions.calls, 1)
+        self.assertFalse(any(k.endswith(":lock") for k in redis.data))  # released
+        print("  [PASS] A second worker waits on the first one's call through Redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Token budget: model limits, priority allocation and review prompt sizing.
+"""
+import sys
+import os
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import core.token_budget as token_budget
+from config import config
+from core.parsed_diff import ParsedDiff
+from core.token_budget import (
+    DEFAULT_LIMITS, ModelLimits, TokenBudget, chain_limits, count_tokens, limits_for, output_budget, truncate_to_tokens,
+)
+from agents.reviewer import COMPACT_REVIEW_NOTE
+from test_concurrent_review import SlowLLM, make_agent
+
+
+class TestTokenBudget(unittest.TestCase):
+    def setUp(self):
+        # Deterministic ~4 chars per token, with or without tiktoken installed
+        self._encoding = (token_budget._encoding, token_budget._encoding_checked)
+        token_budget._encoding, token_budget._encoding_checked = None, True
+
+    def tearDown(self):
+        token_budget._encoding, token_budget._encoding_checked = self._encoding
+
+    def test_model_limits(self):
+        self.assertEqual(limits_for("openai/gpt-oss-120b").context_window, 131072)
+        self.assertEqual(limits_for("meta-llama/llama-3.1-405b-instruct:free").max_output, 4096)
+        self.assertEqual(limits_for("gemini-3-flash-preview").context_window, 1048576)
+        self.assertEqual(limits_for("someone/unknown-model"), DEFAULT_LIMITS)
+        chain = chain_limits(["gemini-3-flash-preview", "meta-llama/llama-3.1-405b-instruct:free", None])
+        self.assertEqual(chain, ModelLimits(131072, 4096))
+        print("  [PASS] Model limits resolved, chain sized for the smallest window")
+
+    def test_priority_allocation(self):
+        budget = TokenBudget(ModelLimits(100000, 4096), fixed_tokens=0, max_prompt_tokens=300)
+        self.assertEqual(budget.total, 300)
+        sections = [("diff", "d" * 800), ("symbols", "s" * 600), ("full_file", "f" * 4000)]
+        allocated = budget.allocate(sections)
+        self.assertEqual(allocated["diff"], "d" * 800)  # 201 tokens, fits
+        self.assertTrue(allocated["symbols"].endswith("[truncated]"))
+        self.assertLessEqual(count_tokens(allocated["symbols"]), 300 - count_tokens("d" * 800))
+        self.assertEqual(allocated["full_file"], "")
+        print("  [PASS] Higher-priority sections are kept whole, the rest truncated or dropped")
+
+    def test_budget_reserves_output_and_fixed_text(self):
+        budget = TokenBudget(ModelLimits(10000, 2000), fixed_tokens=1000, output_tokens=8000, max_prompt_tokens=50000)
+        self.assertEqual(budget.output_tokens, 2000)  # capped at the model's output limit
+        self.assertEqual(budget.total, 9500 - 2000 - 1000)
+        self.assertEqual(truncate_to_tokens("x" * 100, 2), "")
+        print("  [PASS] Output reservation and fixed prompt text come off the window")
+
+    def test_review_prompt_fits_budget(self):
+        added = "".join(f"+value_{i} = {i}  # padding padding padding\n" for i in range(3000))
+        diff = f"diff --git a/f0.py b/f0.py\n--- a/f0.py\n+++ b/f0.py\n@@ -0,0 +1,3000 @@\n{added}"
+        plan = {"high_risk_files": set(), "ignore_files": set(), "focus_instructions": ""}
+        agent = make_agent(SlowLLM(1, delay=0))
+        prepared = asyncio.run(agent._prepare_file("f0.py", diff, ParsedDiff.parse(diff), "Title", None, plan))
+
+        prompt_tokens = count_tokens(prepared.user_prompt) + agent._system_prompt_tokens()
+        self.assertTrue(prepared.safe_diff.endswith("[truncated]"))
+        self.assertLessEqual(prompt_tokens, config.REVIEW_PROMPT_MAX_TOKENS)
+        self.assertGreater(prompt_tokens, config.REVIEW_PROMPT_MAX_TOKENS * 0.9)
+        print("  [PASS] Oversized diff truncated to the prompt budget")
+
+        self.assertFalse(prepared.compact)
+        self.assertEqual(prepared.max_tokens, min(config.REVIEW_OUTPUT_TOKENS, agent._model_limits().max_output))
+
+    def test_output_budget_follows_diff_size_and_risk(self):
+        small, large = ModelLimits(131072, 4096), ModelLimits(131072, 65536)
+        base, per_line = config.REVIEW_OUTPUT_MIN_TOKENS, config.REVIEW_OUTPUT_TOKENS_PER_LINE
+        self.assertEqual(output_budget(0, False, large), base)
+        self.assertEqual(output_budget(100, False, large), base + 100 * per_line)
+        self.assertEqual(output_budget(100, True, large), int((base + 100 * per_line) * config.REVIEW_OUTPUT_HIGH_RISK_FACTOR))
+        self.assertEqual(output_budget(100, True, small), 4096)  # the model's output limit
+        self.assertEqual(output_budget(100000, False, large), config.REVIEW_OUTPUT_TOKENS)
+
+        diff = "diff --git a/f0.py b/f0.py\n--- a/f0.py\n+++ b/f0.py\n@@ -1,1 +1,2 @@\n ctx\n+value = 1\n"
+        plan = {"high_risk_files": set(), "ignore_files": set(), "focus_instructions": ""}
+        prepared = asyncio.run(make_agent(SlowLLM(1, delay=0))._prepare_file("f0.py", diff, ParsedDiff.parse(diff), "Title", None, plan))
+        self.assertTrue(prepared.compact)
+        self.assertIn(COMPACT_REVIEW_NOTE, prepared.user_prompt)
+        self.assertEqual(prepared.max_tokens, base + per_line)
+        print("  [PASS] Reply budget grows with the diff and risk; small low-risk files ask for compact findings")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Triage cascade: cheap classification before the deep review, per-repo settings, savings stats.
+"""
+import sys
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config
+import core.token_budget as token_budget
+from core.triage import TriageFile, TriageSettings, load_triage_settings, triage_files
+from test_concurrent_review import SlowLLM, make_agent, make_diff
+
+
+class TriageLLM(SlowLLM):
+    """Triage requests get `verdicts`; deep reviews are answered (and counted) like SlowLLM."""
+
+    def __init__(self, n_files, verdicts):
+        super().__init__(n_files, delay=0)
+        self.verdicts = verdicts
+        self.triage_prompts = []
+        self.deep_reviews = 0
+
+    async def chat(self, messages, **kwargs):
+        if "You triage pull request diffs" in messages[0]["content"]:
+            self.triage_prompts.append(messages[-1]["content"])
+            return json.dumps({"files": self.verdicts})
+        self.deep_reviews += 1
+        return await super().chat(messages, **kwargs)
+
+
+def triage_file(path, added="x = 1", high_risk=False):
+    return TriageFile(path, f"@@ -0,0 +1 @@\n+{added}\n", additions=1, high_risk=high_risk)
+
+
+class TestTriage(unittest.TestCase):
+    def setUp(self):
+        # Deterministic ~4 chars per token, with or without tiktoken installed
+        self._encoding = (token_budget._encoding, token_budget._encoding_checked)
+        token_budget._encoding, token_budget._encoding_checked = None, True
+
+    def tearDown(self):
+        token_budget._encoding, token_budget._encoding_checked = self._encoding
+
+    def test_repo_settings(self):
+        with tempfile.TemporaryDirectory() as repo:
+            with open(os.path.join(repo, ".pr-reviewer.yml"), "w") as f:
+                f.write("triage:\n  mode: heuristic\n  min_risk_score: 3\n")
+            with patch.object(config, "TRIAGE_ENABLED", True):
+                settings = load_triage_settings(repo)
+                self.assertFalse(TriageSettings.from_repo_config({"triage": False}).enabled)
+                self.assertEqual(TriageSettings.from_repo_config({"triage": {"mode": "magic"}}).mode, "model")
+        self.assertEqual((settings.enabled, settings.mode, settings.min_risk_score), (True, "heuristic", 3))
+        print("  [PASS] .pr-reviewer.yml tightens triage defaults")
+
+    def test_head_config_cannot_loosen_triage(self):
+        with tempfile.TemporaryDirectory() as repo:
+            with open(os.path.join(repo, ".pr-reviewer.yml"), "w") as f:
+                f.write("triage:\n  enabled: true\n  mode: model\n  min_clean_confidence: 0\n  min_risk_score: 99\n")
+            with patch.object(config, "TRIAGE_ENABLED", False):
+                self.assertFalse(load_triage_settings(repo).enabled)
+            with patch.object(config, "TRIAGE_ENABLED", True), patch.object(config, "TRIAGE_MODE", "heuristic"):
+                settings = load_triage_settings(repo)
+        self.assertEqual(
+            (settings.mode, settings.min_risk_score, settings.min_clean_confidence),
+            ("heuristic", config.TRIAGE_MIN_RISK_SCORE, config.TRIAGE_MIN_CLEAN_CONFIDENCE),
+        )
+        print("  [PASS] A PR's own .pr-reviewer.yml cannot turn triage on or loosen it")
+
+    def test_cheap_model_verdicts(self):
+        llm = TriageLLM(0, [
+            {"path": "a.py", "verdict": "clean", "confidence": 0.95, "reason": "rename"},
+            {"path": "b.py", "verdict": "clean", "confidence": 0.4},
+        ])
+        files = [
+            triage_file("a.py"), triage_file("b.py"), triage_file("c.py"),
+            triage_file("d.py", added="os.system(cmd)"), triage_file("e.py", high_risk=True),
+        ]
+        result = asyncio.run(triage_files(files, TriageSettings(enabled=True), llm))
+        self.assertEqual(result.clean, {"a.py": "rename"})
+        self.assertEqual(sorted(result.suspicious), ["b.py", "c.py", "d.py", "e.py"])
+        self.assertEqual(result.model_files, 3)  # d.py and e.py never reach the cheap model
+        self.assertNotIn("d.py", llm.triage_prompts[0])
+        print("  [PASS] Low-confidence, unanswered and risky files stay suspicious")
+
+    def test_failure_means_full_review(self):
+        class DownLLM:
+            async def chat(self, messages, **kwargs):
+                raise ConnectionError("down")
+
+        result = asyncio.run(triage_files([triage_file("a.py")], TriageSettings(enabled=True), DownLLM()))
+        self.assertEqual((result.clean, result.suspicious), ({}, ["a.py"]))
+        print("  [PASS] Triage failure falls back to deep-reviewing everything")
+
+    def test_reviewer_skips_clean_files(self):
+        n = 4  # f3.py is ignored by the planner
+        llm = TriageLLM(n, [{"path": "f1.py", "verdict": "clean", "confidence": 0.9, "reason": "constant"}])
+        result = make_agent(llm).run_inline_review(
+            make_diff(n), "Title", "", triage=TriageSettings(enabled=True),
+        )
+        self.assertEqual(llm.deep_reviews, 2)
+        self.assertIn("f1.py", result["clean_files"])
+        stats = result["stats"]
+        self.assertEqual(stats["triaged_files"], 1)
+        self.assertEqual(stats["triage"]["clean_files"], ["f1.py"])
+        self.assertGreater(stats["triage"]["deep_tokens_avoided"], 0)
+        self.assertIsNotNone(stats["triage"]["deep_seconds_avoided"])
+        print("  [PASS] Clean files skip the deep review, savings recorded in stats")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Verification Script for Workspace GC
+====================================
+Tests mirror eviction ordering and the fetch/maintenance markers.
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.mirror_cache import MirrorCache
+from core.workspace_gc import (
+    GC_LOCK_KEY, MirrorInfo, WorkspaceGC, select_mirrors_to_evict, mark_mirror_fetched, mirror_last_fetch,
+)
+
+MB = 1024 * 1024
+
+
+class TestMirrorEviction(unittest.TestCase):
+    def setUp(self):
+        self.now = 1_000_000.0
+        self.mirrors = [
+            MirrorInfo("a/old", "/m/a/old.git", 100 * MB, self.now - 5000),
+            MirrorInfo("b/mid", "/m/b/mid.git", 300 * MB, self.now - 3000),
+            MirrorInfo("c/new", "/m/c/new.git", 200 * MB, self.now - 10),
+        ]
+
+    def test_evicts_lru_until_enough_freed(self):
+        evicted = select_mirrors_to_evict(self.mirrors, 350 * MB, self.now, 0, set())
+        self.assertEqual([m.repo_full_name for m in evicted], ["a/old", "b/mid"])
+        print("  [PASS] LRU eviction stops once enough bytes are freed.")
+
+    def test_nothing_to_free(self):
+        evicted = select_mirrors_to_evict(self.mirrors, 0, self.now, 0, set())
+        self.assertEqual(evicted, [])
+        print("  [PASS] No eviction below the high-water mark.")
+
+    def test_protected_mirrors_are_skipped(self):
+        evicted = select_mirrors_to_evict(self.mirrors, 150 * MB, self.now, 0, {"a/old"})
+        self.assertEqual([m.repo_full_name for m in evicted], ["b/mid"])
+        print("  [PASS] Mirrors with active jobs are never evicted.")
+
+    def test_idle_mirrors_always_evicted(self):
+        evicted = select_mirrors_to_evict(self.mirrors, 0, self.now, 4000, set())
+        self.assertEqual([m.repo_full_name for m in evicted], ["a/old"])
+        print("  [PASS] Idle mirrors are evicted regardless of disk usage.")
+
+    def test_largest_first_on_ties(self):
+        tied = [
+            MirrorInfo("x/small", "/m/x/small.git", 10 * MB, self.now - 100),
+            MirrorInfo("y/big", "/m/y/big.git", 500 * MB, self.now - 100),
+        ]
+        evicted = select_mirrors_to_evict(tied, 1 * MB, self.now, 0, set())
+        self.assertEqual([m.repo_full_name for m in evicted], ["y/big"])
+        print("  [PASS] Largest mirror goes first among equally stale ones.")
+
+
+class TestMarkers(unittest.TestCase):
+    def test_fetch_marker_roundtrip(self):
+        with tempfile.TemporaryDirectory() as mirror:
+            before = time.time()
+            mark_mirror_fetched(mirror)
+            self.assertGreaterEqual(mirror_last_fetch(mirror), before - 1)
+        print("  [PASS] Fetch marker records the last fetch time.")
+
+
+class TestMirrorLock(unittest.TestCase):
+    def test_locked_mirror_is_not_evicted(self):
+        with tempfile.TemporaryDirectory() as root, patch("core.workspace_gc.os.getcwd", return_value=root):
+            mirror = os.path.join(root, "workspaces", "mirrors", "a", "old.git")
+            os.makedirs(mirror)
+            gc = WorkspaceGC(db_session_factory=None)
+            gc.max_idle_seconds = 1
+            gc._load_job_states = AsyncMock(return_value=(set(), set()))
+            os.utime(mirror, (time.time() - 60, time.time() - 60))
+
+            async def run():
+                async with MirrorCache().try_lock("a/old") as locked:
+                    self.assertTrue(locked)
+                    while_fetching = await gc.run_once()
+                return while_fetching, await gc.run_once()
+
+            while_fetching, after = asyncio.run(run())
+            self.assertEqual((while_fetching["mirrors_evicted"], after["mirrors_evicted"]), (0, 1))
+            self.assertFalse(os.path.isdir(mirror))
+        print("  [PASS] A mirror whose repo lock is held is left for the next cycle.")
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values, self.ttls = {}, {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return False
+        self.values[key], self.ttls[key] = value, ex
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+
+class TestGCLock(unittest.TestCase):
+    def test_lock_is_released_only_by_its_owner(self):
+        redis = FakeRedis()
+        first, second = WorkspaceGC(None, redis), WorkspaceGC(None, redis)
+
+        async def run():
+            self.assertTrue(await first._acquire_lock())
+            self.assertFalse(await second._acquire_lock())
+            redis.values[GC_LOCK_KEY] = second._lock_token  # ours expired and another cycle took it
+            await first._release_lock()
+            return redis.values.get(GC_LOCK_KEY)
+
+        self.assertEqual(asyncio.run(run()), second._lock_token)
+        print("  [PASS] A cycle whose lock expired does not release the next holder's lock.")
+
+    def test_lock_is_renewed_while_the_cycle_runs(self):
+        redis = FakeRedis()
+        gc = WorkspaceGC(None, redis)
+
+        async def run():
+            await gc._acquire_lock()
+            redis.ttls[GC_LOCK_KEY] = 1
+            with patch("core.workspace_gc.GC_LOCK_TTL", 0.03):
+                renewal = asyncio.create_task(gc._renew_lock())
+                await asyncio.sleep(0.05)
+                renewal.cancel()
+
+        asyncio.run(run())
+        self.assertEqual(redis.ttls[GC_LOCK_KEY], 0.03)
+        print("  [PASS] The GC lock is renewed while a cycle runs.")
+
+
+if __name__ == "__main__":
+    unittest.main()
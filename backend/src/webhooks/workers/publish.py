@@ -13,7 +13,7 @@ Responsibilities:
 import os
 import shutil
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 from workers.base import BaseWorker
 
@@ -113,10 +113,32 @@ class PublishWorker(BaseWorker):
         """Publish the review using the full rich CodeRabbit-style body."""
         try:
             if isinstance(review_result, dict):
-                inline_comments = review_result.get("inline_comments", [])
+                # Comments carried over by an incremental review are already on the PR
+                fresh_comments = [c for c in review_result.get("inline_comments", []) if not c.get("carried_over")]
+                inline_comments, rejected = self._place_inline_comments(fresh_comments, data)
                 
                 # Build the full rich body (Walkthrough + Pre-merge checks + Review body)
-                full_body = self._build_rich_body(review_result, data, commit_sha)
+                full_body = await self._build_rich_body(review_result, data, commit_sha)
+                if rejected:
+                    from core.comment_placement import describe_rejection
+                    full_body += (
+                        f"\n\n<details>\n<summary>💬 Comments outside the diff ({len(rejected)})</summary>\n\n"
+                        + "\n".join(describe_rejection(c, p) for c, p in rejected)
+                        + "\n\n</details>"
+                    )
+                carried_over = review_result.get("stats", {}).get("carried_over_files", 0)
+                incremental = data.get("incremental") or {}
+                if carried_over and incremental.get("base_sha"):
+                    full_body += (
+                        f"\n\n♻️ {carried_over} file(s) unchanged since `{incremental['base_sha'][:7]}` — "
+                        "earlier findings carried over, not re-posted."
+                    )
+                triage = review_result.get("stats", {}).get("triage") or {}
+                if triage.get("clean_files"):
+                    full_body += (
+                        f"\n\n🔎 {len(triage['clean_files'])} low-risk file(s) passed triage "
+                        "and skipped the deep review."
+                    )
                 
                 event = "REQUEST_CHANGES" if review_result.get("verdict") in ("REQUEST_CHANGES", "BLOCK") else "COMMENT"
                 if review_result.get("verdict") == "APPROVE" and not inline_comments:
@@ -149,7 +171,25 @@ class PublishWorker(BaseWorker):
                 logger.error(f"[publish] Fallback publish also failed: {e2}")
                 raise
 
-    def _build_rich_body(self, review_result: Dict, data: Dict, commit_sha: str) -> str:
+    def _place_inline_comments(self, comments: List[Dict], data: Dict):
+        """
+        Snap comment lines onto the diff so one bad line can't make GitHub
+        reject the whole review. Returns (placed comments, rejected pairs).
+        """
+        diff_text = data.get("diff_text", "")
+        if not comments or not diff_text:
+            return comments, []
+        
+        from core.parsed_diff import ParsedDiff
+        from core.comment_placement import CommentPlacer
+        
+        placer = CommentPlacer(ParsedDiff.from_dict(data.get("parsed_diff"), diff_text))
+        placed, rejected = placer.place_comments(comments)
+        if rejected:
+            logger.info(f"[publish] {len(rejected)} inline comment(s) could not be placed on the diff")
+        return placed, rejected
+    
+    async def _build_rich_body(self, review_result: Dict, data: Dict, commit_sha: str) -> str:
         """Build the full CodeRabbit-style rich markdown body from a review_result dict."""
         file_summaries = review_result.get("file_summaries", {})
         nitpicks = review_result.get("nitpicks", {})
@@ -303,13 +343,20 @@ class PublishWorker(BaseWorker):
 
         # Fix all issues dropdown
         if all_raw_findings:
+            from core.llm_usage import UsageRecorder, save_usage, usage_scope
+            usage = UsageRecorder()
             try:
                 from agents.fix_prompt_agent import FixPromptAgent
                 fix_agent = FixPromptAgent()
-                fix_prompt = fix_agent.generate_fix_prompt(all_raw_findings, pr_title=data.get("title", ""))
+                with usage_scope(usage):
+                    fix_prompt = await fix_agent.generate_fix_prompt(all_raw_findings, pr_title=data.get("title", ""))
             except Exception as e:
                 logger.warning(f"[publish] Fix prompt generation failed: {e}")
                 fix_prompt = "Fix prompt generation failed. Please refer to inline comments."
+            try:
+                await save_usage(self.db_session_factory, data["job_id"], repo_full_name, "publish", usage)
+            except Exception as e:
+                logger.warning(f"[publish] Failed to save LLM usage: {e}")
             review_body += "<details>\n"
             review_body += "<summary>Fix all issues with AI Agents 🤖</summary>\n\n"
             review_body += fix_prompt + "\n\n"
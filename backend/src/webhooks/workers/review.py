@@ -57,40 +57,93 @@ class ReviewWorker(BaseWorker):
         
         logger.info(f"[review] Job {job_id}: Starting LLM review for {repo_full_name}#{pr_number}")
         
-        # --- 0. Rate Limiting (Token Bucket) ---
-        from core.rate_limiter import TokenBucketRateLimiter
-        rate_limiter = TokenBucketRateLimiter(self.queue)
-        
-        # We need 1 tokens for this request. Wait up to 5 minutes to acquire it.
-        acquired = await rate_limiter.acquire(tokens=1, timeout=300)
-        if not acquired:
-            logger.warning(f"[review] Job {job_id}: Token Bucket limit reached, timed out waiting for capacity.")
-            raise TimeoutError("LLM Token Bucket capacity exhausted. Rate limit backoff failed.")
+        # --- 0. Rate Limiting ---
+        # Every LLM call charges its provider/model's RPM + TPM buckets inside
+        # AsyncLLMService; share them with the other workers through Redis.
+        from core.rate_limiter import get_provider_limiter
+        get_provider_limiter().attach_redis(self.queue.redis)
+        from core.single_flight import get_single_flight
+        get_single_flight().attach_redis(self.queue.redis)  # coalesce identical prompts across workers
         
         # --- 1. Use the existing reviewer agent ---
         try:
             from agents.reviewer import ReviewerAgent
-            from core.llm import LLMService
+            from core.async_llm import AsyncLLMService
             from core.security import SecretScanner
+            from core.parsed_diff import ParsedDiff
+            from core.review_cache import ReviewCache
             
-            llm = LLMService()
+            from core.provider_router import get_router
+            get_router().attach_redis(self.queue.redis)  # share circuit state across workers
+            llm = AsyncLLMService()
             scanner = SecretScanner()
             
             # Sanitize diff before sending to LLM
             safe_diff = scanner.redact(diff_text)
             safe_context = scanner.redact(context_pack) if context_pack else ""
             
+            # Reuse the structure parsed in fetch unless redaction changed the text
+            if safe_diff == diff_text:
+                parsed_diff = ParsedDiff.from_dict(data.get("parsed_diff"), safe_diff)
+            else:
+                parsed_diff = ParsedDiff.parse(safe_diff)
+            
+            # Incremental re-review: carry over results for files unchanged since the last review
+            prior_results = await self._load_prior_results(job_id, data.get("incremental"))
+            
+            # Triage cascade: .pr-reviewer.yml in the checkout overrides the service defaults
+            from core.triage import load_triage_settings, save_triage_stats
+            triage = load_triage_settings(data.get("workspace_dir") if data.get("clone_success") else None)
+            
             # Use the existing reviewer agent for the actual review
-            reviewer = ReviewerAgent(llm_service=llm)
+            reviewer = ReviewerAgent(llm_service=llm, review_cache=ReviewCache(self.queue.redis))
+            
+            # Token / latency accounting for every LLM call of this review
+            from core.llm_usage import UsageRecorder, save_usage, usage_scope
+            usage = UsageRecorder()
+            with usage_scope(usage):
+                review_result = await reviewer.areview(
+                    diff=safe_diff,
+                    title=title,
+                    description=description,
+                    context=safe_context,
+                    repo=repo_full_name,
+                    pr_number=pr_number,
+                    parsed_diff=parsed_diff,
+                    prior_results=prior_results,
+                    triage=triage,
+                )
+            
+            # Snapshot per-file results so the next push can review incrementally
+            file_results = review_result.pop("file_results", []) if isinstance(review_result, dict) else []
+            try:
+                from core.incremental import save_snapshot
+                await save_snapshot(
+                    self.db_session_factory, job_id, data.get("commit_sha", ""),
+                    data.get("file_hashes", {}), review_result, file_results,
+                )
+            except Exception as e:
+                logger.warning(f"[review] Job {job_id}: Failed to save review snapshot: {e}")
             
-            review_result = reviewer.review(
-                diff=safe_diff,
-                title=title,
-                description=description,
-                context=safe_context,
-                repo=repo_full_name,
-                pr_number=pr_number,
-            )
+            triage_stats = review_result.get("stats", {}).get("triage") if isinstance(review_result, dict) else None
+            if triage_stats:
+                logger.info(
+                    f"[review] Job {job_id}: Triage skipped {len(triage_stats['clean_files'])} deep review(s), "
+                    f"~{triage_stats['net_tokens_saved']} tokens saved"
+                )
+                try:
+                    await save_triage_stats(self.db_session_factory, job_id, triage_stats)
+                except Exception as e:
+                    logger.warning(f"[review] Job {job_id}: Failed to save triage stats: {e}")
+            
+            try:
+                await save_usage(self.db_session_factory, job_id, repo_full_name, "review", usage)
+            except Exception as e:
+                logger.warning(f"[review] Job {job_id}: Failed to save LLM usage: {e}")
+            
+            # JSON repair counts (retries avoided) for /api/admin/json-repair
+            from core.json_repair import flush_repair_stats
+            await flush_repair_stats(self.queue.redis)
             
             # --- 2. Parse findings from review result ---
             findings = self._extract_findings(review_result, job_id)
@@ -122,6 +175,27 @@ class ReviewWorker(BaseWorker):
             logger.error(f"[review] Job {job_id}: Review failed: {e}")
             raise
     
+    async def _load_prior_results(self, job_id: int, incremental: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Per-file results of the last reviewed commit for the files fetch marked reusable."""
+        if not incremental or not incremental.get("reuse_files"):
+            return {}
+        from agents.reviewer import FileReviewResult
+        from core.incremental import load_snapshot, prior_results_for
+        
+        try:
+            snapshot = await load_snapshot(self.db_session_factory, incremental["base_job_id"])
+        except Exception as e:
+            logger.warning(f"[review] Job {job_id}: Failed to load review snapshot, reviewing all files: {e}")
+            return {}
+        if not snapshot:
+            return {}
+        prior = prior_results_for(snapshot["file_results"], incremental["reuse_files"])
+        logger.info(
+            f"[review] Job {job_id}: Incremental — carrying over {len(prior)} file(s) "
+            f"from {incremental['base_sha'][:7]}"
+        )
+        return {path: FileReviewResult.from_dict(r) for path, r in prior.items()}
+    
     def _extract_findings(self, review_result: Any, job_id: int) -> List[Dict]:
         """Extract structured findings from reviewer agent output."""
         findings = []